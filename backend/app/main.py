@@ -1,5 +1,4 @@
 from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi import HTTPException
 import logging
@@ -7,12 +6,14 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 import uvicorn
-from fastapi.responses import JSONResponse
 
 from .routes import document, conversation, analysis, websocket
+from .middleware import CORSRequestMiddleware
 from utils.init_db import init_db
+from services.document_job_queue import get_document_job_queue
 from utils.error_handling import http_exception_handler, validation_exception_handler
 from utils.response import add_cors_headers as add_response_cors_headers
+from utils.serialization import FastJSONResponse
 
 # Load environment variables from .env file in the project root
 project_root = Path(__file__).resolve().parent.parent.parent
@@ -48,6 +49,7 @@ app = FastAPI(
     title="Financial Document Analysis System API",
     description="API for analyzing financial documents with Claude API",
     version="0.1.0",
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS
@@ -61,25 +63,16 @@ if not allowed_origins_env_str:
 else:
     allowed_origins = allowed_origins_env_str.split(",")
 
-# Add regex for 127.0.0.1 with any port to support dynamic ports from browser previews
-# This regex matches http://127.0.0.1: followed by one or more digits.
+# Also allow http://127.0.0.1 with any port to support dynamic ports from browser previews
 preview_origin_regex = r"http://127\.0\.0\.1:\d+"
-if preview_origin_regex not in allowed_origins: # Avoid duplicates
-    allowed_origins.append(preview_origin_regex)
+logger.info(f"CORS: Allowing origins: {allowed_origins} and {preview_origin_regex}")
 
-# Also, ensure the specific preview origin provided by the user is included.
-user_preview_origin = "http://127.0.0.1:64142" # From user input
-if user_preview_origin not in allowed_origins:
-    allowed_origins.append(user_preview_origin)
-logger.info(f"CORS: Allowing origins: {allowed_origins}")
-
-# Add CORS middleware directly to the app
+# CORS (preflight and headers on every response, errors included), unhandled-exception
+# responses and request ids in one pure ASGI middleware; see app/middleware.py
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allowed_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    CORSRequestMiddleware,
+    allowed_origins=allowed_origins,
+    allowed_origin_regex=preview_origin_regex,
     expose_headers=["Content-Type", "X-Total-Count"]
 )
 
@@ -96,90 +89,6 @@ async def custom_http_exception_handler(request: Request, exc: HTTPException):
     response = await http_exception_handler(request, exc)
     return add_response_cors_headers(response)
 
-# Handle unexpected errors with CORS headers - this needs to be BEFORE the handle_options middleware
-@app.middleware("http")
-async def add_cors_headers_to_errors(request: Request, call_next):
-    """Add CORS headers to all responses including errors."""
-    # Skip WebSocket requests
-    if request.url.path.startswith("/ws/"):
-        return await call_next(request)
-    
-    try:
-        # Get the origin from the request
-        origin = request.headers.get("origin", "*")
-        # Check if the origin is allowed
-        if origin in allowed_origins or origin == "*":
-            allowed_origin = origin
-        else:
-            allowed_origin = allowed_origins[0] if allowed_origins else "*"
-            
-        try:
-            response = await call_next(request)
-            
-            # Add CORS headers if needed
-            if "access-control-allow-origin" not in response.headers:
-                response.headers["Access-Control-Allow-Origin"] = allowed_origin
-                response.headers["Access-Control-Allow-Credentials"] = "true"
-                response.headers["Access-Control-Allow-Methods"] = "*"
-                response.headers["Access-Control-Allow-Headers"] = "*"
-            
-            return response
-            
-        except Exception as e:
-            # For any uncaught exception, make sure we return a response with CORS headers
-            logging.exception(f"Unhandled exception: {str(e)}")
-            
-            # Create error response with CORS headers
-            response = JSONResponse(
-                status_code=500,
-                content={"detail": f"Internal server error: {str(e)}"}
-            )
-            response.headers["Access-Control-Allow-Origin"] = allowed_origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Methods"] = "*"
-            response.headers["Access-Control-Allow-Headers"] = "*"
-            
-            return response
-    except Exception as outer_e:
-        # Last resort fallback
-        logging.exception(f"Critical error in CORS middleware: {str(outer_e)}")
-        response = JSONResponse(
-            status_code=500,
-            content={"detail": "Critical internal server error"}
-        )
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "*"
-        response.headers["Access-Control-Allow-Headers"] = "*"
-        return response
-
-# Add a middleware to handle OPTIONS requests for CORS preflight
-@app.middleware("http")
-async def handle_options(request: Request, call_next):
-    if request.method == "OPTIONS":
-        # Get the origin from the request
-        origin = request.headers.get("origin", "*")
-        # Check if the origin is allowed
-        if origin in allowed_origins or origin == "*":
-            allowed_origin = origin
-        else:
-            allowed_origin = allowed_origins[0] if allowed_origins else "*"
-            
-        # Return empty response with CORS headers for preflight requests
-        response = JSONResponse(
-            status_code=200,
-            content={}
-        )
-        response.headers["Access-Control-Allow-Origin"] = allowed_origin
-        response.headers["Access-Control-Allow-Methods"] = "*"
-        response.headers["Access-Control-Allow-Headers"] = "*"
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Max-Age"] = "3600"
-        return response
-    
-    # For non-OPTIONS requests, proceed normally
-    return await call_next(request)
-
 # Include routers
 app.include_router(document.router)
 app.include_router(conversation.router)
@@ -214,6 +123,17 @@ async def startup_event():
         # Continue even if database initialization fails
         # In production, you might want to exit the application
         pass
+    
+    # Start document-processing workers (also recovers jobs interrupted by the last shutdown)
+    try:
+        await get_document_job_queue().start()
+    except Exception as e:
+        logger.error(f"Error starting document job queue: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers, returning in-flight jobs to the queue."""
+    await get_document_job_queue().stop()
 
 if __name__ == "__main__":
     # Run the app with uvicorn when script is executed directly
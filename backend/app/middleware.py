@@ -0,0 +1,144 @@
+"""
+ASGI middleware for the HTTP API.
+
+CORSRequestMiddleware handles, in one layer:
+- CORS preflight: every OPTIONS request is answered directly
+- CORS headers on every HTTP response, error responses included
+- a 500 JSON response (with CORS headers) for exceptions nothing else handled
+- request ids: ``X-Request-ID`` is taken from the request or generated, exposed as
+  ``request.state.request_id``, used to initialise the request's cost metrics
+  (utils.request_context) and echoed on the response
+
+It is a plain ASGI callable that only rewrites the ``http.response.start`` message.
+Body chunks (SSE included) go straight to the server's ``send``, with no buffering and
+no extra tasks or queues as ``@app.middleware("http")`` (BaseHTTPMiddleware) adds.
+"""
+import logging
+import re
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+from utils.request_context import init_request_metrics
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+Headers = List[Tuple[bytes, bytes]]
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class CORSRequestMiddleware:
+    """CORS, unhandled-error and request-id handling as a single pure ASGI middleware."""
+
+    def __init__(
+        self,
+        app,
+        allowed_origins: Iterable[str] = (),
+        allowed_origin_regex: Optional[str] = None,
+        expose_headers: Iterable[str] = ("Content-Type", "X-Total-Count"),
+        max_age: int = 3600
+    ):
+        """
+        Args:
+            app: The wrapped ASGI application
+            allowed_origins: Origins echoed back in Access-Control-Allow-Origin
+            allowed_origin_regex: Pattern for further allowed origins (e.g. preview ports)
+            expose_headers: Response headers readable by the browser (X-Request-ID is added)
+            max_age: Seconds browsers may cache a preflight answer
+        """
+        self.app = app
+        self.allowed_origins = list(allowed_origins)
+        self._origin_set = set(self.allowed_origins)
+        self.origin_regex = re.compile(allowed_origin_regex) if allowed_origin_regex else None
+        # Disallowed origins get the first configured origin, which the browser will reject
+        self.fallback_origin = self.allowed_origins[0] if self.allowed_origins else "*"
+        self.expose_headers = ", ".join([*expose_headers, "X-Request-ID"]).encode("latin-1")
+        self.max_age = str(max_age).encode("latin-1")
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if origin in self._origin_set:
+            return True
+        return self.origin_regex is not None and self.origin_regex.fullmatch(origin) is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value.decode("latin-1")
+            elif name == b"x-request-id":
+                request_id = value.decode("latin-1")
+        if request_id is None or not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+        init_request_metrics(request_id)
+
+        allowed = origin is not None and origin != "*" and self.is_allowed_origin(origin)
+        if origin is None or origin == "*":
+            allow_origin = "*"
+        else:
+            allow_origin = origin if allowed else self.fallback_origin
+        cors_headers: Headers = [
+            (b"access-control-allow-origin", allow_origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-allow-methods", b"*"),
+            (b"access-control-allow-headers", b"*"),
+        ]
+        request_id_header = (b"x-request-id", request_id.encode("latin-1"))
+
+        if scope["method"] == "OPTIONS":
+            await self._send_json(send, 200, {}, cors_headers + [
+                (b"access-control-max-age", self.max_age),
+                request_id_header
+            ])
+            return
+
+        response_started = False
+
+        async def send_with_headers(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                headers = [
+                    (name, value) for name, value in message.get("headers", ())
+                    # Allowed origins are always echoed, replacing handler defaults
+                    if not (allowed and name.lower() == b"access-control-allow-origin")
+                ]
+                if not any(name.lower() == b"access-control-allow-origin" for name, _ in headers):
+                    headers.extend(cors_headers)
+                headers.append((b"access-control-expose-headers", self.expose_headers))
+                if allowed:
+                    headers.append((b"vary", b"Origin"))
+                headers.append(request_id_header)
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        except Exception as e:
+            if response_started:
+                raise
+            logger.exception(f"Unhandled exception for request {request_id}: {e}")
+            await self._send_json(send, 500, {"detail": f"Internal server error: {str(e)}"}, cors_headers + [
+                (b"access-control-expose-headers", self.expose_headers),
+                request_id_header
+            ])
+
+    @staticmethod
+    async def _send_json(send, status: int, content, headers: Headers):
+        body = dumps(content)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                *headers
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
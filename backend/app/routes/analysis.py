@@ -19,6 +19,7 @@ from utils.dependencies import (
 from pdf_processing.api_service import ClaudeService
 from pdf_processing.langchain_service import LangChainService
 from utils.database import get_db
+from utils.serialization import ModelEncoder
 
 # Configure more verbose logging
 logger = logging.getLogger(__name__)
@@ -26,6 +27,9 @@ logging.basicConfig(level=logging.INFO)
 
 router = APIRouter(prefix="/api/analysis", tags=["analysis"])
 
+# Precomputed serializer for analysis responses (charts, tables and metrics can be large)
+ANALYSIS_RESPONSE_ENCODER = ModelEncoder(AnalysisApiResponse)
+
 # Dependencies
 async def get_document_repository(db: AsyncSession = Depends(get_db)):
     return DocumentRepository(db)
@@ -88,9 +92,11 @@ async def run_analysis_endpoint(
         )
 
         # Log the dictionary received from the service
-        logger.info(f"--- analysis_result_dict from AnalysisService for analysis {analysis_id} ---")
-        logger.info(json.dumps(analysis_result_dict, indent=2, default=str)) # Use default=str for any non-serializable items
-        logger.info(f"--- End analysis_result_dict from AnalysisService ---")
+        # Pretty-printing the whole result is expensive; only do it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"--- analysis_result_dict from AnalysisService for analysis {analysis_id} ---")
+            logger.debug(json.dumps(analysis_result_dict, indent=2, default=str)) # Use default=str for any non-serializable items
+            logger.debug(f"--- End analysis_result_dict from AnalysisService ---")
 
         # Ensure visualization_data is properly structured for VisualizationDataResponse
         viz_data_input = analysis_result_dict.get("visualization_data") or {}
@@ -128,11 +134,11 @@ async def run_analysis_endpoint(
         logger.info(f"Charts: {len(api_response.visualization_data.charts)}, Tables: {len(api_response.visualization_data.tables)}")
         logger.info(f"Metrics: {len(api_response.metrics)}, Ratios: {len(api_response.ratios)}, Comparisons: {len(api_response.comparative_periods)}")
 
-        # Temporarily log the exact response being sent to the frontend
-        response_to_send = api_response.model_dump(by_alias=True)
-        logger.info(f"--- JSON Response to Frontend ---")
-        logger.info(json.dumps(response_to_send, indent=2))
-        logger.info(f"--- End JSON Response to Frontend ---")
+        response_to_send = ANALYSIS_RESPONSE_ENCODER.response(api_response)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"--- JSON Response to Frontend ---")
+            logger.debug(response_to_send.body.decode("utf-8"))
+            logger.debug(f"--- End JSON Response to Frontend ---")
 
         return response_to_send
 
@@ -199,7 +205,7 @@ async def get_analysis_result(
             periods=analysis_result_obj.periods,
             query=analysis_result_obj.query
         )
-        return api_response.model_dump(by_alias=True) # Use model_dump for Pydantic V2
+        return ANALYSIS_RESPONSE_ENCODER.response(api_response)
 
     except ValueError as ve:
         logger.warning(f"Analysis not found: {ve}")
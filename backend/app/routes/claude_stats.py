@@ -79,6 +79,55 @@ async def get_file_cache_stats() -> Dict[str, Any]:
         logger.error(f"Error getting file cache stats: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve cache stats: {str(e)}")
 
+@router.get("/response-cache")
+async def get_response_cache_stats() -> Dict[str, Any]:
+    """
+    Get persistent response cache statistics for deterministic Claude calls.
+    
+    Returns:
+        Dictionary with hit/miss counters and store size
+    """
+    try:
+        from utils.response_cache import get_response_cache
+        
+        cache_stats = get_response_cache().stats()
+        
+        return {
+            "cache_stats": cache_stats,
+            "optimization_impact": {
+                "description": "Each hit skips a full classification or extraction call for byte-identical content",
+                "cache_hit_benefit": "Local SQLite lookup vs multi-second model call"
+            },
+            "status": "active" if cache_stats["entries"] > 0 else "empty"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting response cache stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve response cache stats: {str(e)}")
+
+@router.get("/rate-limits")
+async def get_rate_limit_stats() -> Dict[str, Any]:
+    """
+    Get the shared Claude rate-limiter state seen by every worker on this host.
+    
+    Returns:
+        Dictionary with per-dimension budgets and queued waiters
+    """
+    try:
+        from utils.claude_bucket import ClaudeBucket
+        
+        state = ClaudeBucket.snapshot()
+        
+        return {
+            "rate_limits": state,
+            "dimensions": ["requests", "input_tokens", "output_tokens"],
+            "status": "throttling" if state.get("queued_waiters", 0) > 0 else "active"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting rate limit stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve rate limit stats: {str(e)}")
+
 @router.get("/optimization-summary")
 async def get_optimization_summary() -> Dict[str, Any]:
     """
@@ -114,7 +163,7 @@ async def get_optimization_summary() -> Dict[str, Any]:
                 },
                 "rate_limiting": {
                     "status": "active", 
-                    "benefit": "Prevents 429 errors with token bucket",
+                    "benefit": "Prevents 429 errors with a worker-shared requests/input/output token bucket",
                     "throttling_enabled": True
                 }
             },
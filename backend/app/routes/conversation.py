@@ -1,25 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, status
 from fastapi.responses import StreamingResponse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
-import json
 import asyncio
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.message import ConversationCreateRequest, MessageRequest, MessageResponse
 from utils.dependencies import get_conversation_service, get_document_service
 from models.message import Message, MessageRole, ConversationState
-from models.document import Citation
 from services.conversation_service import ConversationService
+from services.stream_protocol import negotiate_protocol, PROTOCOL_DELTA
+from services.sse_stream import SSEStream, parse_event_id
+from utils.serialization import ModelEncoder
+from utils.message_converters import stored_citation_to_internal
 from pdf_processing.api_service import ClaudeService
 from pdf_processing.document_service import DocumentService
 from repositories.document_repository import DocumentRepository
 from repositories.conversation_repository import ConversationRepository
 from utils.database import get_db
+from app.routes import websocket as ws_routes
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/conversation", tags=["conversation"])
 
+# Precomputed serializers for the largest responses (history with analysis blocks)
+MESSAGE_ENCODER = ModelEncoder(Message)
+MESSAGE_LIST_ENCODER = ModelEncoder(List[Message])
+
 
 # Dependencies
 async def get_document_repository(db: AsyncSession = Depends(get_db)):
@@ -204,8 +212,8 @@ async def get_conversation_history(
     if conversation.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
     
-    # Get the conversation messages
-    messages = await conversation_service.get_conversation_messages(
+    # Messages, analysis blocks, citations and document titles in a fixed number of queries
+    messages, citations_by_message = await conversation_service.conversation_repository.get_conversation_history(
         conversation_id=conversation_id,
         limit=limit,
         offset=offset
@@ -215,43 +223,19 @@ async def get_conversation_history(
     api_messages = []
     
     for msg in messages:
-        # Get citations for this message
-        citations = await conversation_service.conversation_repository.get_message_citations(msg.id)
-        
-        # Convert citations to Citation objects
-        citation_objects = []
-        for citation in citations:
-            # Get the document for this citation
-            document = await conversation_service.document_repository.get_document(citation.document_id)
-            doc_title = document.filename if document else "Unknown Document"
-            
-            citation_objects.append(
-                Citation(
-                    id=citation.id,
-                    document_id=citation.document_id,
-                    document_title=doc_title,
-                    content=citation.content,
-                    metadata=citation.metadata or {},
-                    type=citation.metadata.get("type", "unknown") if citation.metadata else "unknown"
-                )
-            )
-        
-        # Create content blocks if available
-        content_blocks = None
-        if hasattr(msg, 'content_blocks') and msg.content_blocks:
-            content_blocks = msg.content_blocks
-        
-        # Get analysis blocks for this message
-        analysis_blocks = []
-        if hasattr(msg, 'analysis_blocks'):
-            for block in msg.analysis_blocks:
-                analysis_blocks.append({
-                    "id": block.id,
-                    "block_type": block.block_type,
-                    "title": block.title,
-                    "content": block.content,
-                    "created_at": block.created_at
-                })
+        citations = citations_by_message.get(msg.id, [])
+        
+        # Analysis blocks were loaded with the page
+        analysis_blocks = [
+            {
+                "id": block.id,
+                "block_type": block.block_type,
+                "title": block.title,
+                "content": block.content,
+                "created_at": block.created_at
+            }
+            for block in msg.analysis_blocks
+        ]
         
         api_messages.append(
             Message(
@@ -262,14 +246,55 @@ async def get_conversation_history(
                 content=msg.content,
                 referenced_documents=[],  # We don't store this directly in the database
                 referenced_analyses=[],   # We don't store this directly in the database
-                citation_links=[citation.id for citation in citations],
-                citations=citation_objects,
-                content_blocks=content_blocks,
+                citation_links=[citation.id for citation, _ in citations],
+                citations=[stored_citation_to_internal(citation, title) for citation, title in citations],
+                content_blocks=msg.content_blocks or None,
                 analysis_blocks=analysis_blocks
             )
         )
     
-    return api_messages
+    return MESSAGE_LIST_ENCODER.response(api_messages)
+
+@router.get("/search", response_model=Dict[str, Any], response_model_by_alias=True)
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0),
+    conversation_service: ConversationService = Depends(get_conversation_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Full-text search over the current user's conversations and messages.
+    
+    Returns:
+        Matching conversations and messages, best match first; message snippets are HTML
+        with the matched terms in <mark> tags
+    """
+    repository = conversation_service.conversation_repository
+    conversations = await repository.search_conversations(user_id=user_id, query=q, limit=limit, offset=offset)
+    messages = await repository.search_messages(user_id=user_id, query=q, limit=limit, offset=offset)
+    return {
+        "conversations": [
+            {
+                "id": conversation.id,
+                "title": conversation.title,
+                "updatedAt": conversation.updated_at.isoformat() if conversation.updated_at else None
+            }
+            for conversation in conversations
+        ],
+        "messages": [
+            {
+                "messageId": hit["message_id"],
+                "conversationId": hit["conversation_id"],
+                "conversationTitle": hit["conversation_title"],
+                "role": hit["role"],
+                "timestamp": hit["created_at"],
+                "snippet": hit["snippet"],
+                "rank": hit["rank"]
+            }
+            for hit in messages
+        ]
+    }
 
 @router.get("/{conversation_id}", response_model=Dict[str, Any], response_model_by_alias=True)
 async def get_conversation(
@@ -643,26 +668,12 @@ async def get_message(
         if conversation.user_id != user_id:
             raise HTTPException(status_code=403, detail="Not authorized to access this message")
         
-        # Get citations for this message
-        citations = await conversation_service.conversation_repository.get_message_citations(message.id)
-        
-        # Convert citations to Citation objects
-        citation_objects = []
-        for citation in citations:
-            # Get the document for this citation
-            document = await conversation_service.document_repository.get_document(citation.document_id)
-            doc_title = document.filename if document else "Unknown Document"
-            
-            citation_objects.append(
-                Citation(
-                    id=citation.id,
-                    document_id=citation.document_id,
-                    document_title=doc_title,
-                    content=citation.content,
-                    metadata=citation.metadata or {},
-                    type=citation.metadata.get("type", "unknown") if citation.metadata else "unknown"
-                )
-            )
+        # Get citations for this message, with document titles, in one query
+        citations = await conversation_service.conversation_repository.get_citations_for_messages([message.id])
+        citation_objects = [
+            stored_citation_to_internal(citation, title)
+            for citation, title in citations.get(message.id, [])
+        ]
         
         # Get analysis blocks for this message
         analysis_blocks = []
@@ -688,7 +699,7 @@ async def get_message(
             analysisBlocks=analysis_blocks
         )
         
-        return api_message.model_dump(by_alias=True)
+        return MESSAGE_ENCODER.response(api_message)
         
     except HTTPException:
         raise
@@ -699,19 +710,61 @@ async def get_message(
             detail=f"Error getting message: {str(e)}"
         )
 
+def _sse_response(stream: SSEStream, start, protocol_version: int) -> StreamingResponse:
+    """
+    Stream an SSEStream that the WebSocket pipeline delivers to. ``start`` runs once the
+    response is being consumed; when the client goes away the stream is detached, stays
+    resumable and is cancelled unless resumed within STREAM_CANCEL_AFTER_DISCONNECT_SECONDS.
+    """
+    client_id = stream.client_id
+    
+    async def generate_stream():
+        try:
+            await start()
+            async for chunk in stream.events():
+                yield chunk
+        finally:
+            ws_routes.manager.disconnect(client_id)
+    
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Stop nginx-style proxies buffering the stream
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "*",
+            "X-Stream-Protocol": str(protocol_version),
+        }
+    )
+
+def _attach_sse_stream(request: Request, session_id: str) -> SSEStream:
+    stream = SSEStream(f"sse_{session_id}_{uuid.uuid4().hex}", is_disconnected=request.is_disconnected)
+    ws_routes.manager.attach(stream.client_id, stream)
+    return stream
+
 @router.post("/{session_id}/message/stream")
 async def send_message_streaming(
     session_id: str,
     message: MessageRequest,
+    request: Request,
+    protocol: Optional[str] = Query(None, description="Stream protocol version (1 = legacy accumulated_text, 2 = deltas)"),
     conversation_service: ConversationService = Depends(get_conversation_service),
 ):
     """
     Send a message to a conversation and get a streaming AI response.
     Returns Server-Sent Events (SSE) for real-time streaming.
     
+    The stream runs through the same pipeline as the WebSocket endpoint and carries the
+    same events (see services/sse_stream.py for batching, keep-alives and event ids).
+    With protocol 2 every event has an ``id``; after a dropped connection,
+    ``GET /{session_id}/message/stream/resume`` with ``Last-Event-ID`` replays what was missed.
+    
     Args:
         session_id: The ID of the conversation session
         message: The message content and optional citation IDs
+        protocol: Wire protocol version, see services/stream_protocol.py
         
     Returns:
         StreamingResponse with Server-Sent Events
@@ -722,66 +775,60 @@ async def send_message_streaming(
             detail="Session ID in path must match session ID in request body"
         )
     
-    async def generate_stream():
-        """Generate streaming response as Server-Sent Events."""
-        try:
-            # Define callback for streaming events
-            async def emit_callback(event: Dict[str, Any]):
-                # Format as Server-Sent Event
-                event_data = json.dumps(event)
-                yield f"data: {event_data}\n\n"
-            
-            # Process the message with streaming
-            result = await conversation_service.process_user_message_streaming(
-                conversation_id=session_id,
-                content=message.content,
-                citation_ids=message.citation_links,
-                referenced_documents=message.referenced_documents,
-                referenced_analyses=message.referenced_analyses,
-                emit_callback=emit_callback
-            )
-            
-            # Send final completion event
-            message_obj = result.get("message", {})
-            message_id = None
-            if message_obj and hasattr(message_obj, 'id'):
-                message_id = str(message_obj.id)
-            elif message_obj and isinstance(message_obj, dict):
-                message_id = str(message_obj.get("id")) if message_obj.get("id") else None
-            
-            completion_event = {
-                "type": "message_complete",
-                "success": result.get("success", True),
-                "message_id": message_id
-            }
-            
-            yield f"data: {json.dumps(completion_event)}\n\n"
-            
-        except ValueError as e:
-            error_event = {
-                "type": "error",
-                "error": "validation_error",
-                "message": str(e)
-            }
-            yield f"data: {json.dumps(error_event)}\n\n"
-            
-        except Exception as e:
-            logger.exception(f"Error in streaming message processing: {str(e)}")
-            error_event = {
-                "type": "error", 
-                "error": "server_error",
-                "message": f"An error occurred while processing the message: {str(e)}"
-            }
-            yield f"data: {json.dumps(error_event)}\n\n"
+    protocol_version = negotiate_protocol(protocol)
+    stream = _attach_sse_stream(request, session_id)
     
-    # Return streaming response with SSE headers
-    return StreamingResponse(
-        generate_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
\ No newline at end of file
+    async def start():
+        task = asyncio.create_task(ws_routes.handle_streaming_message(
+            conversation_service=conversation_service,
+            conversation_id=session_id,
+            user_message=message.content,
+            options={
+                "citation_ids": message.citation_links,
+                "referenced_documents": message.referenced_documents,
+                "referenced_analyses": message.referenced_analyses
+            },
+            client_id=stream.client_id,
+            protocol_version=protocol_version
+        ))
+        task.add_done_callback(lambda _: stream.close())
+    
+    return _sse_response(stream, start, protocol_version)
+
+@router.get("/{session_id}/message/stream/resume")
+async def resume_message_stream(
+    session_id: str,
+    request: Request,
+    message_id: Optional[str] = Query(None, description="Streaming message to resume"),
+    last_seq: int = Query(0, ge=0, description="Last seq received"),
+    last_event_id: Optional[str] = Header(None, description="<message_id>:<seq> of the last event received")
+):
+    """
+    Resume a protocol 2 SSE stream after a dropped connection.
+    
+    Replies with a ``resumed`` event, the events after ``Last-Event-ID`` (or
+    message_id/last_seq) and then the live stream; ``resume_failed`` if the stream is
+    unknown or no longer resumable.
+    """
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None:
+        message_id, last_seq = resume_from
+    if not message_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide Last-Event-ID or message_id"
+        )
+    
+    stream = _attach_sse_stream(request, session_id)
+    stream.message_id = message_id
+    
+    async def start():
+        await ws_routes.handle_resume(
+            conversation_id=session_id,
+            message_id=message_id,
+            last_seq=last_seq,
+            client_id=stream.client_id
+        )
+        ws_routes.notify_when_finished(message_id, stream.client_id, stream.close)
+    
+    return _sse_response(stream, start, PROTOCOL_DELTA)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Path, Body
 from fastapi.responses import FileResponse, Response
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 import logging
 import os
 
@@ -10,9 +10,12 @@ from models.database_models import ProcessingStatusEnum
 from repositories.document_repository import DocumentRepository
 from pdf_processing.document_service import DocumentService
 from utils.database import get_db
+from utils.storage import FileTooLargeError, STREAM_CHUNK_SIZE
+import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.dependencies import get_document_service, get_document_repository, get_analysis_repository
 from repositories.analysis_repository import AnalysisRepository
+from repositories.document_job_repository import DocumentJobRepository
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +30,14 @@ async def get_document_service(db: AsyncSession = Depends(get_db)):
     document_repository = DocumentRepository(db)
     return DocumentService(document_repository)
 
+# Product upload limit; the Files API limit (settings.FILES_MAX_SIZE_MB) also applies
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+async def _iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an upload in fixed-size chunks instead of loading it whole."""
+    while chunk := await file.read(STREAM_CHUNK_SIZE):
+        yield chunk
+
 @router.post("/upload", response_model=DocumentUploadResponse, response_model_by_alias=True)
 async def upload_document(
     file: UploadFile = File(...),
@@ -40,18 +51,22 @@ async def upload_document(
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="File must be a PDF")
     
-    # Validate file size (10MB max)
-    if file.size and file.size > 10 * 1024 * 1024:
+    # Validate file size (10MB max) up front when the client declared it
+    if file.size and file.size > MAX_UPLOAD_BYTES:
         raise HTTPException(status_code=413, detail="File size must be less than 10MB")
     
     try:
-        # Read the file
-        file_data = await file.read()
-        
-        # Upload and process the document
-        response = await document_service.upload_document(file_data, file.filename, user_id)
+        # Stream the file to storage in chunks; the limit is also enforced while streaming
+        response = await document_service.upload_document_stream(
+            _iter_upload(file),
+            file.filename,
+            user_id,
+            max_size_bytes=min(MAX_UPLOAD_BYTES, settings.FILES_MAX_SIZE_MB * 1024 * 1024)
+        )
         
         return response
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
@@ -83,6 +98,30 @@ async def list_documents(
     # Convert to API schema
     return [document_repository.document_to_metadata_schema(doc) for doc in documents]
 
+@router.get("/jobs/stats", response_model=Dict[str, Any])
+async def get_document_job_stats():
+    """
+    Get document-processing queue statistics (job counts by status, waiting users, local workers).
+    """
+    from services.document_job_queue import get_document_job_queue
+    
+    return await get_document_job_queue().stats()
+
+@router.get("/{document_id}/job", response_model=Dict[str, Any])
+async def get_document_job_status(
+    document_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the status, stage, progress and retry state of a document's latest processing job.
+    """
+    job_repository = DocumentJobRepository(db)
+    job = await job_repository.get_latest_job_for_document(document_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No processing job found for document")
+    
+    return job_repository.job_to_status(job)
+
 @router.get("/{document_id}", response_model=ProcessedDocument, response_model_by_alias=True)
 async def get_document(
     document_id: str,
@@ -365,7 +404,7 @@ async def get_document_file(
         
         # If binary retrieval failed, try physical file
         # Get the actual file path
-        file_path = document_service.document_repository.get_document_file_path(document_id)
+        file_path = await document_service.document_repository.get_document_file_path(document_id)
         
         # Check if the file exists
         if os.path.exists(file_path):
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set, Tuple
 import json
 import logging
 import asyncio
 import uuid
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from services.conversation_service import ConversationService
+from services.connection_outbox import ConnectionOutbox
+from services.stream_protocol import StreamEncoder, negotiate_protocol, PROTOCOL_LEGACY, PROTOCOL_DELTA
+from services.stream_replay import StreamReplayBuffer
+from services.stream_session_store import FramePublisher, SessionRecord, WORKER_ID, get_session_store
+from utils.metrics import record_stream_cancellation
+from utils.serialization import ENCODING_JSON, ENCODING_MSGPACK, dumps_text, negotiate_ws_encoding, packb
+import settings
 from pdf_processing.document_service import DocumentService
 from repositories.document_repository import DocumentRepository
 from repositories.conversation_repository import ConversationRepository
@@ -20,78 +27,215 @@ router = APIRouter(prefix="/ws", tags=["websocket"])
 # Session tracking for streaming messages
 @dataclass
 class StreamingSession:
-    """Track state of an active streaming session."""
+    """
+    Track state of a streaming message. The session outlives the socket that started
+    it: frames keep going into its replay buffer, and a resume handshake from another
+    connection reattaches it by pointing client_id at the new socket. With a shared
+    session store the frames are also published so that other workers can relay them.
+    """
     message_id: str
     client_id: str
     conversation_id: str
     active: bool = True
     has_sent_start: bool = False
     created_at: datetime = None
+    completed_at: Optional[datetime] = None
+    encoder: StreamEncoder = field(default_factory=StreamEncoder)
+    replay: StreamReplayBuffer = field(default_factory=StreamReplayBuffer)
+    # Serializes live delivery against resume so replayed and live frames never interleave
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Task running handle_streaming_message, cancelled by cancel_stream
+    task: Optional[asyncio.Task] = None
+    cancel_reason: Optional[str] = None
+    # Set when the session store is shared with other workers
+    publisher: Optional[FramePublisher] = None
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.utcnow()
+    
+    async def deliver(self, event: Dict[str, Any]):
+        """Encode an event, record its frames for replay and send them to the attached client."""
+        async with self.lock:
+            frames = self.encoder.encode(event)
+            for frame in frames:
+                self.replay.append(frame)
+                await manager.send_message(self.client_id, frame)
+            if self.publisher is not None:
+                self.publisher.add(frames)
 
-# Global session tracker
+# Sessions running in this worker, keyed by streaming message_id. Other workers find them
+# through the session store (services/stream_session_store.py)
 streaming_sessions: Dict[str, StreamingSession] = {}
+# (message_id, task) relaying a stream owned by another worker, keyed by the client_id it sends to
+remote_relays: Dict[str, Tuple[str, asyncio.Task]] = {}
+# Picks up cancel requests for this worker's streams from a shared session store
+_command_poller: Optional[asyncio.Task] = None
+# Pending disconnect checks started by _after_disconnect_grace (kept referenced until they finish)
+_disconnect_checks: Set[asyncio.Task] = set()
+
+def cancel_stream(session: StreamingSession, reason: str) -> bool:
+    """
+    Cancel a running stream. The CancelledError propagates through the conversation
+    service into ClaudeService._process_streaming_response, which closes the Claude
+    stream and releases the unused output reservation; the partial answer is persisted.
+    
+    Returns:
+        True if a running stream was cancelled
+    """
+    if not session.active or session.task is None or session.task.done():
+        return False
+    session.cancel_reason = reason
+    session.task.cancel()
+    logger.info(f"WEBSOCKET_FLOW: Cancelling stream {session.message_id} ({reason})")
+    return True
+
+def _after_disconnect_grace(check, *args):
+    """Run an async check STREAM_CANCEL_AFTER_DISCONNECT_SECONDS from now."""
+    def start():
+        task = asyncio.create_task(_run_disconnect_check(check, *args))
+        _disconnect_checks.add(task)
+        task.add_done_callback(_disconnect_checks.discard)
+
+    asyncio.get_running_loop().call_later(settings.STREAM_CANCEL_AFTER_DISCONNECT_SECONDS, start)
+
+async def _run_disconnect_check(check, *args):
+    try:
+        await check(*args)
+    except Exception as e:
+        logger.error(f"Disconnect check {check.__name__} failed: {e}", exc_info=True)
+
+async def _cancel_if_still_detached(session: StreamingSession, client_id: str):
+    if session.client_id != client_id or client_id in manager.outboxes:
+        return
+    record = await get_session_store().get(session.message_id)
+    if record is not None and record.client_id != client_id:
+        return  # Resumed on another worker
+    cancel_stream(session, "disconnect")
+
+async def _cancel_remote_if_still_detached(message_id: str, client_id: str):
+    store = get_session_store()
+    record = await store.get(message_id)
+    if record is not None and record.active and record.client_id == client_id:
+        await store.request_cancel(message_id, "disconnect")
+
+def _ensure_command_poller():
+    """Start polling the shared store for cancel requests while this worker runs streams."""
+    global _command_poller
+    if _command_poller is None or _command_poller.done():
+        _command_poller = asyncio.create_task(_poll_commands())
+
+async def _poll_commands():
+    store = get_session_store()
+    while any(session.active for session in streaming_sessions.values()):
+        await asyncio.sleep(settings.STREAM_STORE_POLL_SECONDS)
+        for message_id, reason in await store.take_cancel_requests(WORKER_ID):
+            session = streaming_sessions.get(message_id)
+            if session is not None:
+                cancel_stream(session, reason)
 
 def cleanup_stale_sessions(max_age_minutes: int = 30):
-    """Remove sessions older than max_age_minutes."""
+    """
+    Remove finished sessions once they are no longer resumable
+    (STREAM_RESUME_GRACE_SECONDS after completion) and any inactive session older than
+    max_age_minutes.
+    """
     now = datetime.utcnow()
     sessions_to_remove = []
     
     for session_key, session in streaming_sessions.items():
         age = (now - session.created_at).total_seconds() / 60
-        if age > max_age_minutes and not session.active:
+        if session.active:
+            continue
+        if age > max_age_minutes:
+            sessions_to_remove.append(session_key)
+        elif session.completed_at and (now - session.completed_at).total_seconds() > settings.STREAM_RESUME_GRACE_SECONDS:
             sessions_to_remove.append(session_key)
             
     for session_key in sessions_to_remove:
-        logger.info(f"Removing stale session {session_key} (age > {max_age_minutes} minutes)")
+        logger.info(f"Removing stale session {session_key}")
         del streaming_sessions[session_key]
         
     return len(sessions_to_remove)
 
 # Connection manager for WebSocket connections
 class ConnectionManager:
+    """
+    Tracks open sockets. Messages are queued on a per-connection ConnectionOutbox and
+    written by its sender task, so producers never wait on a client's network.
+    """
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        self.outboxes: Dict[str, ConnectionOutbox] = {}
         
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str, encoding: str = ENCODING_JSON):
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        
+        if encoding == ENCODING_MSGPACK:
+            async def send(frame: Dict[str, Any]):
+                await websocket.send_bytes(packb(frame))
+        else:
+            async def send(frame: Dict[str, Any]):
+                await websocket.send_text(dumps_text(frame))
+        
+        async def on_close(reason: str):
+            logger.warning(f"Closing WebSocket {client_id}: {reason}")
+            self.disconnect(client_id)
+            if reason == "slow_consumer":
+                try:
+                    await websocket.close(code=1013, reason="Client too slow")
+                except Exception:
+                    pass
+        
+        outbox = ConnectionOutbox(send, on_close=on_close)
+        outbox.start()
+        self.outboxes[client_id] = outbox
         logger.info(f"WebSocket connected: {client_id}")
         
+    def attach(self, client_id: str, outbox):
+        """
+        Register a non-WebSocket sink under client_id, e.g. an SSEStream. It takes the place
+        of a ConnectionOutbox (put/flush/close), so streams, resume and cancel work the same.
+        """
+        self.outboxes[client_id] = outbox
+    
     def disconnect(self, client_id: str):
+        outbox = self.outboxes.pop(client_id, None)
+        if outbox is not None:
+            outbox.close()
         if client_id in self.active_connections:
             del self.active_connections[client_id]
             logger.info(f"WebSocket disconnected: {client_id}")
             
-        # Clean up any active streaming sessions for this client
-        sessions_to_remove = []
+        # Streaming sessions stay resumable; their frames keep going to the replay buffer.
+        # Streams nobody resumes within STREAM_CANCEL_AFTER_DISCONNECT_SECONDS are cancelled.
         for session_key, session in streaming_sessions.items():
-            if session.client_id == client_id:
-                sessions_to_remove.append(session_key)
-                
-        for session_key in sessions_to_remove:
-            logger.info(f"Cleaning up orphaned session {session_key} after client disconnect")
-            del streaming_sessions[session_key]
+            if session.client_id == client_id and session.active:
+                logger.info(f"Session {session_key} detached after client disconnect; awaiting resume")
+                _after_disconnect_grace(_cancel_if_still_detached, session, client_id)
+        relay = remote_relays.pop(client_id, None)
+        if relay is not None:
+            message_id, task = relay
+            task.cancel()
+            _after_disconnect_grace(_cancel_remote_if_still_detached, message_id, client_id)
     
-    async def send_message(self, client_id: str, message: Dict[str, Any]):
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending message to {client_id}: {e}")
-                self.disconnect(client_id)
+    async def send_message(self, client_id: str, message: Dict[str, Any]) -> bool:
+        """Queue a message for a client; False if the client is gone."""
+        outbox = self.outboxes.get(client_id)
+        if outbox is None:
+            return False
+        return await outbox.put(message)
+    
+    async def flush(self, client_id: str):
+        """Wait for a client's queued messages to be written (e.g. before closing)."""
+        outbox = self.outboxes.get(client_id)
+        if outbox is not None:
+            await outbox.flush()
     
     async def broadcast(self, message: Dict[str, Any]):
-        for client_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to {client_id}: {e}")
-                self.disconnect(client_id)
+        for outbox in list(self.outboxes.values()):
+            await outbox.put(message)
 
 manager = ConnectionManager()
 
@@ -120,19 +264,36 @@ async def get_document_service(
 async def websocket_conversation(
     websocket: WebSocket,
     conversation_id: str,
-    user_id: Optional[str] = "default-user"  # In production, extract from JWT token
+    user_id: Optional[str] = "default-user",  # In production, extract from JWT token
+    protocol: Optional[str] = None,
+    encoding: Optional[str] = None
 ):
     """
     WebSocket endpoint for real-time conversation streaming.
     
-    Protocol:
+    Protocol (negotiated with ?protocol=, see services/stream_protocol.py):
     - Client sends: {"type": "message", "content": "user message", "options": {...}}
-    - Server sends: {"type": "text_delta", "text": "partial text", "accumulated_text": "full text so far"}
-    - Server sends: {"type": "tool_start", "tool_id": "...", "tool_name": "..."}
-    - Server sends: {"type": "tool_complete", "tool_id": "...", "result": {...}}
-    - Server sends: {"type": "message_complete", "message_id": "..."}
+    - Server sends: {"type": "connected", "protocol": 2, ...}
+    - Server sends: {"type": "text_delta", "seq": 3, "text": "partial text"}
+    - Server sends: {"type": "snapshot", "seq": 40, "text": "full text so far", "length": ..., "checksum": "sha256:..."}
+    - Server sends: {"type": "tool_start", "seq": 41, "tool_id": "...", "tool_name": "..."}
+    - Server sends: {"type": "tool_progress", "tool_id": "...", "rows": [...], "row_offset": 0, ...}
+      while a chart/table tool input is still streaming (see utils/tool_progress.py)
+    - Server sends: {"type": "tool_complete", "seq": 42, "tool_id": "...", "result": {...}}
+    - Server sends: {"type": "message_complete", "seq": 43, "message_id": "..."}
+    Protocol 1 (legacy) omits seq and snapshots and adds "accumulated_text" to text events.
+    With ?encoding=msgpack server frames are binary MessagePack (when a MessagePack library is
+    installed; "connected" reports the encoding in use). Client messages are always JSON text.
+    - Client sends: {"type": "resume", "message_id": "...", "last_seq": 42} after reconnecting
+      (protocol 2); missed frames are replayed, then the live stream continues on this socket
+    - Client sends: {"type": "cancel", "message_id": "..."} to stop generation; the server
+      answers {"type": "message_cancelled", "message_id": "...", "reason": "client_cancel"}
+    Streams run in a task so the socket keeps being read while they do; a stream left
+    detached by a disconnect is cancelled unless resumed in time.
     """
-    logger.info(f"WebSocket endpoint called for conversation: {conversation_id}, user: {user_id}")
+    protocol_version = negotiate_protocol(protocol)
+    frame_encoding = negotiate_ws_encoding(encoding)
+    logger.info(f"WebSocket endpoint called for conversation: {conversation_id}, user: {user_id}, protocol: {protocol_version}")
     # Use timestamp to make client_id unique for each connection
     import time
     client_id = f"{user_id}_{conversation_id}_{int(time.time() * 1000)}"
@@ -148,7 +309,7 @@ async def websocket_conversation(
         )
         
         try:
-            await manager.connect(websocket, client_id)
+            await manager.connect(websocket, client_id, encoding=frame_encoding)
             logger.info(f"WebSocket connection established for conversation: {conversation_id}")
         except Exception as e:
             logger.error(f"Failed to accept WebSocket connection: {e}", exc_info=True)
@@ -163,6 +324,7 @@ async def websocket_conversation(
             await websocket.close(code=1011, reason=str(e))
             return
         
+        stream_task: Optional[asyncio.Task] = None
         try:
             # Verify conversation exists and user has access
             try:
@@ -181,6 +343,7 @@ async def websocket_conversation(
                         "type": "error", 
                         "message": "Access denied"
                     }))
+                    manager.disconnect(client_id)
                     await websocket.close()
                     return
             else:
@@ -190,6 +353,8 @@ async def websocket_conversation(
             await manager.send_message(client_id, {
                 "type": "connected",
                 "conversation_id": conversation_id,
+                "protocol": protocol_version,
+                "encoding": frame_encoding,
                 "timestamp": datetime.utcnow().isoformat() + 'Z'
             })
             
@@ -207,12 +372,32 @@ async def websocket_conversation(
                     continue
                 
                 if message_data.get("type") == "message":
-                    # Process streaming message
-                    await handle_streaming_message(
+                    if stream_task is not None and not stream_task.done():
+                        await manager.send_message(client_id, {
+                            "type": "error",
+                            "message": "A response is already streaming on this connection"
+                        })
+                        continue
+                    # Process streaming message in a task so cancel and disconnects are seen immediately
+                    stream_task = asyncio.create_task(handle_streaming_message(
                         conversation_service=conversation_service,
                         conversation_id=conversation_id,
                         user_message=message_data.get("content", ""),
                         options=message_data.get("options", {}),
+                        client_id=client_id,
+                        protocol_version=protocol_version
+                    ))
+                elif message_data.get("type") == "cancel":
+                    await handle_cancel(
+                        conversation_id=conversation_id,
+                        message_id=message_data.get("message_id"),
+                        client_id=client_id
+                    )
+                elif message_data.get("type") == "resume":
+                    await handle_resume(
+                        conversation_id=conversation_id,
+                        message_id=message_data.get("message_id"),
+                        last_seq=message_data.get("last_seq", 0),
                         client_id=client_id
                     )
                 elif message_data.get("type") == "ping":
@@ -235,42 +420,65 @@ async def websocket_conversation(
                 "type": "error",
                 "message": f"Server error: {str(e)}"
             })
+            await manager.flush(client_id)
             manager.disconnect(client_id)
+        finally:
+            # The stream uses this connection's DB session: let it finish, be resumed
+            # elsewhere or be cancelled before the session closes
+            if stream_task is not None and not stream_task.done():
+                try:
+                    await stream_task
+                except asyncio.CancelledError:
+                    stream_task.cancel()
+                    raise
+                except Exception:
+                    pass
 
 async def handle_streaming_message(
     conversation_service: ConversationService,
     conversation_id: str,
     user_message: str,
     options: Dict[str, Any],
-    client_id: str
+    client_id: str,
+    protocol_version: int = PROTOCOL_LEGACY
 ):
     """
     Handle a streaming message request and emit real-time updates.
     """
-    streaming_message_id = None
-    session_key = None
+    cleanup_stale_sessions()
+    store = get_session_store()
+    await store.remove_expired(settings.STREAM_RESUME_GRACE_SECONDS, 30 * 60)
+    
+    # Generate a unique message ID for this streaming session
+    streaming_message_id = str(uuid.uuid4())
+    session_key = streaming_message_id
+    
+    # Create new streaming session
+    session = StreamingSession(
+        message_id=streaming_message_id,
+        client_id=client_id,
+        conversation_id=conversation_id,
+        active=True,
+        has_sent_start=False,
+        encoder=StreamEncoder(protocol_version)
+    )
+    session.task = asyncio.current_task()
     try:
-        # Generate a unique message ID for this streaming session
-        streaming_message_id = str(uuid.uuid4())
-        
-        # Create session key for tracking
-        session_key = f"{client_id}_{conversation_id}"
-        
-        # Create new streaming session
-        session = StreamingSession(
-            message_id=streaming_message_id,
-            client_id=client_id,
-            conversation_id=conversation_id,
-            active=True,
-            has_sent_start=False
-        )
-        
         # Store session for tracking
         streaming_sessions[session_key] = session
-        logger.info(f"WEBSOCKET_FLOW: Created streaming session {session_key} with message_id: {streaming_message_id}")
+        await store.register(SessionRecord(
+            message_id=streaming_message_id,
+            conversation_id=conversation_id,
+            client_id=client_id,
+            protocol=protocol_version
+        ))
+        if store.shared:
+            session.publisher = FramePublisher(store, streaming_message_id)
+            _ensure_command_poller()
+        logger.info(f"WEBSOCKET_FLOW: Created streaming session {session_key} for client {client_id}")
         
         # Emit message start event with the message ID
-        await manager.send_message(client_id, {
+        await session.deliver({
             "type": "message_start",
             "message_id": streaming_message_id,
             "timestamp": datetime.now().isoformat()
@@ -281,21 +489,8 @@ async def handle_streaming_message(
         
         # Define callback for streaming events with enhanced message ID handling
         async def emit_callback(event: Dict[str, Any]):
-            # Get the session for this streaming operation
-            session_lookup_key = f"{client_id}_{conversation_id}"
-            current_session = streaming_sessions.get(session_lookup_key)
-            
-            if not current_session:
-                logger.error(f"No session found for {session_lookup_key} - creating emergency session")
-                # This shouldn't happen, but create an emergency session if needed
-                current_session = StreamingSession(
-                    message_id=streaming_message_id or str(uuid.uuid4()),
-                    client_id=client_id,
-                    conversation_id=conversation_id,
-                    active=True,
-                    has_sent_start=True  # Assume we've already sent start
-                )
-                streaming_sessions[session_lookup_key] = current_session
+            current_session = session
+            session_lookup_key = session_key
             
             # Always use the session's message_id to ensure consistency
             if event.get("message_id") != current_session.message_id:
@@ -341,7 +536,7 @@ async def handle_streaming_message(
                 current_session.active = False
                 logger.info(f"WEBSOCKET_FLOW: Marking session {session_lookup_key} as inactive after message_complete")
                 
-            await manager.send_message(client_id, event)
+            await current_session.deliver(event)
         
         # Process the message with streaming enabled
         result = await conversation_service.process_user_message_streaming(
@@ -360,20 +555,207 @@ async def handle_streaming_message(
         # Note: message_complete event is now sent by conversation_service
         # to ensure proper timing after all visualizations are processed
         
+    except asyncio.CancelledError:
+        if session.cancel_reason is None:
+            raise  # Server shutdown, not a client cancel
+        record_stream_cancellation(session.cancel_reason)
+        logger.info(f"WEBSOCKET_FLOW: Stream {streaming_message_id} cancelled ({session.cancel_reason})")
+        await session.deliver({
+            "type": "message_cancelled",
+            "message_id": streaming_message_id,
+            "reason": session.cancel_reason,
+            "timestamp": datetime.now().isoformat()
+        })
     except Exception as e:
         logger.error(f"WEBSOCKET_FLOW: Error handling streaming message {streaming_message_id}: {e}", exc_info=True)
         logger.error(f"WEBSOCKET_FLOW: Conversation {conversation_id} processing failed")
-        await manager.send_message(client_id, {
+        await session.deliver({
             "type": "error",
             "message": f"Error processing message: {str(e)}",
             "message_id": streaming_message_id,
             "timestamp": datetime.now().isoformat()
         })
     finally:
-        # Clean up the session after processing is complete
-        if session_key and session_key in streaming_sessions:
-            logger.info(f"WEBSOCKET_FLOW: Cleaning up session {session_key}")
-            del streaming_sessions[session_key]
+        # Keep the finished session resumable for a grace period; cleanup_stale_sessions drops it
+        session.active = False
+        session.completed_at = datetime.utcnow()
+        # Publish the last frames before the record says finished, so relays see them
+        if session.publisher is not None:
+            await session.publisher.close()
+        await store.mark_finished(streaming_message_id)
+        logger.info(f"WEBSOCKET_FLOW: Session {session_key} finished")
+
+def notify_when_finished(message_id: str, client_id: str, callback):
+    """
+    Call callback once the stream client_id is attached to has nothing more to send: when
+    the local stream task or the relay of a remote stream ends, or now if neither runs.
+    """
+    session = streaming_sessions.get(message_id)
+    relay = remote_relays.get(client_id)
+    if session is not None and session.active and session.task is not None and not session.task.done():
+        session.task.add_done_callback(lambda _: callback())
+    elif relay is not None and relay[0] == message_id and not relay[1].done():
+        relay[1].add_done_callback(lambda _: callback())
+    else:
+        callback()
+
+async def handle_cancel(
+    conversation_id: str,
+    message_id: Optional[str],
+    client_id: str
+):
+    """
+    Cancel the named stream, or the stream attached to this connection if no message_id is
+    given. A stream running in another worker is asked to cancel through the session store;
+    its message_cancelled frame reaches the client through the relay.
+    """
+    if not message_id and client_id in remote_relays:
+        message_id = remote_relays[client_id][0]
+    session = streaming_sessions.get(message_id) if message_id else next(
+        (s for s in streaming_sessions.values() if s.client_id == client_id and s.active), None
+    )
+    if session is None and message_id:
+        cancelled = await _request_remote_cancel(conversation_id, message_id)
+    else:
+        cancelled = session is not None and session.conversation_id == conversation_id and cancel_stream(session, "client_cancel")
+    if not cancelled:
+        await manager.send_message(client_id, {
+            "type": "cancel_failed",
+            "message_id": message_id,
+            "reason": "not_streaming"
+        })
+
+async def _request_remote_cancel(conversation_id: str, message_id: str) -> bool:
+    store = get_session_store()
+    if not store.shared:
+        return False
+    record = await store.get(message_id)
+    if record is None or record.conversation_id != conversation_id:
+        return False
+    return await store.request_cancel(message_id, "client_cancel")
+
+async def handle_resume(
+    conversation_id: str,
+    message_id: Optional[str],
+    last_seq: Any,
+    client_id: str
+):
+    """
+    Replay the frames a reconnecting client missed and reattach it to the live stream.
+    
+    Client sends {"type": "resume", "message_id": "...", "last_seq": 17}; the server answers
+    {"type": "resumed", "message_id": "...", "replayed": n, "active": bool}, followed by
+    the frames after last_seq (or a snapshot if they were evicted) and then live frames.
+    Only protocol 2 streams are resumable. Streams running in another worker are resumed
+    from the shared session store's frame log.
+    """
+    cleanup_stale_sessions()
+    session = streaming_sessions.get(message_id) if message_id else None
+    if session is None and message_id and get_session_store().shared:
+        await resume_remote_stream(conversation_id, message_id, last_seq, client_id)
+        return
+    if session is None or session.conversation_id != conversation_id:
+        await manager.send_message(client_id, {
+            "type": "resume_failed",
+            "message_id": message_id,
+            "reason": "unknown_message"
+        })
+        return
+    if session.encoder.version < PROTOCOL_DELTA:
+        await manager.send_message(client_id, {
+            "type": "resume_failed",
+            "message_id": message_id,
+            "reason": "protocol"
+        })
+        return
+    try:
+        last_seq = int(last_seq)
+    except (TypeError, ValueError):
+        last_seq = 0
+    
+    async with session.lock:
+        frames = session.replay.since(last_seq)
+        if frames is None:
+            # The client is behind the buffer; resynchronise it with the current text
+            snapshot = session.encoder.snapshot(message_id)
+            session.replay.append(snapshot)
+            frames = [snapshot]
+        await manager.send_message(client_id, {
+            "type": "resumed",
+            "message_id": message_id,
+            "replayed": len(frames),
+            "active": session.active
+        })
+        for frame in frames:
+            await manager.send_message(client_id, frame)
+        previous_client = session.client_id
+        session.client_id = client_id
+    await get_session_store().attach(message_id, client_id)
+    logger.info(f"WEBSOCKET_FLOW: Resumed {message_id} on {client_id} (was {previous_client}) from seq {last_seq}, replayed {len(frames)} frames")
+
+async def resume_remote_stream(
+    conversation_id: str,
+    message_id: str,
+    last_seq: Any,
+    client_id: str
+):
+    """Resume a stream owned by another worker: replay its published frames, then relay new ones."""
+    store = get_session_store()
+    record = await store.get(message_id)
+    if record is None or record.conversation_id != conversation_id or record.protocol < PROTOCOL_DELTA:
+        await manager.send_message(client_id, {
+            "type": "resume_failed",
+            "message_id": message_id,
+            "reason": "unknown_message" if record is None or record.conversation_id != conversation_id else "protocol"
+        })
+        return
+    try:
+        last_seq = int(last_seq)
+    except (TypeError, ValueError):
+        last_seq = 0
+    
+    await store.attach(message_id, client_id)
+    frames = await store.frames_after(message_id, last_seq)
+    await manager.send_message(client_id, {
+        "type": "resumed",
+        "message_id": message_id,
+        "replayed": len(frames),
+        "active": record.active
+    })
+    for frame in frames:
+        await manager.send_message(client_id, frame)
+        last_seq = frame["seq"]
+    if record.active:
+        previous = remote_relays.pop(client_id, None)
+        if previous is not None:
+            previous[1].cancel()
+        task = asyncio.create_task(_relay_remote_stream(message_id, last_seq, client_id))
+        remote_relays[client_id] = (message_id, task)
+    logger.info(f"WEBSOCKET_FLOW: Resumed {message_id} of worker {record.worker_id} on {client_id}, replayed {len(frames)} frames")
+
+async def _relay_remote_stream(message_id: str, last_seq: int, client_id: str):
+    """Forward frames another worker publishes for message_id until its stream finishes."""
+    store = get_session_store()
+    finished = False
+    try:
+        while True:
+            await asyncio.sleep(settings.STREAM_STORE_POLL_SECONDS)
+            frames = await store.frames_after(message_id, last_seq)
+            for frame in frames:
+                if not await manager.send_message(client_id, frame):
+                    return
+                last_seq = frame["seq"]
+            if frames:
+                continue
+            if finished:
+                return
+            record = await store.get(message_id)
+            # The owner publishes its last frames before marking the record finished: drain once more
+            finished = record is None or not record.active
+    finally:
+        relay = remote_relays.get(client_id)
+        if relay is not None and relay[1] is asyncio.current_task():
+            del remote_relays[client_id]
 
 @router.websocket("/analysis/{analysis_type}")
 async def websocket_analysis(
@@ -426,6 +808,7 @@ async def websocket_analysis(
             "type": "error",
             "message": f"Server error: {str(e)}"
         })
+        await manager.flush(client_id)
         manager.disconnect(client_id)
 
 async def handle_streaming_analysis(
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the indexes declared in models/database_models.py to an existing database.
+`Base.metadata.create_all` only creates indexes together with new tables, so databases created
+before an index was declared (e.g. the message, citation, document and conversation access-path
+indexes) never get it. This creates every declared index the database lacks; rerunning is a no-op.
+
+Usage:
+    python migrate_add_indexes.py            # create missing indexes
+    python migrate_add_indexes.py --dry-run  # list missing indexes only
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from typing import List
+from sqlalchemy import inspect
+
+from utils.database import engine, Base
+import models.database_models  # noqa: F401  (registers the tables on Base.metadata)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_missing_indexes(connection, dry_run: bool = False) -> List[str]:
+    """
+    Create the declared indexes missing from existing tables.
+
+    Returns:
+        Names of the indexes that were (or, in a dry run, would be) created
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all builds new tables with their indexes
+        present = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in present:
+                continue
+            columns = ", ".join(column.name for column in index.columns)
+            logger.info(f"{'Would create' if dry_run else 'Creating'} {index.name} ON {table.name}({columns})")
+            if not dry_run:
+                index.create(connection)
+            created.append(index.name)
+    return created
+
+
+async def migrate_add_indexes(dry_run: bool = False):
+    """Create missing tables, then the declared indexes missing from existing tables."""
+    try:
+        async with engine.begin() as conn:
+            created = await conn.run_sync(create_missing_indexes, dry_run)
+            if not dry_run:
+                await conn.run_sync(Base.metadata.create_all)
+
+        prefix = "[dry run] " if dry_run else ""
+        logger.info(f"{prefix}Indexes missing: {len(created)}")
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the model-declared indexes missing from the database")
+    parser.add_argument("--dry-run", action="store_true", help="List missing indexes without creating them")
+    args = parser.parse_args()
+    asyncio.run(migrate_add_indexes(dry_run=args.dry_run))
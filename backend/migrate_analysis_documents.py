@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Migration script to backfill the analysis_documents lookup table.
+Creates the table if needed and inserts one row per (document, analysis) pair found in
+AnalysisResult.document_ids, so per-document analysis queries can use the index instead of
+scanning analysis_results. Safe to rerun: existing rows are left alone.
+
+Usage:
+    python migrate_analysis_documents.py            # backfill
+    python migrate_analysis_documents.py --dry-run  # report missing rows only
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, Any
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from utils.database import engine, Base, SessionLocal
+from models.database_models import AnalysisResult, AnalysisDocument
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+async def backfill_analysis_documents(session, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Insert the analysis_documents rows missing for existing analyses.
+
+    Returns:
+        Counts of analyses scanned, analyses updated and rows inserted
+    """
+    existing = await session.execute(select(AnalysisDocument.analysis_id, AnalysisDocument.document_id))
+    indexed = set(existing.all())
+
+    report = {"analyses": 0, "analyses_updated": 0, "rows_inserted": 0}
+    pending = []
+    result = await session.stream(select(AnalysisResult.id, AnalysisResult.document_ids))
+    async for analysis_id, document_ids in result:
+        report["analyses"] += 1
+        missing = [
+            {"analysis_id": analysis_id, "document_id": doc_id}
+            for doc_id in dict.fromkeys(document_ids or [])
+            if (analysis_id, doc_id) not in indexed
+        ]
+        if not missing:
+            continue
+        report["analyses_updated"] += 1
+        report["rows_inserted"] += len(missing)
+        pending.extend(missing)
+
+    if not dry_run:
+        for start in range(0, len(pending), BATCH_SIZE):
+            await session.execute(insert(AnalysisDocument), pending[start:start + BATCH_SIZE])
+        await session.commit()
+    return report
+
+
+async def migrate_analysis_documents(dry_run: bool = False):
+    """Create the analysis_documents table if needed and backfill it."""
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with SessionLocal() as session:
+            report = await backfill_analysis_documents(session, dry_run=dry_run)
+
+        prefix = "[dry run] " if dry_run else ""
+        logger.info(
+            f"{prefix}Analyses scanned: {report['analyses']}, analyses updated: {report['analyses_updated']}, "
+            f"rows inserted: {report['rows_inserted']}"
+        )
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the analysis_documents lookup table")
+    parser.add_argument("--dry-run", action="store_true", help="Report missing rows without changing anything")
+    args = parser.parse_args()
+    asyncio.run(migrate_analysis_documents(dry_run=args.dry_run))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Migration script to fold legacy per-document uploads into content-addressed blobs.
+Every document still stored as `<document_id>.pdf` is hashed and moved to
+`blobs/<sha[:2]>/<sha>.pdf`; byte-identical files collapse into one blob with a
+reference count. Queued jobs pointing at a legacy key are repointed at the blob.
+
+Usage:
+    python migrate_blob_storage.py            # migrate
+    python migrate_blob_storage.py --dry-run  # report duplicates and savings only
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from collections import defaultdict
+from typing import Dict, Any
+from sqlalchemy import update, or_
+from sqlalchemy.future import select
+
+from utils.database import engine, Base, SessionLocal
+from utils.storage import StorageService
+from models.database_models import Document, DocumentBlob, DocumentJob, StorageBlob
+from repositories.blob_repository import BlobRepository
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def fold_legacy_uploads(session, storage: StorageService, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Move legacy document files into blobs, deduplicating identical content.
+
+    Each document's reference is committed before its legacy file is moved or removed, and
+    a rerun first finishes moves that an interrupted run committed but never performed.
+
+    Returns:
+        Counts of migrated documents, blobs created, duplicates removed, missing files,
+        and bytes reclaimed
+    """
+    blob_repository = BlobRepository(session)
+    if not dry_run:
+        await _finish_interrupted_moves(session, storage)
+
+    result = await session.execute(
+        select(Document.id, Document.mime_type)
+        .where(Document.id.not_in(select(DocumentBlob.document_id)))
+        .order_by(Document.upload_timestamp)
+    )
+    report = {"documents": 0, "blobs_created": 0, "duplicates_removed": 0, "missing_files": 0, "bytes_reclaimed": 0}
+    seen: Dict[str, list] = defaultdict(list)
+
+    for document_id, mime_type in result.all():
+        legacy_key = f"{document_id}.pdf"
+        stored = await storage.describe_file(legacy_key)
+        if stored is None:
+            logger.warning(f"Document {document_id}: no file at {legacy_key}, leaving it unmigrated")
+            report["missing_files"] += 1
+            continue
+
+        blob_key = storage.blob_key(stored.sha256)
+        duplicate = bool(seen[stored.sha256]) or await storage.exists(blob_key)
+        seen[stored.sha256].append(document_id)
+        report["documents"] += 1
+        if duplicate:
+            report["duplicates_removed"] += 1
+            report["bytes_reclaimed"] += stored.size
+        else:
+            report["blobs_created"] += 1
+        if dry_run:
+            continue
+
+        stored.file_id, stored.path = blob_key, storage.get_file_path(blob_key)
+        await blob_repository.add_reference(document_id, stored, mime_type)
+        await session.execute(
+            update(Document).where(Document.id == document_id).values(file_path=stored.path)
+        )
+        await session.execute(
+            update(DocumentJob)
+            .where(
+                DocumentJob.document_id == document_id,
+                or_(DocumentJob.storage_key == legacy_key, DocumentJob.storage_key.is_(None))
+            )
+            .values(storage_key=blob_key, file_size=stored.size, content_sha256=stored.sha256)
+        )
+        await session.commit()
+
+        if duplicate:
+            await storage.delete_file(legacy_key)
+        else:
+            await storage.move_file(legacy_key, blob_key)
+
+    for sha256, document_ids in seen.items():
+        if len(document_ids) > 1:
+            logger.info(f"Blob {sha256[:12]}… shared by {len(document_ids)} documents")
+    return report
+
+
+async def _finish_interrupted_moves(session, storage: StorageService) -> None:
+    """Move legacy files into blobs that were referenced but never populated."""
+    result = await session.execute(
+        select(DocumentBlob.document_id, StorageBlob.storage_key)
+        .join(StorageBlob, StorageBlob.sha256 == DocumentBlob.sha256)
+    )
+    for document_id, blob_key in result.all():
+        legacy_key = f"{document_id}.pdf"
+        if not await storage.exists(legacy_key):
+            continue
+        if await storage.exists(blob_key):
+            await storage.delete_file(legacy_key)
+        else:
+            logger.info(f"Completing interrupted move of {legacy_key} to {blob_key}")
+            await storage.move_file(legacy_key, blob_key)
+
+
+async def migrate_blob_storage(dry_run: bool = False):
+    """Create the blob tables if needed and fold legacy uploads into blobs."""
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with SessionLocal() as session:
+            report = await fold_legacy_uploads(session, StorageService.get_storage_service(), dry_run=dry_run)
+            stats = await BlobRepository(session).blob_stats()
+
+        prefix = "[dry run] " if dry_run else ""
+        logger.info(
+            f"{prefix}Documents migrated: {report['documents']}, blobs created: {report['blobs_created']}, "
+            f"duplicates removed: {report['duplicates_removed']}, missing files: {report['missing_files']}, "
+            f"reclaimed: {report['bytes_reclaimed'] / (1024 ** 2):.1f} MB"
+        )
+        logger.info(f"Blob store: {stats}")
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold legacy uploads into content-addressed blobs")
+    parser.add_argument("--dry-run", action="store_true", help="Report duplicates without changing anything")
+    args = parser.parse_args()
+    asyncio.run(migrate_blob_storage(dry_run=args.dry_run))
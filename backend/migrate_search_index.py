@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to create and backfill the full-text search index (see utils/search_index.py).
+On SQLite this creates the FTS5 tables and sync triggers if needed and rebuilds the index from
+every message and conversation title; rerunning it after a VACUUM lets the sync triggers find
+index rows by rowid again. On Postgres it creates the GIN indexes, which index existing rows as
+they are built.
+
+Usage:
+    python migrate_search_index.py            # create and rebuild the index
+    python migrate_search_index.py --dry-run  # report what would be indexed only
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, Any
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from utils.database import engine, Base
+from utils.search_index import install_search_index, rebuild_search_index
+from models.database_models import Conversation, Message
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_search_index(connection, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Install the search index objects and re-index all rows.
+
+    Returns:
+        Counts of messages and conversations covered by the index
+    """
+    report = {
+        "messages": connection.execute(select(func.count()).select_from(Message)).scalar_one(),
+        "conversations": connection.execute(select(func.count()).select_from(Conversation)).scalar_one(),
+    }
+    if not dry_run:
+        install_search_index(connection, rebuild_if_new=False)
+        rebuild_search_index(connection)
+    return report
+
+
+async def migrate_search_index(dry_run: bool = False):
+    """Create the tables if needed, then install and backfill the search index."""
+    try:
+        async with engine.begin() as conn:
+            if not dry_run:
+                await conn.run_sync(Base.metadata.create_all)
+            report = await conn.run_sync(backfill_search_index, dry_run)
+
+        prefix = "[dry run] " if dry_run else ""
+        logger.info(f"{prefix}Messages indexed: {report['messages']}, conversations indexed: {report['conversations']}")
+        logger.info("Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and backfill the full-text search index")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be indexed without changing anything")
+    args = parser.parse_args()
+    asyncio.run(migrate_search_index(dry_run=args.dry_run))
@@ -19,8 +19,11 @@ Key Components:
 - Conversation: Model for chat sessions between users and the AI assistant
 - AnalysisResult: Model for storing results of financial analyses
 - AnalysisBlock: Model for storing analysis blocks (charts, insights, etc.) attached to messages
-- ConversationDocument, MessageCitation: Association tables for many-to-many relationships
-- DocumentType, ProcessingStatusEnum: Enums for document classification and processing state
+- DocumentJob: Model for durable document-processing jobs consumed by the ingestion worker pool
+- StorageBlob, DocumentBlob: Reference-counted content-addressed file storage and the document references to it
+- ClaudeFileCacheEntry: Files API file ID (or rejection / upload lease) per content SHA-256, shared by every worker
+- ConversationDocument, MessageCitation, AnalysisDocument: Association tables for many-to-many relationships
+- DocumentType, ProcessingStatusEnum, JobStatusEnum: Enums for document classification and processing state
 
 Interactions with other files:
 -----------------------------
@@ -52,10 +55,13 @@ Interactions with other files:
 9. cfin/backend/utils/database.py:
    - Provides the Base class for all ORM models and manages the database engine/session
 
+10. cfin/backend/utils/search_index.py:
+   - Installs the full-text search index on messages and conversations after create_all
+
 These models are the backbone of the backend application, ensuring consistent data structure and relationships across all services and repositories.
 """
 from __future__ import annotations
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Boolean, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Boolean, Index, Enum as SQLAlchemyEnum, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 import uuid
 from datetime import datetime
@@ -63,6 +69,7 @@ import enum
 from typing import Optional
 
 from utils.database import Base
+from utils.search_index import register_search_index
 
 
 class DocumentType(enum.Enum):
@@ -82,6 +89,13 @@ class ProcessingStatusEnum(enum.Enum):
     UPLOADED_PENDING_ANALYSIS = "uploaded_pending_analysis"
 
 
+class JobStatusEnum(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 def generate_uuid():
     return str(uuid.uuid4())
 
@@ -104,6 +118,9 @@ class User(Base):
 class Document(Base):
     """Document model for storing uploaded financial documents."""
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_user_uploaded", "user_id", "upload_timestamp"),
+    )
     
     id: Mapped[str] = mapped_column(String, primary_key=True, default=generate_uuid)
     filename: Mapped[str] = mapped_column(String, nullable=False)
@@ -155,6 +172,9 @@ class Document(Base):
 class Citation(Base):
     """Citation model for storing document citations."""
     __tablename__ = "citations"
+    __table_args__ = (
+        Index("ix_citations_document_id", "document_id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     document_id = Column(String, ForeignKey("documents.id"), nullable=False)
@@ -171,6 +191,9 @@ class Citation(Base):
 class MessageCitation(Base):
     """Many-to-many relationship between messages and citations."""
     __tablename__ = "message_citations"
+    __table_args__ = (
+        Index("ix_message_citations_citation_id", "citation_id"),
+    )
     
     message_id = Column(String, ForeignKey("messages.id"), primary_key=True)
     citation_id = Column(String, ForeignKey("citations.id"), primary_key=True)
@@ -183,6 +206,9 @@ class MessageCitation(Base):
 class Conversation(Base):
     """Conversation model for storing chat interactions."""
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+    )
     
     id: Mapped[str] = mapped_column(String, primary_key=True, default=generate_uuid)
     title: Mapped[str] = mapped_column(String, nullable=False)
@@ -213,6 +239,9 @@ class ConversationDocument(Base):
 class Message(Base):
     """Message model for storing conversation messages."""
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
     
     id: Mapped[str] = mapped_column(String, primary_key=True, default=generate_uuid)
     conversation_id: Mapped[str] = mapped_column(String, ForeignKey("conversations.id"), nullable=False)
@@ -233,8 +262,8 @@ class Message(Base):
 class AnalysisResult(Base):
     """Analysis result model for storing document analysis results.
     
-    Note: We store document IDs as a JSON array (document_ids) to support multi-document analysis without a join table.
-    This design avoids extra schema complexity and aligns with the API contract, but requires application-level integrity checks.
+    Note: document_ids stays a JSON array, as the API contract returns it. AnalysisRepository mirrors it into
+    analysis_documents so per-document lookups are indexed; write through the repository to keep the two in sync.
     """
     __tablename__ = "analysis_results"
     
@@ -248,9 +277,20 @@ class AnalysisResult(Base):
     # Removed: document = relationship("Document", back_populates="analysis_results")
 
 
+class AnalysisDocument(Base):
+    """Indexed document -> analysis lookup mirroring AnalysisResult.document_ids."""
+    __tablename__ = "analysis_documents"
+    
+    document_id = Column(String, primary_key=True)  # No FK: analyses may outlive their documents' rows
+    analysis_id = Column(String, ForeignKey("analysis_results.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
 class AnalysisBlock(Base):
     """Analysis block model for storing message-related analysis blocks."""
     __tablename__ = "analysis_blocks"
+    __table_args__ = (
+        Index("ix_analysis_blocks_message_id", "message_id"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     message_id = Column(String, ForeignKey("messages.id"), nullable=False)
@@ -260,4 +300,92 @@ class AnalysisBlock(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    message = relationship("Message", back_populates="analysis_blocks")
\ No newline at end of file
+    message = relationship("Message", back_populates="analysis_blocks")
+
+
+class DocumentJob(Base):
+    """Durable document-processing job; claimed by queue workers and survives restarts."""
+    __tablename__ = "document_jobs"
+    __table_args__ = (
+        Index("ix_document_jobs_status_available", "status", "available_at"),
+        # At most one queued/running job per document, however many processes enqueue
+        Index(
+            "uq_document_jobs_active_document", "document_id", unique=True,
+            sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')")
+        ),
+    )
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
+    user_id = Column(String, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    # Storage handle recorded at upload so workers never need the bytes in memory up front
+    storage_key = Column(String)
+    file_size = Column(Integer)
+    content_sha256 = Column(String(64))
+    status = Column(SQLAlchemyEnum(JobStatusEnum), default=JobStatusEnum.QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Not claimable before (retry backoff)
+    locked_by = Column(String)  # Worker that claimed the job
+    heartbeat_at = Column(DateTime)  # Refreshed while running; stale heartbeats are recovered
+    stage = Column(String, default="queued")
+    progress = Column(Float, default=0.0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    # Relationships
+    document = relationship("Document")
+
+
+class StorageBlob(Base):
+    """Content-addressed file stored once per SHA-256 and shared by every document with those bytes."""
+    __tablename__ = "storage_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    storage_key = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    mime_type = Column(String)
+    ref_count = Column(Integer, default=0, nullable=False)  # Documents referencing the blob; deleted at zero
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_referenced_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DocumentBlob(Base):
+    """Reference from a document to the content-addressed blob holding its file."""
+    __tablename__ = "document_blobs"
+    
+    document_id = Column(String, ForeignKey("documents.id"), primary_key=True)
+    sha256 = Column(String(64), ForeignKey("storage_blobs.sha256"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    blob = relationship("StorageBlob")
+
+
+class ClaudeFileCacheEntry(Base):
+    """Files API outcome for one content SHA-256: a file ID, a rejection, or an in-flight upload lease."""
+    __tablename__ = "claude_file_cache"
+    __table_args__ = (
+        Index("ix_claude_file_cache_last_accessed", "last_accessed"),
+    )
+    
+    content_sha256 = Column(String(64), primary_key=True)
+    status = Column(String, nullable=False)  # ready, rejected or uploading
+    file_id = Column(String)
+    error = Column(Text)
+    size_bytes = Column(Integer)
+    lease_owner = Column(String)  # Worker holding the upload lease
+    # Epoch seconds, compared against time.time() like the Files API TTLs they track
+    created_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)
+    last_accessed = Column(Float, nullable=False)
+    validated_at = Column(Float)
+
+
+# Full-text search over message content and conversation titles (FTS5 on SQLite, GIN on
+# Postgres), installed whenever the tables are created; see utils/search_index.py
+register_search_index(Base.metadata)
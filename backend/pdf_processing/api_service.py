@@ -41,15 +41,19 @@ import base64
 import json
 import re
 import uuid
-from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING, ForwardRef
+import random
+from typing import Dict, List, Optional, Any, Tuple, Union, TYPE_CHECKING, ForwardRef
 import logging
 import asyncio
-from anthropic import AsyncAnthropic, RateLimitError
+import time
+from types import SimpleNamespace
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient, RateLimitError
 from anthropic.types import Message as AnthropicMessage
 from datetime import datetime
 import contextlib
 import httpx
 import copy
+import hashlib
 
 # Claude API optimization imports
 import settings
@@ -58,7 +62,13 @@ from utils.claude_bucket import ClaudeBucket
 from pdf_processing.claude_file_client import upload_pdf
 from pdf_processing.model_router import choose_model
 from utils.hashlib_utils import sha256_str
-from utils.token_utils import count_tokens
+from utils.token_utils import token_estimator, total_input_tokens, TokenEstimate
+from utils.metrics import record_token_efficiency, record_token_estimate_drift, record_prompt_cache_usage, record_cancelled_output_tokens
+from utils.prompt_caching import apply_cache_breakpoints, min_cacheable_tokens
+from utils.response_cache import get_response_cache, prompt_hash, ResponseCache
+from utils.storage import StoredFile
+from utils.tool_progress import ToolInputProgress, PROGRESSIVE_TOOLS
+from utils.shingle_index import ShingleIndex
 
 from models.document import ProcessedDocument, Citation as DocumentCitation, DocumentContentType, DocumentMetadata, ProcessingStatus
 from pdf_processing.langchain_service import LangChainService
@@ -69,10 +79,10 @@ import base64
 import json
 import re
 import uuid
-from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING, ForwardRef
+from typing import Dict, List, Optional, Any, Tuple, Union, TYPE_CHECKING, ForwardRef
 import logging
 from importlib.resources import files # Added for this change
-from anthropic import AsyncAnthropic, RateLimitError
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient, RateLimitError
 from anthropic.types import Message as AnthropicMessage
 from datetime import datetime
 import contextlib
@@ -86,7 +96,13 @@ from utils.claude_bucket import ClaudeBucket
 from pdf_processing.claude_file_client import upload_pdf
 from pdf_processing.model_router import choose_model
 from utils.hashlib_utils import sha256_str
-from utils.token_utils import count_tokens
+from utils.token_utils import token_estimator, total_input_tokens, TokenEstimate
+from utils.metrics import record_token_efficiency, record_token_estimate_drift, record_prompt_cache_usage, record_cancelled_output_tokens
+from utils.prompt_caching import apply_cache_breakpoints, min_cacheable_tokens
+from utils.response_cache import get_response_cache, prompt_hash, ResponseCache
+from utils.storage import StoredFile
+from utils.tool_progress import ToolInputProgress, PROGRESSIVE_TOOLS
+from utils.shingle_index import ShingleIndex
 
 from models.document import ProcessedDocument, Citation as DocumentCitation, DocumentContentType, DocumentMetadata, ProcessingStatus
 from pdf_processing.langchain_service import LangChainService
@@ -120,6 +136,37 @@ except Exception as e:
     logger.error(f"Error loading default_financial_analysis_prompt.md: {e}", exc_info=True)
     LOADED_DEFAULT_FINANCIAL_PROMPT = "Error: Default financial analysis prompt could not be loaded. Please check system configuration." # Fallback prompt
 
+# Prompts for the deterministic upload-time calls. Their hashes are part of the response
+# cache key, so editing them invalidates previously cached results.
+DOCUMENT_TYPE_PROMPT = "Analyze this financial document. Determine if it's a balance sheet, income statement, cash flow statement, or other type of document. Also identify the time periods covered (e.g., Q1 2023, FY 2022, etc.). Return ONLY a JSON response in this format:\n\n{\n  \"document_type\": \"balance_sheet|income_statement|cash_flow|notes|other\",\n  \"periods\": [\"period1\", \"period2\", ...]\n}"
+
+FINANCIAL_EXTRACTION_SYSTEM_PROMPT = """You are a specialized financial document analysis assistant. Extract structured financial data from the document accurately using Claude's native PDF support.
+
+Follow these guidelines:
+1. Analyze both the text and visual elements (charts, tables, graphs) in the document.
+2. Extract values with their correct time periods, labels, and units.
+3. Present the data in a structured JSON format.
+4. Provide citations for extracted data points when possible.
+5. Any textual narrative should be brief and clearly separated from the JSON structure."""
+
+FINANCIAL_EXTRACTION_PROMPT_TEMPLATE = (
+    "From this {doc_type} document, provide a comprehensive JSON object "
+    "containing all extracted financial data. The JSON should include key metrics, "
+    "time periods, and values. Structure the JSON clearly with categories like "
+    "revenue, expenses, assets, liabilities, etc. "
+    "Include any visual data from charts and tables."
+)
+
+RESPONSE_CACHE_PROMPT_VERSIONS = {
+    "document_type": prompt_hash(DOCUMENT_TYPE_PROMPT),
+    "financial_extraction": prompt_hash(FINANCIAL_EXTRACTION_SYSTEM_PROMPT, FINANCIAL_EXTRACTION_PROMPT_TEMPLATE),
+}
+
+async def _update_rate_limits_from_response(response: httpx.Response) -> None:
+    """httpx response hook: record Messages API rate-limit headers in the shared limiter."""
+    if response.request.url.path.endswith("/messages"):
+        await asyncio.to_thread(ClaudeBucket.update, response.headers)
+
 @contextlib.asynccontextmanager
 async def get_anthropic_client():
     """
@@ -181,12 +228,20 @@ class ClaudeService:
             self.client = AsyncAnthropic(
                 api_key=self.api_key,
                 timeout=httpx.Timeout(90.0, connect=5.0), # Set overall timeout to 90s
-                max_retries=5 # Set max retries to 5
+                max_retries=5, # Set max retries to 5
+                # Feed rate-limit headers of every response (streaming, non-streaming, 429s) to the shared limiter
+                http_client=DefaultAsyncHttpxClient(event_hooks={"response": [_update_rate_limits_from_response]})
             )
             
             # Token efficiency headers for Claude API optimization
             self._extra_headers = {"anthropic-beta": ANTHROPIC_BETA}
             self._tools_for_api = CLAUDE_API_TOOLS_LIST  # existing list
+
+            # Background SDK token-count samples (kept referenced until they finish)
+            self._token_count_tasks = set()
+
+            # Persistent cache for deterministic classification/extraction results
+            self.response_cache = self._init_response_cache()
             
             logger.info(f"ClaudeService initialized with model: {self.model}, PDF support, timeout=90s, max_retries=5, headers: {self._extra_headers}")
         except Exception as e:
@@ -211,55 +266,64 @@ class ClaudeService:
             logger.warning("LangGraph service not available, skipping initialization")
             self.langgraph_service = None
 
-    async def _claude_call(self, stream: bool = False, **kwargs):
+    @staticmethod
+    def _init_response_cache() -> Optional[ResponseCache]:
+        """Open the shared response cache and drop entries made with outdated prompts."""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        try:
+            cache = get_response_cache()
+            cache.sync_prompt_versions(RESPONSE_CACHE_PROMPT_VERSIONS)
+            return cache
+        except Exception as e:
+            logger.warning(f"Response cache unavailable, continuing without it: {e}")
+            return None
+
+    def _response_cache_key(self, content_sha256: Optional[str], file_id: Optional[str], model: str,
+                            prompt_name: str, *variant: str) -> Optional[str]:
+        """
+        Build the response cache key for a deterministic call, or None if caching is off.
+        
+        Content is identified by the SHA-256 of the document bytes when known, falling back
+        to the Files API file_id (stable for an uploaded file). Extra variant strings cover
+        template parameters such as the document type.
+        """
+        if not getattr(self, "response_cache", None) or not (content_sha256 or file_id):
+            return None
+        content_id = content_sha256 or f"file_id:{file_id}"
+        prompt_digest = prompt_hash(RESPONSE_CACHE_PROMPT_VERSIONS[prompt_name], *variant)
+        return ResponseCache.make_key(content_id, model, prompt_digest)
+
+    async def _claude_call(self, stream: bool = False, cache_prefix: bool = True, **kwargs):
         """
         Central wrapper for all Claude API calls with rate limiting and token efficiency.
         Supports both streaming and non-streaming modes.
         
         Args:
             stream: Whether to stream the response
+            cache_prefix: Add prompt-cache breakpoints; False for one-off requests whose
+                prefix no later request re-reads
             **kwargs: Arguments to pass to client.messages.create
             
         Returns:
             Claude API response (AnthropicMessage if stream=False, AsyncStream if stream=True)
         """
-        # Estimate tokens for rate limiting
+        # Estimate tokens locally for rate limiting (no count_tokens round trip on the hot path)
+        model = kwargs.get("model", self.model)
         messages = kwargs.get("messages", [])
-        tokens_in = count_tokens(messages) # Custom estimator
-
-        # --- BEGIN SDK TOKEN COUNTING (AWAITED AND ALIGNED V4) ---
-        sdk_actual_tokens = None # Initialize to ensure it's defined
-        try:
-            actual_messages_for_count = messages if isinstance(messages, list) else []
-            if not actual_messages_for_count and isinstance(messages, dict):
-                actual_messages_for_count = [messages]
-
-            # Sanitize messages so the count_tokens endpoint accepts them
-            sanitized_messages_for_count = self._sanitize_messages_for_token_count(actual_messages_for_count)
-
-            params_for_count = {
-                "model": kwargs.get("model", self.model),
-                "messages": sanitized_messages_for_count  # use sanitized copy
-            }
-
-            if "tools" in kwargs and kwargs.get("tools"):
-                params_for_count["tools"] = kwargs.get("tools")
-            
-            if "system" in kwargs and kwargs.get("system"):
-                params_for_count["system"] = kwargs.get("system")
-            
-            sdk_token_count_result = await self.client.messages.count_tokens(**params_for_count)
-            sdk_actual_tokens = sdk_token_count_result.input_tokens
-            logger.info(f"Anthropic SDK estimated input tokens ({'streaming' if stream else 'non-streaming'}): {sdk_actual_tokens} (Custom estimate: {tokens_in})")
-        except Exception as e:
-            logger.error(f"Error during SDK token counting ({'streaming' if stream else 'non-streaming'}): {e}", exc_info=True)
-        # --- END SDK TOKEN COUNTING (AWAITED AND ALIGNED V4) ---
-
-        # Apply rate limiting based on current token bucket state
-        # Use SDK token count if available for more accurate throttling, otherwise fall back to custom estimate
-        tokens_for_throttling = sdk_actual_tokens if sdk_actual_tokens is not None else tokens_in
-        logger.info(f"Throttling based on token count: {tokens_for_throttling} (SDK count: {sdk_actual_tokens}, Custom estimate: {tokens_in})")
-        await ClaudeBucket.throttle(tokens_for_throttling)
+        token_estimate = token_estimator.estimate(
+            model,
+            messages if isinstance(messages, list) else [messages],
+            system=kwargs.get("system"),
+            tools=kwargs.get("tools")
+        )
+        logger.info(f"Throttling based on local token estimate: {token_estimate.tokens} (raw: {token_estimate.raw_tokens}, correction: {token_estimate.correction:.2f})")
+        if settings.PROMPT_CACHING_ENABLED and cache_prefix and token_estimate.tokens >= min_cacheable_tokens(model):
+            # Cache the stable prefix (tools, system prompt, document) for later turns
+            kwargs = apply_cache_breakpoints(kwargs)
+        self._maybe_sample_token_count(kwargs)
+        await ClaudeBucket.throttle(token_estimate.tokens, output_tokens=kwargs.get("max_tokens", 0))
+        reserved_at = time.time()  # Headers applied after this supersede the reservation
 
         try:
             # Make the API call with token efficiency headers
@@ -286,11 +350,102 @@ class ClaudeService:
             # Re-raise other errors
             raise
         
-        # Update rate limit state from response headers if available (non-streaming only)
-        if not stream and hasattr(resp, 'response_headers') and resp.response_headers:
-            ClaudeBucket.update(resp.response_headers)
+        # Rate-limit headers are recorded by the http client response hook for both modes
+        if stream:
+            # Usage arrives on the stream; _process_streaming_response settles it
+            resp.token_estimate = token_estimate
+            resp.output_reservation = kwargs.get("max_tokens", 0)
+            resp.output_reserved_at = reserved_at
+        else:
+            self._observe_token_usage(token_estimate, getattr(resp, "usage", None))
+            await self._release_output_reservation(kwargs.get("max_tokens", 0), getattr(resp, "usage", None), reserved_at)
         return resp
 
+    async def _release_output_reservation(self, reserved_tokens: Any, usage: Any,
+                                          reserved_at: Optional[float] = None) -> None:
+        """
+        Give back output tokens reserved from max_tokens that the response did not generate.
+
+        Args:
+            reserved_tokens: Output tokens reserved with the rate limiter (max_tokens)
+            usage: ``usage`` object from the Claude response
+            reserved_at: When the tokens were reserved (see ClaudeBucket.release)
+        """
+        output_tokens = getattr(usage, "output_tokens", None)
+        if not isinstance(reserved_tokens, int) or not isinstance(output_tokens, int):
+            return
+        try:
+            await ClaudeBucket.release(output_tokens=reserved_tokens - output_tokens, reserved_at=reserved_at)
+        except Exception as e:
+            logger.warning(f"Could not release unused output token reservation: {e}")
+
+    def _observe_token_usage(self, token_estimate: Optional[TokenEstimate], usage: Any) -> None:
+        """
+        Feed the actual input tokens of a completed response back into the local estimator
+        and report its prompt cache reads and writes.
+
+        Args:
+            token_estimate: Estimate recorded by _claude_call before the request was sent
+            usage: ``usage`` object from the Claude response
+        """
+        if not isinstance(token_estimate, TokenEstimate):
+            return
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        if isinstance(cache_read_tokens, int) and isinstance(cache_write_tokens, int) and (cache_read_tokens or cache_write_tokens):
+            record_prompt_cache_usage(token_estimate.model, cache_read_tokens, cache_write_tokens)
+            logger.info(f"Prompt cache for {token_estimate.model}: {cache_read_tokens} tokens read, {cache_write_tokens} tokens written")
+        actual_tokens = total_input_tokens(usage)
+        if actual_tokens <= 0:
+            return
+        if not token_estimate.has_placeholder_blocks:
+            token_estimator.observe(token_estimate.model, token_estimate.raw_tokens, actual_tokens)
+        record_token_efficiency(token_estimate.model, token_estimate.tokens, actual_tokens)
+
+    def _maybe_sample_token_count(self, request_kwargs: Dict[str, Any]) -> None:
+        """
+        Occasionally check the local estimate against the SDK count_tokens endpoint.
+        The check runs as a background task so it never delays the real request.
+        """
+        if settings.TOKEN_COUNT_SAMPLE_RATE <= 0 or random.random() >= settings.TOKEN_COUNT_SAMPLE_RATE:
+            return
+        task = asyncio.create_task(self._sample_token_count_drift(dict(request_kwargs)))
+        self._token_count_tasks.add(task)
+        task.add_done_callback(self._token_count_tasks.discard)
+
+    async def _sample_token_count_drift(self, request_kwargs: Dict[str, Any]) -> None:
+        """
+        Compare the local estimate with the SDK token count and export the drift metric.
+
+        Args:
+            request_kwargs: Arguments of the sampled messages.create/stream call
+        """
+        try:
+            model = request_kwargs.get("model", self.model)
+            messages = request_kwargs.get("messages", [])
+            if isinstance(messages, dict):
+                messages = [messages]
+            # count_tokens rejects Files API references, so compare on the same sanitized request
+            sanitized_messages = self._sanitize_messages_for_token_count(messages if isinstance(messages, list) else [])
+
+            params_for_count = {"model": model, "messages": sanitized_messages}
+            if request_kwargs.get("tools"):
+                params_for_count["tools"] = request_kwargs["tools"]
+            if request_kwargs.get("system"):
+                params_for_count["system"] = request_kwargs["system"]
+
+            local_estimate = token_estimator.estimate(
+                model,
+                sanitized_messages,
+                system=params_for_count.get("system"),
+                tools=params_for_count.get("tools")
+            )
+            sdk_result = await self.client.messages.count_tokens(**params_for_count)
+            record_token_estimate_drift(model, local_estimate.tokens, sdk_result.input_tokens)
+            logger.info(f"Sampled token count for {model}: SDK {sdk_result.input_tokens}, local estimate {local_estimate.tokens}")
+        except Exception as e:
+            logger.warning(f"Sampled SDK token count failed: {e}")
+
     def _process_claude_response(self, response: AnthropicMessage) -> Dict[str, Any]:
         """
         Process Claude API response and extract text, tool calls, and citations.
@@ -334,6 +489,10 @@ class ClaudeService:
         Process streaming Claude API response and emit events for real-time updates.
         Implements hybrid streaming: text content streams immediately, tools buffer until complete.
         
+        Cancelling the calling task (client cancel or disconnect) closes the stream, which
+        stops generation upstream, and gives back the output tokens that were reserved but
+        not generated before the CancelledError propagates.
+        
         Args:
             stream_manager: AsyncMessageStreamManager from Claude API
             emit_callback: Optional callback function to emit streaming events
@@ -349,8 +508,11 @@ class ClaudeService:
         last_content_update_length = 0  # Track last content update to avoid duplicates
         tool_calls = []
         tool_buffer = {}  # Buffer incomplete tool calls by ID
+        tool_progress = {}  # Partial visualization inputs by content block index
         citations = []
         message_id = None  # Track message ID for consistent event emission
+        output_tokens = 0  # Running output count from message_delta usage
+        reservation_released = False  # Unused output reservation already given back
         
         try:
             async with stream_manager as stream:
@@ -358,6 +520,7 @@ class ClaudeService:
                     if chunk.type == "message_start":
                         # Message started - capture message ID and emit initial event
                         message_id = chunk.message.id
+                        self._observe_token_usage(getattr(stream_manager, "token_estimate", None), getattr(chunk.message, "usage", None))
                         if emit_callback:
                             await emit_callback({
                                 "type": "message_start",
@@ -381,6 +544,8 @@ class ClaudeService:
                                 "name": chunk.content_block.name,
                                 "input": {}
                             }
+                            if chunk.content_block.name in PROGRESSIVE_TOOLS:
+                                tool_progress[chunk.index] = ToolInputProgress(tool_id, chunk.content_block.name)
                             # Mark that tools have started
                             if not tools_started:
                                 tools_started = True
@@ -430,9 +595,13 @@ class ClaudeService:
                                 post_tool_text += text_delta
                                 logger.info(f"Ignoring post-tool text delta: {len(text_delta)} chars")
                         elif chunk.delta.type == "input_json_delta":
-                            # Buffer tool input (don't stream incomplete JSON)
-                            # This accumulates the tool parameters - we'll process when complete
-                            pass
+                            # Charts and tables are previewed from partial input as rows complete;
+                            # the final tool input still comes from get_final_message()
+                            progress = tool_progress.get(chunk.index)
+                            if progress is not None:
+                                progress_event = progress.feed(chunk.delta.partial_json, message_id)
+                                if progress_event and emit_callback:
+                                    await emit_callback(progress_event)
                     
                     elif chunk.type == "content_block_stop":
                         if chunk.index is not None:
@@ -458,6 +627,9 @@ class ClaudeService:
                     
                     elif chunk.type == "message_delta":
                         # Message metadata updates
+                        delta_output_tokens = getattr(getattr(chunk, "usage", None), "output_tokens", None)
+                        if isinstance(delta_output_tokens, int):
+                            output_tokens = delta_output_tokens
                         if hasattr(chunk.delta, 'stop_reason') and chunk.delta.stop_reason:
                             if emit_callback:
                                 await emit_callback({
@@ -490,6 +662,12 @@ class ClaudeService:
                 if received_streaming_text:
                     logger.info(f"Received {len(accumulated_text)} chars during streaming, will ignore text in final_message")
                 final_message = await stream.get_final_message()
+                reservation_released = True
+                await self._release_output_reservation(
+                    getattr(stream_manager, "output_reservation", None),
+                    getattr(final_message, "usage", None),
+                    getattr(stream_manager, "output_reserved_at", None)
+                )
                 
                 # Extract tool calls and *any* new text from final message (concluding insights often appear here)
                 concluding_text = ""
@@ -524,12 +702,32 @@ class ClaudeService:
                             "message_id": message_id
                         })
                 
+                final_usage = getattr(final_message, "usage", None)
                 return {
                     "text": accumulated_text,
                     "tool_calls": tool_calls,
-                    "citations": citations
+                    "citations": citations,
+                    "usage": {
+                        "input_tokens": getattr(final_usage, "input_tokens", None),
+                        "output_tokens": getattr(final_usage, "output_tokens", None),
+                        "cache_read_input_tokens": getattr(final_usage, "cache_read_input_tokens", None),
+                        "cache_creation_input_tokens": getattr(final_usage, "cache_creation_input_tokens", None)
+                    }
                 }
                 
+        except asyncio.CancelledError:
+            # Leaving `async with stream_manager` above already closed the HTTP stream
+            generated = max(output_tokens, token_estimator.count_text(accumulated_text + post_tool_text))
+            reserved = getattr(stream_manager, "output_reservation", None)
+            if isinstance(reserved, int) and not reservation_released:
+                # Cancelled before the final message settled the reservation
+                record_cancelled_output_tokens(reserved - generated)
+                await self._release_output_reservation(
+                    reserved, SimpleNamespace(output_tokens=min(generated, reserved)),
+                    getattr(stream_manager, "output_reserved_at", None)
+                )
+            logger.info(f"Streaming response cancelled after ~{generated} output tokens ({len(accumulated_text)} chars streamed)")
+            raise
         except Exception as e:
             logger.error(f"Error processing streaming response: {e}", exc_info=True)
             # Return what we have so far
@@ -540,14 +738,15 @@ class ClaudeService:
                 "error": str(e)
             }
 
-    def _is_substantially_new_content(self, new_text: str, existing_text: str, similarity_threshold: float = 0.15) -> bool:
+    def _is_substantially_new_content(self, new_text: str, existing: Union[str, ShingleIndex], similarity_threshold: float = 0.15) -> bool:
         """
-        Check if new_text contains substantially new content compared to existing_text.
-        Uses multiple methods to detect duplicates and near-duplicates.
+        Check if new_text contains substantially new content compared to the existing text.
+        Near-duplicates are detected by vocabulary overlap and by word-shingle containment.
         
         Args:
             new_text: The new text content to evaluate
-            existing_text: The accumulated text content so far
+            existing: ShingleIndex maintained over the accumulated text (preferred: the check is
+                then O(len(new_text))), or the accumulated text itself
             similarity_threshold: Minimum proportion of new content required (0.15 = 15% new)
             
         Returns:
@@ -555,46 +754,11 @@ class ClaudeService:
         """
         if not new_text or not new_text.strip():
             return False
-            
-        if not existing_text:
-            return True
-            
-        new_text_clean = new_text.strip().lower()
-        existing_text_clean = existing_text.strip().lower()
-        
-        # Method 1: Check if new text is completely contained in existing text
-        if new_text_clean in existing_text_clean:
-            return False
-            
-        # Method 2: Check if substantial portion (>85%) of new text already exists
-        new_words = set(new_text_clean.split())
-        existing_words = set(existing_text_clean.split())
-        
-        if new_words:
-            overlap_ratio = len(new_words.intersection(existing_words)) / len(new_words)
-            if overlap_ratio > (1 - similarity_threshold):  # More than 85% overlap
-                return False
-        
-        # Method 3: Check for repeated sentence patterns
-        new_sentences = [s.strip() for s in new_text_clean.split('.') if s.strip()]
-        existing_sentences = [s.strip() for s in existing_text_clean.split('.') if s.strip()]
-        
-        if new_sentences and existing_sentences:
-            # Count how many new sentences are similar to existing ones
-            similar_count = 0
-            for new_sent in new_sentences:
-                if len(new_sent) > 10:  # Only check substantial sentences
-                    for existing_sent in existing_sentences:
-                        if new_sent in existing_sent or existing_sent in new_sent:
-                            similar_count += 1
-                            break
-            
-            similarity_ratio = similar_count / len(new_sentences) if new_sentences else 0
-            if similarity_ratio > (1 - similarity_threshold):
-                return False
-        
-        # If we made it here, the content appears to be substantially new
-        return True
+        if isinstance(existing, str):
+            if not existing:
+                return True
+            existing = ShingleIndex.from_text(existing)
+        return existing.is_substantially_new(new_text, similarity_threshold)
 
     async def execute_tool_interaction_turn(
         self,
@@ -672,7 +836,8 @@ class ClaudeService:
         max_tokens: int = 4000,
         model: Optional[str] = None,
         stream: bool = False,
-        emit_callback=None
+        emit_callback=None,
+        cache_namespace: Optional[str] = None
     ):
         """
         Generate a response from Claude based on a conversation with a system prompt.
@@ -686,6 +851,8 @@ class ClaudeService:
             model: Optional model override (e.g., "claude-3-5-haiku-20241022")
             stream: Whether to stream the response
             emit_callback: Optional callback for streaming events
+            cache_namespace: If set, non-streaming responses are served from and stored in the
+                persistent response cache under this prompt name (for deterministic prompts only)
             
         Returns:
             Generated response text (str if stream=False, dict if stream=True)
@@ -709,23 +876,17 @@ class ClaudeService:
 
             # Use provided model or default to instance model
             used_model = model or self.model
-            
-            # --- BEGIN SDK TOKEN COUNTING (AWAITED AND ALIGNED V4) ---
-            try:
-                params_for_count_native = {
-                    "model": used_model,
-                    "messages": self._sanitize_messages_for_token_count(list(formatted_messages))
-                }
 
-                if system_prompt and isinstance(system_prompt, str):
-                    params_for_count_native["system"] = system_prompt
-                
-                sdk_token_count_result_native = await self.client.messages.count_tokens(**params_for_count_native)
-                sdk_actual_tokens_native = sdk_token_count_result_native.input_tokens
-                logger.info(f"Anthropic SDK estimated input tokens (generate_response {'streaming' if stream else 'non-streaming'}): {sdk_actual_tokens_native}")
-            except Exception as e:
-                logger.error(f"Error during SDK token counting (generate_response {'streaming' if stream else 'non-streaming'}): {e}", exc_info=True)
-            # --- END SDK TOKEN COUNTING (AWAITED AND ALIGNED V4) ---
+            cache_key = None
+            if cache_namespace and not stream and getattr(self, "response_cache", None):
+                messages_sha256 = sha256_str(json.dumps(formatted_messages, sort_keys=True, default=str))
+                cache_key = ResponseCache.make_key(
+                    messages_sha256, used_model, prompt_hash(system_prompt, str(temperature), str(max_tokens))
+                )
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Response cache hit for {cache_namespace}")
+                    return cached["text"]
             
             # Call Claude API
             response = await self._claude_call(
@@ -742,7 +903,12 @@ class ClaudeService:
                 return await self._process_streaming_response(response, emit_callback)
             else:
                 # Return non-streaming response as before
-                return response.content[0].text
+                text = response.content[0].text
+                if cache_key:
+                    await self.response_cache.set(
+                        cache_key, {"text": text}, cache_namespace, prompt_hash(system_prompt), used_model
+                    )
+                return text
                 
         except Exception as e:
             logger.error(f"Error calling Claude API: {str(e)}")
@@ -790,7 +956,7 @@ class ClaudeService:
             return doc.full_text
             
         # Extract text using Files API
-        pdf_bytes = await document_repo.storage_service.get_file(f"{doc_id}.pdf")
+        pdf_bytes = await document_repo.storage_service.get_file(await document_repo.get_storage_key(doc_id))
         if not pdf_bytes:
             raise ValueError(f"PDF content not found for document {doc_id}")
             
@@ -807,13 +973,20 @@ class ClaudeService:
         
         return text
 
-    async def process_pdf(self, pdf_data: bytes, filename: str) -> Tuple[str, ProcessedDocument, List[DocumentCitation]]:
+    @staticmethod
+    def _pdf_size(pdf_data: Union[bytes, StoredFile, None]) -> int:
+        if isinstance(pdf_data, StoredFile):
+            return pdf_data.size
+        return len(pdf_data) if pdf_data else 0
+
+    async def process_pdf(self, pdf_data: Union[bytes, StoredFile], filename: str) -> Tuple[str, ProcessedDocument, List[DocumentCitation]]:
         """
         Process a PDF using Claude's native PDF support via Files API.
         No manual text extraction - relies on Files API for full document access.
         
         Args:
-            pdf_data: Raw bytes of the PDF file
+            pdf_data: Raw bytes of the PDF file, or a storage handle that is streamed
+                to the Files API without loading the whole file
             filename: Name of the PDF file
             
         Returns:
@@ -827,7 +1000,7 @@ class ClaudeService:
                 id=uuid.UUID(document_id),
                 filename=filename,
                 upload_timestamp=datetime.now(),
-                file_size=len(pdf_data) if pdf_data else 0,
+                file_size=self._pdf_size(pdf_data),
                 mime_type="application/pdf",
                 user_id="system"
             )
@@ -849,26 +1022,58 @@ class ClaudeService:
         try:
             logger.info(f"Processing PDF: {filename} with Claude API using native PDF support.")
             
-            pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
+            if isinstance(pdf_data, StoredFile):
+                content_sha256 = pdf_data.sha256
+            else:
+                content_sha256 = hashlib.sha256(pdf_data).hexdigest()
             
             # Step 1: Upload to Files API once and reuse the file_id
             from pdf_processing.claude_file_client import upload_pdf
             claude_file_id = await upload_pdf(filename, pdf_data)
             logger.info(f"Generated Claude file_id {claude_file_id} for {filename}")
             
-            # Step 2: Analyze document to determine type and periods using file_id
-            logger.info(f"Analyzing document type for {filename}")
-            document_type, periods = await self._analyze_document_type_with_file_id(claude_file_id, filename)
-            logger.info(f"Document {filename} classified as: {document_type.value} with periods: {periods}")
-            
-            # Step 3: Extract structured financial data and citations using file_id
-            logger.info(f"Extracting structured financial data and citations for {filename}")
-            # This call now returns structured_data (JSON-like dict) and citations_list
-            structured_financial_data, citations_from_extraction = await self._extract_financial_data_with_citations_by_file_id(
-                file_id=claude_file_id,
-                filename=filename, 
-                document_type=document_type
-            )
+            if settings.PDF_INGEST_MODE == "serial":
+                # Step 2: Analyze document to determine type and periods using file_id
+                logger.info(f"Analyzing document type for {filename}")
+                document_type, periods = await self._analyze_document_type_with_file_id(claude_file_id, filename, content_sha256=content_sha256)
+                logger.info(f"Document {filename} classified as: {document_type.value} with periods: {periods}")
+                
+                # Step 3: Extract structured financial data and citations using file_id
+                logger.info(f"Extracting structured financial data and citations for {filename}")
+                # This call now returns structured_data (JSON-like dict) and citations_list
+                structured_financial_data, citations_from_extraction = await self._extract_financial_data_with_citations_by_file_id(
+                    file_id=claude_file_id,
+                    filename=filename, 
+                    document_type=document_type,
+                    content_sha256=content_sha256
+                )
+            else:
+                # Steps 2+3 pipelined: both calls only need the file_id, so extraction runs with a
+                # type-agnostic prompt alongside classification instead of waiting a round trip for it
+                logger.info(f"Classifying and extracting {filename} concurrently")
+                classification = asyncio.create_task(
+                    self._analyze_document_type_with_file_id(claude_file_id, filename, content_sha256=content_sha256)
+                )
+                extraction = asyncio.create_task(
+                    self._extract_financial_data_with_citations_by_file_id(
+                        file_id=claude_file_id,
+                        filename=filename,
+                        document_type=None,
+                        content_sha256=content_sha256
+                    )
+                )
+                try:
+                    await asyncio.gather(classification, extraction)
+                except BaseException:
+                    # A failure in either call (or our own cancellation) cancels the sibling; gather
+                    # has already surfaced the original exception, so re-raise it as-is
+                    for task in (classification, extraction):
+                        task.cancel()
+                    await asyncio.gather(classification, extraction, return_exceptions=True)
+                    raise
+                document_type, periods = classification.result()
+                structured_financial_data, citations_from_extraction = extraction.result()
+                logger.info(f"Document {filename} classified as: {document_type.value} with periods: {periods}")
             citations_list = citations_from_extraction # Assuming _extract_financial_data_with_citations returns List[Any] for citations
             logger.info(f"Extracted {len(citations_list)} citations for {filename}")
 
@@ -898,7 +1103,7 @@ class ClaudeService:
                 id=uuid.UUID(document_id_str),
                 filename=filename,
                 upload_timestamp=datetime.now(),
-                file_size=len(pdf_data),
+                file_size=self._pdf_size(pdf_data),
                 mime_type="application/pdf",
                 user_id="system"
             )
@@ -926,7 +1131,7 @@ class ClaudeService:
                 id=uuid.UUID(document_id_err),
                 filename=filename,
                 upload_timestamp=datetime.now(),
-                file_size=len(pdf_data) if pdf_data else 0,
+                file_size=self._pdf_size(pdf_data),
                 mime_type="application/pdf",
                 user_id="system"
             )
@@ -990,7 +1195,8 @@ class ClaudeService:
             response = await self._claude_call(
                 model=optimal_model,
                 max_tokens=1000,
-                messages=messages
+                messages=messages,
+                cache_prefix=False  # One-off classification; its prefix is never re-read
             )
             
             # Extract JSON from the response
@@ -1044,7 +1250,7 @@ class ClaudeService:
                 logger.exception(f"Error in document type analysis: {e}")
                 return DocumentContentType.OTHER, []
 
-    async def _extract_financial_data_with_citations_by_file_id(self, file_id: str, filename: str, document_type: DocumentContentType) -> Tuple[Dict[str, Any], List[Any]]:
+    async def _extract_financial_data_with_citations_by_file_id(self, file_id: str, filename: str, document_type: Optional[DocumentContentType], content_sha256: Optional[str] = None) -> Tuple[Dict[str, Any], List[Any]]:
         """
         Extract financial data from a PDF using Claude's native PDF support with existing file_id.
         Optimized version that reuses uploaded file_id instead of uploading again.
@@ -1052,7 +1258,8 @@ class ClaudeService:
         Args:
             file_id: Existing Claude file ID from previous upload
             filename: Name of the PDF file
-            document_type: Type of document being processed
+            document_type: Type of document being processed, or None for a type-agnostic prompt
+            content_sha256: Optional SHA-256 of the PDF bytes; keys the response cache
             
         Returns:
             Tuple of extracted structured data dictionary and list of citations
@@ -1065,15 +1272,16 @@ class ClaudeService:
             logger.info(f"Extracting structured financial data with citations from: {filename} using file_id {file_id}")
             
             doc_type_str = document_type.value if document_type else "financial document"
-            
-            system_prompt = """You are a specialized financial document analysis assistant. Extract structured financial data from the document accurately using Claude's native PDF support.
 
-Follow these guidelines:
-1. Analyze both the text and visual elements (charts, tables, graphs) in the document.
-2. Extract values with their correct time periods, labels, and units.
-3. Present the data in a structured JSON format.
-4. Provide citations for extracted data points when possible.
-5. Any textual narrative should be brief and clearly separated from the JSON structure."""
+            cache_key = self._response_cache_key(
+                content_sha256, file_id, settings.MODEL_SONNET, "financial_extraction", doc_type_str
+            )
+            cached = await self.response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info(f"Response cache hit for financial data extraction of {filename}")
+                return cached["data"], cached["citations"]
+            
+            system_prompt = FINANCIAL_EXTRACTION_SYSTEM_PROMPT
             
             messages = [
                 {
@@ -1085,13 +1293,7 @@ Follow these guidelines:
                         },
                         {
                             "type": "text",
-                            "text": (
-                                f"From this {doc_type_str} document, provide a comprehensive JSON object "
-                                "containing all extracted financial data. The JSON should include key metrics, "
-                                "time periods, and values. Structure the JSON clearly with categories like "
-                                "revenue, expenses, assets, liabilities, etc. "
-                                "Include any visual data from charts and tables."
-                            )
+                            "text": FINANCIAL_EXTRACTION_PROMPT_TEMPLATE.format(doc_type=doc_type_str)
                         }
                     ]
                 }
@@ -1102,7 +1304,8 @@ Follow these guidelines:
                 model=settings.MODEL_SONNET,
                 max_tokens=4000,
                 system=system_prompt,
-                messages=messages
+                messages=messages,
+                cache_prefix=False  # One-off extraction; its prefix is never re-read
             )
             
             processed_response_content = self._process_claude_response(response)
@@ -1144,6 +1347,15 @@ Follow these guidelines:
             if claude_preamble_text:
                 parsed_financial_json['claude_textual_output_accompanying_json'] = claude_preamble_text
                 logger.info(f"Captured Claude's preamble text, length: {len(claude_preamble_text)}")
+
+            # Only well-formed extractions are worth replaying for identical content
+            if cache_key and parsed_financial_json and not (
+                "error_parsing_financial_json" in parsed_financial_json or "parsing_error_occurred" in parsed_financial_json
+            ):
+                await self.response_cache.set(
+                    cache_key, {"data": parsed_financial_json, "citations": citations},
+                    "financial_extraction", RESPONSE_CACHE_PROMPT_VERSIONS["financial_extraction"], settings.MODEL_SONNET
+                )
             
             return parsed_financial_json, citations
             
@@ -1221,7 +1433,8 @@ Follow these guidelines:
                 model=settings.MODEL_SONNET,
                 max_tokens=4000,
                 system=system_prompt,
-                messages=messages
+                messages=messages,
+                cache_prefix=False  # One-off extraction; its prefix is never re-read
             )
             
             processed_response_content = self._process_claude_response(response)
@@ -1278,13 +1491,13 @@ Follow these guidelines:
                 logger.error(f"Error extracting structured financial data: {str(e)}", exc_info=True)
                 return {"error_extracting_structured_data": str(e)}, []
 
-    async def analyze_pdf_content(self, pdf_data: bytes, filename: str, use_cached_file_id: str = None) -> ProcessedDocument:
+    async def analyze_pdf_content(self, pdf_data: Union[bytes, StoredFile], filename: str, use_cached_file_id: str = None) -> ProcessedDocument:
         """
         Lightweight PDF analysis using Claude's native PDF support.
         Uses cached file ID when available, otherwise uploads the PDF.
         
         Args:
-            pdf_data: Raw PDF bytes
+            pdf_data: Raw PDF bytes or a storage handle (only read when there is no file ID)
             filename: Name of the PDF file
             use_cached_file_id: Optional cached Claude file ID
             
@@ -1300,10 +1513,13 @@ Follow these guidelines:
                 logger.info(f"Using cached file_id {file_id} for analysis")
                 
                 # Lightweight document type analysis using file ID
-                document_type, periods = await self._analyze_document_type_with_file_id(file_id, filename)
+                content_sha256 = pdf_data.sha256 if isinstance(pdf_data, StoredFile) else None
+                document_type, periods = await self._analyze_document_type_with_file_id(file_id, filename, content_sha256=content_sha256)
             else:
                 # Convert to base64 and analyze directly
                 logger.info(f"No cached file_id, analyzing {filename} directly")
+                if isinstance(pdf_data, StoredFile):
+                    pdf_data = await pdf_data.read()
                 pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
                 document_type, periods = await self._analyze_document_type(pdf_base64, filename)
             
@@ -1315,7 +1531,7 @@ Follow these guidelines:
                 id=uuid.UUID(document_id_str),
                 filename=filename,
                 upload_timestamp=datetime.now(),
-                file_size=len(pdf_data),
+                file_size=self._pdf_size(pdf_data),
                 mime_type="application/pdf",
                 user_id="system"
             )
@@ -1342,7 +1558,7 @@ Follow these guidelines:
                 id=uuid.UUID(document_id_err),
                 filename=filename,
                 upload_timestamp=datetime.now(),
-                file_size=len(pdf_data) if pdf_data else 0,
+                file_size=self._pdf_size(pdf_data),
                 mime_type="application/pdf",
                 user_id="system"
             )
@@ -1356,7 +1572,7 @@ Follow these guidelines:
                 processing_status=ProcessingStatus.FAILED
             )
 
-    async def _analyze_document_type_with_file_id(self, file_id: str, filename: str) -> Tuple[DocumentContentType, List[str]]:
+    async def _analyze_document_type_with_file_id(self, file_id: str, filename: str, content_sha256: Optional[str] = None) -> Tuple[DocumentContentType, List[str]]:
         """
         Analyze document type using Files API file ID (token-efficient).
         Uses Claude's native PDF support through the Files API.
@@ -1364,6 +1580,7 @@ Follow these guidelines:
         Args:
             file_id: Claude file ID
             filename: Name of the PDF file
+            content_sha256: Optional SHA-256 of the PDF bytes; keys the response cache
             
         Returns:
             Tuple of document type and periods
@@ -1371,6 +1588,16 @@ Follow these guidelines:
         try:
             logger.info(f"Analyzing document type for {filename} using file_id={file_id}")
             
+            # Use model router for cost optimization 
+            optimal_model = choose_model(set(), 1000)  # Simple task, low token estimate  
+            logger.info(f"Model router selected {optimal_model} for document type analysis")
+
+            cache_key = self._response_cache_key(content_sha256, file_id, optimal_model, "document_type")
+            cached = await self.response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info(f"Response cache hit for document type analysis of {filename}")
+                return DocumentContentType(cached["document_type"]), cached["periods"]
+            
             # Use file reference with Claude's native PDF support via Files API
             messages = [
                 {
@@ -1382,21 +1609,18 @@ Follow these guidelines:
                         },
                         {
                             "type": "text",
-                            "text": "Analyze this financial document. Determine if it's a balance sheet, income statement, cash flow statement, or other type of document. Also identify the time periods covered (e.g., Q1 2023, FY 2022, etc.). Return ONLY a JSON response in this format:\n\n{\n  \"document_type\": \"balance_sheet|income_statement|cash_flow|notes|other\",\n  \"periods\": [\"period1\", \"period2\", ...]\n}"
+                            "text": DOCUMENT_TYPE_PROMPT
                         }
                     ]
                 }
             ]
              
-            # Use model router for cost optimization 
-            optimal_model = choose_model(set(), 1000)  # Simple task, low token estimate  
-            logger.info(f"Model router selected {optimal_model} for document type analysis")
-             
             # Call Claude API with Files API support
             response = await self._claude_call(
                 model=optimal_model,
                 max_tokens=1000,
-                messages=messages
+                messages=messages,
+                cache_prefix=False  # One-off classification; its prefix is never re-read
             )
             
             # Extract JSON from the response
@@ -1431,6 +1655,11 @@ Follow these guidelines:
             
             periods = result.get("periods", [])
             logger.info(f"Document {filename} classified as {document_type.value} with periods: {periods}")
+            if cache_key:
+                await self.response_cache.set(
+                    cache_key, {"document_type": document_type.value, "periods": periods},
+                    "document_type", RESPONSE_CACHE_PROMPT_VERSIONS["document_type"], optimal_model
+                )
             return document_type, periods
             
         except Exception as e:
@@ -1678,6 +1907,7 @@ Follow these guidelines:
             # Initialize conversation tracking
             conversation_messages = initial_messages.copy()
             accumulated_text = ""
+            accumulated_index = ShingleIndex()  # Dedup index over accumulated_text, grown per turn
             accumulated_charts = []
             accumulated_tables = []
             accumulated_metrics = []
@@ -1743,20 +1973,21 @@ Follow these guidelines:
                         if turn == 0:
                             # First turn - save for analysis result but DON'T re-stream
                             accumulated_text = response_text
+                            accumulated_index.add(response_text)
+                            accumulated_index.flush()
                             logger.info(f"Turn {turn + 1}: Captured streamed text ({len(response_text)} chars) - already sent to frontend")
                         else:
                             # Subsequent turns - check if this is new content
                             logger.info(f"Turn {turn + 1}: Received {len(response_text)} chars")
                             
                             # Only accumulate if this is genuinely new content, not a duplicate
-                            response_plain = response_text.replace('\n', ' ').replace('  ', ' ').strip()
-                            accumulated_plain = accumulated_text.replace('\n', ' ').replace('  ', ' ').strip()
-                            
-                            if response_plain[:min(100, len(response_plain))] in accumulated_plain:
+                            if not self._is_substantially_new_content(response_text, accumulated_index):
                                 logger.warning(f"Turn {turn + 1}: Detected duplicate content - ignoring to prevent duplication")
                             else:
                                 # This appears to be new content, accumulate it
                                 accumulated_text = accumulated_text + "\n\n" + response_text
+                                accumulated_index.add(response_text)
+                                accumulated_index.flush()
                                 logger.info(f"Turn {turn + 1}: Added new content to accumulated_text")
                     
                     # Log tool calls for debugging
@@ -2021,7 +2252,8 @@ Follow these guidelines:
                 model=settings.MODEL_HAIKU,  # Use fast model for validation
                 messages=test_messages,
                 max_tokens=10,
-                temperature=0
+                temperature=0,
+                cache_prefix=False
             )
             
             # If we get any response, the file_id is valid
@@ -2,7 +2,12 @@ import httpx
 import settings
 import asyncio
 import os
-from utils.file_cache import get_cached_file_id, cache_file_id
+import contextlib
+from typing import Union, Optional
+from utils.file_cache import (
+    FileCacheManager, FileRejectedError, STATUS_REJECTED, get_file_cache, upload_lease_owner
+)
+from utils.storage import StoredFile
 from utils.secure_logging import audit_pdf_access, PrivacyAwareLogger
 
 log = PrivacyAwareLogger(__name__)
@@ -24,13 +29,23 @@ def _get_masked_headers() -> dict:
 
 _BASE_URL = "https://api.anthropic.com/v1/files"
 
-async def upload_pdf(filename: str, data: bytes, max_retries: int = 3) -> str:
+# Client errors meaning the file itself is unacceptable (cached negatively). A plain 400
+# can just as well be a malformed request or a transient API-side problem, and auth and
+# rate-limit errors say nothing about the content, so none of those are cached
+_REJECTION_STATUS_CODES = {413, 415, 422}
+
+async def upload_pdf(filename: str, data: Union[bytes, StoredFile], max_retries: int = 3) -> str:
     """
     Upload a PDF to Claude's Files API with retry logic and cross-tenant caching.
     
+    Identical content (by byte-level SHA-256) is uploaded once per cache lifetime: cached
+    file IDs are re-validated against the Files API periodically, rejected content fails
+    fast, and concurrent uploads of the same bytes wait on the first one's lease.
+    
     Args:
         filename: Name of the PDF file
-        data: Raw PDF bytes
+        data: Raw PDF bytes, or a storage handle whose content is streamed from storage
+            (its recorded size and SHA-256 are used for the limit check and cache lookup)
         max_retries: Maximum retry attempts for 5xx errors
         
     Returns:
@@ -38,41 +53,109 @@ async def upload_pdf(filename: str, data: bytes, max_retries: int = 3) -> str:
         
     Raises:
         ValueError: If PDF exceeds 32MB limit
+        FileRejectedError: If the Files API already rejected identical content
         httpx.HTTPStatusError: If API request fails after retries
     """
-    if len(data) > settings.FILES_MAX_SIZE_MB * 1024 ** 2:
+    stored = data if isinstance(data, StoredFile) else None
+    size = stored.size if stored else len(data)
+    if size > settings.FILES_MAX_SIZE_MB * 1024 ** 2:
         raise ValueError(f"PDF exceeds Files-API {settings.FILES_MAX_SIZE_MB} MB limit")
 
+    cache = get_file_cache()
+    content_sha256 = stored.sha256 if stored else FileCacheManager.content_key(data)
+    headers = _get_safe_headers()
+
     # Check cache first to avoid duplicate uploads
-    cached_file_id = await get_cached_file_id(data)
+    cached_file_id = await _usable_cached_file_id(cache, content_sha256, headers)
+    owner = upload_lease_owner()
+    while not cached_file_id and not await cache.claim_upload(content_sha256, owner):
+        # Another worker is uploading the same bytes; use its result
+        entry = await cache.wait_for_upload(content_sha256)
+        if entry:
+            cached_file_id = await _usable_cached_file_id(cache, content_sha256, headers, entry)
     if cached_file_id:
         log.info("Using cached file_id=%s for %s (%.1f MB)", 
-                cached_file_id, filename, len(data)/(1024**2))
+                cached_file_id, filename, size/(1024**2))
         # Audit cache hit for compliance
-        audit_pdf_access("cache_hit", cached_file_id, "system", len(data))
+        audit_pdf_access("cache_hit", cached_file_id, "system", size)
         return cached_file_id
 
-    headers = _get_safe_headers()
+    try:
+        async with (stored.open() if stored else contextlib.nullcontext(data)) as payload:
+            file_id = await _post_with_retries(filename, payload, headers, max_retries)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in _REJECTION_STATUS_CODES:
+            await cache.cache_rejection(content_sha256, f"HTTP {e.response.status_code}: {e.response.text[:500]}", size)
+        else:
+            await cache.release_upload(content_sha256, owner)
+        raise
+    except BaseException:
+        await cache.release_upload(content_sha256, owner)
+        raise
+
+    # Cache the file ID for future use (replaces the upload lease)
+    await cache.cache_file_id(None, file_id, content_sha256=content_sha256, size_bytes=size)
+    
+    # Audit successful upload for compliance
+    audit_pdf_access("upload", file_id, "system", size)
     
+    log.info("Uploaded %s (%.1f MB) → %s", filename, size/(1024**2), file_id)
+    return file_id
+
+
+async def _usable_cached_file_id(cache: FileCacheManager, content_sha256: str, headers: dict,
+                                 entry=None) -> Optional[str]:
+    """
+    Return a cached file ID that is still live, raising for negatively cached content.
+
+    File IDs not validated within the validation interval are checked against the Files
+    API; a file that no longer exists is dropped from the cache so the caller re-uploads.
+    """
+    entry = entry or await cache.get_entry(content_sha256=content_sha256)
+    if entry is None:
+        return None
+    if entry.status == STATUS_REJECTED:
+        raise FileRejectedError(content_sha256, entry.error or "rejected")
+    if entry.needs_validation:
+        live = await _file_is_live(entry.file_id, headers)
+        if live is False:
+            log.info("Cached file_id=%s no longer exists upstream; re-uploading", entry.file_id)
+            await cache.invalidate(content_sha256)
+            return None
+        if live:
+            await cache.mark_validated(content_sha256)
+    return entry.file_id
+
+
+async def _file_is_live(file_id: str, headers: dict) -> Optional[bool]:
+    """Check a file ID with the Files API; None when the answer is unknown (network/5xx)."""
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            r = await client.get(f"{_BASE_URL}/{file_id}", headers=headers)
+    except httpx.HTTPError as e:
+        log.warning("Could not validate file_id=%s: %s", file_id, str(e))
+        return None
+    if r.status_code == 200:
+        return True
+    if r.status_code in (404, 410):
+        return False
+    return None
+
+
+async def _post_with_retries(filename: str, payload, headers: dict, max_retries: int) -> str:
+    """POST the file (bytes or a seekable file object) to the Files API, retrying 5xx errors."""
     for attempt in range(max_retries + 1):
         try:
+            if hasattr(payload, "seek"):
+                payload.seek(0)
             async with httpx.AsyncClient(timeout=60) as client:
                 r = await client.post(
                     _BASE_URL,
                     headers=headers,
-                    files={"file": (filename, data, "application/pdf")},
+                    files={"file": (filename, payload, "application/pdf")},
                 )
             r.raise_for_status()
-            file_id = r.json()["id"]
-            
-            # Cache the file ID for future use
-            await cache_file_id(data, file_id)
-            
-            # Audit successful upload for compliance
-            audit_pdf_access("upload", file_id, "system", len(data))
-            
-            log.info("Uploaded %s (%.1f MB) → %s", filename, len(data)/(1024**2), file_id)
-            return file_id
+            return r.json()["id"]
             
         except httpx.HTTPStatusError as e:
             # Retry only on 5xx server errors, not 4xx client errors
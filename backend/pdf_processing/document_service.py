@@ -1,30 +1,36 @@
 import logging
-from typing import Dict, List, Optional, Any
-import asyncio
+from typing import Dict, List, Optional, Any, Callable, Awaitable, AsyncIterator, Union
 import settings
 
 from models.document import (
     Citation as CitationSchema,
-    DocumentUploadResponse
+    DocumentUploadResponse,
+    ProcessingStatus
 )
 from models.database_models import DocumentType, ProcessingStatusEnum, Citation
 from pdf_processing.api_service import ClaudeService
 from repositories.document_repository import DocumentRepository
+from repositories.document_job_repository import DocumentJobRepository
+from utils.storage import StoredFile
+
+# Async callback receiving (stage, fraction complete) while a document is processed
+ProgressCallback = Callable[[str, float], Awaitable[None]]
 
 
 logger = logging.getLogger(__name__)
 
 
 class DocumentService:
-    def __init__(self, document_repository: DocumentRepository):
+    def __init__(self, document_repository: DocumentRepository, claude_service: Optional[ClaudeService] = None):
         """
         Initialize the document service.
         
         Args:
             document_repository: Repository for document operations
+            claude_service: Optional shared Claude service (a new one is created if omitted)
         """
         self.document_repository = document_repository
-        self.claude_service = ClaudeService()
+        self.claude_service = claude_service or ClaudeService()
         
     async def upload_document(self, file_data: bytes, filename: str, user_id: str) -> DocumentUploadResponse:
         """
@@ -47,8 +53,8 @@ class DocumentService:
                 mime_type="application/pdf"
             )
             
-            # Start background processing with Files API optimization
-            asyncio.create_task(self._process_document_optimized(document.id, file_data, filename))
+            # Hand processing to the durable job queue; workers bound concurrency and retry failures
+            await self._enqueue_processing(document.id, user_id, filename)
             
             # Return upload response
             return self.document_repository.document_to_upload_response(document)
@@ -57,114 +63,193 @@ class DocumentService:
             logger.error(f"Error uploading document: {str(e)}", exc_info=True)
             raise
     
-    async def _process_document_optimized(self, document_id: str, pdf_data: bytes, filename: str):
+    async def upload_document_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        user_id: str,
+        max_size_bytes: Optional[int] = None
+    ) -> DocumentUploadResponse:
+        """
+        Upload a document by streaming it to storage, then queue it for processing.
+        
+        The content is hashed while it is written and never held in memory as a whole;
+        the processing job receives a storage handle instead of bytes.
+        
+        Args:
+            chunks: Async iterator over the PDF content
+            filename: Name of the file
+            user_id: ID of the user uploading the document
+            max_size_bytes: Optional size limit enforced while streaming
+            
+        Returns:
+            Document upload response with status and document ID
+            
+        Raises:
+            FileTooLargeError: If the upload crosses max_size_bytes
+        """
+        document, stored = await self.document_repository.create_document_from_stream(
+            chunks,
+            filename=filename,
+            user_id=user_id,
+            mime_type="application/pdf",
+            max_size_bytes=max_size_bytes
+        )
+        logger.info(f"Streamed upload {filename} to storage ({stored.size} bytes, sha256={stored.sha256[:16]}...)")
+        
+        await self._enqueue_processing(document.id, user_id, filename, stored=stored)
+        
+        return self.document_repository.document_to_upload_response(document)
+    
+    async def _enqueue_processing(
+        self, document_id: str, user_id: str, filename: str, stored: Optional[StoredFile] = None
+    ) -> None:
+        """
+        Enqueue a processing job for an uploaded document and wake local workers.
+        
+        A failed enqueue is logged rather than raised: the document stays PENDING and the
+        queue's periodic recovery pass enqueues stranded documents.
+        """
+        from services.document_job_queue import get_document_job_queue
+        
+        try:
+            job_repository = DocumentJobRepository(self.document_repository.db)
+            job = await job_repository.enqueue(
+                document_id, user_id, filename, max_attempts=settings.DOCUMENT_JOB_MAX_ATTEMPTS, stored=stored
+            )
+            logger.info(f"Enqueued processing job {job.id} for document {document_id}")
+            get_document_job_queue().notify()
+        except Exception as e:
+            logger.error(f"Failed to enqueue processing job for document {document_id}: {e}", exc_info=True)
+            # Leave the session usable for the rest of the request
+            await self.document_repository.db.rollback()
+    
+    async def process_document(
+        self,
+        document_id: str,
+        pdf_data: Union[bytes, StoredFile],
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> None:
         """
         Process a document with Claude API optimizations using Files API and cached text.
         
+        Raises on failure so the job queue can retry; the caller owns the FAILED status.
+        
         Args:
             document_id: ID of the document
-            pdf_data: Raw bytes of the PDF file
+            pdf_data: Raw bytes of the PDF file or a handle to it in storage
             filename: Name of the file
+            progress_callback: Optional async callback receiving (stage, fraction complete)
         """
-        try:
-            # Update status to processing
-            await self.document_repository.update_document_status(document_id, ProcessingStatusEnum.PROCESSING)
-            logger.info(f"Starting optimized processing of document {document_id} ({filename}) with Claude Files API")
-            
-            # Initialize claude_file_id for later use
-            claude_file_id = None
+        async def report(stage: str, progress: float) -> None:
+            if progress_callback:
+                await progress_callback(stage, progress)
+        
+        # Update status to processing
+        await self.document_repository.update_document_status(document_id, ProcessingStatusEnum.PROCESSING)
+        logger.info(f"Starting optimized processing of document {document_id} ({filename}) with Claude Files API")
+        await report("analyzing", 0.1)
+        
+        # Initialize claude_file_id for later use
+        claude_file_id = None
+        
+        # Get the document record to use with Files API optimization
+        doc = await self.document_repository.get_document(document_id)
+        if not doc:
+            raise ValueError(f"Document {document_id} not found")
+        
+        # Check if we have cached file_id and can use Files API optimization
+        if doc.claude_file_id:
+            logger.info(f"Using cached Files API file_id={doc.claude_file_id} for document {document_id}")
             
-            # Get the document record to use with Files API optimization
-            doc = await self.document_repository.get_document(document_id)
-            if not doc:
-                raise ValueError(f"Document {document_id} not found")
+            # For cached files, use lightweight analysis approach to avoid redundant API calls
+            processed_document_model = await self.claude_service.analyze_pdf_content(
+                pdf_data, filename, use_cached_file_id=doc.claude_file_id
+            )
+            citations_list = []  # Citations from cache if needed
+            claude_file_id = doc.claude_file_id  # Use the existing cached file_id
             
-            # Check if we have cached file_id and can use Files API optimization
-            if doc.claude_file_id:
-                logger.info(f"Using cached Files API file_id={doc.claude_file_id} for document {document_id}")
-                
-                # For cached files, use lightweight analysis approach to avoid redundant API calls
-                processed_document_model = await self.claude_service.analyze_pdf_content(
-                    pdf_data, filename, use_cached_file_id=doc.claude_file_id
-                )
-                citations_list = []  # Citations from cache if needed
-                claude_file_id = doc.claude_file_id  # Use the existing cached file_id
-                
-            else:
-                logger.info(f"No cached file_id for document {document_id}, performing full processing")
-                # Process with Claude service using Files API (no manual text extraction)
-                processing_note, processed_document_model, citations_list = await self.claude_service.process_pdf(pdf_data, filename)
-                
-                if not processed_document_model:
-                    raise ValueError("Claude service returned None for processed_document_model")
-                
-                logger.info(f"Processed document using Files API: {processing_note}")
-                
-                # Extract claude_file_id from processed document data
-                if processed_document_model.extracted_data and isinstance(processed_document_model.extracted_data, dict):
-                    claude_file_id = processed_document_model.extracted_data.get('claude_file_id')
-                    logger.info(f"Extracted claude_file_id {claude_file_id} from processed document data")
-                else:
-                    claude_file_id = None
-                
-                # Update document with new cached data (file_id should now be set)
-                if claude_file_id:
-                    await self.document_repository.update_document(document_id, {
-                        "claude_file_id": claude_file_id
-                    })
-                    logger.info(f"Stored claude_file_id {claude_file_id} in database for document {document_id}")
-                else:
-                    logger.warning(f"No claude_file_id found in processed document data for {document_id}")
+        else:
+            logger.info(f"No cached file_id for document {document_id}, performing full processing")
+            # Process with Claude service using Files API (no manual text extraction)
+            processing_note, processed_document_model, citations_list = await self.claude_service.process_pdf(pdf_data, filename)
             
-            # Determine document type from the processed model
-            document_type_enum = DocumentType[processed_document_model.content_type.upper()] if processed_document_model.content_type else DocumentType.OTHER
+            if not processed_document_model:
+                raise ValueError("Claude service returned None for processed_document_model")
+            if processed_document_model.processing_status == ProcessingStatus.FAILED:
+                # process_pdf reports pipeline errors in-band; surface them so the job is retried
+                raise ValueError(processing_note)
             
-            # Update document with extracted content and Claude optimizations (no raw_text for PDFs)
-            logger.info(f"Updating document {document_id} content with Claude optimizations using Files API")
-            await self.document_repository.update_document_content(
-                document_id=document_id,
-                document_type=document_type_enum,
-                periods=processed_document_model.periods,
-                extracted_data=processed_document_model.extracted_data,
-                raw_text=None,  # No raw_text needed - use Files API instead
-                confidence_score=processed_document_model.confidence_score
-            )
+            logger.info(f"Processed document using Files API: {processing_note}")
             
-            logger.info(f"Document {document_id} processed with Claude optimizations. File ID: {claude_file_id}")
+            # Extract claude_file_id from processed document data
+            if processed_document_model.extracted_data and isinstance(processed_document_model.extracted_data, dict):
+                claude_file_id = processed_document_model.extracted_data.get('claude_file_id')
+                logger.info(f"Extracted claude_file_id {claude_file_id} from processed document data")
+            else:
+                claude_file_id = None
             
-            # Store citations as before
-            added_db_citations: List[Citation] = []
-            logger.info(f"Storing {len(citations_list)} citations for document {document_id}")
-            for citation_schema_item in citations_list:
-                if not isinstance(citation_schema_item, CitationSchema):
-                    logger.warning(f"Skipping non-CitationSchema item in citations_list: {type(citation_schema_item)}")
-                    continue
+            # Update document with new cached data (file_id should now be set)
+            if claude_file_id:
+                await self.document_repository.update_document(document_id, {
+                    "claude_file_id": claude_file_id
+                })
+                logger.info(f"Stored claude_file_id {claude_file_id} in database for document {document_id}")
+            else:
+                logger.warning(f"No claude_file_id found in processed document data for {document_id}")
+        
+        await report("storing_results", 0.8)
+        
+        # Determine document type from the processed model
+        document_type_enum = DocumentType[processed_document_model.content_type.upper()] if processed_document_model.content_type else DocumentType.OTHER
+        
+        # Update document with extracted content and Claude optimizations (no raw_text for PDFs)
+        logger.info(f"Updating document {document_id} content with Claude optimizations using Files API")
+        await self.document_repository.update_document_content(
+            document_id=document_id,
+            document_type=document_type_enum,
+            periods=processed_document_model.periods,
+            extracted_data=processed_document_model.extracted_data,
+            raw_text=None,  # No raw_text needed - use Files API instead
+            confidence_score=processed_document_model.confidence_score
+        )
+        
+        logger.info(f"Document {document_id} processed with Claude optimizations. File ID: {claude_file_id}")
+        
+        # Store citations as before, skipping any a failed earlier attempt already stored
+        added_db_citations: List[Citation] = []
+        stored_citations = {
+            (citation.page, citation.text, citation.section)
+            for citation in await self.document_repository.get_document_citations(document_id)
+        }
+        logger.info(f"Storing {len(citations_list)} citations for document {document_id}")
+        for citation_schema_item in citations_list:
+            if not isinstance(citation_schema_item, CitationSchema):
+                logger.warning(f"Skipping non-CitationSchema item in citations_list: {type(citation_schema_item)}")
+                continue
+            citation_key = (citation_schema_item.page, citation_schema_item.text, citation_schema_item.section)
+            if citation_key in stored_citations:
+                continue
+            stored_citations.add(citation_key)
 
-                bounding_box = citation_schema_item.bounding_box or {
-                    "top": 0, "left": 0, "width": 0, "height": 0
-                }
-                
-                db_citation = await self.document_repository.add_citation(
-                    document_id=document_id,
-                    page=citation_schema_item.page,
-                    text=citation_schema_item.text,
-                    section=citation_schema_item.section,
-                    bounding_box=bounding_box
-                )
-                if db_citation:
-                    added_db_citations.append(db_citation)
-            
-            # Update status to completed
-            await self.document_repository.update_document_status(document_id, ProcessingStatusEnum.COMPLETED)
-            logger.info(f"Successfully completed optimized processing for document {document_id}")
+            bounding_box = citation_schema_item.bounding_box or {
+                "top": 0, "left": 0, "width": 0, "height": 0
+            }
             
-        except Exception as e:
-            logger.error(f"Error in optimized document processing for {document_id}: {str(e)}", exc_info=True)
-            await self.document_repository.update_document_status(
+            db_citation = await self.document_repository.add_citation(
                 document_id=document_id,
-                status=ProcessingStatusEnum.FAILED,
-                error_message=f"Optimized processing error: {str(e)}"
+                page=citation_schema_item.page,
+                text=citation_schema_item.text,
+                section=citation_schema_item.section,
+                bounding_box=bounding_box
             )
+            if db_citation:
+                added_db_citations.append(db_citation)
+        
+        # Update status to completed
+        await self.document_repository.update_document_status(document_id, ProcessingStatusEnum.COMPLETED)
+        logger.info(f"Successfully completed optimized processing for document {document_id}")
     
     async def get_document_text_optimized(self, document_id: str) -> str:
         """
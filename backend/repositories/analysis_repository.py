@@ -21,8 +21,11 @@ Key Components:
 Interactions with other files:
 -----------------------------
 1. cfin/backend/models/database_models.py:
-   - Uses the AnalysisResult, Document, and User SQLAlchemy ORM models.
+   - Uses the AnalysisResult, AnalysisDocument, Document, and User SQLAlchemy ORM models.
    - AnalysisResult is the primary model managed by this repository.
+   - AnalysisDocument mirrors AnalysisResult.document_ids; it is written alongside every
+     create/update/delete so per-document queries are indexed lookups with SQL-side
+     ordering, limit and offset.
    - Document and User models are used for context (e.g., associating analysis with a document, which implicitly links to a user).
 
 2. cfin/backend/services/analysis_service.py:
@@ -42,9 +45,9 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import update, delete, insert, func, cast, String
 
-from models.database_models import AnalysisResult
+from models.database_models import AnalysisResult, AnalysisDocument
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +86,8 @@ class AnalysisRepository:
         
         # Add to database
         self.db.add(analysis)
+        await self.db.flush()
+        await self._set_documents(analysis.id, document_ids)
         await self.db.commit()
         await self.db.refresh(analysis)
         
@@ -122,16 +127,11 @@ class AnalysisRepository:
         Returns:
             List of analysis results
         """
-        # For SQLite, fetch all and filter in Python since document_ids is a JSON array
-        result = await self.db.execute(select(AnalysisResult))
-        all_analyses = result.scalars().all()
-        filtered = []
-        for analysis in all_analyses:
-            if document_id in (analysis.document_ids or []):
-                if not analysis_type or analysis.analysis_type == analysis_type:
-                    filtered.append(analysis)
-        filtered.sort(key=lambda x: x.created_at, reverse=True)
-        return filtered[offset:offset+limit]
+        query = self._for_documents(select(AnalysisResult), [document_id], analysis_type)
+        result = await self.db.execute(
+            query.order_by(AnalysisResult.created_at.desc()).limit(limit).offset(offset)
+        )
+        return list(result.scalars().all())
     
     async def list_latest_analyses(
         self,
@@ -150,22 +150,29 @@ class AnalysisRepository:
         Returns:
             List of analysis results
         """
-        # For SQLite, fetch all and filter in Python
-        result = await self.db.execute(select(AnalysisResult))
-        all_analyses = result.scalars().all()
-        analyses_by_document = {doc_id: [] for doc_id in document_ids}
-        for analysis in all_analyses:
-            for doc_id in document_ids:
-                if doc_id in (analysis.document_ids or []):
-                    if not analysis_type or analysis.analysis_type == analysis_type:
-                        if len(analyses_by_document[doc_id]) < limit:
-                            analyses_by_document[doc_id].append(analysis)
-        # Flatten and sort
-        latest_analyses = []
-        for doc_analyses in analyses_by_document.values():
-            latest_analyses.extend(doc_analyses)
-        latest_analyses.sort(key=lambda x: x.created_at, reverse=True)
-        return latest_analyses
+        if not document_ids:
+            return []
+        # Rank each document's analyses newest first and keep the top `limit` per document
+        ranked = (
+            select(
+                AnalysisDocument.analysis_id,
+                func.row_number().over(
+                    partition_by=AnalysisDocument.document_id,
+                    order_by=AnalysisResult.created_at.desc()
+                ).label("rank")
+            )
+            .join(AnalysisResult, AnalysisResult.id == AnalysisDocument.analysis_id)
+            .where(AnalysisDocument.document_id.in_(document_ids))
+        )
+        if analysis_type:
+            ranked = ranked.where(AnalysisResult.analysis_type == analysis_type)
+        ranked = ranked.subquery()
+        result = await self.db.execute(
+            select(AnalysisResult)
+            .where(AnalysisResult.id.in_(select(ranked.c.analysis_id).where(ranked.c.rank <= limit)))
+            .order_by(AnalysisResult.created_at.desc())
+        )
+        return list(result.scalars().all())
     
     async def update_analysis(
         self,
@@ -187,6 +194,8 @@ class AnalysisRepository:
             .where(AnalysisResult.id == analysis_id)
             .values(**update_data)
         )
+        if "document_ids" in update_data:
+            await self._set_documents(analysis_id, update_data["document_ids"])
         await self.db.commit()
         
         return await self.get_analysis(analysis_id)
@@ -201,7 +210,10 @@ class AnalysisRepository:
         Returns:
             True if analysis was deleted, False otherwise
         """
-        # Delete from database
+        # Delete from database (SQLite does not enforce the cascade without PRAGMA foreign_keys)
+        await self.db.execute(
+            delete(AnalysisDocument).where(AnalysisDocument.analysis_id == analysis_id)
+        )
         await self.db.execute(
             delete(AnalysisResult).where(AnalysisResult.id == analysis_id)
         )
@@ -224,15 +236,9 @@ class AnalysisRepository:
         Returns:
             Number of analysis results
         """
-        # For SQLite, fetch all and filter in Python
-        result = await self.db.execute(select(AnalysisResult))
-        all_analyses = result.scalars().all()
-        count = 0
-        for analysis in all_analyses:
-            if document_id in (analysis.document_ids or []):
-                if not analysis_type or analysis.analysis_type == analysis_type:
-                    count += 1
-        return count
+        query = self._for_documents(select(func.count()).select_from(AnalysisResult), [document_id], analysis_type)
+        result = await self.db.execute(query)
+        return result.scalar_one()
     
     async def search_analyses(
         self,
@@ -255,18 +261,16 @@ class AnalysisRepository:
         Returns:
             List of matching analysis results
         """
-        # For SQLite, fetch all and filter in Python
-        result = await self.db.execute(select(AnalysisResult))
-        all_analyses = result.scalars().all()
-        matching_analyses = []
-        for analysis in all_analyses:
-            if any(doc_id in (analysis.document_ids or []) for doc_id in document_ids):
-                if not analysis_type or analysis.analysis_type == analysis_type:
-                    result_data_str = str(analysis.result_data)
-                    if query.lower() in result_data_str.lower():
-                        matching_analyses.append(analysis)
-        matching_analyses.sort(key=lambda x: x.created_at, reverse=True)
-        return matching_analyses[offset:offset + limit]
+        if not document_ids:
+            return []
+        # Case-insensitive substring match over the serialized result_data
+        statement = self._for_documents(select(AnalysisResult), document_ids, analysis_type).where(
+            func.lower(cast(AnalysisResult.result_data, String)).contains(query.lower(), autoescape=True)
+        )
+        result = await self.db.execute(
+            statement.order_by(AnalysisResult.created_at.desc()).limit(limit).offset(offset)
+        )
+        return list(result.scalars().all())
     
     async def is_document_referenced(self, document_id: str) -> bool:
         """
@@ -276,9 +280,28 @@ class AnalysisRepository:
         Returns:
             True if the document is referenced, False otherwise
         """
-        result = await self.db.execute(select(AnalysisResult))
-        all_analyses = result.scalars().all()
-        for analysis in all_analyses:
-            if document_id in (analysis.document_ids or []):
-                return True
-        return False
\ No newline at end of file
+        result = await self.db.execute(
+            select(AnalysisDocument.analysis_id).where(AnalysisDocument.document_id == document_id).limit(1)
+        )
+        return result.first() is not None
+
+    @staticmethod
+    def _for_documents(statement, document_ids: List[str], analysis_type: Optional[str] = None):
+        """Restrict a statement over AnalysisResult to analyses referencing any of document_ids."""
+        statement = statement.where(
+            AnalysisResult.id.in_(
+                select(AnalysisDocument.analysis_id).where(AnalysisDocument.document_id.in_(document_ids))
+            )
+        )
+        if analysis_type:
+            statement = statement.where(AnalysisResult.analysis_type == analysis_type)
+        return statement
+
+    async def _set_documents(self, analysis_id: str, document_ids: Optional[List[str]]) -> None:
+        """Replace the analysis_documents rows of an analysis (caller commits)."""
+        await self.db.execute(
+            delete(AnalysisDocument).where(AnalysisDocument.analysis_id == analysis_id)
+        )
+        rows = [{"analysis_id": analysis_id, "document_id": doc_id} for doc_id in dict.fromkeys(document_ids or [])]
+        if rows:
+            await self.db.execute(insert(AnalysisDocument), rows)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Blob Repository Module
+=====================
+
+This module provides the repository layer for content-addressed file storage. Each
+distinct file is stored once as a blob keyed by its SHA-256 (``storage_blobs``), and
+documents reference blobs through ``document_blobs``. A per-blob reference count decides
+when the underlying file can be removed from storage.
+
+Primary responsibilities:
+- Record a document's reference to a blob, creating the blob row on first use
+- Release a document's reference and report blobs that became unreferenced
+- Remove unreferenced blob rows under a lock so their files can be unlinked safely
+- Resolve the storage key and content hash behind a document
+- Summarize deduplication savings
+
+Key Components:
+- BlobRepository: Reference-counting operations for StorageBlob and DocumentBlob entities
+
+Interactions with other files:
+-----------------------------
+1. cfin/backend/models/database_models.py:
+   - Uses StorageBlob and DocumentBlob
+
+2. cfin/backend/repositories/document_repository.py:
+   - DocumentRepository adds a reference on upload, releases it on delete, and resolves
+     storage keys through this repository
+
+3. cfin/backend/migrate_blob_storage.py:
+   - Folds legacy per-document files into blobs and records their references here
+
+Methods here never commit; callers commit together with the document change they belong to.
+"""
+
+import logging
+from typing import Optional, Dict, Any
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, delete, func
+
+from models.database_models import StorageBlob, DocumentBlob
+from utils.storage import StoredFile
+
+logger = logging.getLogger(__name__)
+
+
+class BlobRepository:
+    """Repository for reference-counted content-addressed blobs."""
+
+    def __init__(self, db: AsyncSession):
+        """Initialize the blob repository."""
+        self.db = db
+
+    async def add_reference(self, document_id: str, stored: StoredFile, mime_type: Optional[str] = None) -> None:
+        """
+        Reference a blob from a document, creating the blob row if this is its first reference.
+
+        The increment is a single UPDATE so concurrent uploads of the same content never lose
+        a count; if two uploads race to create the row, the loser's commit raises
+        IntegrityError and can simply be retried. A tombstoned row (ref_count 0, file
+        possibly already unlinked) is revived by the same UPDATE, so callers must make sure
+        the blob file exists once the reference is committed.
+
+        Args:
+            document_id: ID of the referencing document
+            stored: Handle to the blob in storage
+            mime_type: MIME type of the content
+        """
+        now = datetime.utcnow()
+        result = await self.db.execute(
+            update(StorageBlob)
+            .where(StorageBlob.sha256 == stored.sha256)
+            .values(ref_count=StorageBlob.ref_count + 1, last_referenced_at=now)
+        )
+        if result.rowcount == 0:
+            self.db.add(StorageBlob(
+                sha256=stored.sha256,
+                storage_key=stored.file_id,
+                size=stored.size,
+                mime_type=mime_type,
+                ref_count=1,
+                created_at=now,
+                last_referenced_at=now
+            ))
+        self.db.add(DocumentBlob(document_id=document_id, sha256=stored.sha256, created_at=now))
+        await self.db.flush()
+
+    async def get_blob_for_document(self, document_id: str) -> Optional[StorageBlob]:
+        """Get the blob a document references, or None for documents stored under a legacy key."""
+        result = await self.db.execute(
+            select(StorageBlob)
+            .join(DocumentBlob, DocumentBlob.sha256 == StorageBlob.sha256)
+            .where(DocumentBlob.document_id == document_id)
+        )
+        return result.scalars().first()
+
+    async def release_reference(self, document_id: str) -> Optional[str]:
+        """
+        Drop a document's reference to its blob.
+
+        The blob row is kept as a tombstone when its count reaches zero; remove it with
+        delete_unreferenced after committing.
+
+        Returns:
+            SHA-256 of the blob if it is now unreferenced, otherwise None
+        """
+        result = await self.db.execute(select(DocumentBlob).where(DocumentBlob.document_id == document_id))
+        reference = result.scalars().first()
+        if not reference:
+            return None
+
+        sha256 = reference.sha256
+        await self.db.delete(reference)
+        await self.db.execute(
+            update(StorageBlob)
+            .where(StorageBlob.sha256 == sha256)
+            .values(ref_count=StorageBlob.ref_count - 1)
+        )
+        remaining = await self.db.execute(select(StorageBlob.ref_count).where(StorageBlob.sha256 == sha256))
+        return sha256 if (remaining.scalar() or 0) <= 0 else None
+
+    async def delete_unreferenced(self, sha256: str) -> Optional[str]:
+        """
+        Remove a blob row if nothing references it any more.
+
+        The conditional DELETE write-locks the row (the whole database on SQLite) until the
+        caller commits, so an upload cannot re-reference the blob in between: delete the
+        file before committing. Of several concurrent calls only one removes the row.
+
+        Returns:
+            Storage key of the removed blob, or None if it is referenced again or already gone
+        """
+        blob_result = await self.db.execute(select(StorageBlob.storage_key).where(StorageBlob.sha256 == sha256))
+        storage_key = blob_result.scalar()
+        removed = await self.db.execute(
+            delete(StorageBlob).where(StorageBlob.sha256 == sha256, StorageBlob.ref_count <= 0)
+        )
+        return storage_key if removed.rowcount == 1 else None
+
+    async def blob_stats(self) -> Dict[str, Any]:
+        """Blob counts and the bytes saved by sharing blobs between documents."""
+        result = await self.db.execute(
+            select(
+                func.count(StorageBlob.sha256),
+                func.coalesce(func.sum(StorageBlob.ref_count), 0),
+                func.coalesce(func.sum(StorageBlob.size), 0),
+                func.coalesce(func.sum(StorageBlob.size * StorageBlob.ref_count), 0)
+            ).where(StorageBlob.ref_count > 0)
+        )
+        blobs, references, stored_bytes, referenced_bytes = result.one()
+        return {
+            "blobs": blobs,
+            "references": references,
+            "stored_bytes": stored_bytes,
+            "bytes_saved": referenced_bytes - stored_bytes
+        }
@@ -12,7 +12,8 @@ Primary responsibilities:
 - Add, retrieve, and update messages within conversations.
 - Manage associations between conversations and documents.
 - Link messages to citations and analysis blocks.
-- Provide methods for listing and searching conversations and messages.
+- Provide methods for listing and searching conversations and messages (full-text, ranked,
+  via the index in utils/search_index.py).
 
 Key Components:
 - ConversationRepository: Main class encapsulating all database operations for conversations.
@@ -42,14 +43,22 @@ with database queries or ORM complexities.
 
 import logging
 import uuid
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete, func, and_, or_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import update, delete, func, and_
+from sqlalchemy.orm import selectinload, noload
 
 from models.database_models import Conversation, Message, Document, Citation, MessageCitation, ConversationDocument, AnalysisBlock
+from utils.search_index import (
+    CONVERSATION_SEARCH_POSTGRES,
+    CONVERSATION_SEARCH_SQLITE,
+    MESSAGE_SEARCH_POSTGRES,
+    MESSAGE_SEARCH_SQLITE,
+    build_match_query,
+    highlight,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -282,6 +291,28 @@ class ConversationRepository:
         )
         return result.scalars().first()
         
+    async def update_message_content(self, message_id: str, content: str) -> bool:
+        """
+        Persist only a message's content with a single UPDATE.
+        
+        Lightweight path for streamed partial content: no merge and no re-select of
+        citations and analysis blocks.
+        
+        Args:
+            message_id: ID of the message
+            content: Full content to store
+            
+        Returns:
+            True if the message exists and was updated
+        """
+        result = await self.db.execute(
+            update(Message)
+            .where(Message.id == message_id)
+            .values(content=content, updated_at=datetime.utcnow())
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+    
     async def update_message(self, message: Message) -> Optional[Message]:
         """
         Update a message with new data while preserving existing analysis_blocks.
@@ -356,6 +387,70 @@ class ConversationRepository:
         )
         return result.scalars().all()
     
+    async def get_conversation_history(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[Message], Dict[str, List[Tuple[Citation, Optional[str]]]]]:
+        """
+        Get a page of messages with their analysis blocks, citations and cited document titles.
+        
+        Runs three queries whatever the page size: the messages, their analysis blocks, and
+        their citations joined to the document filename (no other document columns are read).
+        
+        Args:
+            conversation_id: ID of the conversation
+            limit: Maximum number of messages to return
+            offset: Starting index
+            
+        Returns:
+            The messages, oldest first, and a mapping of message ID to (citation, document title)
+            pairs; the title is None when the document no longer exists
+        """
+        result = await self.db.execute(
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .options(
+                noload(Message.citations),
+                selectinload(Message.analysis_blocks)
+            )
+            .order_by(Message.created_at.asc())
+            .limit(limit)
+            .offset(offset)
+        )
+        messages = list(result.scalars().all())
+        citations = await self.get_citations_for_messages([message.id for message in messages])
+        return messages, citations
+    
+    async def get_citations_for_messages(
+        self,
+        message_ids: List[str]
+    ) -> Dict[str, List[Tuple[Citation, Optional[str]]]]:
+        """
+        Get the citations of several messages, with the cited document's filename, in one query.
+        
+        Args:
+            message_ids: IDs of the messages
+            
+        Returns:
+            Mapping of message ID to (citation, document title) pairs ordered by page;
+            messages without citations are absent
+        """
+        if not message_ids:
+            return {}
+        result = await self.db.execute(
+            select(MessageCitation.message_id, Citation, Document.filename)
+            .join(Citation, Citation.id == MessageCitation.citation_id)
+            .outerjoin(Document, Document.id == Citation.document_id)
+            .where(MessageCitation.message_id.in_(message_ids))
+            .order_by(MessageCitation.message_id, Citation.page, Citation.id)
+        )
+        citations: Dict[str, List[Tuple[Citation, Optional[str]]]] = {}
+        for message_id, citation, filename in result.all():
+            citations.setdefault(message_id, []).append((citation, filename))
+        return citations
+    
     async def get_message_citations(self, message_id: str) -> List[Citation]:
         """
         Get citations for a message.
@@ -525,6 +620,9 @@ class ConversationRepository:
         """
         Search conversations by title and content.
         
+        Uses the full-text index (utils/search_index.py): a conversation ranks by its best
+        match, with title matches weighted double.
+        
         Args:
             user_id: ID of the user
             query: Search query
@@ -532,39 +630,59 @@ class ConversationRepository:
             offset: Starting index
             
         Returns:
-            List of matching conversations
+            List of matching conversations, best match first
         """
-        # Search conversations by title
-        conversations_query = (
-            select(Conversation)
-            .where(and_(
-                Conversation.user_id == user_id,
-                Conversation.title.ilike(f"%{query}%")
-            ))
-        )
+        params = self._search_params(user_id, query, limit, offset)
+        if params is None:
+            return []
+        statement = CONVERSATION_SEARCH_POSTGRES if self._is_postgres() else CONVERSATION_SEARCH_SQLITE
+        ranked = (await self.db.execute(statement, params)).all()
+        if not ranked:
+            return []
         
-        # Also get conversations with messages matching the query
-        message_conversations_query = (
-            select(Conversation)
-            .join(Message, Message.conversation_id == Conversation.id)
-            .where(and_(
-                Conversation.user_id == user_id,
-                Message.content.ilike(f"%{query}%")
-            ))
-            .distinct()
-        )
-        
-        # Combine results
-        combined_query = (
-            select(Conversation)
-            .where(or_(
-                Conversation.id.in_(conversations_query.with_only_columns(Conversation.id)),
-                Conversation.id.in_(message_conversations_query.with_only_columns(Conversation.id))
-            ))
-            .order_by(Conversation.updated_at.desc())
-            .limit(limit)
-            .offset(offset)
+        result = await self.db.execute(
+            select(Conversation).where(Conversation.id.in_([row.conversation_id for row in ranked]))
         )
+        conversations = {conversation.id: conversation for conversation in result.scalars().all()}
+        return [conversations[row.conversation_id] for row in ranked if row.conversation_id in conversations]
+    
+    async def search_messages(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the user's messages by content.
         
-        result = await self.db.execute(combined_query)
-        return result.scalars().all()
\ No newline at end of file
+        Args:
+            user_id: ID of the user
+            query: Search query
+            limit: Maximum number of messages to return
+            offset: Starting index
+            
+        Returns:
+            Best matches first, each with message_id, conversation_id, conversation_title,
+            role, created_at, rank (lower is better) and an HTML snippet with the matched
+            terms in <mark> tags
+        """
+        params = self._search_params(user_id, query, limit, offset)
+        if params is None:
+            return []
+        statement = MESSAGE_SEARCH_POSTGRES if self._is_postgres() else MESSAGE_SEARCH_SQLITE
+        result = await self.db.execute(statement, params)
+        return [
+            {**row._asdict(), "snippet": highlight(row.snippet)}
+            for row in result.all()
+        ]
+    
+    def _is_postgres(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+    
+    def _search_params(self, user_id: str, query: str, limit: int, offset: int) -> Optional[Dict[str, Any]]:
+        """Bind parameters for the search statements; None if the query has nothing to match."""
+        match = build_match_query(query)
+        if match is None:
+            return None
+        return {"user_id": user_id, "match": match, "query": query, "limit": limit, "offset": offset}
@@ -0,0 +1,383 @@
+"""
+Document Job Repository Module
+=============================
+
+This module provides the repository layer for the durable document-processing job queue.
+Jobs live in the ``document_jobs`` table so queued and in-flight work survives restarts
+and can be claimed by workers in any process that shares the database.
+
+Primary responsibilities:
+- Enqueue processing jobs for uploaded documents
+- Atomically claim the next runnable job with per-user fairness
+- Record progress, heartbeats, success, and failure with retry backoff
+- Recover jobs abandoned by crashed workers and documents stranded without a job
+
+Key Components:
+- DocumentJobRepository: CRUD and queue operations for DocumentJob entities
+
+Interactions with other files:
+-----------------------------
+1. cfin/backend/models/database_models.py:
+   - Uses DocumentJob, JobStatusEnum, Document, and ProcessingStatusEnum
+
+2. cfin/backend/services/document_job_queue.py:
+   - The DocumentJobQueue worker pool claims and settles jobs through this repository
+
+3. cfin/backend/pdf_processing/document_service.py:
+   - DocumentService.upload_document enqueues a job instead of spawning an untracked task
+"""
+
+import logging
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+
+from models.database_models import DocumentJob, JobStatusEnum, Document, ProcessingStatusEnum
+from utils.storage import StoredFile
+
+logger = logging.getLogger(__name__)
+
+# Oldest runnable jobs considered per claim when choosing the least-served user
+CLAIM_CANDIDATE_LIMIT = 50
+
+
+class DocumentJobRepository:
+    """Repository for document-processing job queue operations."""
+
+    def __init__(self, db: AsyncSession):
+        """Initialize the job repository."""
+        self.db = db
+
+    async def enqueue(
+        self,
+        document_id: str,
+        user_id: str,
+        filename: str,
+        max_attempts: int = 3,
+        stored: Optional[StoredFile] = None
+    ) -> DocumentJob:
+        """
+        Create a queued job for a document.
+
+        A document has at most one queued or running job (enforced by a unique partial
+        index), so enqueueing a document that already has one returns that job instead.
+
+        Args:
+            document_id: ID of the document to process
+            user_id: Owner of the document (used for fairness)
+            filename: Original filename
+            max_attempts: Attempts before the job is marked failed
+            stored: Optional storage handle (key, size, sha256) captured at upload
+
+        Returns:
+            Created (or already active) job record
+        """
+        job = self._new_job(document_id, user_id, filename, max_attempts, stored)
+        if await self._insert_active_job(job):
+            return job
+        active = await self.get_active_job_for_document(document_id)
+        logger.info(f"Document {document_id} already has active job {active.id}; not enqueueing another")
+        return active
+
+    def _new_job(
+        self, document_id: str, user_id: str, filename: str, max_attempts: int, stored: Optional[StoredFile]
+    ) -> DocumentJob:
+        return DocumentJob(
+            document_id=document_id,
+            user_id=user_id,
+            filename=filename,
+            storage_key=stored.file_id if stored else None,
+            file_size=stored.size if stored else None,
+            content_sha256=stored.sha256 if stored else None,
+            status=JobStatusEnum.QUEUED,
+            max_attempts=max_attempts,
+            available_at=datetime.utcnow(),
+            stage="queued",
+            progress=0.0
+        )
+
+    async def _insert_active_job(self, job: DocumentJob) -> bool:
+        """Commit a new job; False if the document already has an active one."""
+        self.db.add(job)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            if await self.get_active_job_for_document(job.document_id) is None:
+                raise
+            return False
+        await self.db.refresh(job)
+        return True
+
+    async def get_job(self, job_id: str) -> Optional[DocumentJob]:
+        """Get a job by ID."""
+        result = await self.db.execute(select(DocumentJob).where(DocumentJob.id == job_id))
+        return result.scalars().first()
+
+    async def get_latest_job_for_document(self, document_id: str) -> Optional[DocumentJob]:
+        """Get the most recently created job for a document."""
+        result = await self.db.execute(
+            select(DocumentJob)
+            .where(DocumentJob.document_id == document_id)
+            .order_by(DocumentJob.created_at.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def get_active_job_for_document(self, document_id: str) -> Optional[DocumentJob]:
+        """Get the queued or running job for a document, if any."""
+        result = await self.db.execute(
+            select(DocumentJob).where(
+                DocumentJob.document_id == document_id,
+                DocumentJob.status.in_([JobStatusEnum.QUEUED, JobStatusEnum.RUNNING])
+            )
+        )
+        return result.scalars().first()
+
+    async def claim_next(self, worker_id: str, max_running_per_user: int) -> Optional[DocumentJob]:
+        """
+        Atomically claim the next runnable job.
+
+        Among the oldest runnable jobs, the one whose user currently has the fewest running
+        jobs wins (ties go to the oldest), so one user's burst of uploads cannot starve
+        everyone else. Users already at ``max_running_per_user`` are skipped. The claim is a
+        conditional UPDATE, so concurrent workers in other processes never run the same job.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+            max_running_per_user: Cap on concurrently running jobs per user (0 = unlimited)
+
+        Returns:
+            The claimed job, or None if nothing is runnable
+        """
+        now = datetime.utcnow()
+        running_result = await self.db.execute(
+            select(DocumentJob.user_id, func.count(DocumentJob.id))
+            .where(DocumentJob.status == JobStatusEnum.RUNNING)
+            .group_by(DocumentJob.user_id)
+        )
+        running_by_user: Dict[str, int] = dict(running_result.all())
+
+        candidates_result = await self.db.execute(
+            select(DocumentJob.id, DocumentJob.user_id)
+            .where(DocumentJob.status == JobStatusEnum.QUEUED, DocumentJob.available_at <= now)
+            .order_by(DocumentJob.available_at, DocumentJob.created_at)
+            .limit(CLAIM_CANDIDATE_LIMIT)
+        )
+        candidates = [
+            (position, job_id, user_id)
+            for position, (job_id, user_id) in enumerate(candidates_result.all())
+            if not max_running_per_user or running_by_user.get(user_id, 0) < max_running_per_user
+        ]
+
+        for _, job_id, _ in sorted(candidates, key=lambda c: (running_by_user.get(c[2], 0), c[0])):
+            claimed = await self.db.execute(
+                update(DocumentJob)
+                .where(DocumentJob.id == job_id, DocumentJob.status == JobStatusEnum.QUEUED)
+                .values(
+                    status=JobStatusEnum.RUNNING,
+                    locked_by=worker_id,
+                    attempts=DocumentJob.attempts + 1,
+                    started_at=now,
+                    heartbeat_at=now,
+                    stage="starting",
+                    progress=0.0
+                )
+            )
+            await self.db.commit()
+            if claimed.rowcount == 1:
+                return await self.get_job(job_id)
+        return None
+
+    async def update_progress(self, job_id: str, worker_id: str, stage: str, progress: float) -> None:
+        """Record progress for a running job (also refreshes its heartbeat)."""
+        await self.db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id, DocumentJob.locked_by == worker_id)
+            .values(stage=stage, progress=progress, heartbeat_at=datetime.utcnow())
+        )
+        await self.db.commit()
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> None:
+        """Refresh the heartbeat of a running job."""
+        await self.db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id, DocumentJob.locked_by == worker_id)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        await self.db.commit()
+
+    async def mark_succeeded(self, job_id: str, worker_id: str) -> bool:
+        """
+        Mark a job as finished successfully.
+
+        Returns:
+            False if the job is no longer held by ``worker_id`` (e.g. it was recovered
+            as stale and claimed by another worker) and was left alone
+        """
+        now = datetime.utcnow()
+        result = await self.db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id, DocumentJob.locked_by == worker_id)
+            .values(status=JobStatusEnum.SUCCEEDED, stage="completed", progress=1.0,
+                    finished_at=now, heartbeat_at=now, locked_by=None, last_error=None)
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+
+    async def mark_failed(
+        self, job: DocumentJob, worker_id: str, error: str, backoff_seconds: float
+    ) -> Optional[bool]:
+        """
+        Record a failed attempt; requeue with exponential backoff while attempts remain.
+
+        Args:
+            job: The job that failed
+            worker_id: Worker that ran the attempt
+            error: Error description
+            backoff_seconds: Base delay; attempt n waits backoff_seconds * 2**(n-1)
+
+        Returns:
+            True if the job will be retried, False if it is now permanently failed, None
+            if the job is no longer held by ``worker_id`` and was left alone
+        """
+        now = datetime.utcnow()
+        retry = job.attempts < job.max_attempts
+        values: Dict[str, Any] = {"last_error": error[:4000], "locked_by": None, "heartbeat_at": now}
+        if retry:
+            delay = backoff_seconds * (2 ** max(job.attempts - 1, 0))
+            values.update(status=JobStatusEnum.QUEUED, stage="retry_scheduled",
+                          available_at=now + timedelta(seconds=delay))
+        else:
+            values.update(status=JobStatusEnum.FAILED, stage="failed", finished_at=now)
+        result = await self.db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job.id, DocumentJob.locked_by == worker_id)
+            .values(**values)
+        )
+        await self.db.commit()
+        if not result.rowcount:
+            return None
+        return retry
+
+    async def release(self, job_id: str, worker_id: str) -> None:
+        """Return an interrupted job to the queue without consuming an attempt (graceful shutdown)."""
+        await self.db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id, DocumentJob.locked_by == worker_id,
+                   DocumentJob.status == JobStatusEnum.RUNNING)
+            .values(status=JobStatusEnum.QUEUED, locked_by=None, stage="requeued",
+                    attempts=DocumentJob.attempts - 1, available_at=datetime.utcnow())
+        )
+        await self.db.commit()
+
+    async def recover_stale_jobs(self, stale_after_seconds: int) -> int:
+        """
+        Requeue running jobs whose worker stopped heartbeating (crash, deploy, OOM).
+
+        A job that was already on its last attempt is marked failed, together with its
+        document, instead of being requeued; otherwise a document that reliably kills its
+        worker would be retried forever.
+
+        Returns:
+            Number of jobs requeued
+        """
+        now = datetime.utcnow()
+        stale = (
+            DocumentJob.status == JobStatusEnum.RUNNING,
+            DocumentJob.heartbeat_at < now - timedelta(seconds=stale_after_seconds)
+        )
+        exhausted_result = await self.db.execute(
+            select(DocumentJob.id, DocumentJob.document_id, DocumentJob.attempts)
+            .where(*stale, DocumentJob.attempts >= DocumentJob.max_attempts)
+        )
+        for job_id, document_id, attempts in exhausted_result.all():
+            error = f"Worker stopped responding during attempt {attempts}"
+            failed = await self.db.execute(
+                update(DocumentJob)
+                .where(DocumentJob.id == job_id, *stale)
+                .values(status=JobStatusEnum.FAILED, stage="failed", finished_at=now, locked_by=None,
+                        last_error=error)
+            )
+            if failed.rowcount == 1:
+                await self.db.execute(
+                    update(Document)
+                    .where(Document.id == document_id)
+                    .values(processing_status=ProcessingStatusEnum.FAILED,
+                            error_message=f"Processing failed after {attempts} attempts: {error}")
+                )
+                logger.warning(f"Document job {job_id} failed permanently: {error}")
+
+        result = await self.db.execute(
+            update(DocumentJob)
+            .where(*stale, DocumentJob.attempts < DocumentJob.max_attempts)
+            .values(status=JobStatusEnum.QUEUED, locked_by=None, stage="recovered", available_at=now)
+        )
+        await self.db.commit()
+        return result.rowcount or 0
+
+    async def enqueue_stranded_documents(self, max_attempts: int = 3) -> List[DocumentJob]:
+        """
+        Enqueue documents left PENDING/PROCESSING without any unfinished job.
+
+        Covers documents uploaded before the queue existed and uploads whose job insert
+        never happened. Safe to run from several processes at once: a document another
+        process enqueued meanwhile keeps its single active job.
+
+        Returns:
+            Jobs created
+        """
+        active_jobs = (
+            select(DocumentJob.document_id)
+            .where(DocumentJob.status.in_([JobStatusEnum.QUEUED, JobStatusEnum.RUNNING]))
+        )
+        result = await self.db.execute(
+            select(Document.id, Document.user_id, Document.filename)
+            .where(
+                Document.processing_status.in_([ProcessingStatusEnum.PENDING, ProcessingStatusEnum.PROCESSING]),
+                Document.id.not_in(active_jobs)
+            )
+        )
+        jobs = []
+        for document_id, user_id, filename in result.all():
+            job = self._new_job(document_id, user_id or "default-user", filename, max_attempts, None)
+            if await self._insert_active_job(job):
+                # Detach so a later conflict's rollback doesn't expire the jobs already created
+                self.db.expunge(job)
+                jobs.append(job)
+        return jobs
+
+    async def queue_stats(self) -> Dict[str, Any]:
+        """Job counts by status plus the number of users with queued work."""
+        result = await self.db.execute(
+            select(DocumentJob.status, func.count(DocumentJob.id)).group_by(DocumentJob.status)
+        )
+        counts = {status.value: count for status, count in result.all()}
+        users_result = await self.db.execute(
+            select(func.count(func.distinct(DocumentJob.user_id))).where(DocumentJob.status == JobStatusEnum.QUEUED)
+        )
+        return {
+            "jobs_by_status": {status.value: counts.get(status.value, 0) for status in JobStatusEnum},
+            "users_waiting": users_result.scalar() or 0
+        }
+
+    def job_to_status(self, job: DocumentJob) -> Dict[str, Any]:
+        """Convert a job to its API status payload."""
+        return {
+            "job_id": job.id,
+            "document_id": job.document_id,
+            "status": job.status.value if job.status else None,
+            "stage": job.stage,
+            "progress": job.progress,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "last_error": job.last_error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "next_attempt_at": job.available_at.isoformat()
+            if job.status == JobStatusEnum.QUEUED and job.available_at else None
+        }
@@ -32,6 +32,8 @@ Interactions with other files:
    - Uses StorageService for file storage and retrieval operations
    - Methods used: save_file, get_file
    - Handles the actual storage of PDF binary content
+   - In content-addressed mode uploads are staged with stage_blob, referenced, then promoted
+     with promote_blob, and are deduplicated by SHA-256
 
 4. cfin/backend/pdf_processing/document_service.py:
    - DocumentService initializes this repository and uses it for all document operations
@@ -49,6 +51,11 @@ Interactions with other files:
    - ClaudeService indirectly uses this repository via _prepare_document_for_citation
    - If document binary isn't provided directly, fetches it via get_document_file_content
 
+8. cfin/backend/repositories/blob_repository.py:
+   - BlobRepository tracks which blob each document references and the blob reference counts
+   - get_storage_key resolves a document to its blob key, falling back to the legacy
+     ``<document_id>.pdf`` key for documents stored before blobs existed
+
 This repository acts as the central point for all document data access in the application,
 ensuring consistent document handling across all services. It manages both the structured
 data in the database and the binary content in the storage system.
@@ -56,16 +63,18 @@ data in the database and the binary content in the storage system.
 
 import logging
 import uuid
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import update, delete, func
+from sqlalchemy.exc import IntegrityError
 import os
 
 from models.database_models import Document, Citation, DocumentType, ProcessingStatusEnum
 from models.document import ProcessedDocument, DocumentMetadata, DocumentUploadResponse, Citation as CitationSchema
-from utils.storage import StorageService
+from utils.storage import StorageService, StoredFile, iter_bytes
+from repositories.blob_repository import BlobRepository
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +91,7 @@ class DocumentRepository:
         """
         self.db = db
         self.storage_service = storage_service or StorageService.get_storage_service()
+        self.blob_repository = BlobRepository(db)
     
     async def create_document(self, file_data: bytes, filename: str, user_id: str, mime_type: str) -> Document:
         """
@@ -96,34 +106,89 @@ class DocumentRepository:
         Returns:
             Created document record
         """
+        document, _ = await self.create_document_from_stream(iter_bytes(file_data), filename, user_id, mime_type)
+        return document
+    
+    async def create_document_from_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        user_id: str,
+        mime_type: str,
+        max_size_bytes: Optional[int] = None
+    ) -> Tuple[Document, StoredFile]:
+        """
+        Create a new document record, streaming its content to storage.
+        
+        Args:
+            chunks: Async iterator over the file content
+            filename: Name of the file
+            user_id: ID of the user uploading the document
+            mime_type: MIME type of the file
+            max_size_bytes: Optional limit; storage raises FileTooLargeError when crossed
+            
+        Returns:
+            Created document record and a handle to the stored file
+        """
         # Generate a unique ID for the document
         document_id = str(uuid.uuid4())
         
-        # Store the file
-        file_path = await self.storage_service.save_file(
-            file_data=file_data,
-            file_id=f"{document_id}.pdf",
-            content_type=mime_type
-        )
-        
-        # Create document record
-        document = Document(
-            id=document_id,
-            filename=filename,
-            file_path=file_path,
-            file_size=len(file_data),
-            mime_type=mime_type,
-            user_id=user_id,
-            upload_timestamp=datetime.utcnow(),
-            processing_status=ProcessingStatusEnum.PENDING
-        )
+        # Store the file, hashing it on the way. Blobs are only staged here and promoted once
+        # the reference is committed, so a concurrent delete can't unlink a blob we rely on
+        content_addressed = self.storage_service.content_addressed
+        if content_addressed:
+            staged = await self.storage_service.stage_blob(
+                chunks, content_type=mime_type, max_size_bytes=max_size_bytes
+            )
+            stored = self.storage_service.blob_for(staged)
+        else:
+            staged = stored = await self.storage_service.save_stream(
+                chunks,
+                file_id=f"{document_id}.pdf",
+                content_type=mime_type,
+                max_size_bytes=max_size_bytes
+            )
         
-        # Save to database
-        self.db.add(document)
-        await self.db.commit()
+        try:
+            # The first upload of new content races other uploads of the same bytes to create
+            # the blob row; the loser rolls back and retries as a plain reference increment
+            for attempt in range(2):
+                # Create document record
+                document = Document(
+                    id=document_id,
+                    filename=filename,
+                    file_path=stored.path,
+                    file_size=stored.size,
+                    mime_type=mime_type,
+                    user_id=user_id,
+                    upload_timestamp=datetime.utcnow(),
+                    processing_status=ProcessingStatusEnum.PENDING
+                )
+                
+                # Save to database
+                self.db.add(document)
+                try:
+                    if content_addressed:
+                        await self.blob_repository.add_reference(document_id, stored, mime_type)
+                    await self.db.commit()
+                    break
+                except IntegrityError:
+                    await self.db.rollback()
+                    if attempt:
+                        raise
+        except BaseException:
+            # Nothing references the file we wrote; don't leave it behind
+            await self.db.rollback()
+            await self.storage_service.delete_file(staged.file_id)
+            raise
+        
+        if content_addressed:
+            # Checked only now: a delete that unlinked the blob before our reference landed
+            # leaves the (revived or recreated) row without a file, which our staged copy restores
+            stored, _ = await self.storage_service.promote_blob(staged)
         await self.db.refresh(document)
         
-        return document
+        return document, stored
     
     async def get_document(self, document_id: str) -> Optional[Document]:
         """
@@ -170,7 +235,7 @@ class DocumentRepository:
             
         try:
             # Get the file path
-            file_path = f"{document_id}.pdf"
+            file_path = await self.get_storage_key(document_id)
             logger.info(f"Retrieving document content using file path: {file_path}")
             
             # Get the raw PDF content from storage
@@ -442,9 +507,9 @@ class DocumentRepository:
         if not document:
             return False
         
-        # Delete the file
-        file_id = f"{document_id}.pdf"
-        await self.storage_service.delete_file(file_id)
+        # Drop the blob reference; the file goes only with the last reference
+        blob = await self.blob_repository.get_blob_for_document(document_id)
+        unreferenced = await self.blob_repository.release_reference(document_id) if blob else None
         
         # Delete from database
         await self.db.execute(
@@ -452,6 +517,16 @@ class DocumentRepository:
         )
         await self.db.commit()
         
+        # Delete the file
+        if unreferenced:
+            # Unlink inside the transaction that removes the row, while it holds the lock
+            orphaned_key = await self.blob_repository.delete_unreferenced(unreferenced)
+            if orphaned_key:
+                await self.storage_service.delete_file(orphaned_key)
+            await self.db.commit()
+        elif not blob:
+            await self.storage_service.delete_file(f"{document_id}.pdf")
+        
         return True
     
     async def add_citation(
@@ -618,7 +693,21 @@ class DocumentRepository:
             analysisId=str(citation.analysis_id) if citation.analysis_id else None,
         )
         
-    def get_document_file_path(self, document_id: str) -> str:
+    async def get_storage_key(self, document_id: str) -> str:
+        """
+        Get the storage key of a document's file.
+        
+        Args:
+            document_id: ID of the document
+            
+        Returns:
+            The content-addressed blob key, or the legacy ``<document_id>.pdf`` key for
+            documents stored before blobs were introduced
+        """
+        blob = await self.blob_repository.get_blob_for_document(document_id)
+        return blob.storage_key if blob else f"{document_id}.pdf"
+    
+    async def get_document_file_path(self, document_id: str) -> str:
         """
         Get the physical file path for a document.
         
@@ -628,9 +717,7 @@ class DocumentRepository:
         Returns:
             Absolute path to the document file
         """
-        # The storage service uses the document ID with a .pdf extension as the file ID
-        file_id = f"{document_id}.pdf"
-        return self.storage_service.get_file_path(file_id)
+        return self.storage_service.get_file_path(await self.get_storage_key(document_id))
     
     async def get_document_binary(self, document_id: str) -> Optional[bytes]:
         """
@@ -653,7 +740,7 @@ class DocumentRepository:
                 return document.binary_data
             
             # If we don't have binary data in the DB, try to read from file
-            file_path = self.get_document_file_path(document_id)
+            file_path = await self.get_document_file_path(document_id)
             if os.path.exists(file_path):
                 with open(file_path, 'rb') as f:
                     return f.read()
@@ -60,6 +60,7 @@ from utils.visualization_helpers import (
 
 from .analysis_strategies import strategy_map # Added for Story #1
 from utils.exceptions import ToolSchemaValidationError # Corrected import
+from utils.serialization import to_jsonable
 
 logger = logging.getLogger(__name__)
 
@@ -74,25 +75,11 @@ logger = logging.getLogger(__name__)
 def ensure_json_serializable(obj: Any) -> Any:
     """
     Recursively convert an object to ensure it's JSON serializable.
-    Converts Pydantic models to dicts and handles other non-serializable types.
+    Converts Pydantic models to dicts (by alias), datetimes to ISO strings and any other
+    non-serializable value to a string. The tree is walked by the native encoder in
+    utils.serialization rather than in Python.
     """
-    if hasattr(obj, 'model_dump'):
-        # It's a Pydantic model
-        return obj.model_dump(by_alias=True)
-    elif hasattr(obj, 'dict'):
-        # Older Pydantic models
-        return obj.dict(by_alias=True)
-    elif isinstance(obj, dict):
-        return {k: ensure_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [ensure_json_serializable(item) for item in obj]
-    elif isinstance(obj, (str, int, float, bool, type(None))):
-        return obj
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    else:
-        # For any other type, convert to string
-        return str(obj)
+    return to_jsonable(obj)
 
 class AnalysisService:
     """Service for managing financial analysis."""
@@ -242,7 +229,8 @@ class AnalysisService:
                 # Get PDF content for Claude's native PDF support
                 try:
                     # Get the PDF binary content from storage
-                    pdf_content = await self.document_repository.storage_service.get_file(f"{doc.id}.pdf")
+                    storage_key = await self.document_repository.get_storage_key(doc.id)
+                    pdf_content = await self.document_repository.storage_service.get_file(storage_key)
                     if pdf_content:
                         # Convert to base64 for Claude API
                         pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
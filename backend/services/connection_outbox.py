@@ -0,0 +1,212 @@
+"""
+WebSocket Connection Outbox
+===========================
+
+Per-connection outbound queue that decouples the streaming pipeline from the client's
+network speed. `ConnectionManager.send_message` only enqueues; a sender task per
+connection drains the queue, so a slow browser tab no longer stalls the Claude stream
+consumer that produced the events.
+
+Coalescing:
+-----------
+After the first frame of a burst arrives the sender waits WS_COALESCE_WINDOW_MS and
+then drains everything queued. Within a drain:
+- a ``content_update`` (other than post-tool text) superseded by a later one for the
+  same message is dropped
+- adjacent ``text_delta`` frames of the same message merge into one frame. Texts are
+  concatenated; ``accumulated_text`` (protocol 1) is the latest; ``seq`` (protocol 2)
+  is the last merged seq and ``seq_start`` the first. Seqs of dropped content_updates
+  fall inside that range.
+
+Backpressure:
+-------------
+The queue is bounded by WS_OUTBOUND_MAX_FRAMES. When it fills, the queued frames are
+compacted as above first. If the queue is still full the slow-consumer policy applies:
+- "disconnect" closes the connection. The stream itself keeps running.
+- "block" makes the producer wait until the sender catches up.
+
+Integration Points:
+-------------------
+- `app/routes/websocket.py`: ConnectionManager owns one outbox per client_id
+- `utils/metrics.py`: queue depth, frames sent/coalesced, slow-consumer actions
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import settings
+from utils.metrics import record_ws_drain, record_ws_slow_consumer
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_DISCONNECT = "disconnect"
+SLOW_CONSUMER_BLOCK = "block"
+
+
+def coalesce_frames(frames: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge adjacent text deltas and drop superseded content updates, preserving order."""
+    superseded = set()
+    latest_update: Dict[Any, int] = {}
+    for index in range(len(frames) - 1, -1, -1):
+        frame = frames[index]
+        if frame.get("type") == "content_update" and not frame.get("is_post_tools"):
+            key = frame.get("message_id")
+            if key in latest_update:
+                superseded.add(index)
+            else:
+                latest_update[key] = index
+
+    merged: List[Dict[str, Any]] = []
+    owned = False  # merged[-1] is a copy that may be extended in place
+    for index, frame in enumerate(frames):
+        if index in superseded:
+            continue
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and frame.get("type") == "text_delta"
+            and previous.get("type") == "text_delta"
+            and frame.get("message_id") == previous.get("message_id")
+        ):
+            if not owned:
+                previous = dict(previous)
+                if "seq" in previous:
+                    previous.setdefault("seq_start", previous["seq"])
+                merged[-1] = previous
+                owned = True
+            previous["text"] = previous.get("text", "") + frame.get("text", "")
+            if "accumulated_text" in frame:
+                previous["accumulated_text"] = frame["accumulated_text"]
+            if "seq" in frame:
+                previous["seq"] = frame["seq"]
+            continue
+        merged.append(frame)
+        owned = False
+    return merged
+
+
+class ConnectionOutbox:
+    """Bounded outbound queue with a coalescing sender task for one WebSocket."""
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], Awaitable[Any]],
+        on_close: Optional[Callable[[str], Awaitable[Any]]] = None,
+        coalesce_window_seconds: float = settings.WS_COALESCE_WINDOW_MS / 1000,
+        max_frames: int = settings.WS_OUTBOUND_MAX_FRAMES,
+        slow_consumer_policy: str = settings.WS_SLOW_CONSUMER_POLICY
+    ):
+        """
+        Args:
+            send: Coroutine writing one frame to the socket
+            on_close: Called once with the reason ("send_failed", "slow_consumer") when the
+                outbox shuts itself down
+            coalesce_window_seconds: How long the sender waits after the first frame of a burst
+            max_frames: Queue depth that marks the client as a slow consumer
+            slow_consumer_policy: "disconnect" or "block"
+        """
+        self._send = send
+        self._on_close = on_close
+        self.coalesce_window_seconds = coalesce_window_seconds
+        self.max_frames = max_frames
+        self.slow_consumer_policy = slow_consumer_policy
+        self._frames: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.frames_sent = 0
+        self.frames_enqueued = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    async def put(self, frame: Dict[str, Any]) -> bool:
+        """
+        Queue a frame for sending.
+
+        Returns:
+            False if the outbox is closed (or was closed by the slow-consumer policy)
+        """
+        if self.closed:
+            return False
+        if len(self._frames) >= self.max_frames:
+            self._compact()
+        while len(self._frames) >= self.max_frames:
+            if self.slow_consumer_policy == SLOW_CONSUMER_BLOCK:
+                record_ws_slow_consumer(SLOW_CONSUMER_BLOCK)
+                self._drained.clear()
+                await self._drained.wait()
+                if self.closed:
+                    return False
+            else:
+                record_ws_slow_consumer(SLOW_CONSUMER_DISCONNECT)
+                logger.warning(f"Outbound queue full ({len(self._frames)} frames); disconnecting slow consumer")
+                await self._shutdown("slow_consumer")
+                return False
+        self._frames.append(frame)
+        self.frames_enqueued += 1
+        self._ready.set()
+        return True
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        """Wait until every queued frame has been handed to the socket."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._wait_empty(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox flush timed out with {len(self._frames)} frames queued")
+
+    def close(self) -> None:
+        """Stop the sender task and discard queued frames."""
+        self.closed = True
+        self._frames.clear()
+        self._drained.set()
+        task, self._task = self._task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _wait_empty(self) -> None:
+        while not self.closed and (self._frames or self._ready.is_set()):
+            await asyncio.sleep(self.coalesce_window_seconds or 0.001)
+
+    def _compact(self) -> None:
+        compacted = coalesce_frames(list(self._frames))
+        self._frames = deque(compacted)
+
+    async def _shutdown(self, reason: str) -> None:
+        if self.closed:
+            return
+        self.close()
+        if self._on_close is not None:
+            await self._on_close(reason)
+
+    async def _run(self) -> None:
+        while not self.closed:
+            await self._ready.wait()
+            if self.coalesce_window_seconds > 0:
+                await asyncio.sleep(self.coalesce_window_seconds)
+            batch = list(self._frames)
+            self._frames.clear()
+            self._drained.set()
+            frames = coalesce_frames(batch)
+            try:
+                for frame in frames:
+                    await self._send(frame)
+            except Exception as e:
+                logger.error(f"Error sending queued frame: {e}")
+                self._ready.clear()
+                await self._shutdown("send_failed")
+                return
+            self.frames_sent += len(frames)
+            record_ws_drain(len(batch), len(frames))
+            if not self._frames:
+                self._ready.clear()
@@ -66,6 +66,7 @@ from repositories.document_repository import DocumentRepository
 from repositories.analysis_repository import AnalysisRepository
 from pdf_processing.api_service import ClaudeService
 from models.database_models import Message, Conversation
+from services.message_persister import MessageContentPersister
 
 logger = logging.getLogger(__name__)
 
@@ -886,6 +887,10 @@ class ConversationService:
         # A new flag to indicate tool_start has been processed by this callback
         # This is specific to the current streaming interaction via this callback instance.
         tool_start_processed_in_current_stream = False
+        # Streamed content is written behind: coalesced into a few writes, flushed at tool_start and completion
+        content_persister = MessageContentPersister(
+            lambda text: self.conversation_repository.update_message_content(assistant_message_placeholder.id, text)
+        )
         
         async def enhanced_emit_callback(event: Dict[str, Any]):
             nonlocal has_good_content, last_good_content, tool_start_processed_in_current_stream
@@ -894,6 +899,7 @@ class ConversationService:
 
             if event_type == "tool_start":
                 tool_start_processed_in_current_stream = True # Mark that tool_start passed through here
+                await content_persister.flush("tool_start")
                 if assistant_message_placeholder.content and len(assistant_message_placeholder.content) > 100:
                     has_good_content = True
                     last_good_content = assistant_message_placeholder.content
@@ -937,8 +943,8 @@ class ConversationService:
                     return
 
                 assistant_message_placeholder.content = new_content
-                await self.conversation_repository.update_message(assistant_message_placeholder)
-                logger.info(f"📝 DB Content updated: {len(new_content)} chars")
+                if await content_persister.submit(new_content):
+                    logger.info(f"📝 DB Content updated: {len(new_content)} chars")
                 
                 if new_content.count('\n') > 2 and len(new_content) > 500: 
                     if not tool_start_processed_in_current_stream: 
@@ -1060,13 +1066,34 @@ class ConversationService:
                 combined_doc_text += f"\n\n{doc['raw_text']}"
         
         # Use Claude's streaming with tools - let Claude decide whether to use visualization tools
-        result = await self.claude_service.analyze_with_visualization_tools_streaming(
-            document_text=combined_doc_text,
-            user_query=content,
-            file_id=file_id,
-            emit_callback=enhanced_emit_callback,
-            message_id=message_id
-        )
+        try:
+            result = await self.claude_service.analyze_with_visualization_tools_streaming(
+                document_text=combined_doc_text,
+                user_query=content,
+                file_id=file_id,
+                emit_callback=enhanced_emit_callback,
+                message_id=message_id
+            )
+        except asyncio.CancelledError:
+            # Client cancelled or went away: keep the partial answer instead of the placeholder
+            try:
+                await content_persister.flush("cancelled")
+                if assistant_message_placeholder.content == "Processing your request...":
+                    assistant_message_placeholder.content = "Response cancelled."
+                    await self.conversation_repository.update_message_content(
+                        assistant_message_placeholder.id, assistant_message_placeholder.content
+                    )
+            except Exception as persist_error:
+                logger.error(f"Failed to persist cancelled message {assistant_message_placeholder.id}: {persist_error}")
+            logger.info(f"Streaming cancelled for message {assistant_message_placeholder.id}; kept {len(assistant_message_placeholder.content)} chars")
+            raise
+        finally:
+            # Whatever streamed so far is persisted before completion (or failure) is reported
+            try:
+                await content_persister.flush("complete")
+            except Exception as flush_error:
+                logger.error(f"Failed to persist streamed content for message {assistant_message_placeholder.id}: {flush_error}")
+            logger.info(f"Streamed content persistence for message {assistant_message_placeholder.id}: {content_persister.stats()}")
         
         # Extract results
         analysis_text = result.get("analysis_text", "")
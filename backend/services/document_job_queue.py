@@ -0,0 +1,240 @@
+"""
+Document Job Queue Module
+========================
+
+Durable, bounded worker pool for document ingestion. Uploads enqueue a row in the
+``document_jobs`` table (see DocumentJobRepository); a fixed number of workers per
+process claim jobs from the database, so concurrent Claude pipelines are capped no
+matter how many uploads arrive, queued work survives restarts and deploys, and workers
+in several processes can share one queue.
+
+Key Responsibilities:
+---------------------
+- Run ``DOCUMENT_JOB_WORKERS`` workers that claim jobs with per-user fairness
+- Retry failed jobs with exponential backoff up to ``DOCUMENT_JOB_MAX_ATTEMPTS``
+- Heartbeat running jobs and requeue jobs whose worker died
+- Enqueue documents stranded in PENDING/PROCESSING at startup and periodically after
+- Record per-job stage/progress for the status API
+
+Integration Points:
+-------------------
+- `DocumentService.upload_document`: enqueues jobs and calls `notify()`
+- `DocumentService.process_document`: the per-job processing pipeline
+- `app/main.py`: starts the pool on startup and stops it on shutdown
+- `app/routes/document.py`: exposes job status and queue statistics
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, Any, List, Optional, Callable
+
+import settings
+from models.database_models import DocumentJob, ProcessingStatusEnum
+from repositories.document_job_repository import DocumentJobRepository
+from repositories.document_repository import DocumentRepository
+from utils.database import SessionLocal
+from utils.storage import StorageService, StoredFile
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentJobQueue:
+    """Process-local worker pool consuming the database-backed document job queue."""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        workers: int = settings.DOCUMENT_JOB_WORKERS,
+        max_running_per_user: int = settings.DOCUMENT_JOB_MAX_RUNNING_PER_USER,
+        retry_backoff_seconds: float = settings.DOCUMENT_JOB_RETRY_BACKOFF_SECONDS,
+        stale_after_seconds: int = settings.DOCUMENT_JOB_STALE_SECONDS,
+        poll_interval: float = 2.0,
+        heartbeat_interval: float = 15.0
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = min(heartbeat_interval, stale_after_seconds / 3)
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._active_jobs: Dict[str, str] = {}  # worker_id -> job_id
+        self._claude_service = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Recover abandoned work and start the worker pool."""
+        if self._tasks:
+            return
+        await self.recover()
+        if self.workers <= 0:
+            logger.info("Document job queue running in enqueue-only mode (DOCUMENT_JOB_WORKERS=0)")
+            return
+        for n in range(self.workers):
+            worker_id = f"{self.worker_prefix}:w{n}"
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_id), name=f"document-job-{worker_id}"))
+        self._tasks.append(asyncio.create_task(self._maintenance_loop(), name="document-job-maintenance"))
+        logger.info(f"Document job queue started with {self.workers} workers ({self.worker_prefix})")
+
+    async def stop(self) -> None:
+        """Stop workers; in-flight jobs are returned to the queue without consuming an attempt."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Document job queue stopped")
+
+    def notify(self) -> None:
+        """Wake idle workers (called after an enqueue in this process)."""
+        self._wakeup.set()
+
+    async def recover(self) -> Dict[str, int]:
+        """Requeue jobs from dead workers and enqueue documents stranded without a job."""
+        async with self.session_factory() as session:
+            repository = DocumentJobRepository(session)
+            requeued = await repository.recover_stale_jobs(self.stale_after_seconds)
+            stranded = await repository.enqueue_stranded_documents(settings.DOCUMENT_JOB_MAX_ATTEMPTS)
+        if requeued or stranded:
+            logger.warning(f"Document job recovery: requeued {requeued} stale jobs, enqueued {len(stranded)} stranded documents")
+            self.notify()
+        return {"requeued": requeued, "stranded": len(stranded)}
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue statistics for the status API."""
+        async with self.session_factory() as session:
+            queue_stats = await DocumentJobRepository(session).queue_stats()
+        return {
+            **queue_stats,
+            "local_workers": self.workers if self.running else 0,
+            "local_active_jobs": len(self._active_jobs),
+            "max_running_per_user": self.max_running_per_user
+        }
+
+    async def _worker_loop(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await self._claim(worker_id)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run_job(job, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Document job worker {worker_id} error: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.stale_after_seconds / 2, 1))
+            try:
+                # Also picks up uploads whose job insert failed after the document was saved
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Document job maintenance error: {e}", exc_info=True)
+
+    async def _claim(self, worker_id: str) -> Optional[DocumentJob]:
+        async with self.session_factory() as session:
+            return await DocumentJobRepository(session).claim_next(worker_id, self.max_running_per_user)
+
+    async def _heartbeat_loop(self, job_id: str, worker_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_factory() as session:
+                    await DocumentJobRepository(session).heartbeat(job_id, worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for document job {job_id}: {e}")
+
+    async def _run_job(self, job: DocumentJob, worker_id: str) -> None:
+        logger.info(f"Worker {worker_id} running job {job.id} for document {job.document_id} (attempt {job.attempts}/{job.max_attempts})")
+        self._active_jobs[worker_id] = job.id
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job.id, worker_id))
+        try:
+            async with self.session_factory() as session:
+                job_repository = DocumentJobRepository(session)
+
+                async def progress(stage: str, fraction: float) -> None:
+                    await job_repository.update_progress(job.id, worker_id, stage, fraction)
+
+                try:
+                    await self._process_job(job, session, progress)
+                except asyncio.CancelledError:
+                    await job_repository.release(job.id, worker_id)
+                    raise
+                except Exception as e:
+                    await self._handle_failure(job, worker_id, session, e)
+                else:
+                    if await job_repository.mark_succeeded(job.id, worker_id):
+                        logger.info(f"Document job {job.id} succeeded")
+                    else:
+                        logger.warning(f"Document job {job.id} finished after worker {worker_id} lost it")
+        finally:
+            heartbeat.cancel()
+            self._active_jobs.pop(worker_id, None)
+
+    async def _process_job(self, job: DocumentJob, session, progress) -> None:
+        """Run the document pipeline for one job; raises on failure."""
+        from pdf_processing.document_service import DocumentService
+
+        storage_service = StorageService.get_storage_service()
+        document_repository = DocumentRepository(session, storage_service)
+        storage_key = job.storage_key or await document_repository.get_storage_key(job.document_id)
+        if job.content_sha256 and job.file_size is not None:
+            pdf_source = StoredFile(storage_key, storage_service.get_file_path(storage_key),
+                                    job.file_size, job.content_sha256, storage_service)
+        else:
+            # Jobs recovered for documents uploaded before handles were recorded
+            pdf_source = await storage_service.describe_file(storage_key)
+        if not pdf_source:
+            raise ValueError(f"PDF content not found for document {job.document_id}")
+        if self._claude_service is None:
+            from pdf_processing.api_service import ClaudeService
+            self._claude_service = ClaudeService()
+        document_service = DocumentService(document_repository, claude_service=self._claude_service)
+        await document_service.process_document(job.document_id, pdf_source, job.filename, progress_callback=progress)
+
+    async def _handle_failure(self, job: DocumentJob, worker_id: str, session, error: Exception) -> None:
+        logger.error(f"Document job {job.id} attempt {job.attempts} failed: {error}", exc_info=True)
+        await session.rollback()
+        will_retry = await DocumentJobRepository(session).mark_failed(
+            job, worker_id, str(error), self.retry_backoff_seconds
+        )
+        if will_retry is None:
+            # Recovered as stale meanwhile: the document's status belongs to its new run
+            logger.warning(f"Document job {job.id} failed after worker {worker_id} lost it")
+            return
+        document_repository = DocumentRepository(session, StorageService.get_storage_service())
+        if will_retry:
+            await document_repository.update_document_status(
+                job.document_id, ProcessingStatusEnum.PENDING,
+                error_message=f"Attempt {job.attempts} of {job.max_attempts} failed, retry scheduled: {error}"
+            )
+        else:
+            await document_repository.update_document_status(
+                job.document_id, ProcessingStatusEnum.FAILED,
+                error_message=f"Processing failed after {job.attempts} attempts: {error}"
+            )
+
+
+_document_job_queue: Optional[DocumentJobQueue] = None
+
+
+def get_document_job_queue() -> DocumentJobQueue:
+    """Get the process-wide document job queue."""
+    global _document_job_queue
+    if _document_job_queue is None:
+        _document_job_queue = DocumentJobQueue()
+    return _document_job_queue
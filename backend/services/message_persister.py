@@ -0,0 +1,111 @@
+"""
+Streamed Message Persistence
+===========================
+
+Write-behind buffer for assistant content that arrives as a stream. The streaming
+pipeline emits a ``content_update`` roughly every 50 characters; writing each one is a
+commit per event, which for a long answer means ~100 write transactions that also
+serialize SQLite writers across concurrent streams. MessageContentPersister keeps only
+the latest accumulated text and writes it when enough new bytes or enough time has
+accumulated, and always when the caller flushes at a boundary (tool start, completion).
+
+Flushes ride on incoming events rather than a background timer, so the request's
+database session is never used from two tasks at once.
+
+Integration Points:
+-------------------
+- `ConversationService.process_user_message_streaming`: submits every accepted
+  content_update and flushes at tool_start and before message_complete
+- `ConversationRepository.update_message_content`: the lightweight write used per flush
+- `utils/metrics.py`: flush counts and write lag
+"""
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+import settings
+from utils.metrics import record_stream_flush
+
+logger = logging.getLogger(__name__)
+
+
+class MessageContentPersister:
+    """Debounced writer for the accumulated content of one streaming message."""
+
+    def __init__(
+        self,
+        save: Callable[[str], Awaitable[Any]],
+        min_interval_seconds: float = settings.STREAM_PERSIST_INTERVAL_SECONDS,
+        min_bytes: int = settings.STREAM_PERSIST_MIN_BYTES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            save: Coroutine function persisting the full accumulated content
+            min_interval_seconds: Flush once pending content is at least this old
+            min_bytes: Flush once this many bytes were added since the last write
+            clock: Monotonic clock (injectable for tests)
+        """
+        self._save = save
+        self.min_interval_seconds = min_interval_seconds
+        self.min_bytes = min_bytes
+        self._clock = clock
+        self._pending: Optional[str] = None
+        self._pending_since: Optional[float] = None
+        self._last_flushed_length = 0
+        self.submitted = 0
+        self.flushes = 0
+        self.max_lag_seconds = 0.0
+
+    @property
+    def has_pending(self) -> bool:
+        return self._pending is not None
+
+    async def submit(self, content: str) -> bool:
+        """
+        Record the latest accumulated content, writing it if a threshold is reached.
+
+        Returns:
+            True if this call flushed to the database
+        """
+        now = self._clock()
+        self.submitted += 1
+        self._pending = content
+        if self._pending_since is None:
+            self._pending_since = now
+        if len(content.encode("utf-8")) - self._last_flushed_length >= self.min_bytes:
+            return await self.flush("bytes")
+        if now - self._pending_since >= self.min_interval_seconds:
+            return await self.flush("interval")
+        return False
+
+    async def flush(self, reason: str = "explicit") -> bool:
+        """
+        Write pending content now.
+
+        Returns:
+            True if content was written, False if nothing was pending
+        """
+        if self._pending is None:
+            return False
+        content, pending_since = self._pending, self._pending_since
+        self._pending = None
+        self._pending_since = None
+        await self._save(content)
+        now = self._clock()
+        lag = now - pending_since
+        self._last_flushed_length = len(content.encode("utf-8"))
+        self.flushes += 1
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        record_stream_flush(reason, lag)
+        logger.debug("Flushed streamed content (%d chars, reason=%s, lag=%.3fs)", len(content), reason, lag)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Write-behind statistics for this message."""
+        return {
+            "submitted": self.submitted,
+            "flushes": self.flushes,
+            "coalesced": self.submitted - self.flushes,
+            "max_lag_seconds": round(self.max_lag_seconds, 3)
+        }
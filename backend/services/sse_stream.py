@@ -0,0 +1,165 @@
+"""
+Server-Sent Events Stream
+=========================
+
+Outbound side of an SSE response, fed by the same pipeline as WebSocket streams:
+`app/routes/websocket.py` runs the stream (StreamingSession: encoder, replay buffer,
+resume and cancel handling) and delivers frames through `ConnectionManager`, where an
+SSEStream is registered under its own client_id in place of a ConnectionOutbox.
+
+Output:
+-------
+- Each frame is one ``data:`` line. Sequenced frames (protocol 2) carry
+  ``id: <message_id>:<seq>`` so a reconnecting client can send it back as
+  ``Last-Event-ID`` and have the missed frames replayed.
+- Frames are batched: after the first frame of a burst the stream waits
+  SSE_FLUSH_INTERVAL_MS, coalesces the queued frames (`coalesce_frames`) and yields
+  them as one chunk, i.e. one write and flush per batch.
+- A ``: keep-alive`` comment is sent after SSE_HEARTBEAT_SECONDS without output, so
+  proxies do not drop the connection during long tool turns.
+- The stream ends when it is closed (the session finished), or early when the
+  client has disconnected (checked at least once per heartbeat interval).
+
+Backpressure:
+-------------
+The queue is bounded by WS_OUTBOUND_MAX_FRAMES. A full queue is compacted first. If
+it is still full the stream is closed as a slow consumer; the session keeps running
+and can be resumed.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import settings
+from services.connection_outbox import coalesce_frames
+from utils.metrics import record_ws_drain, record_ws_slow_consumer
+from utils.serialization import dumps_text
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_event(frame: Dict[str, Any], message_id: Optional[str] = None) -> str:
+    """One SSE event for a frame; sequenced frames get an ``id:`` line."""
+    event = f"data: {dumps_text(frame)}\n\n"
+    seq = frame.get("seq")
+    message_id = frame.get("message_id") or message_id
+    if seq is not None and message_id:
+        return f"id: {message_id}:{seq}\n{event}"
+    return event
+
+
+def parse_event_id(last_event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a ``Last-Event-ID`` of the form ``<message_id>:<seq>``; None if malformed."""
+    if not last_event_id or ":" not in last_event_id:
+        return None
+    message_id, _, seq = last_event_id.rpartition(":")
+    try:
+        return message_id, int(seq)
+    except ValueError:
+        return None
+
+
+class SSEStream:
+    """Queue of frames for one SSE response, drained by ``events()``."""
+
+    def __init__(
+        self,
+        client_id: str,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        heartbeat_seconds: float = settings.SSE_HEARTBEAT_SECONDS,
+        flush_interval_seconds: float = settings.SSE_FLUSH_INTERVAL_MS / 1000,
+        max_frames: int = settings.WS_OUTBOUND_MAX_FRAMES
+    ):
+        """
+        Args:
+            client_id: Key of the stream in ConnectionManager
+            is_disconnected: Coroutine reporting whether the client went away
+                (``Request.is_disconnected``)
+            heartbeat_seconds: Idle time before a keep-alive comment
+            flush_interval_seconds: How long to gather a burst into one chunk
+            max_frames: Queue depth that marks the client as a slow consumer
+        """
+        self.client_id = client_id
+        self._is_disconnected = is_disconnected
+        self.heartbeat_seconds = heartbeat_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_frames = max_frames
+        self._frames: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.message_id: Optional[str] = None
+        self.frames_sent = 0
+        self.heartbeats_sent = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    async def put(self, frame: Dict[str, Any]) -> bool:
+        """Queue a frame; False once the stream is closed."""
+        if self.closed:
+            return False
+        if len(self._frames) >= self.max_frames:
+            self._frames = deque(coalesce_frames(list(self._frames)))
+            if len(self._frames) >= self.max_frames:
+                record_ws_slow_consumer("disconnect")
+                logger.warning(f"SSE queue full ({len(self._frames)} frames); closing slow consumer")
+                self.close()
+                self._frames.clear()
+                return False
+        self._frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        """Frames are written by the response generator; nothing to wait for here."""
+
+    def close(self) -> None:
+        """End the stream once the queued frames have been written."""
+        self.closed = True
+        self._ready.set()
+
+    async def _client_gone(self) -> bool:
+        if self._is_disconnected is None:
+            return False
+        try:
+            return await self._is_disconnected()
+        except Exception:
+            return True
+
+    async def events(self) -> AsyncIterator[str]:
+        """Yield SSE chunks until the stream is closed and drained, or the client disconnects."""
+        while True:
+            if not self._frames and not self.closed:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await self._client_gone():
+                        logger.info("SSE client disconnected")
+                        return
+                    self.heartbeats_sent += 1
+                    yield HEARTBEAT
+                    continue
+                if self.flush_interval_seconds > 0 and not self.closed:
+                    await asyncio.sleep(self.flush_interval_seconds)
+            batch = list(self._frames)
+            self._frames.clear()
+            self._ready.clear()
+            if batch:
+                if await self._client_gone():
+                    logger.info("SSE client disconnected")
+                    return
+                frames = coalesce_frames(batch)
+                yield "".join(self._format(frame) for frame in frames)
+                self.frames_sent += len(frames)
+                record_ws_drain(len(batch), len(frames))
+            if self.closed and not self._frames:
+                return
+
+    def _format(self, frame: Dict[str, Any]) -> str:
+        if frame.get("type") == "message_start" and frame.get("message_id"):
+            self.message_id = frame["message_id"]
+        return format_event(frame, self.message_id)
@@ -0,0 +1,161 @@
+"""
+Streaming Wire Protocol
+=======================
+
+Encodes the events produced by the streaming pipeline for the wire. Upstream events
+(`ClaudeService._process_streaming_response`) carry the full ``accumulated_text`` on
+every ``text_delta`` and ``content_update``; that is cheap in-process, where the string
+is shared by reference, but resending it on every frame makes bytes on the wire and
+serialization time grow quadratically with answer length.
+
+Protocol versions:
+------------------
+- 1 (legacy): events are forwarded unchanged, ``accumulated_text`` included.
+- 2 (delta): every frame of a stream carries a monotonically increasing ``seq``.
+  ``text_delta`` frames carry only ``text``; ``content_update`` frames carry ``length``
+  instead of ``accumulated_text``. ``snapshot`` frames carry the full text with its
+  ``length`` and a ``checksum`` (``sha256:<hex>`` of the UTF-8 text). They are sent
+  every STREAM_SNAPSHOT_INTERVAL_CHARS characters of new text, before
+  ``content_block_stop`` / ``message_complete`` / ``error``, and whenever the text the
+  client can rebuild from deltas diverges from the server's.
+
+Clients pick a version with the ``protocol`` query parameter on
+``/ws/conversation/{id}`` and ``POST /api/conversation/{id}/message/stream``;
+without one, STREAM_PROTOCOL_DEFAULT_VERSION applies.
+
+Integration Points:
+-------------------
+- `app/routes/websocket.py`: one encoder per streamed message
+- `app/routes/conversation.py`: `send_message_streaming` SSE frames
+"""
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_LEGACY = 1
+PROTOCOL_DELTA = 2
+SUPPORTED_PROTOCOLS = (PROTOCOL_LEGACY, PROTOCOL_DELTA)
+
+# Events after which the client should hold verified text
+_SNAPSHOT_BEFORE = ("content_block_stop", "message_complete", "error")
+
+
+def negotiate_protocol(requested: Optional[Any]) -> int:
+    """
+    Resolve the protocol version requested by a client.
+
+    Args:
+        requested: Value of the ``protocol`` query parameter, if any
+
+    Returns:
+        A supported version; unknown or malformed requests fall back to the default
+    """
+    if requested is None or requested == "":
+        return settings.STREAM_PROTOCOL_DEFAULT_VERSION
+    try:
+        version = int(requested)
+    except (TypeError, ValueError):
+        version = None
+    if version not in SUPPORTED_PROTOCOLS:
+        logger.warning(f"Unsupported stream protocol {requested!r}, using {settings.STREAM_PROTOCOL_DEFAULT_VERSION}")
+        return settings.STREAM_PROTOCOL_DEFAULT_VERSION
+    return version
+
+
+def text_checksum(text: str) -> str:
+    """Checksum carried by snapshot frames."""
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StreamEncoder:
+    """Per-message encoder turning pipeline events into wire frames."""
+
+    def __init__(
+        self,
+        version: int = PROTOCOL_DELTA,
+        snapshot_interval_chars: int = settings.STREAM_SNAPSHOT_INTERVAL_CHARS
+    ):
+        """
+        Args:
+            version: Negotiated protocol version
+            snapshot_interval_chars: New characters of text between periodic snapshots
+        """
+        self.version = version
+        self.snapshot_interval_chars = snapshot_interval_chars
+        self.seq = 0
+        self._text = ""  # Latest accumulated text from upstream
+        self._client_length = 0  # Characters the client holds after applying our frames
+        self._snapshot_length = 0  # Length of the text at the last snapshot
+
+    def encode(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Encode one pipeline event.
+
+        Returns:
+            Frames to send, in order (possibly a snapshot followed by the event)
+        """
+        if self.version == PROTOCOL_LEGACY:
+            return [event]
+
+        event_type = event.get("type")
+        message_id = event.get("message_id")
+        frames: List[Dict[str, Any]] = []
+
+        if event_type == "text_delta":
+            delta = event.get("text", "")
+            upstream = event.get("accumulated_text")
+            synced = self._client_length == len(self._text)
+            self._text = upstream if upstream is not None else self._text + delta
+            if synced and len(self._text) == self._client_length + len(delta):
+                self._client_length = len(self._text)
+                frames.append(self._frame(event, exclude="accumulated_text"))
+            else:
+                # The client missed text (filtered upstream); a snapshot resynchronises it
+                frames.append(self._snapshot(message_id))
+            if len(self._text) - self._snapshot_length >= self.snapshot_interval_chars:
+                frames.append(self._snapshot(message_id))
+            return frames
+
+        if event_type == "content_update" and "accumulated_text" in event:
+            accumulated = event["accumulated_text"]
+            self._text = accumulated
+            if self._client_length != len(accumulated):
+                frames.append(self._snapshot(message_id))
+            frame = self._frame(event, exclude="accumulated_text")
+            frame["length"] = len(accumulated)
+            frames.append(frame)
+            return frames
+
+        if event_type in _SNAPSHOT_BEFORE and self._snapshot_length != len(self._text):
+            frames.append(self._snapshot(message_id))
+        frames.append(self._frame(event))
+        return frames
+
+    def snapshot(self, message_id: Optional[str]) -> Dict[str, Any]:
+        """A sequenced snapshot of the current text, e.g. to resynchronise a resuming client."""
+        return self._snapshot(message_id)
+
+    def _next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def _frame(self, event: Dict[str, Any], exclude: Optional[str] = None) -> Dict[str, Any]:
+        frame = {key: value for key, value in event.items() if key != exclude}
+        frame["seq"] = self._next_seq()
+        return frame
+
+    def _snapshot(self, message_id: Optional[str]) -> Dict[str, Any]:
+        self._client_length = len(self._text)
+        self._snapshot_length = len(self._text)
+        return {
+            "type": "snapshot",
+            "seq": self._next_seq(),
+            "message_id": message_id,
+            "text": self._text,
+            "length": len(self._text),
+            "checksum": text_checksum(self._text)
+        }
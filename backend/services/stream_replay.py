@@ -0,0 +1,58 @@
+"""
+Stream Replay Buffer
+====================
+
+Bounded ring buffer of the sequenced frames (protocol 2, see services/stream_protocol.py)
+sent for one in-flight message. When a WebSocket drops mid-answer the stream keeps
+running and its frames keep landing here; a client reconnecting with
+``{"type": "resume", "message_id": ..., "last_seq": ...}`` is sent the frames after
+``last_seq`` and then reattached to the live stream, instead of regenerating the answer.
+
+If the client is further behind than the buffer reaches, the caller falls back to a
+snapshot of the current text.
+
+Integration Points:
+-------------------
+- `app/routes/websocket.py`: one buffer per StreamingSession, replayed by the resume handshake
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import settings
+
+
+class StreamReplayBuffer:
+    """Last ``capacity`` sequenced frames of a stream."""
+
+    def __init__(self, capacity: int = settings.STREAM_REPLAY_BUFFER_EVENTS):
+        self.capacity = capacity
+        self._frames: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def first_seq(self) -> Optional[int]:
+        return self._frames[0]["seq"] if self._frames else None
+
+    @property
+    def last_seq(self) -> Optional[int]:
+        return self._frames[-1]["seq"] if self._frames else None
+
+    def append(self, frame: Dict[str, Any]) -> None:
+        """Record a frame; frames without a seq (protocol 1) are ignored."""
+        if "seq" in frame:
+            self._frames.append(frame)
+
+    def since(self, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Frames with seq greater than ``last_seq``.
+
+        Returns:
+            The frames in order, or None if some of them were already evicted
+        """
+        if not self._frames or last_seq >= self._frames[-1]["seq"]:
+            return []
+        if self._frames[0]["seq"] > last_seq + 1:
+            return None
+        return [frame for frame in self._frames if frame["seq"] > last_seq]
@@ -0,0 +1,401 @@
+"""
+Streaming Session Store
+=======================
+
+Where streaming sessions are registered so that any worker can find them. The live
+state of a stream (its task, encoder and replay buffer) always stays in the worker
+process running it, like the socket itself. The store holds what other workers need:
+- which worker owns a message and whether it is still streaming
+- a log of the stream's sequenced frames, for cross-worker fan-out
+- cancel requests addressed to the owning worker
+
+Implementations:
+----------------
+- InProcessSessionStore (STREAM_SESSION_STORE=memory, default): a single worker. Local
+  lookups find every session, so no frames are published.
+- SQLiteSessionStore (STREAM_SESSION_STORE=sqlite): a SQLite file shared by all workers
+  on the host (STREAM_SESSION_DB), like the rate-limit bucket and response cache.
+  - The owner publishes frames in batches every STREAM_STORE_POLL_SECONDS.
+  - A worker that receives a resume for a stream it does not own relays frames from
+    the log to its client.
+  - The owner polls for cancel requests.
+  - Expired sessions are removed for every worker at once.
+
+Integration Points:
+-------------------
+- `app/routes/websocket.py`: registration, publishing, remote resume/cancel, cleanup
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import settings
+from utils.local_store import LocalStore, default_store_path
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as the owner of the streams it runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+DEFAULT_DB_PATH = default_store_path("STREAM_SESSION_DB", "cfin_stream_sessions.sqlite3")
+
+
+@dataclass
+class SessionRecord:
+    """Shared view of one streaming message."""
+    message_id: str
+    conversation_id: str
+    client_id: str
+    worker_id: str = WORKER_ID
+    protocol: int = 2
+    active: bool = True
+    created_at: float = field(default_factory=time.time)
+    completed_at: Optional[float] = None
+
+
+class StreamSessionStore(ABC):
+    """Registry of streaming sessions visible to every worker using the same store."""
+
+    # Whether other processes can see this store (enables frame publishing and polling)
+    shared: bool = False
+
+    @abstractmethod
+    async def register(self, record: SessionRecord) -> None:
+        """Record a stream that has started on this worker."""
+
+    @abstractmethod
+    async def mark_finished(self, message_id: str) -> None:
+        """Record that a stream has ended (completed, failed or cancelled)."""
+
+    @abstractmethod
+    async def attach(self, message_id: str, client_id: str) -> None:
+        """Record the client a stream was resumed on (by any worker)."""
+
+    @abstractmethod
+    async def get(self, message_id: str) -> Optional[SessionRecord]:
+        """Look up a stream by message_id."""
+
+    @abstractmethod
+    async def append_frames(self, message_id: str, frames: List[Dict[str, Any]]) -> None:
+        """Publish sequenced frames of a stream."""
+
+    @abstractmethod
+    async def frames_after(self, message_id: str, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Published frames with seq greater than ``seq``, in order."""
+
+    @abstractmethod
+    async def request_cancel(self, message_id: str, reason: str) -> bool:
+        """Ask the owning worker to cancel an active stream. False if it is not active."""
+
+    @abstractmethod
+    async def take_cancel_requests(self, worker_id: str) -> List[Tuple[str, str]]:
+        """Pending (message_id, reason) cancel requests for streams owned by ``worker_id``."""
+
+    @abstractmethod
+    async def remove_expired(self, grace_seconds: float, max_age_seconds: float) -> int:
+        """Drop sessions finished more than grace_seconds ago or started more than max_age_seconds ago."""
+
+
+class InProcessSessionStore(StreamSessionStore):
+    """Single-process store: plain dictionaries."""
+
+    shared = False
+
+    def __init__(self, max_frames: int = settings.STREAM_REPLAY_BUFFER_EVENTS):
+        self.max_frames = max_frames
+        self._records: Dict[str, SessionRecord] = {}
+        self._frames: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._cancels: Dict[str, str] = {}
+
+    async def register(self, record: SessionRecord) -> None:
+        self._records[record.message_id] = record
+
+    async def mark_finished(self, message_id: str) -> None:
+        record = self._records.get(message_id)
+        if record is not None:
+            record.active = False
+            record.completed_at = time.time()
+        self._cancels.pop(message_id, None)
+
+    async def attach(self, message_id: str, client_id: str) -> None:
+        record = self._records.get(message_id)
+        if record is not None:
+            record.client_id = client_id
+
+    async def get(self, message_id: str) -> Optional[SessionRecord]:
+        return self._records.get(message_id)
+
+    async def append_frames(self, message_id: str, frames: List[Dict[str, Any]]) -> None:
+        self._frames.setdefault(message_id, deque(maxlen=self.max_frames)).extend(frames)
+
+    async def frames_after(self, message_id: str, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        return [frame for frame in self._frames.get(message_id, ()) if frame["seq"] > seq][:limit]
+
+    async def request_cancel(self, message_id: str, reason: str) -> bool:
+        record = self._records.get(message_id)
+        if record is None or not record.active:
+            return False
+        self._cancels[message_id] = reason
+        return True
+
+    async def take_cancel_requests(self, worker_id: str) -> List[Tuple[str, str]]:
+        taken = [(message_id, reason) for message_id, reason in self._cancels.items()
+                 if message_id in self._records and self._records[message_id].worker_id == worker_id]
+        for message_id, _ in taken:
+            del self._cancels[message_id]
+        return taken
+
+    async def remove_expired(self, grace_seconds: float, max_age_seconds: float) -> int:
+        now = time.time()
+        expired = [
+            message_id for message_id, record in self._records.items()
+            if (not record.active and record.completed_at is not None and now - record.completed_at > grace_seconds)
+            or now - record.created_at > max_age_seconds
+        ]
+        for message_id in expired:
+            self._records.pop(message_id, None)
+            self._frames.pop(message_id, None)
+            self._cancels.pop(message_id, None)
+        return len(expired)
+
+
+class SQLiteSessionStore(LocalStore, StreamSessionStore):
+    """Host-shared store in a SQLite file; all workers on the host see the same sessions."""
+
+    shared = True
+    store_name = "Stream session store"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        super().__init__(db_path)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS stream_sessions ("
+            " message_id TEXT PRIMARY KEY,"
+            " conversation_id TEXT NOT NULL,"
+            " client_id TEXT NOT NULL,"
+            " worker_id TEXT NOT NULL,"
+            " protocol INTEGER NOT NULL,"
+            " active INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " completed_at REAL,"
+            " cancel_reason TEXT,"
+            " cancel_taken INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_stream_sessions_worker ON stream_sessions (worker_id, active)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS stream_frames ("
+            " message_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " frame TEXT NOT NULL,"
+            " PRIMARY KEY (message_id, seq)) WITHOUT ROWID"
+        )
+
+    # -- synchronous operations (run in a worker thread by the async wrappers) --
+
+    def _register(self, record: SessionRecord) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO stream_sessions"
+                " (message_id, conversation_id, client_id, worker_id, protocol, active, created_at, completed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.message_id, record.conversation_id, record.client_id, record.worker_id,
+                 record.protocol, int(record.active), record.created_at, record.completed_at)
+            )
+        finally:
+            conn.close()
+
+    def _mark_finished(self, message_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE stream_sessions SET active = 0, completed_at = ? WHERE message_id = ?",
+                (time.time(), message_id)
+            )
+        finally:
+            conn.close()
+
+    def _attach(self, message_id: str, client_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE stream_sessions SET client_id = ? WHERE message_id = ?", (client_id, message_id))
+        finally:
+            conn.close()
+
+    def _get(self, message_id: str) -> Optional[SessionRecord]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT message_id, conversation_id, client_id, worker_id, protocol, active, created_at, completed_at"
+                " FROM stream_sessions WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return SessionRecord(
+            message_id=row[0], conversation_id=row[1], client_id=row[2], worker_id=row[3],
+            protocol=row[4], active=bool(row[5]), created_at=row[6], completed_at=row[7]
+        )
+
+    def _append_frames(self, message_id: str, frames: List[Dict[str, Any]]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO stream_frames (message_id, seq, frame) VALUES (?, ?, ?)",
+                [(message_id, frame["seq"], json.dumps(frame)) for frame in frames]
+            )
+        finally:
+            conn.close()
+
+    def _frames_after(self, message_id: str, seq: int, limit: int) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT frame FROM stream_frames WHERE message_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (message_id, seq, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def _request_cancel(self, message_id: str, reason: str) -> bool:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE stream_sessions SET cancel_reason = ?, cancel_taken = 0"
+                " WHERE message_id = ? AND active = 1", (reason, message_id)
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def _take_cancel_requests(self, worker_id: str) -> List[Tuple[str, str]]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT message_id, cancel_reason FROM stream_sessions"
+                " WHERE worker_id = ? AND active = 1 AND cancel_reason IS NOT NULL AND cancel_taken = 0",
+                (worker_id,)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE stream_sessions SET cancel_taken = 1 WHERE message_id = ?",
+                    [(row[0],) for row in rows]
+                )
+            conn.execute("COMMIT")
+            return [(row[0], row[1]) for row in rows]
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _remove_expired(self, grace_seconds: float, max_age_seconds: float) -> int:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = [row[0] for row in conn.execute(
+                "SELECT message_id FROM stream_sessions"
+                " WHERE (active = 0 AND completed_at < ?) OR created_at < ?",
+                (now - grace_seconds, now - max_age_seconds)
+            ).fetchall()]
+            if expired:
+                conn.executemany("DELETE FROM stream_frames WHERE message_id = ?", [(m,) for m in expired])
+                conn.executemany("DELETE FROM stream_sessions WHERE message_id = ?", [(m,) for m in expired])
+            conn.execute("COMMIT")
+            return len(expired)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # -- async API --
+
+    async def register(self, record: SessionRecord) -> None:
+        await self._run(self._register, record)
+
+    async def mark_finished(self, message_id: str) -> None:
+        await self._run(self._mark_finished, message_id)
+
+    async def attach(self, message_id: str, client_id: str) -> None:
+        await self._run(self._attach, message_id, client_id)
+
+    async def get(self, message_id: str) -> Optional[SessionRecord]:
+        return await self._run(self._get, message_id)
+
+    async def append_frames(self, message_id: str, frames: List[Dict[str, Any]]) -> None:
+        if frames:
+            await self._run(self._append_frames, message_id, frames)
+
+    async def frames_after(self, message_id: str, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        return await self._run(self._frames_after, message_id, seq, limit, default=[])
+
+    async def request_cancel(self, message_id: str, reason: str) -> bool:
+        return await self._run(self._request_cancel, message_id, reason, default=False)
+
+    async def take_cancel_requests(self, worker_id: str) -> List[Tuple[str, str]]:
+        return await self._run(self._take_cancel_requests, worker_id, default=[])
+
+    async def remove_expired(self, grace_seconds: float, max_age_seconds: float) -> int:
+        return await self._run(self._remove_expired, grace_seconds, max_age_seconds, default=0)
+
+
+class FramePublisher:
+    """Batches a stream's frames into a shared store, one write per STREAM_STORE_POLL_SECONDS."""
+
+    def __init__(self, store: StreamSessionStore, message_id: str,
+                 interval_seconds: float = settings.STREAM_STORE_POLL_SECONDS):
+        self.store = store
+        self.message_id = message_id
+        self.interval_seconds = interval_seconds
+        self._pending: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.Task] = None
+
+    def add(self, frames: List[Dict[str, Any]]) -> None:
+        self._pending.extend(frame for frame in frames if "seq" in frame)
+        if self._pending and self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval_seconds)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._pending = self._pending, []
+        await self.store.append_frames(self.message_id, batch)
+
+    async def close(self) -> None:
+        """Publish whatever is pending now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+_session_store: Optional[StreamSessionStore] = None
+
+
+def get_session_store() -> StreamSessionStore:
+    """Get the process-wide session store selected by STREAM_SESSION_STORE."""
+    global _session_store
+    if _session_store is None:
+        if settings.STREAM_SESSION_STORE == "sqlite":
+            _session_store = SQLiteSessionStore()
+        else:
+            _session_store = InProcessSessionStore()
+    return _session_store
@@ -42,16 +42,17 @@ class VizClassifier:
                 user_query, document_context, conversation_history
             )
             
-            # Use Claude to classify visualization needs
-            response = await self.claude_service.generate_response(
+            # Use Claude to classify visualization needs; identical query/context pairs are served from the response cache
+            response_text = await self.claude_service.generate_response(
                 messages=[{"role": "user", "content": classification_prompt}],
-                system="You are a financial analysis assistant that determines what visualizations and analysis are needed for user queries.",
+                system_prompt="You are a financial analysis assistant that determines what visualizations and analysis are needed for user queries.",
                 max_tokens=1000,
-                temperature=0.1  # Low temperature for consistent classification
+                temperature=0.1,  # Low temperature for consistent classification
+                cache_namespace="viz_classification"
             )
             
             # Parse Claude's response to extract VizNeeds
-            viz_needs = self._parse_classification_response(response.get("text", ""))
+            viz_needs = self._parse_classification_response(response_text)
             
             logger.info(f"Classified viz needs: charts={viz_needs.needs_charts}, tables={viz_needs.needs_tables}, metrics={viz_needs.needs_metrics}")
             
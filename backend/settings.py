@@ -24,4 +24,77 @@ SELECTED_MODEL = MODEL_HAIKU if PROCESSING_MODE == "fast" else MODEL_SONNET
 PDF_EXTRACT_PROMPT = "EXTRACT ALL TEXT: You must extract the complete, full text content from this entire PDF document. Include every page, every table, every number, every financial statement, and every section. Output ONLY the extracted text content - do not ask questions, do not provide commentary, do not suggest options. Extract the complete document text now."
 
 # Files-API hard limit
-FILES_MAX_SIZE_MB = 32 
\ No newline at end of file
+FILES_MAX_SIZE_MB = 32 
+
+# Fraction of Claude calls whose local token estimate is checked against the SDK
+# count_tokens endpoint in the background (0 disables the check)
+TOKEN_COUNT_SAMPLE_RATE = float(os.getenv("CLAUDE_TOKEN_COUNT_SAMPLE_RATE", "0.05"))
+
+# Automatic prompt-cache breakpoints on tools, system prompt and document blocks
+PROMPT_CACHING_ENABLED = os.getenv("CLAUDE_PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+
+# Persistent cache of deterministic Claude results (classification, extraction) keyed by content hash
+RESPONSE_CACHE_ENABLED = os.getenv("CLAUDE_RESPONSE_CACHE", "true").lower() in ("1", "true", "yes")
+
+# PDF ingestion: "pipelined" runs classification and extraction concurrently on the uploaded
+# file_id (extraction uses a type-agnostic prompt); "serial" classifies first and passes the
+# detected type into the extraction prompt
+PDF_INGEST_MODE = os.getenv("PDF_INGEST_MODE", "pipelined").lower()
+
+# Write-behind persistence of streamed assistant content: write when this many bytes were
+# added or the pending content is this old (always at tool_start and message completion)
+STREAM_PERSIST_INTERVAL_SECONDS = float(os.getenv("STREAM_PERSIST_INTERVAL_SECONDS", "1.0"))
+STREAM_PERSIST_MIN_BYTES = int(os.getenv("STREAM_PERSIST_MIN_BYTES", "2048"))
+
+# Streaming wire protocol (see services/stream_protocol.py): 2 sends deltas with sequence
+# numbers and periodic checksummed snapshots, 1 resends accumulated_text on every event.
+# Clients override per connection with ?protocol=
+STREAM_PROTOCOL_DEFAULT_VERSION = int(os.getenv("STREAM_PROTOCOL_DEFAULT_VERSION", "2"))
+STREAM_SNAPSHOT_INTERVAL_CHARS = int(os.getenv("STREAM_SNAPSHOT_INTERVAL_CHARS", "4096"))
+
+# Resumable streams: sequenced frames kept per in-flight message for the WebSocket resume
+# handshake, and how long a finished stream stays resumable
+STREAM_REPLAY_BUFFER_EVENTS = int(os.getenv("STREAM_REPLAY_BUFFER_EVENTS", "2000"))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "60"))
+# A stream whose socket dropped is cancelled (Claude stream closed, partial answer kept)
+# unless a client resumes it within this many seconds
+STREAM_CANCEL_AFTER_DISCONNECT_SECONDS = float(os.getenv("STREAM_CANCEL_AFTER_DISCONNECT_SECONDS", "15"))
+# Streaming session registry (see services/stream_session_store.py): "memory" for a single
+# worker, "sqlite" to share sessions between the workers of a host (STREAM_SESSION_DB) so a
+# client can resume or cancel a stream from any worker. Frames are published to, and remote
+# commands picked up from, the shared store every STREAM_STORE_POLL_SECONDS
+STREAM_SESSION_STORE = os.getenv("STREAM_SESSION_STORE", "memory").lower()
+STREAM_STORE_POLL_SECONDS = float(os.getenv("STREAM_STORE_POLL_SECONDS", "0.1"))
+
+# WebSocket outbound queues: events are queued per connection and written by a sender task
+# that waits this long to merge adjacent text deltas into one frame. A connection holding
+# WS_OUTBOUND_MAX_FRAMES unsent frames is a slow consumer: "disconnect" closes it (the
+# stream keeps running), "block" makes the producer wait for the queue to drain
+WS_COALESCE_WINDOW_MS = float(os.getenv("WS_COALESCE_WINDOW_MS", "25"))
+WS_OUTBOUND_MAX_FRAMES = int(os.getenv("WS_OUTBOUND_MAX_FRAMES", "1000"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect").lower()
+
+# SSE streams (see services/sse_stream.py): frames of a burst are gathered for this long and
+# written as one chunk; an idle stream gets a keep-alive comment this often so proxies keep
+# the connection open during long tool turns
+SSE_FLUSH_INTERVAL_MS = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "25"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# Database engine (see utils/database.py). SQLite connections are pooled and opened in WAL
+# mode with these pragmas; a writer waits up to SQLITE_BUSY_TIMEOUT_MS for the write lock
+# instead of failing with "database is locked". The pool settings apply to Postgres too
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))  # Postgres only
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across app crashes in WAL mode
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # Per connection
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+# Document-processing job queue (DB-backed; see services/document_job_queue.py)
+DOCUMENT_JOB_WORKERS = int(os.getenv("DOCUMENT_JOB_WORKERS", "2"))  # Workers per process; 0 = enqueue only
+DOCUMENT_JOB_MAX_ATTEMPTS = int(os.getenv("DOCUMENT_JOB_MAX_ATTEMPTS", "3"))
+DOCUMENT_JOB_MAX_RUNNING_PER_USER = int(os.getenv("DOCUMENT_JOB_MAX_RUNNING_PER_USER", "2"))
+DOCUMENT_JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("DOCUMENT_JOB_RETRY_BACKOFF_SECONDS", "10"))
+DOCUMENT_JOB_STALE_SECONDS = int(os.getenv("DOCUMENT_JOB_STALE_SECONDS", "300"))  # Running jobs without a heartbeat this long are requeued
@@ -93,7 +93,7 @@ async def test_claude_bucket():
         "anthropic-ratelimit-tokens-reset": "10.5"
     })
     
-    assert ClaudeBucket._tokens_remaining == 1000
+    assert ClaudeBucket.snapshot()["input_tokens"]["remaining"] == 1000
     logger.info("✅ Claude bucket test passed - rate limit state updated correctly")
 
 async def test_hash_utils():
@@ -2,6 +2,7 @@ import pytest
 import os
 import sys
 import asyncio
+import tempfile
 from unittest.mock import patch, MagicMock, AsyncMock
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
@@ -16,6 +17,13 @@ os.environ["SQLITE_DB_URL"] = "sqlite:///test.db"
 os.environ["STORAGE_TYPE"] = "local"
 os.environ["LOCAL_STORAGE_PATH"] = "./test_uploads"
 
+# Host-shared SQLite stores persist across runs by design; give each test session
+# fresh ones so cached state never leaks between runs
+_shared_store_dir = tempfile.mkdtemp(prefix="cfin-tests-")
+os.environ["CLAUDE_RESPONSE_CACHE_DB"] = os.path.join(_shared_store_dir, "response_cache.sqlite3")
+os.environ["CLAUDE_RATE_LIMIT_DB"] = os.path.join(_shared_store_dir, "ratelimit.sqlite3")
+os.environ["STREAM_SESSION_DB"] = os.path.join(_shared_store_dir, "stream_sessions.sqlite3")
+
 # Load test environment variables
 # load_dotenv(".env.test")  # Uncomment and create this file when needed
 
@@ -138,11 +138,10 @@ class TestClaudeUpgradeIntegration:
         
         ClaudeBucket.update(test_headers)
         
-        assert ClaudeBucket._tokens_remaining == 5000
-        # _reset_ts is calculated as current time + reset seconds, so just verify it's reasonable
-        import time
-        expected_reset_time = time.time() + 30.5
-        assert abs(ClaudeBucket._reset_ts - expected_reset_time) < 2  # Within 2 seconds tolerance
+        state = ClaudeBucket.snapshot()["input_tokens"]
+        assert state["remaining"] == 5000
+        # reset is stored as current time + reset seconds, so just verify it's reasonable
+        assert abs(state["reset_in_seconds"] - 30.5) < 2  # Within 2 seconds tolerance
         
         # Test throttle calculation (should not throttle with plenty of tokens)
         delay = await ClaudeBucket.throttle(100)  # Need 100 tokens
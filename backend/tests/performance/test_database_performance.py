@@ -0,0 +1,101 @@
+"""
+Benchmark: concurrent streaming writers against the tuned SQLite engine profile
+(utils.database.build_engine: pooled connections, WAL, synchronous=NORMAL, busy_timeout)
+and the previous default engine (NullPool, rollback journal, driver defaults).
+
+Each writer persists streamed content the way MessagePersister does, one short
+UPDATE-and-commit per flush, while readers page through history. Reported: writes/sec,
+read latency and how many operations failed with "database is locked".
+"""
+import asyncio
+import pytest
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils.database import build_engine
+
+WRITERS = 8
+WRITES_PER_WRITER = 40
+READERS = 4
+
+
+async def _prepare(engine):
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id TEXT, content TEXT)"))
+        for i in range(WRITERS):
+            await conn.execute(text("INSERT INTO messages (id, conversation_id, content) VALUES (:id, 'c1', '')"),
+                               {"id": i})
+
+
+async def _run(engine):
+    errors = 0
+    read_latencies = []
+    writers_done = asyncio.Event()
+
+    async def writer(message_id: int):
+        nonlocal errors
+        content = ""
+        for i in range(WRITES_PER_WRITER):
+            content += f"chunk {i} of the streamed answer. "
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text("UPDATE messages SET content = :c WHERE id = :id"),
+                                       {"c": content, "id": message_id})
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                errors += 1
+
+    async def reader():
+        nonlocal errors
+        while not writers_done.is_set():
+            started = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT id, content FROM messages WHERE conversation_id = 'c1'"))
+                read_latencies.append(time.perf_counter() - started)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                errors += 1
+            await asyncio.sleep(0.001)
+
+    readers = [asyncio.create_task(reader()) for _ in range(READERS)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(WRITERS)))
+    elapsed = time.perf_counter() - started
+    writers_done.set()
+    await asyncio.gather(*readers)
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95)] * 1000 if read_latencies else 0.0
+    return WRITERS * WRITES_PER_WRITER / elapsed, p95, errors
+
+
+async def _measure(engine):
+    try:
+        await _prepare(engine)
+        return await _run(engine)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.performance
+@pytest.mark.asyncio
+async def test_tuned_sqlite_profile_sustains_concurrent_writers(tmp_path):
+    default_rate, default_p95, default_errors = await _measure(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'default.db'}")
+    )
+    tuned_rate, tuned_p95, tuned_errors = await _measure(
+        build_engine(f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}")
+    )
+
+    print(f"\ndefault engine: {default_rate:.0f} writes/s, read p95 {default_p95:.1f} ms, locked errors {default_errors}")
+    print(f"tuned profile: {tuned_rate:.0f} writes/s, read p95 {tuned_p95:.1f} ms, locked errors {tuned_errors}")
+    assert tuned_errors == 0
+    assert tuned_rate > default_rate
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: near-duplicate checks against a long streamed answer.
+
+Compares the incremental ShingleIndex check with the previous implementation of
+ClaudeService._is_substantially_new_content, which re-split the whole accumulated text
+and compared every sentence pair on each call.
+"""
+import pytest
+import random
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.shingle_index import ShingleIndex
+
+
+def legacy_is_substantially_new_content(new_text: str, existing_text: str, similarity_threshold: float = 0.15) -> bool:
+    if not new_text or not new_text.strip():
+        return False
+    if not existing_text:
+        return True
+    new_text_clean = new_text.strip().lower()
+    existing_text_clean = existing_text.strip().lower()
+    if new_text_clean in existing_text_clean:
+        return False
+    new_words = set(new_text_clean.split())
+    existing_words = set(existing_text_clean.split())
+    if new_words and len(new_words & existing_words) / len(new_words) > (1 - similarity_threshold):
+        return False
+    new_sentences = [s.strip() for s in new_text_clean.split('.') if s.strip()]
+    existing_sentences = [s.strip() for s in existing_text_clean.split('.') if s.strip()]
+    if new_sentences and existing_sentences:
+        similar_count = 0
+        for new_sent in new_sentences:
+            if len(new_sent) > 10:
+                for existing_sent in existing_sentences:
+                    if new_sent in existing_sent or existing_sent in new_sent:
+                        similar_count += 1
+                        break
+        if similar_count / len(new_sentences) > (1 - similarity_threshold):
+            return False
+    return True
+
+
+def synthetic_answer(sentences: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    return " ".join(
+        " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 20))) + "."
+        for _ in range(sentences)
+    )
+
+
+@pytest.mark.performance
+def test_shingle_index_check_is_submillisecond_and_independent_of_answer_length():
+    answer = synthetic_answer(3000)  # ~40k words, a long multi-turn analysis
+    candidate = synthetic_answer(6, seed=99)
+
+    index = ShingleIndex()
+    for start in range(0, len(answer), 40):  # Indexed as it streams in
+        index.add(answer[start:start + 40])
+    index.flush()
+
+    runs = 200
+    started = time.perf_counter()
+    for _ in range(runs):
+        index.is_substantially_new(candidate)
+    indexed_ms = (time.perf_counter() - started) * 1000 / runs
+
+    started = time.perf_counter()
+    for _ in range(5):
+        legacy_is_substantially_new_content(candidate, answer)
+    legacy_ms = (time.perf_counter() - started) * 1000 / 5
+
+    print(f"\nnear-duplicate check on {index.word_count} words: indexed {indexed_ms:.3f} ms, legacy {legacy_ms:.1f} ms")
+    assert index.is_substantially_new(candidate) == legacy_is_substantially_new_content(candidate, answer)
+    assert indexed_ms < 1.0
+    assert indexed_ms * 20 < legacy_ms
@@ -0,0 +1,127 @@
+"""
+Benchmark: the pure ASGI CORSRequestMiddleware against the previous middleware stack
+(Starlette's CORSMiddleware plus two ``@app.middleware("http")`` layers).
+
+Apps are driven directly through the ASGI interface, without a server or network, so
+the numbers isolate middleware overhead: requests/sec for a small JSON route, and the
+latency between an SSE chunk being yielded and reaching the server's ``send``.
+"""
+import asyncio
+import pytest
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.middleware import CORSRequestMiddleware
+
+ORIGINS = ["http://localhost:3000"]
+SSE_CHUNKS = 200
+
+
+def add_routes(app: FastAPI, yielded: list):
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(SSE_CHUNKS):
+                yielded.append(time.perf_counter())
+                yield f"data: {i}\n\n"
+                await asyncio.sleep(0)
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def legacy_app(yielded: list) -> FastAPI:
+    """The middleware stack app/main.py used before CORSRequestMiddleware."""
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=ORIGINS, allow_credentials=True,
+                       allow_methods=["*"], allow_headers=["*"], expose_headers=["Content-Type", "X-Total-Count"])
+
+    @app.middleware("http")
+    async def add_cors_headers_to_errors(request: Request, call_next):
+        origin = request.headers.get("origin", "*")
+        allowed_origin = origin if origin in ORIGINS or origin == "*" else ORIGINS[0]
+        try:
+            response = await call_next(request)
+            if "access-control-allow-origin" not in response.headers:
+                response.headers["Access-Control-Allow-Origin"] = allowed_origin
+            return response
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"detail": f"Internal server error: {str(e)}"})
+
+    @app.middleware("http")
+    async def handle_options(request: Request, call_next):
+        if request.method == "OPTIONS":
+            return JSONResponse(status_code=200, content={})
+        return await call_next(request)
+
+    add_routes(app, yielded)
+    return app
+
+
+def asgi_app(yielded: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CORSRequestMiddleware, allowed_origins=ORIGINS)
+    add_routes(app, yielded)
+    return app
+
+
+async def call(app, path: str, received: list):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"origin", b"http://localhost:3000")],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80)
+    }
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # Client stays connected
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(time.perf_counter())
+
+    await app(scope, receive, send)
+
+
+async def measure(app, yielded: list):
+    received: list = []
+    for _ in range(50):  # Warm up
+        await call(app, "/ping", received)
+    requests = 1000
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, "/ping", received)
+    rps = requests / (time.perf_counter() - started)
+
+    yielded.clear()
+    received.clear()
+    await call(app, "/stream", received)
+    latencies = sorted((r - y) * 1e6 for y, r in zip(yielded, received))
+    return rps, latencies[len(latencies) // 2]
+
+
+@pytest.mark.performance
+@pytest.mark.asyncio
+async def test_asgi_middleware_beats_base_http_middleware_stack():
+    legacy_yielded: list = []
+    new_yielded: list = []
+    legacy_rps, legacy_latency_us = await measure(legacy_app(legacy_yielded), legacy_yielded)
+    new_rps, new_latency_us = await measure(asgi_app(new_yielded), new_yielded)
+
+    print(f"\nlegacy stack: {legacy_rps:.0f} req/s, median SSE chunk latency {legacy_latency_us:.0f} us")
+    print(f"ASGI middleware: {new_rps:.0f} req/s, median SSE chunk latency {new_latency_us:.0f} us")
+    assert new_rps > legacy_rps
+    assert new_latency_us < legacy_latency_us
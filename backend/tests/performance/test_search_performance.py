@@ -0,0 +1,112 @@
+"""
+Benchmark: conversation search through the full-text index against the previous
+``ILIKE '%q%'`` query, as the message table grows.
+
+The LIKE query reads every message body on each search, so its latency grows with the
+table; the FTS5 lookup only touches the postings of the searched terms.
+"""
+import random
+import pytest
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import and_, insert, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from models.database_models import Conversation, Message, User
+from repositories.conversation_repository import ConversationRepository
+
+VOCABULARY = [
+    "revenue", "margin", "liquidity", "guidance", "segment", "forecast", "dividend", "capex",
+    "inventory", "receivables", "leverage", "covenant", "impairment", "amortization", "accrual",
+    "working", "capital", "operating", "income", "statement", "balance", "quarter", "growth",
+]
+SIZES = (2_000, 20_000)
+CONVERSATIONS = 200
+SEARCHES = 20
+
+
+def _message(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(60))
+
+
+async def legacy_search(session, user_id: str, query: str, limit: int = 10):
+    """The ILIKE query search_conversations ran before the full-text index."""
+    title_ids = select(Conversation.id).where(and_(Conversation.user_id == user_id, Conversation.title.ilike(f"%{query}%")))
+    message_ids = (
+        select(Conversation.id)
+        .join(Message, Message.conversation_id == Conversation.id)
+        .where(and_(Conversation.user_id == user_id, Message.content.ilike(f"%{query}%")))
+    )
+    result = await session.execute(
+        select(Conversation)
+        .where(or_(Conversation.id.in_(title_ids), Conversation.id.in_(message_ids)))
+        .order_by(Conversation.updated_at.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def _timed(search) -> float:
+    await search()  # Warm up
+    started = time.perf_counter()
+    for _ in range(SEARCHES):
+        await search()
+    return (time.perf_counter() - started) / SEARCHES * 1000
+
+
+@pytest.mark.performance
+@pytest.mark.asyncio
+async def test_full_text_search_latency_stays_flat(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+    rng = random.Random(7)
+    results = {}
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User).values(id="u1", username="u1", email="u1@x", hashed_password="x"))
+            await conn.execute(
+                insert(Conversation),
+                [{"id": f"c{i}", "title": f"Review {i}", "user_id": "u1"} for i in range(CONVERSATIONS)]
+            )
+
+        inserted = 0
+        async with sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+            repository = ConversationRepository(session)
+            for size in SIZES:
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        insert(Message),
+                        [
+                            {"id": f"m{i}", "conversation_id": f"c{i % CONVERSATIONS}", "role": "assistant",
+                             "content": _message(rng)}
+                            for i in range(inserted, size)
+                        ]
+                    )
+                inserted = size
+                # A term that occurs in a handful of messages, as most real searches do
+                needle = f"needle{size}"
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        text("UPDATE messages SET content = content || ' ' || :needle WHERE id IN ('m1', 'm2', 'm3')"),
+                        {"needle": needle}
+                    )
+
+                fts_ms = await _timed(lambda: repository.search_conversations("u1", needle))
+                like_ms = await _timed(lambda: legacy_search(session, "u1", needle))
+                assert {c.id for c in await repository.search_conversations("u1", needle)} == \
+                    {c.id for c in await legacy_search(session, "u1", needle)}
+                results[size] = (fts_ms, like_ms)
+    finally:
+        await engine.dispose()
+
+    for size, (fts_ms, like_ms) in results.items():
+        print(f"\n{size} messages: full-text {fts_ms:.2f} ms, ILIKE {like_ms:.2f} ms")
+    small, large = results[SIZES[0]], results[SIZES[-1]]
+    assert large[0] < large[1]
+    assert large[0] < small[0] * 3  # Flat, where ILIKE grows with the table
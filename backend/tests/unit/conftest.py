@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+import models.database_models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    """Engine for a fresh SQLite file with the application schema (and search index)."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+async def session(session_factory):
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,109 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import event
+from sqlalchemy.future import select
+
+from models.database_models import AnalysisResult, AnalysisDocument
+from repositories.analysis_repository import AnalysisRepository
+from migrate_analysis_documents import backfill_analysis_documents
+
+
+async def _seed(repository: AnalysisRepository):
+    """Five analyses with distinct, increasing created_at values."""
+    specs = [
+        (["d1"], "ratios", {"summary": "Revenue up"}),
+        (["d1", "d2"], "comparison", {"summary": "Margins 50%_wide"}),
+        (["d2"], "ratios", {"summary": "Cash flow"}),
+        (["d1"], "ratios", {"summary": "REVENUE down"}),
+        (["d3"], "ratios", {"summary": "Unrelated revenue"}),
+    ]
+    start = datetime(2024, 1, 1)
+    created = []
+    for i, (document_ids, analysis_type, data) in enumerate(specs):
+        analysis = await repository.create_analysis(document_ids, analysis_type, data)
+        await repository.update_analysis(analysis.id, {"created_at": start + timedelta(days=i)})
+        created.append(analysis.id)
+    return created
+
+
+class TestAnalysisRepository:
+    @pytest.mark.asyncio
+    async def test_document_queries_are_ordered_and_paginated_in_sql(self, session):
+        repository = AnalysisRepository(session)
+        a0, a1, a2, a3, a4 = await _seed(repository)
+
+        assert [a.id for a in await repository.list_document_analyses("d1")] == [a3, a1, a0]
+        assert [a.id for a in await repository.list_document_analyses("d1", limit=1, offset=1)] == [a1]
+        assert [a.id for a in await repository.list_document_analyses("d1", analysis_type="ratios")] == [a3, a0]
+        assert await repository.count_document_analyses("d1") == 3
+        assert await repository.count_document_analyses("d2", analysis_type="ratios") == 1
+        assert await repository.count_document_analyses("missing") == 0
+
+        latest = await repository.list_latest_analyses(["d1", "d2"], limit=1)
+        assert [a.id for a in latest] == [a3, a2]
+
+        assert [a.id for a in await repository.search_analyses(["d1", "d2"], "revenue")] == [a3, a0]
+        assert [a.id for a in await repository.search_analyses(["d1"], "50%_")] == [a1]
+        assert await repository.search_analyses(["d1"], "up%") == []
+
+    @pytest.mark.asyncio
+    async def test_association_follows_updates_and_deletes(self, session):
+        repository = AnalysisRepository(session)
+        analysis = await repository.create_analysis(["d1", "d1", "d2"], "ratios", {"summary": "x"})
+
+        assert await repository.is_document_referenced("d1")
+        await repository.update_analysis(analysis.id, {"document_ids": ["d3"]})
+        assert not await repository.is_document_referenced("d1")
+        assert await repository.is_document_referenced("d3")
+
+        await repository.delete_analysis(analysis.id)
+        assert not await repository.is_document_referenced("d3")
+        rows = await session.execute(select(AnalysisDocument))
+        assert rows.all() == []
+
+    @pytest.mark.asyncio
+    async def test_lookups_do_not_scan_analysis_results(self, engine, session):
+        repository = AnalysisRepository(session)
+        await _seed(repository)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            await repository.is_document_referenced("d1")
+            await repository.list_document_analyses("d1")
+            async with engine.connect() as conn:
+                plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statements[-1]}", ("d1", 10, 0))
+                details = " ".join(row[-1] for row in plan.all())
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        assert "FROM analysis_results" not in statements[0]
+        assert "SCAN analysis_results" not in details
+        assert "analysis_documents" in details
+
+    @pytest.mark.asyncio
+    async def test_backfill_indexes_existing_analyses_once(self, session):
+        session.add_all([
+            AnalysisResult(id="legacy-1", document_ids=["d1", "d2"], analysis_type="ratios", result_data={}),
+            AnalysisResult(id="legacy-2", document_ids=[], analysis_type="ratios", result_data={}),
+        ])
+        await session.commit()
+        repository = AnalysisRepository(session)
+        assert not await repository.is_document_referenced("d1")
+
+        dry_run = await backfill_analysis_documents(session, dry_run=True)
+        assert dry_run == {"analyses": 2, "analyses_updated": 1, "rows_inserted": 2}
+        assert not await repository.is_document_referenced("d1")
+
+        await backfill_analysis_documents(session)
+        assert [a.id for a in await repository.list_document_analyses("d2")] == ["legacy-1"]
+        rerun = await backfill_analysis_documents(session)
+        assert rerun["rows_inserted"] == 0
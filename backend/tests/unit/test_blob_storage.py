@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.storage import LocalStorageService, iter_bytes
+from models.database_models import Document, ProcessingStatusEnum
+from repositories.blob_repository import BlobRepository
+from repositories.document_repository import DocumentRepository
+from migrate_blob_storage import fold_legacy_uploads
+
+
+PAYLOAD = b"%PDF-1.4\n" + os.urandom(50_000)
+OTHER_PAYLOAD = b"%PDF-1.4\n" + os.urandom(20_000)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("STORAGE_CONTENT_ADDRESSED", "true")
+    return LocalStorageService()
+
+
+def _files(storage):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), storage.upload_dir)
+        for root, _, names in os.walk(storage.upload_dir) for name in names
+    )
+
+
+class TestBlobStorage:
+    @pytest.mark.asyncio
+    async def test_save_blob_stores_identical_content_once(self, storage):
+        first, created_first = await storage.save_blob(iter_bytes(PAYLOAD), "application/pdf")
+        second, created_second = await storage.save_blob(iter_bytes(PAYLOAD, chunk_size=4096), "application/pdf")
+
+        sha = hashlib.sha256(PAYLOAD).hexdigest()
+        assert first.file_id == second.file_id == f"blobs/{sha[:2]}/{sha}.pdf"
+        assert (created_first, created_second) == (True, False)
+        assert _files(storage) == [first.file_id]
+        assert await second.read() == PAYLOAD
+
+    @pytest.mark.asyncio
+    async def test_documents_share_blob_until_last_reference_is_deleted(self, storage, session):
+        repository = DocumentRepository(session, storage)
+        doc_a = await repository.create_document(PAYLOAD, "a.pdf", "u1", "application/pdf")
+        doc_b = await repository.create_document(PAYLOAD, "b.pdf", "u1", "application/pdf")
+        doc_c = await repository.create_document(OTHER_PAYLOAD, "c.pdf", "u1", "application/pdf")
+
+        key = await repository.get_storage_key(doc_a.id)
+        assert key == await repository.get_storage_key(doc_b.id) != await repository.get_storage_key(doc_c.id)
+        assert len(_files(storage)) == 2
+        assert (await BlobRepository(session).get_blob_for_document(doc_a.id)).ref_count == 2
+
+        assert await repository.delete_document(doc_a.id)
+        assert await storage.exists(key)
+        assert (await repository.get_document_content(doc_b.id))["content"] == PAYLOAD
+
+        assert await repository.delete_document(doc_b.id)
+        assert not await storage.exists(key)
+        stats = await BlobRepository(session).blob_stats()
+        assert stats["blobs"] == 1 and stats["references"] == 1
+
+    @pytest.mark.asyncio
+    async def test_upload_survives_delete_of_last_reference_mid_upload(self, storage, session):
+        repository = DocumentRepository(session, storage)
+        doc_a = await repository.create_document(PAYLOAD, "a.pdf", "u1", "application/pdf")
+        key = await repository.get_storage_key(doc_a.id)
+        uploader = DocumentRepository(AsyncSession(bind=session.bind, expire_on_commit=False), storage)
+        add_reference = uploader.blob_repository.add_reference
+
+        async def delete_then_add_reference(*args, **kwargs):
+            # The upload has staged its copy; the last existing reference goes away meanwhile
+            assert await repository.delete_document(doc_a.id)
+            assert not await storage.exists(key)
+            await add_reference(*args, **kwargs)
+
+        uploader.blob_repository.add_reference = delete_then_add_reference
+        doc_b = await uploader.create_document(PAYLOAD, "b.pdf", "u1", "application/pdf")
+
+        assert await uploader.get_storage_key(doc_b.id) == key
+        assert await uploader.get_document_binary(doc_b.id) == PAYLOAD
+        assert _files(storage) == [key]
+        await uploader.db.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_commit_leaves_no_file_behind(self, storage, session, monkeypatch):
+        repository = DocumentRepository(session, storage)
+
+        async def failing_commit():
+            raise RuntimeError("database unavailable")
+
+        monkeypatch.setattr(session, "commit", failing_commit)
+        with pytest.raises(RuntimeError):
+            await repository.create_document(PAYLOAD, "a.pdf", "u1", "application/pdf")
+
+        assert _files(storage) == []
+
+    @pytest.mark.asyncio
+    async def test_legacy_layout_still_readable_and_deletable(self, storage, session, monkeypatch):
+        monkeypatch.setenv("STORAGE_CONTENT_ADDRESSED", "false")
+        repository = DocumentRepository(session, storage)
+        document = await repository.create_document(PAYLOAD, "a.pdf", "u1", "application/pdf")
+
+        assert await repository.get_storage_key(document.id) == f"{document.id}.pdf"
+        assert await repository.get_document_binary(document.id) == PAYLOAD
+        assert await repository.delete_document(document.id)
+        assert _files(storage) == []
+
+
+@pytest.mark.asyncio
+async def test_migration_folds_duplicate_legacy_uploads(storage, session):
+    for document_id, payload in (("d1", PAYLOAD), ("d2", PAYLOAD), ("d3", OTHER_PAYLOAD), ("gone", PAYLOAD)):
+        session.add(Document(id=document_id, filename=f"{document_id}.pdf", file_path="legacy", file_size=len(payload),
+                             mime_type="application/pdf", user_id="u1", processing_status=ProcessingStatusEnum.COMPLETED))
+        if document_id != "gone":
+            await storage.save_file(payload, f"{document_id}.pdf", "application/pdf")
+    await session.commit()
+
+    dry_run = await fold_legacy_uploads(session, storage, dry_run=True)
+    assert dry_run["duplicates_removed"] == 1 and len(_files(storage)) == 3
+
+    report = await fold_legacy_uploads(session, storage)
+
+    assert report == {"documents": 3, "blobs_created": 2, "duplicates_removed": 1, "missing_files": 1,
+                      "bytes_reclaimed": len(PAYLOAD)}
+    assert all(path.startswith("blobs/") for path in _files(storage)) and len(_files(storage)) == 2
+    repository = DocumentRepository(session, storage)
+    assert await repository.get_storage_key("d1") == await repository.get_storage_key("d2")
+    assert (await repository.get_document("d2")).file_path == storage.get_file_path(
+        await repository.get_storage_key("d2"))
+    # Idempotent
+    assert (await fold_legacy_uploads(session, storage))["documents"] == 0
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime, timezone, timedelta
+import pytest
+import sqlite3
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils import claude_bucket
+from utils.claude_bucket import ClaudeBucket, SharedRateLimiter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "ratelimit.sqlite3")
+
+
+def _headers(dimension: str, limit: int, remaining: int, reset: str = "60"):
+    prefix = f"anthropic-ratelimit-{dimension}"
+    return {f"{prefix}-limit": str(limit), f"{prefix}-remaining": str(remaining), f"{prefix}-reset": reset}
+
+
+class TestSharedRateLimiter:
+    def test_state_is_shared_between_instances(self, db_path):
+        worker_a = SharedRateLimiter(db_path)
+        worker_b = SharedRateLimiter(db_path)
+
+        worker_a.update_from_headers(_headers("input-tokens", 80_000, 5_000))
+
+        state = worker_b.snapshot()
+        assert state["input_tokens"]["limit"] == 80_000
+        assert state["input_tokens"]["remaining"] == 5_000
+
+    def test_tracks_all_dimensions_and_rfc3339_reset(self, db_path):
+        limiter = SharedRateLimiter(db_path)
+        reset_at = (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat().replace("+00:00", "Z")
+        headers = {}
+        headers.update(_headers("requests", 50, 49, reset_at))
+        headers.update(_headers("input-tokens", 40_000, 39_000, reset_at))
+        headers.update(_headers("output-tokens", 8_000, 7_000, reset_at))
+        limiter.update_from_headers(headers)
+
+        state = limiter.snapshot()
+        assert set(state) >= {"requests", "input_tokens", "output_tokens"}
+        assert 25 < state["output_tokens"]["reset_in_seconds"] <= 30
+
+    def test_legacy_tokens_header_maps_to_input_tokens(self, db_path):
+        limiter = SharedRateLimiter(db_path)
+        limiter.update_from_headers({
+            "anthropic-ratelimit-tokens-remaining": "5000",
+            "anthropic-ratelimit-tokens-reset": "30.5"
+        })
+        assert limiter.snapshot()["input_tokens"]["remaining"] == 5000
+
+    @pytest.mark.asyncio
+    async def test_acquire_reserves_budget_and_release_returns_it(self, db_path):
+        limiter = SharedRateLimiter(db_path)
+        limiter.update_from_headers(_headers("output-tokens", 60_000, 10_000))
+
+        waited = await limiter.acquire(input_tokens=10, output_tokens=4_000)
+        assert waited < 0.5
+        assert limiter.snapshot()["output_tokens"]["remaining"] == pytest.approx(6_000, abs=50)
+
+        limiter.release(output_tokens=3_500)
+        assert limiter.snapshot()["output_tokens"]["remaining"] == pytest.approx(9_500, abs=50)
+
+    @pytest.mark.asyncio
+    async def test_release_is_skipped_once_newer_headers_reset_the_budget(self, db_path):
+        limiter = SharedRateLimiter(db_path)
+        limiter.update_from_headers(_headers("output-tokens", 60_000, 10_000))
+        await limiter.acquire(output_tokens=4_000)
+        reserved_at = time.time()
+
+        # The response's own headers already count only the tokens it really used
+        limiter.update_from_headers(_headers("output-tokens", 60_000, 9_500))
+        limiter.release(reserved_at, output_tokens=3_500)
+
+        assert limiter.snapshot()["output_tokens"]["remaining"] == pytest.approx(9_500, abs=50)
+
+    @pytest.mark.asyncio
+    async def test_waits_for_refill_when_budget_exhausted(self, db_path):
+        limiter = SharedRateLimiter(db_path, poll_interval=0.01)
+        # 6000/min refills 100 tokens per second
+        limiter.update_from_headers(_headers("input-tokens", 6_000, 0))
+
+        started = time.monotonic()
+        await limiter.acquire(input_tokens=20)
+        elapsed = time.monotonic() - started
+        assert 0.1 <= elapsed < 2.0
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_released_in_fifo_order(self, db_path):
+        worker_a = SharedRateLimiter(db_path, poll_interval=0.01)
+        worker_b = SharedRateLimiter(db_path, poll_interval=0.01)
+        worker_a.update_from_headers(_headers("input-tokens", 6_000, 0))
+
+        order = []
+
+        async def request(limiter, name):
+            await limiter.acquire(input_tokens=10)
+            order.append(name)
+
+        tasks = []
+        for i, limiter in enumerate([worker_a, worker_b, worker_a, worker_b]):
+            tasks.append(asyncio.create_task(request(limiter, i)))
+            await asyncio.sleep(0.02)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+
+        assert order == [0, 1, 2, 3]
+        assert worker_a.snapshot()["queued_waiters"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self, db_path):
+        limiter = SharedRateLimiter(db_path, poll_interval=0.01)
+        limiter.update_from_headers({"retry-after": "30"})
+
+        task = asyncio.create_task(limiter.acquire(input_tokens=10))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert limiter.snapshot()["queued_waiters"] == 0
+
+    @pytest.mark.asyncio
+    async def test_throttles_again_after_the_reset(self, db_path):
+        limiter = SharedRateLimiter(db_path, poll_interval=0.01)
+        limiter.update_from_headers(_headers("requests", 10, 0, reset="0.2"))
+        await asyncio.sleep(0.3)
+
+        for _ in range(10):
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+        # The fresh window is spent and refills at one request per 6 s
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(), timeout=0.5)
+
+    @pytest.mark.asyncio
+    async def test_unknown_limit_window_is_probed_by_one_request(self, db_path):
+        limiter = SharedRateLimiter(db_path, poll_interval=0.01)
+        limiter.update_from_headers({"retry-after": "0.2"})
+        await asyncio.sleep(0.3)
+
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(), timeout=0.3)
+
+        # The probe's response reports the real budget
+        limiter.update_from_headers(_headers("requests", 50, 40))
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+
+class TestClaudeBucket:
+    @pytest.mark.asyncio
+    async def test_unavailable_store_never_fails_calls(self, db_path, monkeypatch):
+        def locked():
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(claude_bucket, "get_rate_limiter", locked)
+        await ClaudeBucket.throttle(100, output_tokens=100)
+        ClaudeBucket.update(_headers("requests", 50, 49))
+        await ClaudeBucket.release(output_tokens=100)
+
+        limiter = SharedRateLimiter(db_path)
+        monkeypatch.setattr(claude_bucket, "get_rate_limiter", lambda: limiter)
+        monkeypatch.setattr(limiter, "_connect", locked)
+        await ClaudeBucket.throttle(100, output_tokens=100)
+        ClaudeBucket.update(_headers("requests", 50, 49))
+        await ClaudeBucket.release(output_tokens=100)
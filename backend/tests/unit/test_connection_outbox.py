@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from services.connection_outbox import ConnectionOutbox, coalesce_frames
+
+
+def delta(seq, text, message_id="m1"):
+    return {"type": "text_delta", "seq": seq, "text": text, "message_id": message_id}
+
+
+class SlowSocket:
+    """Records frames; each send takes `delay` seconds like a congested client."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+
+    async def send(self, frame):
+        await asyncio.sleep(self.delay)
+        self.frames.append(frame)
+
+
+def test_coalesce_merges_adjacent_deltas_and_drops_superseded_updates():
+    frames = [
+        delta(1, "Hel"),
+        {"type": "content_update", "seq": 2, "length": 3, "message_id": "m1"},
+        delta(3, "lo"),
+        {"type": "content_update", "seq": 4, "length": 5, "message_id": "m1"},
+        {"type": "tool_start", "seq": 5, "message_id": "m1"},
+        delta(6, "!"),
+    ]
+
+    merged = coalesce_frames(frames)
+
+    assert [frame["type"] for frame in merged] == ["text_delta", "content_update", "tool_start", "text_delta"]
+    assert merged[0] == {"type": "text_delta", "seq": 3, "seq_start": 1, "text": "Hello", "message_id": "m1"}
+    assert merged[1]["seq"] == 4
+    assert frames[0]["text"] == "Hel"  # Inputs are not mutated
+
+
+@pytest.mark.asyncio
+async def test_producer_is_not_held_up_by_slow_socket():
+    socket = SlowSocket(delay=0.05)
+    outbox = ConnectionOutbox(socket.send, coalesce_window_seconds=0.025, max_frames=1000)
+    outbox.start()
+
+    started = time.monotonic()
+    for seq in range(1, 201):
+        assert await outbox.put(delta(seq, "x"))
+    produced_in = time.monotonic() - started
+    await outbox.flush()
+    outbox.close()
+
+    assert produced_in < 0.05
+    assert "".join(frame["text"] for frame in socket.frames) == "x" * 200
+    assert len(socket.frames) < 10
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_disconnected_when_queue_stays_full():
+    closed = []
+
+    async def on_close(reason):
+        closed.append(reason)
+
+    socket = SlowSocket(delay=10)
+    outbox = ConnectionOutbox(socket.send, on_close=on_close, coalesce_window_seconds=0, max_frames=3)
+    outbox.start()
+    await outbox.put({"type": "tool_start", "message_id": "m1"})
+    await asyncio.sleep(0.01)  # Sender is now stuck writing the first frame
+
+    results = [await outbox.put({"type": "tool_complete", "tool_id": str(i)}) for i in range(4)]
+
+    assert results == [True, True, True, False]
+    assert closed == ["slow_consumer"]
+    assert await outbox.put({"type": "ping"}) is False
+
+
+@pytest.mark.asyncio
+async def test_full_queue_of_deltas_is_compacted_instead_of_disconnecting():
+    closed = []
+
+    async def on_close(reason):
+        closed.append(reason)
+
+    socket = SlowSocket(delay=10)
+    outbox = ConnectionOutbox(socket.send, on_close=on_close, coalesce_window_seconds=0, max_frames=3)
+    outbox.start()
+    await outbox.put({"type": "tool_start", "message_id": "m1"})
+    await asyncio.sleep(0.01)
+
+    for seq in range(1, 20):
+        assert await outbox.put(delta(seq, "y"))
+
+    assert closed == []
+    assert outbox.depth <= 3
+    outbox.close()
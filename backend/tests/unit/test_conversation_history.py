@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import event
+
+from models.database_models import (
+    AnalysisBlock, Citation, Conversation, Document, Message, MessageCitation, User
+)
+from repositories.conversation_repository import ConversationRepository
+from app.routes.conversation import get_conversation_history
+
+
+async def _seed(session, message_count: int) -> str:
+    """A conversation whose messages each cite two of three documents and carry one analysis block."""
+    session.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="x"))
+    session.add(Conversation(id="c1", title="Q3 review", user_id="u1"))
+    for i in range(3):
+        session.add(Document(
+            id=f"d{i}", filename=f"report-{i}.pdf", file_path=f"/tmp/d{i}.pdf", file_size=1,
+            mime_type="application/pdf", user_id="u1", raw_text="x" * 10_000
+        ))
+    start = datetime(2024, 1, 1)
+    for i in range(message_count):
+        message_id = str(uuid.uuid4())
+        session.add(Message(
+            id=message_id, conversation_id="c1", role="assistant" if i % 2 else "user",
+            content=f"message {i}", created_at=start + timedelta(minutes=i)
+        ))
+        for page, document_id in ((2, f"d{i % 3}"), (1, f"d{(i + 1) % 3}")):
+            citation_id = f"cit-{i}-{page}"
+            session.add(Citation(id=citation_id, document_id=document_id, page=page, text=f"quote {i}.{page}"))
+            session.add(MessageCitation(message_id=message_id, citation_id=citation_id))
+        session.add(AnalysisBlock(message_id=message_id, block_type="chart", title="Revenue", content={"data": [i]}))
+    await session.commit()
+    session.expunge_all()
+    return "c1"
+
+
+def _count_selects(engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    return statements, lambda: event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+class TestConversationHistory:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("message_count", [2, 40])
+    async def test_history_page_uses_constant_number_of_queries(self, engine, session, message_count):
+        conversation_id = await _seed(session, message_count)
+        repository = ConversationRepository(session)
+
+        statements, stop = _count_selects(engine)
+        try:
+            messages, citations = await repository.get_conversation_history(conversation_id, limit=50)
+            [len(message.analysis_blocks) for message in messages]
+        finally:
+            stop()
+
+        assert len(messages) == message_count
+        assert len(statements) == 3
+        assert not any("raw_text" in statement or "extracted_data" in statement for statement in statements)
+        first = citations[messages[0].id]
+        assert [(citation.page, title) for citation, title in first] == [(1, "report-1.pdf"), (2, "report-0.pdf")]
+
+    @pytest.mark.asyncio
+    async def test_history_route_returns_citations_and_blocks(self, engine, session):
+        conversation_id = await _seed(session, 4)
+        repository = ConversationRepository(session)
+        service = SimpleNamespace(conversation_repository=repository, get_conversation=repository.get_conversation)
+
+        statements, stop = _count_selects(engine)
+        try:
+            response = await get_conversation_history(
+                conversation_id, limit=3, offset=1, conversation_service=service, user_id="u1"
+            )
+        finally:
+            stop()
+
+        body = json.loads(response.body)
+        assert len(statements) == 4  # conversation lookup plus the three history queries
+        assert [m["content"] for m in body] == ["message 1", "message 2", "message 3"]
+        citation = body[0]["citations"][0]
+        assert citation["documentTitle"] == "report-2.pdf"
+        assert citation["citedText"] == "quote 1.1"
+        assert citation["startPageNumber"] == 1
+        assert body[0]["citationLinks"] == ["cit-1-1", "cit-1-2"]
+        assert body[0]["analysisBlocks"][0]["content"] == {"data": [1]}
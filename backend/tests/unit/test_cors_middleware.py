@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.middleware import CORSRequestMiddleware
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(
+        CORSRequestMiddleware,
+        allowed_origins=["http://localhost:3000"],
+        allowed_origin_regex=r"http://127\.0\.0\.1:\d+"
+    )
+
+    @app.get("/ok")
+    async def ok(request: Request):
+        return {"request_id": request.state.request_id}
+
+    @app.get("/missing")
+    async def missing():
+        raise HTTPException(status_code=404, detail="nope")
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("kaboom")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_preflight_is_answered_without_reaching_routes(client):
+    response = client.options("/anything", headers={"Origin": "http://localhost:3000"})
+
+    assert response.status_code == 200
+    assert response.json() == {}
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert response.headers["access-control-max-age"] == "3600"
+
+
+def test_allowed_and_preview_origins_are_echoed(client):
+    assert client.get("/ok", headers={"Origin": "http://localhost:3000"}).headers["access-control-allow-origin"] == "http://localhost:3000"
+    response = client.get("/ok", headers={"Origin": "http://127.0.0.1:64142"})
+    assert response.headers["access-control-allow-origin"] == "http://127.0.0.1:64142"
+    assert response.headers["vary"] == "Origin"
+    assert client.get("/ok", headers={"Origin": "http://evil.example"}).headers["access-control-allow-origin"] == "http://localhost:3000"
+
+
+def test_error_responses_carry_cors_headers(client):
+    missing = client.get("/missing", headers={"Origin": "http://localhost:3000"})
+    boom = client.get("/boom", headers={"Origin": "http://localhost:3000"})
+
+    assert missing.status_code == 404
+    assert missing.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert boom.status_code == 500
+    assert boom.json() == {"detail": "Internal server error: kaboom"}
+    assert boom.headers["access-control-allow-credentials"] == "true"
+
+
+def test_request_id_is_propagated_or_generated(client):
+    given = client.get("/ok", headers={"X-Request-ID": "req-123"})
+    generated = client.get("/ok")
+
+    assert given.headers["x-request-id"] == "req-123"
+    assert given.json() == {"request_id": "req-123"}
+    assert generated.headers["x-request-id"] == generated.json()["request_id"]
+    assert len(generated.headers["x-request-id"]) == 32
@@ -0,0 +1,50 @@
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import settings
+from utils import database
+from utils.database import build_engine, engine_options
+
+
+@pytest.mark.asyncio
+async def test_sqlite_file_engine_is_pooled_and_tuned(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+    try:
+        assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+        async with engine.connect() as conn:
+            pragmas = {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+            }
+    finally:
+        await engine.dispose()
+
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+        "mmap_size": settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    }
+
+
+def test_engine_options_per_backend():
+    postgres = engine_options("postgresql+asyncpg://u:p@db/cfin")
+    assert postgres["pool_size"] == settings.DB_POOL_SIZE
+    assert postgres["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert postgres["pool_recycle"] == settings.DB_POOL_RECYCLE_SECONDS
+    assert postgres["pool_pre_ping"] is True
+
+    memory = engine_options("sqlite+aiosqlite:///:memory:")
+    assert "poolclass" not in memory and "connect_args" not in memory
+
+
+def test_sync_engine_is_built_on_first_access():
+    assert database._sync_engine is None or database._sync_engine is database.sync_engine
+    assert database.sync_engine is database.get_sync_engine()
+    assert database.SyncSessionLocal is not None
@@ -0,0 +1,253 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import update
+
+from models.database_models import Document, DocumentJob, JobStatusEnum, ProcessingStatusEnum
+from models.document import Citation as CitationSchema, DocumentMetadata, ProcessedDocument, ProcessingStatus
+from repositories.document_job_repository import DocumentJobRepository
+from repositories.document_repository import DocumentRepository
+from pdf_processing.document_service import DocumentService
+from services.document_job_queue import DocumentJobQueue
+
+
+async def _add_document(session, document_id, user_id="u1", status=ProcessingStatusEnum.PENDING):
+    session.add(Document(id=document_id, filename=f"{document_id}.pdf", file_path="/tmp/x", file_size=1,
+                         mime_type="application/pdf", user_id=user_id, processing_status=status))
+    await session.commit()
+
+
+class TestDocumentJobRepository:
+    @pytest.mark.asyncio
+    async def test_claim_prefers_least_served_user(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            for i in range(3):
+                await repo.enqueue(f"a{i}", "heavy-user", "a.pdf")
+            await repo.enqueue("b0", "light-user", "b.pdf")
+
+            first = await repo.claim_next("w1", max_running_per_user=0)
+            second = await repo.claim_next("w2", max_running_per_user=0)
+
+        assert first.user_id == "heavy-user"
+        # heavy-user already has a running job, so the newer light-user job jumps ahead
+        assert second.user_id == "light-user"
+        assert first.status == JobStatusEnum.RUNNING and first.attempts == 1
+
+    @pytest.mark.asyncio
+    async def test_per_user_running_cap(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            await repo.enqueue("a0", "u1", "a.pdf")
+            await repo.enqueue("a1", "u1", "a.pdf")
+
+            assert await repo.claim_next("w1", max_running_per_user=1) is not None
+            assert await repo.claim_next("w2", max_running_per_user=1) is None
+
+    @pytest.mark.asyncio
+    async def test_failure_backs_off_then_fails_permanently(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            await repo.enqueue("d1", "u1", "d.pdf", max_attempts=2)
+
+            job = await repo.claim_next("w1", 0)
+            assert await repo.mark_failed(job, "w1", "boom", backoff_seconds=60) is True
+            job = await repo.get_job(job.id)
+            assert job.status == JobStatusEnum.QUEUED
+            assert job.available_at > datetime.utcnow() + timedelta(seconds=50)
+            # Not claimable during backoff
+            assert await repo.claim_next("w1", 0) is None
+
+            await session.execute(update(DocumentJob).values(available_at=datetime.utcnow()))
+            await session.commit()
+            job = await repo.claim_next("w1", 0)
+            assert job.attempts == 2
+            assert await repo.mark_failed(job, "w1", "boom again", backoff_seconds=60) is False
+            job = await repo.get_job(job.id)
+            assert job.status == JobStatusEnum.FAILED and job.last_error == "boom again"
+
+    @pytest.mark.asyncio
+    async def test_only_the_owning_worker_can_finish_a_job(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            await repo.enqueue("d1", "u1", "d.pdf")
+            stale = await repo.claim_next("w1", 0)
+            # Recovered as stale and claimed by another worker
+            await repo.release(stale.id, "w1")
+            await repo.claim_next("w2", 0)
+
+            assert await repo.mark_failed(stale, "w1", "late failure", backoff_seconds=0) is None
+            assert await repo.mark_succeeded(stale.id, "w1") is False
+            job = await repo.get_job(stale.id)
+            assert job.status == JobStatusEnum.RUNNING and job.locked_by == "w2"
+
+            assert await repo.mark_succeeded(stale.id, "w2") is True
+            assert (await repo.get_job(stale.id)).status == JobStatusEnum.SUCCEEDED
+
+    @pytest.mark.asyncio
+    async def test_recovers_stale_jobs_and_stranded_documents(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            await _add_document(session, "stranded", status=ProcessingStatusEnum.PROCESSING)
+            await _add_document(session, "done", status=ProcessingStatusEnum.COMPLETED)
+            await repo.enqueue("crashed", "u1", "c.pdf")
+            job = await repo.claim_next("dead-worker", 0)
+            await session.execute(update(DocumentJob).where(DocumentJob.id == job.id)
+                                  .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=10)))
+            await session.commit()
+
+            assert await repo.recover_stale_jobs(stale_after_seconds=60) == 1
+            assert (await repo.get_job(job.id)).status == JobStatusEnum.QUEUED
+
+            created = await repo.enqueue_stranded_documents()
+            assert [j.document_id for j in created] == ["stranded"]
+            # Idempotent while the job is outstanding
+            assert await repo.enqueue_stranded_documents() == []
+
+
+    @pytest.mark.asyncio
+    async def test_stale_job_on_last_attempt_fails_instead_of_requeueing(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            await _add_document(session, "poison", status=ProcessingStatusEnum.PROCESSING)
+            await repo.enqueue("poison", "u1", "p.pdf", max_attempts=1)
+            job = await repo.claim_next("dead-worker", 0)
+            await session.execute(update(DocumentJob).where(DocumentJob.id == job.id)
+                                  .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=10)))
+            await session.commit()
+
+            assert await repo.recover_stale_jobs(stale_after_seconds=60) == 0
+            job = await repo.get_job(job.id)
+            assert job.status == JobStatusEnum.FAILED and "stopped responding" in job.last_error
+            document = await session.get(Document, "poison")
+            await session.refresh(document)
+            assert document.processing_status == ProcessingStatusEnum.FAILED
+            # A failed document is not stranded, so startup recovery leaves it alone
+            assert await repo.enqueue_stranded_documents() == []
+
+    @pytest.mark.asyncio
+    async def test_concurrent_recovery_keeps_one_active_job_per_document(self, session_factory):
+        async with session_factory() as session:
+            for i in range(3):
+                await _add_document(session, f"s{i}")
+
+        async def recover():
+            async with session_factory() as session:
+                return await DocumentJobRepository(session).enqueue_stranded_documents()
+
+        results = await asyncio.gather(*(recover() for _ in range(3)))
+
+        assert sorted(job.document_id for jobs in results for job in jobs) == ["s0", "s1", "s2"]
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            assert (await repo.queue_stats())["jobs_by_status"]["queued"] == 3
+            existing = await repo.get_active_job_for_document("s0")
+            assert (await repo.enqueue("s0", "u1", "s0.pdf")).id == existing.id
+
+
+@pytest.mark.asyncio
+async def test_retried_processing_does_not_duplicate_citations(session_factory):
+    citations = [CitationSchema(page=1, text="Revenue 10"), CitationSchema(page=2, text="Net income 2")]
+
+    class FakeClaudeService:
+        async def process_pdf(self, pdf_data, filename):
+            document = ProcessedDocument(
+                metadata=DocumentMetadata(filename=filename, file_size=1, mime_type="application/pdf", user_id="u1"),
+                processing_status=ProcessingStatus.COMPLETED
+            )
+            return "processed", document, citations
+
+    async with session_factory() as session:
+        await _add_document(session, "d1")
+        repository = DocumentRepository(session)
+        service = DocumentService(repository, claude_service=FakeClaudeService())
+        add_citation = repository.add_citation
+        stored = 0
+
+        async def flaky_add_citation(*args, **kwargs):
+            nonlocal stored
+            if stored == 1:
+                stored += 1
+                raise RuntimeError("connection dropped")
+            stored += 1
+            return await add_citation(*args, **kwargs)
+
+        repository.add_citation = flaky_add_citation
+        with pytest.raises(RuntimeError):
+            await service.process_document("d1", b"%PDF-1.4", "d1.pdf")
+        await service.process_document("d1", b"%PDF-1.4", "d1.pdf")
+
+        assert sorted(c.text for c in await repository.get_document_citations("d1")) == ["Net income 2", "Revenue 10"]
+
+
+class TestDocumentJobQueue:
+    @pytest.mark.asyncio
+    async def test_worker_pool_bounds_concurrency_and_retries(self, session_factory):
+        async with session_factory() as session:
+            repo = DocumentJobRepository(session)
+            for i in range(5):
+                await _add_document(session, f"d{i}", user_id=f"u{i}")
+                await repo.enqueue(f"d{i}", f"u{i}", f"d{i}.pdf", max_attempts=2)
+
+        queue = DocumentJobQueue(session_factory=session_factory, workers=2, max_running_per_user=0,
+                                 retry_backoff_seconds=0, poll_interval=0.01)
+        running = 0
+        peak = 0
+        calls = []
+
+        async def fake_process(job, session, progress):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            calls.append(job.document_id)
+            await progress("analyzing", 0.5)
+            await asyncio.sleep(0.02)
+            running -= 1
+            if job.document_id == "d0" and job.attempts == 1:
+                raise RuntimeError("transient")
+
+        queue._process_job = fake_process
+        await queue.start()
+        try:
+            for _ in range(200):
+                stats = await queue.stats()
+                if stats["jobs_by_status"]["succeeded"] == 5:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await queue.stop()
+
+        assert stats["jobs_by_status"]["succeeded"] == 5
+        assert peak <= 2
+        assert calls.count("d0") == 2
+        async with session_factory() as session:
+            job = await DocumentJobRepository(session).get_latest_job_for_document("d0")
+            assert job.attempts == 2 and job.progress == 1.0
+
+    @pytest.mark.asyncio
+    async def test_maintenance_enqueues_documents_stranded_after_startup(self, session_factory):
+        queue = DocumentJobQueue(session_factory=session_factory, workers=1, stale_after_seconds=2,
+                                 poll_interval=0.01)
+        processed = []
+
+        async def fake_process(job, session, progress):
+            processed.append(job.document_id)
+
+        queue._process_job = fake_process
+        await queue.start()
+        try:
+            # As after an upload whose job insert failed
+            async with session_factory() as session:
+                await _add_document(session, "late")
+            for _ in range(150):
+                if processed:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await queue.stop()
+
+        assert processed == ["late"]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+import httpx
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import update
+
+from models.database_models import ClaudeFileCacheEntry
+from utils.file_cache import FileCacheManager, FileRejectedError
+from pdf_processing import claude_file_client
+
+
+PDF = b"%PDF-1.4\n\xff\xfe\x00binary"
+
+
+@pytest.fixture
+def cache(session_factory):
+    return FileCacheManager(session_factory, max_entries=2)
+
+
+@pytest.fixture
+def uploads(cache, monkeypatch):
+    """Route upload_pdf through the temp cache and count Files API posts."""
+    posts = []
+
+    async def fake_post(filename, payload, headers, max_retries):
+        posts.append(filename)
+        await asyncio.sleep(0.05)
+        return f"file_{len(posts)}"
+
+    monkeypatch.setattr(claude_file_client, "get_file_cache", lambda: cache)
+    monkeypatch.setattr(claude_file_client, "_post_with_retries", fake_post)
+    return posts
+
+
+class TestFileCacheManager:
+    def test_key_is_byte_level_sha256(self):
+        # The old text-decoded hash dropped undecodable bytes, so these collided
+        assert FileCacheManager.content_key(b"%PDF\xff") != FileCacheManager.content_key(b"%PDF\xfe")
+
+    @pytest.mark.asyncio
+    async def test_entries_persist_and_are_shared(self, cache):
+        await cache.cache_file_id(PDF, "file_abc")
+
+        restarted = FileCacheManager(cache.session_factory)
+        assert await restarted.get_file_id(PDF) == "file_abc"
+        assert (await restarted.get_cache_stats())["valid_entries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, cache):
+        for name in (b"a", b"b"):
+            await cache.cache_file_id(name, f"file_{name.decode()}")
+            time.sleep(0.01)
+        await cache.get_file_id(b"a")  # "b" is now least recently used
+        await cache.cache_file_id(b"c", "file_c")
+
+        assert await cache.get_file_id(b"b") is None
+        assert await cache.get_file_id(b"a") == "file_a"
+
+
+class TestUploadPdf:
+    @pytest.mark.asyncio
+    async def test_concurrent_uploads_of_same_bytes_post_once(self, uploads):
+        file_ids = await asyncio.gather(*(claude_file_client.upload_pdf("a.pdf", PDF) for _ in range(3)))
+
+        assert len(uploads) == 1
+        assert set(file_ids) == {"file_1"}
+
+    @pytest.mark.asyncio
+    async def test_rejected_content_is_negatively_cached(self, uploads, monkeypatch):
+        async def reject(filename, payload, headers, max_retries):
+            uploads.append(filename)
+            request = httpx.Request("POST", "https://example.invalid")
+            raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(422, request=request))
+
+        monkeypatch.setattr(claude_file_client, "_post_with_retries", reject)
+        with pytest.raises(httpx.HTTPStatusError):
+            await claude_file_client.upload_pdf("bad.pdf", PDF)
+        with pytest.raises(FileRejectedError):
+            await claude_file_client.upload_pdf("bad.pdf", PDF)
+        assert len(uploads) == 1
+
+    @pytest.mark.asyncio
+    async def test_plain_bad_request_is_not_negatively_cached(self, uploads, monkeypatch):
+        async def bad_request(filename, payload, headers, max_retries):
+            uploads.append(filename)
+            request = httpx.Request("POST", "https://example.invalid")
+            raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request))
+
+        monkeypatch.setattr(claude_file_client, "_post_with_retries", bad_request)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await claude_file_client.upload_pdf("a.pdf", PDF)
+        assert len(uploads) == 2
+
+    @pytest.mark.asyncio
+    async def test_dead_cached_file_id_is_replaced(self, cache, uploads, monkeypatch):
+        await cache.cache_file_id(PDF, "file_deleted_upstream")
+        # Pretend the entry was last validated long ago
+        async with cache.session_factory() as session:
+            await session.execute(update(ClaudeFileCacheEntry).values(validated_at=0))
+            await session.commit()
+
+        async def not_live(file_id, headers):
+            return False
+
+        monkeypatch.setattr(claude_file_client, "_file_is_live", not_live)
+        assert await claude_file_client.upload_pdf("a.pdf", PDF) == "file_1"
+        assert await cache.get_file_id(PDF) == "file_1"
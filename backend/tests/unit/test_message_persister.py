@@ -0,0 +1,100 @@
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from models.database_models import Conversation, Message
+from repositories.conversation_repository import ConversationRepository
+from services.message_persister import MessageContentPersister
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def writes():
+    return []
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def persister(writes, clock):
+    async def save(content):
+        writes.append(content)
+    return MessageContentPersister(save, min_interval_seconds=1.0, min_bytes=1000, clock=clock)
+
+
+class TestMessageContentPersister:
+    @pytest.mark.asyncio
+    async def test_coalesces_fast_stream_into_few_writes(self, persister, writes, clock):
+        text = ""
+        for _ in range(100):  # 5,000 chars in 50-char content_updates
+            text += "x" * 50
+            clock.now += 0.01
+            await persister.submit(text)
+        await persister.flush("complete")
+
+        assert len(writes) == 5  # one per 1,000 new bytes
+        assert writes[-1] == text
+        assert persister.stats()["coalesced"] == 100 - 5
+
+    @pytest.mark.asyncio
+    async def test_slow_stream_flushes_on_interval(self, persister, writes, clock):
+        clock.now = 0.4
+        assert await persister.submit("a") is False
+        clock.now = 1.2
+        assert await persister.submit("ab") is False
+        clock.now = 1.5
+        assert await persister.submit("abc") is True
+
+        assert writes == ["abc"]
+        assert persister.max_lag_seconds == pytest.approx(1.1)
+
+    @pytest.mark.asyncio
+    async def test_interval_counts_from_first_pending_write_not_last_flush(self, persister, writes, clock):
+        await persister.submit("a")
+        await persister.flush("tool_start")
+        clock.now = 30.0  # A long tool call; nothing pending meanwhile
+        assert await persister.submit("ab") is False
+        clock.now = 31.0
+        assert await persister.submit("abc") is True
+        assert writes == ["a", "abc"]
+
+    @pytest.mark.asyncio
+    async def test_flush_without_pending_content_is_a_no_op(self, persister, writes):
+        assert await persister.flush("complete") is False
+        await persister.submit("partial")
+        assert await persister.flush("tool_start") is True
+        assert await persister.flush("complete") is False
+        assert writes == ["partial"]
+
+
+@pytest.mark.asyncio
+async def test_update_message_content_writes_single_column(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'messages.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        session.add(Conversation(id="c1", title="t", user_id="u1"))
+        message = Message(id="m1", conversation_id="c1", role="assistant", content="Processing your request...")
+        session.add(message)
+        await session.commit()
+
+        repository = ConversationRepository(session)
+        assert await repository.update_message_content("m1", "streamed text") is True
+        assert await repository.update_message_content("missing", "x") is False
+        assert message.content == "streamed text"
+    await engine.dispose()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import settings
+from pdf_processing import claude_file_client
+from pdf_processing.api_service import ClaudeService
+from models.document import DocumentContentType, ProcessingStatus
+
+ROUND_TRIP = 0.2
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = ClaudeService(api_key="test-key")
+    calls = {}
+
+    async def fake_upload(filename, data, max_retries=3):
+        return "file_123"
+
+    async def fake_classify(file_id, filename, content_sha256=None):
+        calls["classify"] = time.monotonic()
+        await asyncio.sleep(ROUND_TRIP)
+        return DocumentContentType.BALANCE_SHEET, ["FY 2023"]
+
+    async def fake_extract(file_id, filename, document_type, content_sha256=None):
+        calls["extract"] = time.monotonic()
+        calls["extract_type"] = document_type
+        await asyncio.sleep(ROUND_TRIP)
+        return {"financial_data": {}}, []
+
+    monkeypatch.setattr(claude_file_client, "upload_pdf", fake_upload)
+    monkeypatch.setattr(service, "_analyze_document_type_with_file_id", fake_classify)
+    monkeypatch.setattr(service, "_extract_financial_data_with_citations_by_file_id", fake_extract)
+    service.calls = calls
+    return service
+
+
+@pytest.mark.asyncio
+async def test_pipelined_mode_overlaps_classification_and_extraction(service, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_INGEST_MODE", "pipelined")
+
+    started = time.monotonic()
+    _, document, _ = await service.process_pdf(b"%PDF-1.4", "a.pdf")
+    elapsed = time.monotonic() - started
+
+    assert document.processing_status == ProcessingStatus.COMPLETED
+    assert document.content_type == DocumentContentType.BALANCE_SHEET
+    assert document.extracted_data["claude_file_id"] == "file_123"
+    assert service.calls["extract_type"] is None
+    assert elapsed < 2 * ROUND_TRIP * 0.9
+
+
+@pytest.mark.asyncio
+async def test_serial_mode_passes_classified_type_to_extraction(service, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_INGEST_MODE", "serial")
+
+    await service.process_pdf(b"%PDF-1.4", "a.pdf")
+
+    assert service.calls["extract_type"] == DocumentContentType.BALANCE_SHEET
+    assert service.calls["extract"] - service.calls["classify"] >= ROUND_TRIP * 0.9
+
+
+@pytest.mark.asyncio
+async def test_pipelined_failure_is_reported_as_failed_document(service, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_INGEST_MODE", "pipelined")
+
+    extraction_cancelled = asyncio.Event()
+
+    async def broken_classify(file_id, filename, content_sha256=None):
+        raise RuntimeError("classification exploded")
+
+    async def slow_extract(file_id, filename, document_type, content_sha256=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            extraction_cancelled.set()
+            raise
+
+    monkeypatch.setattr(service, "_analyze_document_type_with_file_id", broken_classify)
+    monkeypatch.setattr(service, "_extract_financial_data_with_citations_by_file_id", slow_extract)
+    note, document, _ = await service.process_pdf(b"%PDF-1.4", "a.pdf")
+
+    assert document.processing_status == ProcessingStatus.FAILED
+    assert "classification exploded" in note
+    assert extraction_cancelled.is_set()
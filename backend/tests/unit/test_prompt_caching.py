@@ -0,0 +1,121 @@
+import copy
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.prompt_caching import apply_cache_breakpoints, count_cache_breakpoints, min_cacheable_tokens, MAX_CACHE_BREAKPOINTS
+from utils.token_utils import TokenEstimator
+
+
+TOOLS = [
+    {"name": "generate_graph_data", "description": "chart", "input_schema": {"type": "object"}},
+    {"name": "generate_table_data", "description": "table", "input_schema": {"type": "object"}},
+]
+
+
+def _first_turn():
+    return {
+        "model": "claude-test",
+        "system": "You are a financial analyst.",
+        "tools": TOOLS,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "document", "source": {"type": "file", "file_id": "file_1"}},
+                {"type": "text", "text": "Chart the revenue"},
+            ],
+        }],
+    }
+
+
+class TestApplyCacheBreakpoints:
+    def test_marks_tools_system_and_document(self):
+        params = apply_cache_breakpoints(_first_turn())
+
+        assert "cache_control" not in params["tools"][0]
+        assert params["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert params["system"] == [{
+            "type": "text", "text": "You are a financial analyst.", "cache_control": {"type": "ephemeral"}
+        }]
+        assert params["messages"][0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+        # Single-message request: the question itself is not a stable prefix
+        assert "cache_control" not in params["messages"][0]["content"][1]
+
+    def test_does_not_mutate_shared_inputs(self):
+        original = _first_turn()
+        snapshot = copy.deepcopy(original)
+        apply_cache_breakpoints(original)
+        assert original == snapshot
+        assert all("cache_control" not in tool for tool in TOOLS)
+
+    def test_later_turns_cache_conversation_prefix(self):
+        params = _first_turn()
+        params["messages"] = params["messages"] + [
+            {"role": "assistant", "content": [{"type": "tool_use", "id": "t1", "name": "generate_graph_data", "input": {}}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "{}"}]},
+        ]
+        cached = apply_cache_breakpoints(params)
+
+        assert cached["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert count_cache_breakpoints(cached) == MAX_CACHE_BREAKPOINTS
+
+    def test_respects_existing_breakpoints(self):
+        params = _first_turn()
+        params["system"] = [
+            {"type": "text", "text": "a", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "b", "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": "c", "cache_control": {"type": "ephemeral"}},
+        ]
+        cached = apply_cache_breakpoints(params)
+
+        assert count_cache_breakpoints(cached) == MAX_CACHE_BREAKPOINTS
+        assert cached["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in cached["messages"][0]["content"][0]
+
+    def test_plain_text_request(self):
+        params = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        assert apply_cache_breakpoints(params) == params
+
+
+def test_min_cacheable_tokens_by_model():
+    assert min_cacheable_tokens("claude-3-5-sonnet-20241022") == 1024
+    assert min_cacheable_tokens("claude-3-5-haiku-20241022") == 2048
+    assert min_cacheable_tokens(None) == 1024
+
+
+@pytest.mark.parametrize("content, cache_prefix, expect_breakpoints", [
+    (_first_turn()["messages"][0]["content"], True, True),   # Document block: ~3k tokens
+    (_first_turn()["messages"][0]["content"], False, False),  # One-off caller opted out
+    ("Chart the revenue", True, False),                     # Below the minimum cacheable prefix
+])
+@pytest.mark.asyncio
+async def test_claude_call_adds_breakpoints_only_when_worthwhile(content, cache_prefix, expect_breakpoints, tmp_path):
+    from pdf_processing.api_service import ClaudeService
+    from utils.claude_bucket import SharedRateLimiter
+
+    estimator = TokenEstimator()
+    estimator._encoding_unavailable = True
+    service = ClaudeService(api_key="test-key")
+    service.client = MagicMock()
+    response = MagicMock()
+    response.response_headers = None
+    response.usage = SimpleNamespace(input_tokens=500)
+    service.client.messages.create = AsyncMock(return_value=response)
+
+    with patch("settings.TOKEN_COUNT_SAMPLE_RATE", 0.0), \
+            patch("settings.PROMPT_CACHING_ENABLED", True), \
+            patch("pdf_processing.api_service.token_estimator", estimator), \
+            patch("utils.claude_bucket._limiter", SharedRateLimiter(str(tmp_path / "ratelimit.sqlite3"))):
+        await service._claude_call(
+            model="claude-3-5-sonnet-20241022",
+            system="You are a financial analyst.",
+            messages=[{"role": "user", "content": content}],
+            max_tokens=10,
+            cache_prefix=cache_prefix,
+        )
+
+    sent = service.client.messages.create.await_args.kwargs
+    assert (count_cache_breakpoints(sent) > 0) == expect_breakpoints
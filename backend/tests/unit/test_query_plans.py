@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.future import select
+
+from models.database_models import (
+    AnalysisBlock, Citation, Conversation, Document, Message, MessageCitation, User
+)
+from repositories.analysis_repository import AnalysisRepository
+from repositories.conversation_repository import ConversationRepository
+from repositories.document_repository import DocumentRepository
+from migrate_add_indexes import create_missing_indexes
+
+# "SCAN <table>" without an index is a full table scan; "SEARCH ... USING INDEX" is a lookup
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@pytest.fixture
+async def session(session_factory):
+    async with session_factory() as session:
+        session.add(User(id="u1", username="u1", email="u1@example.com", hashed_password="x"))
+        session.add(Document(id="d1", filename="q3.pdf", file_path="/tmp/q3.pdf", file_size=1,
+                             mime_type="application/pdf", user_id="u1"))
+        session.add(Conversation(id="c1", title="Q3", user_id="u1"))
+        session.add(Message(id="m1", conversation_id="c1", role="user", content="hi"))
+        session.add(Citation(id="cit1", document_id="d1", page=1, text="Revenue"))
+        session.add(MessageCitation(message_id="m1", citation_id="cit1"))
+        session.add(AnalysisBlock(message_id="m1", block_type="chart", content={}))
+        await session.commit()
+        session.expunge_all()
+        yield session
+
+
+async def _plans(engine, run):
+    """Run ``run()`` and return (statement, EXPLAIN QUERY PLAN details) for each SELECT it issued."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await run()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    plans = []
+    async with engine.connect() as conn:
+        for statement, parameters in captured:
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters))
+            plans.append((statement, [row[-1] for row in result.all()]))
+    assert plans, "no queries captured"
+    return plans
+
+
+def _assert_indexed(plans, ordered: bool = False):
+    for statement, details in plans:
+        scans = [detail for detail in details if _FULL_SCAN.match(detail)]
+        assert not scans, f"full table scan {scans} in:\n{statement}\nplan: {details}"
+        if ordered:
+            assert not any("TEMP B-TREE" in detail for detail in details), \
+                f"ORDER BY not served by an index in:\n{statement}\nplan: {details}"
+
+
+class TestQueryPlans:
+    @pytest.mark.asyncio
+    async def test_conversation_and_document_listings_use_composite_indexes(self, engine, session):
+        conversations = ConversationRepository(session)
+        documents = DocumentRepository(session)
+
+        _assert_indexed(await _plans(engine, lambda: conversations.list_conversations("u1")), ordered=True)
+        _assert_indexed(await _plans(engine, lambda: documents.list_documents("u1")), ordered=True)
+
+    @pytest.mark.asyncio
+    async def test_message_page_uses_conversation_index(self, engine, session):
+        repository = ConversationRepository(session)
+
+        plans = await _plans(engine, lambda: repository.get_conversation_messages("c1"))
+        message_plans = [plan for plan in plans if "FROM messages" in plan[0]]
+        _assert_indexed(message_plans, ordered=True)
+        _assert_indexed(plans)
+
+    @pytest.mark.asyncio
+    async def test_history_citation_and_block_lookups_are_indexed(self, engine, session):
+        conversations = ConversationRepository(session)
+        documents = DocumentRepository(session)
+
+        _assert_indexed(await _plans(engine, lambda: conversations.get_conversation_history("c1")))
+        _assert_indexed(await _plans(engine, lambda: conversations.get_message_analysis_blocks("m1")))
+        _assert_indexed(await _plans(engine, lambda: documents.get_document_citations("d1")))
+        _assert_indexed(await _plans(
+            engine, lambda: session.execute(select(MessageCitation).where(MessageCitation.citation_id == "cit1"))
+        ))
+
+    @pytest.mark.asyncio
+    async def test_analysis_document_lookups_are_indexed(self, engine, session):
+        repository = AnalysisRepository(session)
+
+        _assert_indexed(await _plans(engine, lambda: repository.is_document_referenced("d1")))
+        _assert_indexed(await _plans(engine, lambda: repository.count_document_analyses("d1")))
+
+    @pytest.mark.asyncio
+    async def test_migration_adds_missing_indexes_once(self, engine):
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP INDEX ix_messages_conversation_created"))
+            await conn.execute(text("DROP INDEX ix_citations_document_id"))
+
+        async with engine.begin() as conn:
+            assert await conn.run_sync(create_missing_indexes, True) == [
+                "ix_citations_document_id", "ix_messages_conversation_created"
+            ]
+            assert await conn.run_sync(create_missing_indexes) == [
+                "ix_citations_document_id", "ix_messages_conversation_created"
+            ]
+            names = await conn.run_sync(lambda sync: {i["name"] for i in inspect(sync).get_indexes("messages")})
+            assert await conn.run_sync(create_missing_indexes) == []
+
+        assert "ix_messages_conversation_created" in names
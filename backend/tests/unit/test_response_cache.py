@@ -0,0 +1,84 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.response_cache import ResponseCache, prompt_hash
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=60, max_entries=3)
+
+
+class TestResponseCache:
+    @pytest.mark.asyncio
+    async def test_round_trip_is_shared_between_instances(self, cache, tmp_path):
+        key = ResponseCache.make_key("sha", "model-a", prompt_hash("prompt"))
+        assert await cache.get(key) is None
+
+        await cache.set(key, {"document_type": "balance_sheet", "periods": ["Q1 2024"]}, "document_type", "p1", "model-a")
+
+        other_worker = ResponseCache(cache.db_path)
+        assert await other_worker.get(key) == {"document_type": "balance_sheet", "periods": ["Q1 2024"]}
+        assert cache.stats()["misses"] == 1
+        assert other_worker.stats()["hits"] == 1
+
+    def test_key_depends_on_every_component(self):
+        base = ResponseCache.make_key("sha", "model-a", "prompt")
+        assert base != ResponseCache.make_key("sha2", "model-a", "prompt")
+        assert base != ResponseCache.make_key("sha", "model-b", "prompt")
+        assert base != ResponseCache.make_key("sha", "model-a", "prompt2")
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_are_not_returned(self, cache):
+        cache.ttl_seconds = 0
+        await cache.set("k", {"v": 1}, "document_type", "p1", "m")
+        time.sleep(0.01)
+        assert await cache.get("k") is None
+        assert cache.stats()["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self, cache):
+        for key in ("a", "b", "c"):
+            await cache.set(key, {"v": key}, "document_type", "p1", "m")
+            time.sleep(0.01)
+        await cache.get("a")  # "b" is now least recently used
+        await cache.set("d", {"v": "d"}, "document_type", "p1", "m")
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == {"v": "a"}
+        assert cache.stats()["entries"] == 3
+
+    @pytest.mark.asyncio
+    async def test_prompt_change_invalidates_entries(self, cache):
+        await cache.set("old", {"v": 1}, "document_type", "hash-v1", "m")
+        await cache.set("other", {"v": 2}, "financial_extraction", "hash-x", "m")
+
+        removed = cache.sync_prompt_versions({"document_type": "hash-v2", "financial_extraction": "hash-x"})
+
+        assert removed == 1
+        assert await cache.get("old") is None
+        assert await cache.get("other") == {"v": 2}
+
+
+@pytest.mark.asyncio
+async def test_document_type_analysis_is_served_from_cache(tmp_path, monkeypatch):
+    from pdf_processing.api_service import ClaudeService
+    from models.document import DocumentContentType
+
+    service = ClaudeService(api_key="test-key")
+    service.response_cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    response = SimpleNamespace(content=[SimpleNamespace(text='{"document_type": "balance_sheet", "periods": ["FY 2023"]}')])
+    claude_call = AsyncMock(return_value=response)
+    monkeypatch.setattr(service, "_claude_call", claude_call)
+
+    first = await service._analyze_document_type_with_file_id("file_1", "a.pdf", content_sha256="abc")
+    # Same bytes re-uploaded under a new file_id
+    second = await service._analyze_document_type_with_file_id("file_2", "b.pdf", content_sha256="abc")
+
+    assert first == second == (DocumentContentType.BALANCE_SHEET, ["FY 2023"])
+    claude_call.assert_awaited_once()
@@ -0,0 +1,132 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import delete, text, update
+
+from utils.database import Base
+from utils.search_index import build_match_query, highlight
+from models.database_models import Conversation, Message, User
+from repositories.conversation_repository import ConversationRepository
+from migrate_search_index import backfill_search_index
+
+
+@pytest.fixture
+async def session(session_factory):
+    async with session_factory() as session:
+        session.add_all([
+            User(id="u1", username="u1", email="u1@example.com", hashed_password="x"),
+            User(id="u2", username="u2", email="u2@example.com", hashed_password="x"),
+            Conversation(id="c1", title="Q3 revenue review", user_id="u1"),
+            Conversation(id="c2", title="Balance sheet", user_id="u1"),
+            Conversation(id="c3", title="Other user's revenue", user_id="u2"),
+        ])
+        start = datetime(2024, 1, 1)
+        for i, (conversation_id, content) in enumerate([
+            ("c1", "Revenue grew 12% on strong <b>subscription</b> revenue."),
+            ("c2", "Total liabilities fell while revenues were flat."),
+            ("c2", "Cash and equivalents rose."),
+            ("c3", "Revenue declined."),
+        ]):
+            session.add(Message(id=f"m{i}", conversation_id=conversation_id, role="assistant",
+                                content=content, created_at=start + timedelta(minutes=i)))
+        await session.commit()
+        yield session
+
+
+def test_match_query_quotes_user_input():
+    assert build_match_query("net  revenue") == '"net" "revenue"*'
+    assert build_match_query('revenue" OR NEAR(') == '"revenue" "OR" "NEAR"*'
+    assert build_match_query("  %*  ") is None
+    assert highlight("a < b \x02grew\x03") == "a &lt; b <mark>grew</mark>"
+
+
+class TestSearchIndex:
+    @pytest.mark.asyncio
+    async def test_search_is_ranked_scoped_and_highlighted(self, session):
+        repository = ConversationRepository(session)
+
+        hits = await repository.search_messages("u1", "revenue")
+        assert [hit["message_id"] for hit in hits] == ["m0", "m1"]  # Stemming matches "revenues"
+        assert "<mark>Revenue</mark>" in hits[0]["snippet"]
+        assert "&lt;b&gt;subscription&lt;/b&gt;" in hits[0]["snippet"]
+        assert hits[0]["conversation_title"] == "Q3 revenue review"
+        assert isinstance(hits[0]["created_at"], datetime)
+
+        conversations = await repository.search_conversations("u1", "revenue")
+        assert [conversation.id for conversation in conversations] == ["c1", "c2"]
+        assert [c.id for c in await repository.search_conversations("u1", "bal")] == ["c2"]  # Prefix match
+        assert await repository.search_messages("u1", "!!!") == []
+        assert await repository.search_messages("u1", "revenue", limit=1, offset=1) == [hits[1]]
+
+    @pytest.mark.asyncio
+    async def test_index_follows_updates_and_deletes(self, session):
+        repository = ConversationRepository(session)
+
+        await repository.update_message_content("m2", "Cash flow from operations turned positive.")
+        assert [hit["message_id"] for hit in await repository.search_messages("u1", "operations")] == ["m2"]
+        assert await repository.search_messages("u1", "equivalents") == []
+
+        await session.execute(update(Conversation).where(Conversation.id == "c2").values(title="Liquidity"))
+        await session.execute(delete(Message).where(Message.id == "m0"))
+        await session.commit()
+        assert [c.id for c in await repository.search_conversations("u1", "liquidity")] == ["c2"]
+        assert [hit["message_id"] for hit in await repository.search_messages("u1", "revenue")] == ["m1"]
+
+    @pytest.mark.asyncio
+    async def test_backfill_rebuilds_out_of_sync_index(self, engine, session):
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM message_search"))
+        repository = ConversationRepository(session)
+        assert await repository.search_messages("u1", "revenue") == []
+
+        async with engine.begin() as conn:
+            report = await conn.run_sync(backfill_search_index)
+        assert report == {"messages": 4, "conversations": 3}
+        assert len(await repository.search_messages("u1", "revenue")) == 2
+
+    @pytest.mark.asyncio
+    async def test_index_is_keyed_by_id_not_rowid(self, engine, session):
+        # As after a VACUUM renumbered the rowids of messages
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM message_search"))
+            await conn.execute(text(
+                "INSERT INTO message_search(rowid, id, content) SELECT 4 - rowid, id, content FROM messages"
+            ))
+        repository = ConversationRepository(session)
+        assert [hit["message_id"] for hit in await repository.search_messages("u1", "revenue")] == ["m0", "m1"]
+
+        await repository.update_message_content("m2", "Cash flow from operations turned positive.")
+        session.add(Message(id="m4", conversation_id="c1", role="user", content="Equivalents again?"))
+        await session.commit()
+        assert [hit["message_id"] for hit in await repository.search_messages("u1", "operations")] == ["m2"]
+        assert [hit["message_id"] for hit in await repository.search_messages("u1", "equivalents")] == ["m4"]
+
+    @pytest.mark.asyncio
+    async def test_rowid_linked_index_is_replaced(self, engine, session):
+        async with engine.begin() as conn:
+            for statement in (
+                "DROP TRIGGER messages_search_ai", "DROP TRIGGER messages_search_ad",
+                "DROP TRIGGER messages_search_au", "DROP TABLE message_search",
+                "CREATE VIRTUAL TABLE message_search USING fts5(content, content='messages', content_rowid='rowid')",
+            ):
+                await conn.execute(text(statement))
+            await conn.run_sync(Base.metadata.create_all)
+
+        hits = await ConversationRepository(session).search_messages("u1", "cash")
+        assert [hit["message_id"] for hit in hits] == ["m2"]
+
+    @pytest.mark.asyncio
+    async def test_first_install_indexes_existing_rows(self, engine, session):
+        async with engine.begin() as conn:
+            for statement in (
+                "DROP TRIGGER messages_search_ai", "DROP TRIGGER messages_search_ad",
+                "DROP TRIGGER messages_search_au", "DROP TABLE message_search"
+            ):
+                await conn.execute(text(statement))
+            await conn.run_sync(Base.metadata.create_all)
+
+        hits = await ConversationRepository(session).search_messages("u1", "cash")
+        assert [hit["message_id"] for hit in hits] == ["m2"]
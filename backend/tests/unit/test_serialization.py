@@ -0,0 +1,68 @@
+import json
+import sys
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from fastapi.encoders import jsonable_encoder
+
+from models.message import Message, MessageRole
+from services.analysis_service import ensure_json_serializable
+from utils import serialization
+from utils.serialization import ModelEncoder, dumps_text, negotiate_ws_encoding
+
+
+def make_message(index: int) -> Message:
+    return Message(
+        id=uuid.uuid4(),
+        session_id="c1",
+        timestamp=datetime(2024, 3, 1, 12, 0, index),
+        role=MessageRole.ASSISTANT,
+        content="Revenue grew 12%",
+        analysis_blocks=[{"id": "b1", "block_type": "chart", "content": {"data": [{"x": 1}]}, "created_at": datetime(2024, 3, 1)}]
+    )
+
+
+def test_to_jsonable_converts_models_datetimes_and_unknown_types():
+    tree = {
+        "message": make_message(1),
+        "when": datetime(2024, 3, 1, 9, 30),
+        "amount": Decimal("1.50"),
+        "periods": ("2023", "2024"),
+        "nested": [{"ok": True, "n": None}]
+    }
+
+    result = ensure_json_serializable(tree)
+
+    assert result["message"]["sessionId"] == "c1"
+    assert result["message"]["analysisBlocks"][0]["created_at"] == "2024-03-01T00:00:00"
+    assert result["when"] == "2024-03-01T09:30:00"
+    assert result["amount"] == "1.50"
+    assert result["periods"] == ["2023", "2024"]
+    assert result["nested"] == [{"ok": True, "n": None}]
+    assert json.loads(dumps_text(tree)) == result
+
+
+def test_model_encoder_matches_fastapi_response_model_output():
+    messages = [make_message(i) for i in range(3)]
+    encoder = ModelEncoder(List[Message])
+
+    assert json.loads(encoder.encode(messages)) == jsonable_encoder(messages, by_alias=True)
+    response = encoder.response(messages)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body)[0]["analysisBlocks"][0]["block_type"] == "chart"
+
+
+def test_ws_encoding_negotiation(monkeypatch):
+    assert negotiate_ws_encoding(None) == "json"
+    assert negotiate_ws_encoding("bogus") == "json"
+    if serialization.MSGPACK_AVAILABLE:
+        assert negotiate_ws_encoding("msgpack") == "msgpack"
+        frame = {"type": "text_delta", "seq": 3, "text": "héllo"}
+        assert serialization.unpackb(serialization.packb(frame)) == frame
+
+    monkeypatch.setattr(serialization, "MSGPACK_AVAILABLE", False)
+    assert negotiate_ws_encoding("msgpack") == "json"
@@ -0,0 +1,45 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from pdf_processing.api_service import ClaudeService
+from utils.shingle_index import ShingleIndex
+
+ANSWER = (
+    "Revenue grew 12% year over year to $4.2 billion, driven by subscription sales. "
+    "Operating margin expanded to 18% as marketing spend fell. "
+    "Free cash flow reached $610 million, and the company repurchased $200 million of stock."
+)
+
+
+def test_fragments_index_like_whole_text():
+    whole = ShingleIndex.from_text(ANSWER)
+    streamed = ShingleIndex()
+    for start in range(0, len(ANSWER), 7):  # Cuts words and numbers mid-token
+        streamed.add(ANSWER[start:start + 7])
+    streamed.flush()
+
+    assert streamed.words == whole.words
+    assert streamed.shingles == whole.shingles
+    assert streamed.word_count == whole.word_count
+
+
+def test_detects_repeats_and_near_duplicates():
+    index = ShingleIndex.from_text(ANSWER)
+
+    assert not index.is_substantially_new("")
+    assert not index.is_substantially_new("operating margin expanded to 18%")
+    assert not index.is_substantially_new(ANSWER.upper().replace(".", "\n"))  # Reformatted repeat
+    assert index.is_substantially_new(
+        "Looking ahead, management guided to slower growth in Europe because of currency headwinds."
+    )
+
+
+def test_claude_service_accepts_text_or_index():
+    service = ClaudeService(api_key="test-key")
+    index = ShingleIndex.from_text(ANSWER)
+
+    assert service._is_substantially_new_content("Anything new at all", "")
+    assert not service._is_substantially_new_content(ANSWER, ANSWER)
+    assert not service._is_substantially_new_content(ANSWER, index)
+    assert service._is_substantially_new_content("Debt covenants were renegotiated with lenders in March.", index)
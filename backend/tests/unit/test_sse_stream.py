@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.routes import websocket as ws_routes
+from services.sse_stream import HEARTBEAT, SSEStream, parse_event_id
+from services.stream_protocol import PROTOCOL_DELTA
+
+
+def parse_chunks(chunks):
+    """(event id, payload) for every data event in the chunks."""
+    events = []
+    for chunk in chunks:
+        for block in chunk.split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if "data" in fields:
+                events.append((fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream.events()]
+
+
+def test_parse_event_id():
+    assert parse_event_id("3f2a-11:42") == ("3f2a-11", 42)
+    assert parse_event_id("no-seq") is None
+    assert parse_event_id("m1:x") is None
+
+
+@pytest.mark.asyncio
+async def test_burst_is_coalesced_into_one_chunk_with_event_ids():
+    stream = SSEStream("sse", flush_interval_seconds=0.01)
+    await stream.put({"type": "message_start", "seq": 1, "message_id": "m1"})
+    for seq, text in ((2, "Reve"), (3, "nue "), (4, "grew")):
+        await stream.put({"type": "text_delta", "seq": seq, "text": text, "message_id": "m1"})
+    stream.close()
+
+    chunks = await collect(stream)
+
+    assert len(chunks) == 1
+    assert parse_chunks(chunks) == [
+        ("m1:1", {"type": "message_start", "seq": 1, "message_id": "m1"}),
+        ("m1:4", {"type": "text_delta", "seq": 4, "seq_start": 2, "text": "Revenue grew", "message_id": "m1"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_idle_stream_sends_heartbeats_and_stops_when_client_leaves():
+    checks = []
+
+    async def is_disconnected():
+        checks.append(True)
+        return len(checks) > 2
+
+    stream = SSEStream("sse", is_disconnected=is_disconnected, heartbeat_seconds=0.01)
+
+    assert await asyncio.wait_for(collect(stream), timeout=1) == [HEARTBEAT, HEARTBEAT]
+
+
+class StreamingConversationService:
+    async def process_user_message_streaming(self, emit_callback, **kwargs):
+        text = ""
+        for word in ("Revenue ", "grew ", "12%"):
+            text += word
+            await emit_callback({"type": "text_delta", "text": word, "accumulated_text": text})
+            await asyncio.sleep(0.02)
+        await emit_callback({"type": "message_complete"})
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_shares_websocket_pipeline_and_resumes(monkeypatch):
+    monkeypatch.setattr(ws_routes, "streaming_sessions", {})
+    monkeypatch.setattr(ws_routes.manager, "outboxes", {})
+    first = SSEStream("sse-1", flush_interval_seconds=0)
+    ws_routes.manager.attach(first.client_id, first)
+
+    task = asyncio.create_task(ws_routes.handle_streaming_message(
+        conversation_service=StreamingConversationService(), conversation_id="c1", user_message="hi",
+        options={}, client_id=first.client_id, protocol_version=PROTOCOL_DELTA
+    ))
+    task.add_done_callback(lambda _: first.close())
+    events = parse_chunks(await collect(first))
+    await task
+
+    message_id = events[0][1]["message_id"]
+    assert [payload["type"] for _, payload in events] == ["message_start", "text_delta", "text_delta", "text_delta", "snapshot", "message_complete"]
+    assert all(event_id == f"{message_id}:{payload['seq']}" for event_id, payload in events)
+
+    # Reconnect with Last-Event-ID of the second event
+    resumed = SSEStream("sse-2", flush_interval_seconds=0)
+    ws_routes.manager.attach(resumed.client_id, resumed)
+    last_message_id, last_seq = parse_event_id(events[1][0])
+    await ws_routes.handle_resume("c1", last_message_id, last_seq, resumed.client_id)
+    ws_routes.notify_when_finished(last_message_id, resumed.client_id, resumed.close)
+    replayed = parse_chunks(await asyncio.wait_for(collect(resumed), timeout=1))
+
+    assert replayed[0][1]["type"] == "resumed"
+    assert "".join(payload["text"] for _, payload in replayed if payload["type"] == "text_delta") == "grew 12%"
+    assert replayed[-1] == events[-1]
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.storage import LocalStorageService, FileTooLargeError, iter_bytes
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    return LocalStorageService()
+
+
+PAYLOAD = b"%PDF-1.4\n" + os.urandom(300_000)
+
+
+class TestStreamingStorage:
+    @pytest.mark.asyncio
+    async def test_save_stream_hashes_while_writing(self, storage):
+        stored = await storage.save_stream(iter_bytes(PAYLOAD, chunk_size=64 * 1024), "doc.pdf", "application/pdf")
+
+        assert stored.size == len(PAYLOAD)
+        assert stored.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+        assert await stored.read() == PAYLOAD
+        assert not os.path.exists(stored.path + ".part")
+
+    @pytest.mark.asyncio
+    async def test_size_limit_stops_stream_early(self, storage):
+        consumed = []
+
+        async def chunks():
+            for chunk_no in range(100):
+                consumed.append(chunk_no)
+                yield b"x" * 1024
+
+        with pytest.raises(FileTooLargeError):
+            await storage.save_stream(chunks(), "big.pdf", "application/pdf", max_size_bytes=10 * 1024)
+
+        assert len(consumed) == 11  # stopped at the first chunk over the limit
+        assert os.listdir(storage.upload_dir) == []
+
+    @pytest.mark.asyncio
+    async def test_describe_and_open_existing_file(self, storage):
+        await storage.save_file(PAYLOAD, "legacy.pdf", "application/pdf")
+
+        stored = await storage.describe_file("legacy.pdf")
+        assert stored.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+        async with stored.open() as fh:
+            assert fh.read(8) == PAYLOAD[:8]
+        assert await storage.describe_file("missing.pdf") is None
+
+
+@pytest.mark.asyncio
+async def test_upload_pdf_uses_handle_hash_for_cache(storage, session_factory, monkeypatch):
+    from utils.file_cache import FileCacheManager
+    from pdf_processing import claude_file_client
+
+    cache = FileCacheManager(session_factory)
+    monkeypatch.setattr(claude_file_client, "get_file_cache", lambda: cache)
+
+    stored = await storage.save_stream(iter_bytes(PAYLOAD), "cached.pdf", "application/pdf")
+    await cache.cache_file_id(None, "file_cached_123", content_sha256=stored.sha256)
+
+    assert await claude_file_client.upload_pdf("cached.pdf", stored) == "file_cached_123"
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.routes import websocket as ws_routes
+from pdf_processing import api_service
+from pdf_processing.api_service import ClaudeService
+from services.stream_protocol import PROTOCOL_DELTA
+
+
+class EndlessStream:
+    """Stands in for AsyncMessageStreamManager: emits text deltas until it is closed."""
+
+    def __init__(self):
+        self.output_reservation = 4000
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(id="msg_1", usage=None))
+        while True:
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(type="content_block_delta", index=0, delta=SimpleNamespace(type="text_delta", text="word "))
+            yield SimpleNamespace(type="message_delta", delta=SimpleNamespace(stop_reason=None), usage=SimpleNamespace(output_tokens=20))
+
+
+@pytest.mark.asyncio
+async def test_cancelling_closes_claude_stream_and_releases_unused_reservation(monkeypatch):
+    released = []
+
+    async def release(output_tokens, reserved_at=None):
+        released.append(output_tokens)
+
+    monkeypatch.setattr(api_service.ClaudeBucket, "release", release)
+    stream = EndlessStream()
+    task = asyncio.create_task(ClaudeService(api_key="test-key")._process_streaming_response(stream))
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert stream.closed
+    assert released == [4000 - 20]
+
+
+class FinishedStream(EndlessStream):
+    """A stream that completes, so the final message settles the reservation."""
+
+    async def _chunks(self):
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(id="msg_1", usage=None))
+
+    async def get_final_message(self):
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text="Done.")], usage=SimpleNamespace(output_tokens=50))
+
+
+@pytest.mark.asyncio
+async def test_cancel_after_final_message_does_not_release_twice(monkeypatch):
+    released = []
+
+    async def release(output_tokens, reserved_at=None):
+        released.append(output_tokens)
+
+    async def emit(event):
+        if event["type"] == "content_update":
+            # Client cancels while the concluding text is being sent
+            raise asyncio.CancelledError()
+
+    monkeypatch.setattr(api_service.ClaudeBucket, "release", release)
+    with pytest.raises(asyncio.CancelledError):
+        await ClaudeService(api_key="test-key")._process_streaming_response(FinishedStream(), emit)
+    assert released == [4000 - 50]
+
+
+class StreamingConversationService:
+    def __init__(self):
+        self.cancelled = False
+
+    async def process_user_message_streaming(self, emit_callback, **kwargs):
+        text = ""
+        try:
+            while True:
+                text += "x"
+                await emit_callback({"type": "text_delta", "text": "x", "accumulated_text": text})
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+@pytest.mark.asyncio
+async def test_cancel_message_stops_stream_and_notifies_client(monkeypatch):
+    sent = []
+
+    async def send_message(client_id, message):
+        sent.append(message)
+        return True
+
+    monkeypatch.setattr(ws_routes.manager, "send_message", send_message)
+    monkeypatch.setattr(ws_routes, "streaming_sessions", {})
+    service = StreamingConversationService()
+
+    task = asyncio.create_task(ws_routes.handle_streaming_message(
+        conversation_service=service, conversation_id="c1", user_message="hi",
+        options={}, client_id="client", protocol_version=PROTOCOL_DELTA
+    ))
+    await asyncio.sleep(0.05)
+    await ws_routes.handle_cancel("c1", None, "client")
+    await task
+
+    assert service.cancelled
+    assert sent[-1]["type"] == "message_cancelled"
+    assert sent[-1]["reason"] == "client_cancel"
+    session = next(iter(ws_routes.streaming_sessions.values()))
+    assert not session.active
+
+    await ws_routes.handle_cancel("c1", session.message_id, "client")
+    assert sent[-1] == {"type": "cancel_failed", "message_id": session.message_id, "reason": "not_streaming"}
+
+
+@pytest.mark.asyncio
+async def test_disconnect_checks_are_kept_until_done_and_failures_logged(monkeypatch, caplog):
+    monkeypatch.setattr(ws_routes.settings, "STREAM_CANCEL_AFTER_DISCONNECT_SECONDS", 0)
+    started = asyncio.Event()
+    proceed = asyncio.Event()
+
+    async def failing_check(message_id):
+        started.set()
+        await proceed.wait()
+        raise RuntimeError(f"store down for {message_id}")
+
+    ws_routes._after_disconnect_grace(failing_check, "m1")
+    await asyncio.wait_for(started.wait(), timeout=1)
+    pending = list(ws_routes._disconnect_checks)
+    assert len(pending) == 1
+    proceed.set()
+    await asyncio.gather(*pending)
+
+    assert not ws_routes._disconnect_checks
+    assert "store down for m1" in caplog.text
@@ -0,0 +1,83 @@
+import json
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import settings
+from services.stream_protocol import (
+    StreamEncoder, negotiate_protocol, text_checksum, PROTOCOL_LEGACY, PROTOCOL_DELTA
+)
+
+
+def pipeline_events(chunks):
+    """Events as _process_streaming_response emits them: deltas plus periodic content_updates."""
+    accumulated = ""
+    last_update = 0
+    yield {"type": "message_start", "message_id": "m1"}
+    for chunk in chunks:
+        accumulated += chunk
+        yield {"type": "text_delta", "text": chunk, "accumulated_text": accumulated, "message_id": "m1"}
+        if len(accumulated) - last_update >= 50:
+            yield {"type": "content_update", "accumulated_text": accumulated, "message_id": "m1"}
+            last_update = len(accumulated)
+    yield {"type": "content_block_stop", "block_index": 0, "message_id": "m1"}
+    yield {"type": "message_complete", "message_id": "m1"}
+
+
+def replay(frames):
+    """Minimal protocol-2 client: apply deltas, verify and adopt snapshots."""
+    text = ""
+    for frame in frames:
+        if frame["type"] == "text_delta":
+            text += frame["text"]
+        elif frame["type"] == "snapshot":
+            assert text_checksum(frame["text"]) == frame["checksum"]
+            text = frame["text"]
+    return text
+
+
+def encode_all(encoder, events):
+    return [frame for event in events for frame in encoder.encode(event)]
+
+
+class TestStreamEncoder:
+    def test_delta_frames_are_sequenced_and_reconstruct_text(self):
+        chunks = [f"token{i} " for i in range(500)]
+        frames = encode_all(StreamEncoder(PROTOCOL_DELTA, snapshot_interval_chars=1024), pipeline_events(chunks))
+
+        assert [frame["seq"] for frame in frames] == list(range(1, len(frames) + 1))
+        assert not any("accumulated_text" in frame for frame in frames)
+        assert replay(frames) == "".join(chunks)
+        # A final snapshot lets the client verify the complete text before the block ends
+        stop = next(i for i, frame in enumerate(frames) if frame["type"] == "content_block_stop")
+        assert frames[stop - 1]["type"] == "snapshot"
+        assert frames[stop - 1]["length"] == len("".join(chunks))
+
+    def test_wire_size_grows_linearly_not_quadratically(self):
+        chunks = ["abcd"] * 2000
+        legacy = encode_all(StreamEncoder(PROTOCOL_LEGACY), pipeline_events(chunks))
+        delta = encode_all(StreamEncoder(PROTOCOL_DELTA, snapshot_interval_chars=4096), pipeline_events(chunks))
+
+        legacy_bytes = sum(len(json.dumps(frame)) for frame in legacy)
+        delta_bytes = sum(len(json.dumps(frame)) for frame in delta)
+        assert delta_bytes * 20 < legacy_bytes
+
+    def test_filtered_deltas_trigger_resync_snapshot(self):
+        encoder = StreamEncoder(PROTOCOL_DELTA)
+        encoder.encode({"type": "text_delta", "text": "Hello", "accumulated_text": "Hello"})
+        # Upstream dropped " big" before reaching the encoder
+        frames = encoder.encode({"type": "text_delta", "text": " world", "accumulated_text": "Hello big world"})
+
+        assert frames[0]["type"] == "snapshot"
+        assert frames[0]["text"] == "Hello big world"
+        assert frames[0]["checksum"] == text_checksum("Hello big world")
+
+    def test_legacy_events_pass_through_unchanged(self):
+        event = {"type": "text_delta", "text": "a", "accumulated_text": "a", "message_id": "m1"}
+        assert StreamEncoder(PROTOCOL_LEGACY).encode(event) == [event]
+
+
+@pytest.mark.parametrize("requested,expected", [("1", 1), (2, 2), ("9", None), ("abc", None), (None, None)])
+def test_negotiate_protocol(requested, expected):
+    assert negotiate_protocol(requested) == (expected or settings.STREAM_PROTOCOL_DEFAULT_VERSION)
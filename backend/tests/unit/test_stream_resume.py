@@ -0,0 +1,86 @@
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.routes import websocket as ws_routes
+from services.stream_protocol import StreamEncoder, PROTOCOL_DELTA, PROTOCOL_LEGACY
+from services.stream_replay import StreamReplayBuffer
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Capture frames per client instead of writing to sockets."""
+    frames = {}
+
+    async def send_message(client_id, message):
+        frames.setdefault(client_id, []).append(message)
+        return True
+
+    monkeypatch.setattr(ws_routes.manager, "send_message", send_message)
+    monkeypatch.setattr(ws_routes, "streaming_sessions", {})
+    return frames
+
+
+def make_session(version=PROTOCOL_DELTA, capacity=100):
+    session = ws_routes.StreamingSession(
+        message_id="m1", client_id="old", conversation_id="c1",
+        encoder=StreamEncoder(version), replay=StreamReplayBuffer(capacity)
+    )
+    ws_routes.streaming_sessions["m1"] = session
+    return session
+
+
+async def stream_text(session, chunks, accumulated=""):
+    for chunk in chunks:
+        accumulated += chunk
+        await session.deliver({"type": "text_delta", "text": chunk, "accumulated_text": accumulated, "message_id": "m1"})
+    return accumulated
+
+
+def test_replay_buffer_reports_evicted_frames():
+    buffer = StreamReplayBuffer(capacity=3)
+    for seq in range(1, 6):
+        buffer.append({"seq": seq})
+    buffer.append({"type": "legacy"})  # No seq: not recorded
+
+    assert [frame["seq"] for frame in buffer.since(3)] == [4, 5]
+    assert buffer.since(5) == []
+    assert buffer.since(1) is None
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_frames_then_goes_live(sent):
+    session = make_session()
+    text = await stream_text(session, ["Revenue ", "grew "])
+    last_seen = sent["old"][0]["seq"]
+    text = await stream_text(session, ["12% ", "YoY"], text)  # Socket dropped before these arrived
+
+    await ws_routes.handle_resume("c1", "m1", last_seen, "new")
+    await stream_text(session, ["."], text)
+
+    frames = sent["new"]
+    assert frames[0] == {"type": "resumed", "message_id": "m1", "replayed": 3, "active": True}
+    assert [frame["seq"] for frame in frames[1:]] == list(range(last_seen + 1, last_seen + 5))
+    assert "".join(frame["text"] for frame in frames[1:]) == "grew 12% YoY."
+
+
+@pytest.mark.asyncio
+async def test_resume_behind_buffer_gets_snapshot(sent):
+    session = make_session(capacity=2)
+    text = await stream_text(session, ["a", "b", "c", "d"])
+
+    await ws_routes.handle_resume("c1", "m1", 0, "new")
+
+    assert sent["new"][1]["type"] == "snapshot"
+    assert sent["new"][1]["text"] == text
+
+
+@pytest.mark.asyncio
+async def test_resume_rejects_unknown_or_legacy_streams(sent):
+    make_session(version=PROTOCOL_LEGACY)
+
+    await ws_routes.handle_resume("c1", "missing", 0, "new")
+    await ws_routes.handle_resume("c1", "m1", 0, "new")
+
+    assert [frame["reason"] for frame in sent["new"]] == ["unknown_message", "protocol"]
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import settings
+from app.routes import websocket as ws_routes
+from services.stream_session_store import (
+    FramePublisher, InProcessSessionStore, SessionRecord, SQLiteSessionStore
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InProcessSessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+@pytest.mark.asyncio
+async def test_store_tracks_sessions_frames_and_cancels(store):
+    await store.register(SessionRecord(message_id="m1", conversation_id="c1", client_id="a", worker_id="w1"))
+    await store.append_frames("m1", [{"type": "text_delta", "seq": seq, "text": str(seq)} for seq in (1, 2, 3)])
+
+    assert [frame["seq"] for frame in await store.frames_after("m1", 1)] == [2, 3]
+    assert await store.request_cancel("m1", "client_cancel")
+    assert await store.take_cancel_requests("w2") == []
+    assert await store.take_cancel_requests("w1") == [("m1", "client_cancel")]
+    assert await store.take_cancel_requests("w1") == []
+
+    await store.attach("m1", "b")
+    await store.mark_finished("m1")
+    record = await store.get("m1")
+    assert record.client_id == "b" and not record.active
+    assert not await store.request_cancel("m1", "client_cancel")
+
+    assert await store.remove_expired(grace_seconds=60, max_age_seconds=3600) == 0
+    assert await store.remove_expired(grace_seconds=-1, max_age_seconds=3600) == 1
+    assert await store.get("m1") is None
+    assert await store.frames_after("m1", 0) == []
+
+
+@pytest.mark.asyncio
+async def test_publisher_batches_frames(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    publisher = FramePublisher(store, "m1", interval_seconds=60)
+    publisher.add([{"seq": 1}, {"type": "legacy"}, {"seq": 2}])
+    assert await store.frames_after("m1", 0) == []
+
+    await publisher.close()
+    assert await store.frames_after("m1", 0) == [{"seq": 1}, {"seq": 2}]
+
+
+@pytest.fixture
+def other_worker(monkeypatch, tmp_path):
+    """This process plays the worker a client reconnected to; the stream runs in "owner"."""
+    path = str(tmp_path / "sessions.sqlite3")
+    local_store = SQLiteSessionStore(path)
+    sent = {}
+
+    async def send_message(client_id, message):
+        sent.setdefault(client_id, []).append(message)
+        return True
+
+    monkeypatch.setattr(ws_routes, "get_session_store", lambda: local_store)
+    monkeypatch.setattr(ws_routes.manager, "send_message", send_message)
+    monkeypatch.setattr(ws_routes, "streaming_sessions", {})
+    monkeypatch.setattr(ws_routes, "remote_relays", {})
+    monkeypatch.setattr(settings, "STREAM_STORE_POLL_SECONDS", 0.01)
+    return SQLiteSessionStore(path), sent
+
+
+@pytest.mark.asyncio
+async def test_resume_relays_stream_owned_by_another_worker(other_worker):
+    owner_store, sent = other_worker
+    await owner_store.register(SessionRecord(message_id="m1", conversation_id="c1", client_id="old", worker_id="owner"))
+    await owner_store.append_frames("m1", [{"type": "text_delta", "seq": seq, "text": "x"} for seq in (1, 2, 3)])
+
+    await ws_routes.handle_resume("c1", "m1", 1, "new")
+    _, relay = ws_routes.remote_relays["new"]
+    await owner_store.append_frames("m1", [{"type": "message_complete", "seq": 4, "message_id": "m1"}])
+    await owner_store.mark_finished("m1")
+    await asyncio.wait_for(relay, timeout=2)
+
+    frames = sent["new"]
+    assert frames[0] == {"type": "resumed", "message_id": "m1", "replayed": 2, "active": True}
+    assert [frame["seq"] for frame in frames[1:]] == [2, 3, 4]
+    assert (await owner_store.get("m1")).client_id == "new"
+    assert "new" not in ws_routes.remote_relays
+
+
+@pytest.mark.asyncio
+async def test_cancel_reaches_owning_worker(other_worker):
+    owner_store, sent = other_worker
+    await owner_store.register(SessionRecord(message_id="m1", conversation_id="c1", client_id="old", worker_id="owner"))
+
+    await ws_routes.handle_cancel("c1", "m1", "new")
+    await ws_routes.handle_cancel("c2", "m1", "new")
+
+    assert await owner_store.take_cancel_requests("owner") == [("m1", "client_cancel")]
+    assert sent["new"] == [{"type": "cancel_failed", "message_id": "m1", "reason": "not_streaming"}]
@@ -0,0 +1,126 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from utils.token_utils import (
+    TokenEstimator,
+    total_input_tokens,
+    DOCUMENT_BLOCK_TOKENS,
+    TOOL_USE_SYSTEM_TOKENS,
+    CORRECTION_MAX,
+)
+
+
+@pytest.fixture
+def estimator():
+    # Force the heuristic path so tests never try to download BPE files
+    est = TokenEstimator()
+    est._encoding_unavailable = True
+    return est
+
+
+class TestTokenEstimator:
+    def test_counts_system_tools_and_documents(self, estimator):
+        messages = [{"role": "user", "content": [
+            {"type": "document", "source": {"type": "file", "file_id": "file_123"}},
+            {"type": "text", "text": "a" * 400},
+        ]}]
+        base = estimator.estimate_raw(messages)
+        assert base >= DOCUMENT_BLOCK_TOKENS + 100
+
+        with_system = estimator.estimate_raw(messages, system="s" * 800)
+        assert with_system - base == 200
+
+        tools = [{"name": "generate_graph_data", "description": "d", "input_schema": {"type": "object"}}]
+        with_tools = estimator.estimate_raw(messages, tools=tools)
+        assert with_tools - base > TOOL_USE_SYSTEM_TOKENS
+
+    def test_counts_tool_use_and_tool_result_blocks(self, estimator):
+        messages = [
+            {"role": "assistant", "content": [{"type": "tool_use", "id": "t1", "name": "x", "input": {"rows": ["r" * 400]}}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "c" * 400}]},
+        ]
+        assert estimator.estimate_raw(messages) > 200
+
+    def test_correction_learned_from_usage(self, estimator):
+        assert estimator.correction_factor("model-a") == 1.0
+        estimator.observe("model-a", raw_tokens=1000, actual_tokens=1300)
+        assert estimator.correction_factor("model-a") == pytest.approx(1.3)
+
+        estimate = estimator.estimate("model-a", [{"role": "user", "content": "x" * 4000}])
+        assert estimate.tokens == int(estimate.raw_tokens * 1.3)
+        # Other models are unaffected
+        assert estimator.correction_factor("model-b") == 1.0
+
+    def test_correction_is_smoothed_and_clamped(self, estimator):
+        estimator.observe("model-a", raw_tokens=1000, actual_tokens=1000)
+        estimator.observe("model-a", raw_tokens=1000, actual_tokens=2000)
+        assert 1.0 < estimator.correction_factor("model-a") < 2.0
+
+        estimator.observe("model-c", raw_tokens=10, actual_tokens=10_000)
+        assert estimator.correction_factor("model-c") == CORRECTION_MAX
+
+    def test_flags_placeholder_sized_blocks(self, estimator):
+        document = {"type": "document", "source": {"type": "file", "file_id": "file_123"}}
+        text_document = {"type": "document", "source": {"type": "text", "data": "d" * 400}}
+
+        assert estimator.estimate("model-a", [{"role": "user", "content": [document]}]).has_placeholder_blocks
+        assert estimator.estimate("model-a", [{"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": "t1", "content": [{"type": "image", "source": {}}]}
+        ]}]).has_placeholder_blocks
+        assert not estimator.estimate("model-a", [{"role": "user", "content": [text_document]}]).has_placeholder_blocks
+        assert not estimator.estimate("model-a", [{"role": "user", "content": "hello"}]).has_placeholder_blocks
+
+    def test_total_input_tokens_includes_cache_fields(self):
+        usage = SimpleNamespace(input_tokens=100, cache_creation_input_tokens=50, cache_read_input_tokens=2000)
+        assert total_input_tokens(usage) == 2150
+        assert total_input_tokens(SimpleNamespace(input_tokens=7)) == 7
+        assert total_input_tokens(None) == 0
+
+
+@pytest.mark.asyncio
+async def test_claude_call_does_not_await_count_tokens(estimator, tmp_path):
+    from pdf_processing.api_service import ClaudeService
+    from utils.claude_bucket import SharedRateLimiter
+
+    service = ClaudeService(api_key="test-key")
+    service.client = MagicMock()
+    service.client.messages.count_tokens = AsyncMock()
+    response = MagicMock()
+    response.response_headers = None
+    response.usage = SimpleNamespace(input_tokens=500)
+    service.client.messages.create = AsyncMock(return_value=response)
+
+    with patch("settings.TOKEN_COUNT_SAMPLE_RATE", 0.0), \
+            patch("pdf_processing.api_service.token_estimator", estimator), \
+            patch("utils.claude_bucket._limiter", SharedRateLimiter(str(tmp_path / "ratelimit.sqlite3"))):
+        result = await service._claude_call(
+            model="model-x",
+            system="system prompt",
+            messages=[{"role": "user", "content": "hello"}],
+            max_tokens=10,
+        )
+
+    assert result is response
+    service.client.messages.count_tokens.assert_not_called()
+    service.client.messages.create.assert_awaited_once()
+    # The completed response calibrates the estimator
+    assert estimator.correction_factor("model-x") > 1.0
+
+
+def test_placeholder_estimates_do_not_skew_the_correction(estimator):
+    from pdf_processing.api_service import ClaudeService
+
+    service = ClaudeService(api_key="test-key")
+    # A 40-page PDF counted at the flat DOCUMENT_BLOCK_TOKENS placeholder
+    estimate = estimator.estimate("model-x", [{"role": "user", "content": [
+        {"type": "document", "source": {"type": "file", "file_id": "file_123"}}
+    ]}])
+
+    with patch("pdf_processing.api_service.token_estimator", estimator):
+        service._observe_token_usage(estimate, SimpleNamespace(input_tokens=60_000))
+
+    assert estimator.correction_factor("model-x") == 1.0
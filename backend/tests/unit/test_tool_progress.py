@@ -0,0 +1,113 @@
+import json
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from pdf_processing.api_service import ClaudeService
+from utils.partial_json import IncrementalJSONParser
+from utils.tool_progress import ToolInputProgress
+
+CHART_INPUT = {
+    "chartType": "bar",
+    "config": {"title": "Revenue \"FY\" {2023}", "xAxisKey": "period"},
+    "data": [
+        {"period": "Q1", "revenue": 120.5},
+        {"period": "Q2", "revenue": 131},
+        {"period": "Q3"},
+        {"period": "Q4", "revenue": 150, "note": "record [high]"},
+    ],
+    "chartConfig": {"revenue": {"label": "Revenue"}},
+}
+
+
+def fragments(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 7, 64])
+def test_parser_reports_completed_members_in_order(size):
+    parser = IncrementalJSONParser(max_depth=2)
+    completed = []
+    for fragment in fragments(json.dumps(CHART_INPUT, indent=1), size):
+        completed.extend(parser.feed(fragment))
+
+    rows = [value for path, value in completed if path[0] == "data" and len(path) == 2]
+    top = {path[0]: value for path, value in completed if len(path) == 1}
+    assert rows == CHART_INPUT["data"]
+    assert top == CHART_INPUT
+    assert parser.done
+
+
+def test_rows_are_reported_before_input_is_complete():
+    text = json.dumps(CHART_INPUT)
+    cut = text.index('{"period": "Q3"')
+    progress = ToolInputProgress("toolu_1", "generate_graph_data")
+
+    event = progress.feed(text[:cut], "m1")
+
+    assert event["visualization_type"] == "bar"
+    assert event["config"]["xAxisKey"] == "period"
+    assert [row["period"] for row in event["rows"]] == ["Q1", "Q2"]
+
+
+def test_invalid_rows_are_dropped_from_progress():
+    progress = ToolInputProgress("toolu_1", "generate_graph_data")
+    rows = []
+    for fragment in fragments(json.dumps(CHART_INPUT), 5):
+        event = progress.feed(fragment)
+        if event:
+            assert event["row_offset"] == len(rows)
+            rows.extend(event["rows"])
+
+    assert [row["period"] for row in rows] == ["Q1", "Q2", "Q4"]  # Q3 has no numeric series
+    assert progress.rejected_rows == 1
+
+
+class ToolStream:
+    """Fake stream that sends a generate_table_data tool_use block as input_json_delta fragments."""
+
+    def __init__(self, tool_input):
+        self.tool_input = tool_input
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(id="msg_1", usage=None))
+        block = SimpleNamespace(type="tool_use", id="toolu_1", name="generate_table_data")
+        yield SimpleNamespace(type="content_block_start", index=0, content_block=block)
+        for fragment in fragments(json.dumps(self.tool_input), 16):
+            yield SimpleNamespace(type="content_block_delta", index=0, delta=SimpleNamespace(type="input_json_delta", partial_json=fragment))
+        yield SimpleNamespace(type="content_block_stop", index=0)
+
+    async def get_final_message(self):
+        block = SimpleNamespace(type="tool_use", id="toolu_1", name="generate_table_data", input=self.tool_input)
+        return SimpleNamespace(content=[block], usage=None)
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_emits_tool_progress():
+    table = {
+        "tableType": "comparison",
+        "config": {"title": "Margins", "columns": [{"key": "metric", "label": "Metric"}, {"key": "fy23", "label": "FY23"}]},
+        "data": [{"metric": "Gross", "fy23": 0.41}, {"metric": "Net", "fy23": 0.12}],
+    }
+    events = []
+
+    async def emit(event):
+        events.append(event)
+
+    result = await ClaudeService(api_key="test-key")._process_streaming_response(ToolStream(table), emit)
+
+    progress = [event for event in events if event["type"] == "tool_progress"]
+    assert [row for event in progress for row in event["rows"]] == table["data"]
+    assert progress[0]["tool_id"] == "toolu_1"
+    assert result["tool_calls"][0]["input"] == table
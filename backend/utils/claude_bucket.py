@@ -1,48 +1,445 @@
 """
 Claude API rate limiting utility using token bucket pattern.
+
+State is kept in a small SQLite file so every uvicorn worker on the host throttles
+against the same view of the organisation's limits. Three dimensions are tracked
+(requests, input tokens and output tokens per minute), refreshed from the
+``anthropic-ratelimit-*`` headers of every Messages API response (streaming and
+non-streaming), and replenished continuously between updates the way the API does.
+Waiters are served in FIFO order across processes through a ticket table.
 """
 import asyncio
+import os
+import sqlite3
 import time
 import logging
-from typing import Dict
+from datetime import datetime
+from typing import Dict, Optional, Any, Tuple
+
+from utils.local_store import LocalStore, default_store_path
 
 log = logging.getLogger(__name__)
 
+DIMENSIONS = ("requests", "input_tokens", "output_tokens")
+
+# Header prefix for each dimension; "tokens" is the legacy combined limit
+_HEADER_PREFIXES = {
+    "requests": "anthropic-ratelimit-requests",
+    "input_tokens": "anthropic-ratelimit-input-tokens",
+    "output_tokens": "anthropic-ratelimit-output-tokens",
+}
+_LEGACY_TOKENS_PREFIX = "anthropic-ratelimit-tokens"
+
+DEFAULT_DB_PATH = default_store_path("CLAUDE_RATE_LIMIT_DB", "cfin_claude_ratelimit.sqlite3")
+POLL_INTERVAL_SECONDS = 0.05    # how often queued waiters re-check their position
+MAX_SLEEP_SECONDS = 5.0         # cap on a single sleep so header updates are noticed
+TICKET_TTL_SECONDS = 30.0       # tickets without a heartbeat (dead worker) are dropped
+PROBE_WINDOW_SECONDS = 5.0      # hold on a window of unknown size while one request probes it
+
+
+def _parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """Parse a reset header given either as seconds or as an RFC 3339 timestamp."""
+    if value is None:
+        return None
+    try:
+        return now + float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SharedRateLimiter(LocalStore):
+    """
+    Process-shared, multi-dimensional rate limiter backed by SQLite.
+
+    Each dimension stores its last known limit, remaining budget, reset time and the
+    time of the last update. Budget is replenished linearly at ``limit / 60`` per
+    second, so waiters wake up as capacity returns instead of all at the reset instant.
+    """
+
+    store_name = "Claude rate-limit store"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, poll_interval: float = POLL_INTERVAL_SECONDS,
+                 ticket_ttl: float = TICKET_TTL_SECONDS):
+        self.poll_interval = poll_interval
+        self.ticket_ttl = ticket_ttl
+        super().__init__(db_path)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " dimension TEXT PRIMARY KEY,"
+            " limit_value INTEGER,"
+            " remaining REAL NOT NULL,"
+            " reset_ts REAL NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " headers_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(rate_limits)")}
+        if "headers_at" not in columns:
+            # Stores created before header times were tracked
+            conn.execute("ALTER TABLE rate_limits ADD COLUMN headers_at REAL NOT NULL DEFAULT 0")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_waiters ("
+            " ticket INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " pid INTEGER NOT NULL,"
+            " heartbeat REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def _available(row, now: float) -> Optional[float]:
+        """
+        Budget available now for one dimension.
+
+        Once the reset time has passed the window starts over at the full limit, or
+        None if the limit is unknown (see ``_try_acquire``).
+        """
+        limit_value, remaining, reset_ts, updated_at = row
+        if reset_ts and now >= reset_ts:
+            return float(limit_value) if limit_value else None
+        if not limit_value:
+            # Only a remaining count is known: hold it until the reset time
+            return remaining
+        refill = (now - updated_at) * (limit_value / 60.0)
+        return min(float(limit_value), remaining + max(0.0, refill))
+
+    @staticmethod
+    def _wait_for(row, need: float, available: float, now: float) -> float:
+        """Seconds until ``need`` fits, given the currently available budget."""
+        limit_value, _, reset_ts, _ = row
+        until_reset = max(0.0, reset_ts - now) if reset_ts else 0.0
+        if not limit_value:
+            return until_reset
+        refill_wait = (need - available) / (limit_value / 60.0)
+        return min(refill_wait, until_reset) if until_reset else refill_wait
+
+    # -- updates ---------------------------------------------------------------
+
+    def update_from_headers(self, headers: Any) -> None:
+        """
+        Refresh limiter state from Claude response headers.
+
+        Args:
+            headers: Response headers (any mapping with ``get``)
+        """
+        now = time.time()
+        updates: Dict[str, tuple] = {}
+        for dimension, prefix in _HEADER_PREFIXES.items():
+            remaining = _parse_int(headers.get(f"{prefix}-remaining"))
+            if remaining is None and dimension == "input_tokens":
+                prefix = _LEGACY_TOKENS_PREFIX
+                remaining = _parse_int(headers.get(f"{prefix}-remaining"))
+            if remaining is None:
+                continue
+            limit_value = _parse_int(headers.get(f"{prefix}-limit"))
+            reset_ts = _parse_reset(headers.get(f"{prefix}-reset"), now) or 0.0
+            updates[dimension] = (limit_value, remaining, reset_ts)
+
+        # A 429 carries retry-after: nothing is available in any dimension until then
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            retry_ts = _parse_reset(retry_after, now)
+            if retry_ts:
+                for dimension in DIMENSIONS:
+                    limit_value, _, reset_ts = updates.get(dimension, (None, 0, 0.0))
+                    updates[dimension] = (limit_value, 0, max(reset_ts, retry_ts))
+
+        if not updates:
+            return
+
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            log.warning("Could not persist Claude rate-limit headers: %s", e)
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for dimension, (limit_value, remaining, reset_ts) in updates.items():
+                conn.execute(
+                    "INSERT INTO rate_limits (dimension, limit_value, remaining, reset_ts, updated_at, headers_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(dimension) DO UPDATE SET"
+                    " limit_value = COALESCE(excluded.limit_value, rate_limits.limit_value),"
+                    " remaining = excluded.remaining, reset_ts = excluded.reset_ts,"
+                    " updated_at = excluded.updated_at, headers_at = excluded.headers_at",
+                    (dimension, limit_value, remaining, reset_ts, now, now)
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning("Could not persist Claude rate-limit headers: %s", e)
+        finally:
+            conn.close()
+
+    def release(self, reserved_at: Optional[float] = None, **amounts: int) -> None:
+        """
+        Return over-reserved budget, e.g. output tokens reserved from ``max_tokens``
+        that the response did not use.
+
+        Rate-limit headers received after the reservation replace ``remaining`` with the
+        API's own count, which already reflects what the response really used; crediting
+        the unused part on top of that would count it twice, so such dimensions are left
+        alone.
+
+        Args:
+            reserved_at: When the budget was reserved (None credits unconditionally)
+            **amounts: Budget to return per dimension
+        """
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            log.warning("Could not release Claude rate-limit budget: %s", e)
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for dimension, amount in amounts.items():
+                if dimension in DIMENSIONS and amount > 0:
+                    conn.execute(
+                        "UPDATE rate_limits SET remaining = MIN(COALESCE(limit_value, remaining + ?), remaining + ?)"
+                        " WHERE dimension = ? AND (? IS NULL OR headers_at <= ?)",
+                        (amount, amount, dimension, reserved_at, reserved_at)
+                    )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning("Could not release Claude rate-limit budget: %s", e)
+        finally:
+            conn.close()
+
+    # -- acquisition -----------------------------------------------------------
+
+    def _enqueue(self) -> int:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO rate_limit_waiters (pid, heartbeat) VALUES (?, ?)",
+                (os.getpid(), time.time())
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def _dequeue(self, ticket: int) -> None:
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM rate_limit_waiters WHERE ticket = ?", (ticket,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            log.warning("Could not remove Claude rate-limit ticket %s: %s", ticket, e)
+
+    def _try_acquire(self, ticket: int, cost: Dict[str, int]) -> float:
+        """
+        Attempt to take ``cost`` from every dimension for the given ticket.
+
+        Returns:
+            0.0 if the budget was taken, otherwise the number of seconds to wait
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            log.warning("Claude rate-limit store error, not throttling: %s", e)
+            return 0.0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE rate_limit_waiters SET heartbeat = ? WHERE ticket = ?", (now, ticket))
+            conn.execute("DELETE FROM rate_limit_waiters WHERE heartbeat < ?", (now - self.ticket_ttl,))
+            head = conn.execute("SELECT MIN(ticket) FROM rate_limit_waiters").fetchone()[0]
+            if head is not None and head != ticket:
+                conn.execute("COMMIT")
+                return self.poll_interval
+
+            rows = {
+                row[0]: row[1:]
+                for row in conn.execute(
+                    "SELECT dimension, limit_value, remaining, reset_ts, updated_at FROM rate_limits"
+                )
+            }
+            wait = 0.0
+            new_state: Dict[str, Tuple[float, float]] = {}
+            for dimension, need in cost.items():
+                row = rows.get(dimension)
+                if row is None or need <= 0:
+                    continue
+                limit_value, _, reset_ts, _ = row
+                window_over = bool(reset_ts) and now >= reset_ts
+                available = self._available(row, now)
+                if available is None:
+                    # New window of unknown size: let this request probe it and hold the
+                    # others until its response headers report the real budget
+                    new_state[dimension] = (0.0, now + PROBE_WINDOW_SECONDS)
+                    continue
+                # A single request larger than the whole limit is let through at full capacity
+                if limit_value:
+                    need = min(need, limit_value)
+                if available >= need:
+                    # A passed reset starts a fresh window that refills from now on
+                    new_state[dimension] = (available - need, 0.0 if window_over else reset_ts)
+                else:
+                    wait = max(wait, self._wait_for(row, need, available, now))
+
+            if wait > 0:
+                conn.execute("COMMIT")
+                return max(wait, self.poll_interval)
+
+            for dimension, (remaining, reset_ts) in new_state.items():
+                conn.execute(
+                    "UPDATE rate_limits SET remaining = ?, reset_ts = ?, updated_at = ? WHERE dimension = ?",
+                    (remaining, reset_ts, now, dimension)
+                )
+            conn.execute("DELETE FROM rate_limit_waiters WHERE ticket = ?", (ticket,))
+            conn.execute("COMMIT")
+            return 0.0
+        except sqlite3.Error as e:
+            # Never block Claude calls because the local store is unavailable
+            log.warning("Claude rate-limit store error, not throttling: %s", e)
+            return 0.0
+        finally:
+            conn.close()
+
+    async def acquire(self, input_tokens: int = 0, output_tokens: int = 0, requests: int = 1) -> float:
+        """
+        Wait (FIFO across all workers) until the request fits in every dimension.
+
+        Args:
+            input_tokens: Estimated input tokens of the request
+            output_tokens: Output tokens to reserve (normally ``max_tokens``)
+            requests: Number of requests (1 per API call)
+
+        Returns:
+            Seconds spent waiting
+        """
+        cost = {"requests": requests, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        started = time.monotonic()
+        try:
+            ticket = await asyncio.to_thread(self._enqueue)
+        except sqlite3.Error as e:
+            log.warning("Claude rate-limit store unavailable, not throttling: %s", e)
+            return 0.0
+        try:
+            while True:
+                wait = await asyncio.to_thread(self._try_acquire, ticket, cost)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, MAX_SLEEP_SECONDS))
+        finally:
+            # No-op after a successful acquire; frees the queue head on cancellation or store errors
+            await asyncio.to_thread(self._dequeue, ticket)
+        waited = time.monotonic() - started
+        if waited >= 0.5:
+            log.info("Waited %.2f s for Claude rate-limit (in=%d, out=%d)", waited, input_tokens, output_tokens)
+        return waited
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current view of every dimension plus the FIFO queue depth."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            state: Dict[str, Any] = {}
+            for dimension, limit_value, remaining, reset_ts, updated_at in conn.execute(
+                "SELECT dimension, limit_value, remaining, reset_ts, updated_at FROM rate_limits"
+            ):
+                available = self._available((limit_value, remaining, reset_ts, updated_at), now)
+                state[dimension] = {
+                    "limit": limit_value,
+                    "remaining": remaining,
+                    "available": available,
+                    "reset_in_seconds": max(0.0, reset_ts - now) if reset_ts else 0.0,
+                }
+            state["queued_waiters"] = conn.execute("SELECT COUNT(*) FROM rate_limit_waiters").fetchone()[0]
+            return state
+        finally:
+            conn.close()
+
+    def reset(self) -> None:
+        """Forget all limit state and queued tickets."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM rate_limits")
+            conn.execute("DELETE FROM rate_limit_waiters")
+        finally:
+            conn.close()
+
+
+_limiter: Optional[SharedRateLimiter] = None
+
+
+def get_rate_limiter() -> SharedRateLimiter:
+    """Get the process-wide limiter bound to the host-shared store."""
+    global _limiter
+    if _limiter is None:
+        _limiter = SharedRateLimiter()
+    return _limiter
+
+
 class ClaudeBucket:
     """
     Token bucket implementation for Claude API rate limiting.
     Uses response headers from Claude to implement graceful backoff.
+    Thin facade over the shared SQLite limiter kept for existing call sites.
     """
-    _reset_ts = 0.0
-    _tokens_remaining = 999_999
 
     @classmethod
-    async def throttle(cls, need: int):
+    async def throttle(cls, need: int, output_tokens: int = 0):
         """
         Check if we need to wait before making a request requiring 'need' tokens.
-        
+
         Args:
-            need: Number of tokens needed for the request
+            need: Number of input tokens needed for the request
+            output_tokens: Number of output tokens to reserve (max_tokens)
         """
-        now = time.time()
-        wait = max(0, cls._reset_ts - now) if cls._tokens_remaining < need else 0
-        if wait:
-            log.info("Sleeping %.2f s for Claude rate-limit", wait)
-            await asyncio.sleep(wait)
+        try:
+            limiter = get_rate_limiter()
+        except (sqlite3.Error, OSError) as e:
+            # Never fail a Claude call because the local store is unavailable
+            log.warning("Claude rate-limit store unavailable, not throttling: %s", e)
+            return
+        await limiter.acquire(input_tokens=need, output_tokens=output_tokens)
 
     @classmethod
     def update(cls, headers: Dict[str, str]):
         """
         Update rate limit state from Claude response headers.
-        
+
         Args:
             headers: Response headers from Claude API
         """
         try:
-            cls._tokens_remaining = int(headers.get("anthropic-ratelimit-tokens-remaining",
-                                                  cls._tokens_remaining))
-            reset_in = float(headers.get("anthropic-ratelimit-tokens-reset", 0))
-            cls._reset_ts = time.time() + reset_in
-        except (ValueError, TypeError):
+            get_rate_limiter().update_from_headers(headers)
+        except (ValueError, TypeError, AttributeError):
             # If headers are malformed, keep existing values
-            pass 
\ No newline at end of file
+            pass
+        except (sqlite3.Error, OSError) as e:
+            log.warning("Could not persist Claude rate-limit headers: %s", e)
+
+    @classmethod
+    async def release(cls, output_tokens: int = 0, reserved_at: Optional[float] = None):
+        """
+        Return reserved output tokens that a completed response did not use.
+
+        Skipped once rate-limit headers newer than ``reserved_at`` (normally the
+        response's own) have reset the budget.
+        """
+        if output_tokens <= 0:
+            return
+        try:
+            limiter = get_rate_limiter()
+        except (sqlite3.Error, OSError) as e:
+            log.warning("Could not release Claude rate-limit budget: %s", e)
+            return
+        await asyncio.to_thread(limiter.release, reserved_at, output_tokens=output_tokens)
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """Get the shared limiter state for stats endpoints."""
+        return get_rate_limiter().snapshot()
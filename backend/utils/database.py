@@ -1,9 +1,13 @@
 import os
 import sqlite3
-from sqlalchemy import create_engine
+from typing import Any, Dict
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import settings
 
 # Import sqlite3 error classes for aiosqlite
 import aiosqlite
@@ -18,12 +22,78 @@ if DATABASE_URL.startswith("sqlite"):
     # For SQLite, we need to convert to the async variant
     DATABASE_URL = DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
 
+
+def _is_sqlite_file(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and not url.rstrip("/").endswith(":")
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Pragmas run on every new SQLite connection, in order."""
+    return {
+        "journal_mode": "WAL",  # Readers and the writer no longer block each other
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # Negative = KiB rather than pages
+        "mmap_size": settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+def _apply_sqlite_pragmas(sync_engine) -> None:
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Engine keyword arguments for a database URL.
+
+    SQLite files get a connection pool (aiosqlite otherwise opens a connection, and its
+    thread, per session) and a driver-level lock timeout matching SQLITE_BUSY_TIMEOUT_MS.
+    Postgres gets explicit pool sizing, recycling and pre-ping.
+    """
+    options: Dict[str, Any] = {
+        "echo": True if os.getenv("DEBUG") == "True" else False,
+        "future": True,
+    }
+    if url.startswith("sqlite"):
+        if _is_sqlite_file(url):
+            options.update(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+            )
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+        )
+    return options
+
+
+def build_engine(url: str = DATABASE_URL, **overrides: Any) -> AsyncEngine:
+    """Create an async engine with the production profile for its backend."""
+    engine = create_async_engine(url, **{**engine_options(url), **overrides})
+    if _is_sqlite_file(url):
+        _apply_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
 # Create async engine
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True if os.getenv("DEBUG") == "True" else False,
-    future=True,
-)
+engine = build_engine(DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(
@@ -48,17 +118,34 @@ async def get_db():
     finally:
         await db.close()
 
-# For non-async operations
-sync_engine = None
-SyncSessionLocal = None
-
-if DATABASE_URL.startswith("sqlite+aiosqlite"):
-    # Create sync engine for SQLite
-    sync_url = DATABASE_URL.replace("sqlite+aiosqlite:///", "sqlite:///", 1)
-    sync_engine = create_engine(sync_url, connect_args={"check_same_thread": False})
-    SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
-else:
-    # For PostgreSQL or other databases
-    sync_url = DATABASE_URL.replace("+asyncpg", "", 1) if "+asyncpg" in DATABASE_URL else DATABASE_URL
-    sync_engine = create_engine(sync_url)
-    SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
\ No newline at end of file
+# For non-async operations (create_db.py). Built on first access rather than at import,
+# so the application does not hold a second, unused connection pool.
+_sync_engine = None
+_SyncSessionLocal = None
+
+
+def get_sync_engine():
+    global _sync_engine, _SyncSessionLocal
+    if _sync_engine is None:
+        if DATABASE_URL.startswith("sqlite+aiosqlite"):
+            # Create sync engine for SQLite
+            sync_url = DATABASE_URL.replace("sqlite+aiosqlite:///", "sqlite:///", 1)
+            _sync_engine = create_engine(sync_url, connect_args={"check_same_thread": False})
+            if _is_sqlite_file(sync_url):
+                _apply_sqlite_pragmas(_sync_engine)
+        else:
+            # For PostgreSQL or other databases
+            sync_url = DATABASE_URL.replace("+asyncpg", "", 1) if "+asyncpg" in DATABASE_URL else DATABASE_URL
+            _sync_engine = create_engine(sync_url)
+        _SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_sync_engine)
+    return _sync_engine
+
+
+def __getattr__(name: str):
+    # Keeps `from utils.database import sync_engine, SyncSessionLocal` working lazily
+    if name == "sync_engine":
+        return get_sync_engine()
+    if name == "SyncSessionLocal":
+        get_sync_engine()
+        return _SyncSessionLocal
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
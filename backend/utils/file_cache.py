@@ -2,162 +2,411 @@
 """
 Cross-tenant file cache for Claude Files API optimization.
 Prevents duplicate uploads of identical PDFs by caching file IDs by content SHA256.
-Production-grade implementation with atomic writes and TTL expiration.
+
+Entries live in the ``claude_file_cache`` table of the application database, so every
+worker process on every host shares them and they survive restarts and redeploys. Keys are the SHA-256 of the raw PDF bytes (the same hash storage records for
+content-addressed blobs). Entries expire with the Files API TTL and are evicted least
+recently used first; rejected files are negatively cached so a bad PDF is not re-sent;
+and an upload in progress holds a short lease so concurrent workers wait for its file
+ID instead of uploading the same bytes again.
 """
 
-import logging
 import asyncio
+import hashlib
+import logging
+import os
+import socket
 import time
-from typing import Optional, Dict
-from utils.hashlib_utils import sha256_str
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Union, Callable
+
+from sqlalchemy import select, insert, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models.database_models import ClaudeFileCacheEntry as Entry
+from utils.database import SessionLocal
+from utils.metrics import record_cache_operation
 
 logger = logging.getLogger(__name__)
 
 # Anthropic Files API TTL (90 days as per documentation)
-CLAUDE_FILE_TTL_SECONDS = 90 * 24 * 60 * 60  # 90 days
+CLAUDE_FILE_TTL_SECONDS = int(os.getenv("CLAUDE_FILE_CACHE_TTL_SECONDS", str(90 * 24 * 60 * 60)))  # 90 days
+# How long a rejected file is remembered before the Files API is asked again
+CLAUDE_FILE_REJECTION_TTL_SECONDS = int(os.getenv("CLAUDE_FILE_CACHE_REJECTION_TTL_SECONDS", str(24 * 60 * 60)))
+# Cached file IDs are re-checked against the Files API at most this often
+CLAUDE_FILE_VALIDATION_INTERVAL_SECONDS = int(os.getenv("CLAUDE_FILE_CACHE_VALIDATION_INTERVAL_SECONDS", "3600"))
+# Maximum time one worker may hold the upload lease for a content hash
+CLAUDE_FILE_UPLOAD_LEASE_SECONDS = int(os.getenv("CLAUDE_FILE_CACHE_UPLOAD_LEASE_SECONDS", "120"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("CLAUDE_FILE_CACHE_MAX_ENTRIES", "10000"))
+
+STATUS_READY = "ready"
+STATUS_REJECTED = "rejected"
+STATUS_UPLOADING = "uploading"
+
+
+class FileRejectedError(ValueError):
+    """Raised when the Files API previously rejected identical content (negative cache hit)."""
+    def __init__(self, content_sha256: str, reason: str):
+        super().__init__(f"Files API rejected this content earlier: {reason}")
+        self.content_sha256 = content_sha256
+        self.reason = reason
+
+
+@dataclass
+class FileCacheEntry:
+    """A cached Files API outcome for one content hash."""
+    content_sha256: str
+    status: str
+    file_id: Optional[str]
+    error: Optional[str]
+    expires_at: float
+    validated_at: Optional[float]
+
+    @property
+    def needs_validation(self) -> bool:
+        """Whether the file ID should be confirmed live before use."""
+        return (self.validated_at or 0) + CLAUDE_FILE_VALIDATION_INTERVAL_SECONDS < time.time()
+
 
 class FileCacheManager:
     """
-    Thread-safe cache for Claude file IDs to avoid duplicate uploads.
-    Key: PDF content SHA256, Value: Claude file ID with expiration
-    Production implementation with atomic writes and TTL.
+    Database-backed cache for Claude file IDs to avoid duplicate uploads.
+    Key: SHA-256 of the PDF bytes, Value: Claude file ID (or rejection) with expiration
     """
-    
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, any]] = {}
-        self._lock = asyncio.Lock()
-        
-    async def get_file_id(self, pdf_content: bytes) -> Optional[str]:
+
+    def __init__(self, session_factory: Callable = SessionLocal, ttl_seconds: int = CLAUDE_FILE_TTL_SECONDS,
+                 rejection_ttl_seconds: int = CLAUDE_FILE_REJECTION_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.rejection_ttl_seconds = rejection_ttl_seconds
+        self.max_entries = max_entries
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "rejections": 0, "invalidations": 0, "evictions": 0}
+
+    @staticmethod
+    def content_key(pdf_content: Optional[Union[bytes, str]] = None, content_sha256: Optional[str] = None) -> str:
+        """Cache key: a precomputed content SHA-256 when the caller streamed the file, else the hash of the bytes."""
+        if content_sha256:
+            return content_sha256
+        if isinstance(pdf_content, str):
+            pdf_content = pdf_content.encode("utf-8")
+        return hashlib.sha256(pdf_content or b"").hexdigest()
+
+    # -- store operations (each runs in its own session via _run) ----------------
+
+    async def _lookup(self, session, key: str) -> Optional[FileCacheEntry]:
+        now = time.time()
+        result = await session.execute(
+            select(Entry.status, Entry.file_id, Entry.error, Entry.expires_at, Entry.validated_at)
+            .where(Entry.content_sha256 == key, Entry.status != STATUS_UPLOADING)
+        )
+        row = result.first()
+        if row is None:
+            self._stats["misses"] += 1
+            record_cache_operation("file_get", "miss")
+            return None
+        status, file_id, error, expires_at, validated_at = row
+        if now > expires_at:
+            await session.execute(delete(Entry).where(Entry.content_sha256 == key, Entry.status == status))
+            await session.commit()
+            self._stats["expired"] += 1
+            record_cache_operation("file_get", "expired")
+            logger.info("Cache EXPIRED: Removed %s entry for hash=%s", status, key[:16] + "...")
+            return None
+        await session.execute(update(Entry).where(Entry.content_sha256 == key).values(last_accessed=now))
+        await session.commit()
+        if status == STATUS_REJECTED:
+            self._stats["rejections"] += 1
+            record_cache_operation("file_get", "rejected")
+        else:
+            self._stats["hits"] += 1
+            record_cache_operation("file_get", "hit")
+        return FileCacheEntry(key, status, file_id, error, expires_at, validated_at)
+
+    async def _put(self, session, key: str, status: str, file_id: Optional[str], error: Optional[str],
+                   size_bytes: Optional[int], ttl_seconds: float) -> None:
+        now = time.time()
+        values = dict(status=status, file_id=file_id, error=error, size_bytes=size_bytes, lease_owner=None,
+                      created_at=now, expires_at=now + ttl_seconds, last_accessed=now,
+                      validated_at=now if status == STATUS_READY else None)
+        # Replace-or-insert; if another worker inserts the same key in between, its row is
+        # replaced on the retry (the last result wins, as with any cache write)
+        for attempt in range(2):
+            try:
+                replaced = await session.execute(update(Entry).where(Entry.content_sha256 == key).values(**values))
+                if replaced.rowcount == 0:
+                    await session.execute(insert(Entry).values(content_sha256=key, **values))
+                await self._evict(session, now)
+                await session.commit()
+                return
+            except IntegrityError:
+                await session.rollback()
+                if attempt:
+                    raise
+
+    async def _evict(self, session, now: float) -> None:
+        """Drop expired entries and lapsed leases, then least recently used ones beyond max_entries."""
+        expired = (await session.execute(delete(Entry).where(Entry.expires_at < now))).rowcount
+        count = (await session.execute(select(func.count()).select_from(Entry))).scalar()
+        evicted = 0
+        if count > self.max_entries:
+            oldest = (
+                select(Entry.content_sha256)
+                .where(Entry.status != STATUS_UPLOADING)
+                .order_by(Entry.last_accessed)
+                .limit(count - self.max_entries)
+            )
+            evicted = (await session.execute(
+                delete(Entry).where(Entry.content_sha256.in_(oldest)).execution_options(synchronize_session=False)
+            )).rowcount
+        if expired or evicted:
+            self._stats["evictions"] += expired + evicted
+            record_cache_operation("file_evict", "lru")
+
+    async def _claim(self, session, key: str, owner: str, lease_seconds: float) -> bool:
+        now = time.time()
+        lease = dict(status=STATUS_UPLOADING, lease_owner=owner, file_id=None, error=None, size_bytes=None,
+                     created_at=now, expires_at=now + lease_seconds, last_accessed=now, validated_at=None)
+        # Take over an expired entry or our own lease; a live entry of any other kind blocks us
+        taken = await session.execute(
+            update(Entry)
+            .where(
+                Entry.content_sha256 == key,
+                or_(Entry.expires_at < now, and_(Entry.status == STATUS_UPLOADING, Entry.lease_owner == owner))
+            )
+            .values(**lease)
+        )
+        try:
+            if taken.rowcount == 0:
+                await session.execute(insert(Entry).values(content_sha256=key, **lease))
+            await session.commit()
+        except IntegrityError:
+            # A live entry (someone else's lease or result) exists
+            await session.rollback()
+            return False
+        return True
+
+    async def _delete(self, session, key: str, status: Optional[str] = None, owner: Optional[str] = None) -> int:
+        statement = delete(Entry).where(Entry.content_sha256 == key)
+        if status:
+            statement = statement.where(Entry.status == status)
+        if owner:
+            statement = statement.where(Entry.lease_owner == owner)
+        removed = (await session.execute(statement)).rowcount
+        await session.commit()
+        return removed
+
+    async def _lease_active(self, session, key: str) -> bool:
+        result = await session.execute(
+            select(Entry.content_sha256).where(
+                Entry.content_sha256 == key, Entry.status == STATUS_UPLOADING, Entry.expires_at >= time.time()
+            )
+        )
+        return result.first() is not None
+
+    async def _mark_validated(self, session, key: str) -> None:
+        await session.execute(update(Entry).where(Entry.content_sha256 == key).values(validated_at=time.time()))
+        await session.commit()
+
+    async def _store_stats(self, session) -> Dict[str, Any]:
+        now = time.time()
+        live = (Entry.expires_at >= now).label("live")
+        result = await session.execute(
+            select(Entry.status, live, func.count(), func.coalesce(func.sum(Entry.size_bytes), 0))
+            .group_by(Entry.status, live)
+        )
+        counts = {"cached_files": 0, "valid_entries": 0, "expired_entries": 0, "rejected_entries": 0,
+                  "uploads_in_progress": 0, "total_size_bytes": 0}
+        for status, live, count, size_bytes in result.all():
+            if status == STATUS_UPLOADING:
+                counts["uploads_in_progress"] += count if live else 0
+                continue
+            if status == STATUS_REJECTED:
+                counts["rejected_entries"] += count if live else 0
+                continue
+            counts["cached_files"] += count
+            counts["valid_entries" if live else "expired_entries"] += count
+            counts["total_size_bytes"] += size_bytes
+        return counts
+
+    async def _cleanup_expired(self, session) -> int:
+        removed = (await session.execute(delete(Entry).where(Entry.expires_at < time.time()))).rowcount
+        await session.commit()
+        return removed
+
+    async def _clear(self, session) -> int:
+        removed = (await session.execute(delete(Entry))).rowcount
+        await session.commit()
+        return removed
+
+    async def _run(self, operation, *args, default=None):
+        """Run a store operation in a fresh session; store errors are logged and ignored."""
+        try:
+            async with self.session_factory() as session:
+                return await operation(session, *args)
+        except SQLAlchemyError as e:
+            logger.warning("File cache store operation %s failed: %s", operation.__name__, e)
+            return default
+
+    # -- async API -------------------------------------------------------------
+
+    async def get_entry(self, pdf_content: Optional[bytes] = None, content_sha256: Optional[str] = None) -> Optional[FileCacheEntry]:
+        """
+        Get the cached outcome (file ID or rejection) for PDF content.
+
+        Args:
+            pdf_content: Raw PDF bytes
+            content_sha256: Precomputed content hash (used instead of pdf_content)
+
+        Returns:
+            The live cache entry, or None on miss/expiry
+        """
+        return await self._run(self._lookup, self.content_key(pdf_content, content_sha256))
+
+    async def get_file_id(self, pdf_content: Optional[bytes] = None, content_sha256: Optional[str] = None) -> Optional[str]:
         """
         Get cached file ID for PDF content if it exists and hasn't expired.
-        
+
         Args:
             pdf_content: Raw PDF bytes
-            
+            content_sha256: Precomputed content hash (used instead of pdf_content)
+
         Returns:
             Claude file ID if cached and valid, None otherwise
         """
-        # Handle both bytes and string input
-        if isinstance(pdf_content, bytes):
-            content_hash = sha256_str(pdf_content.decode('utf-8', errors='ignore'))
-        else:
-            content_hash = sha256_str(str(pdf_content))
-        
-        async with self._lock:
-            cached_entry = self._cache.get(content_hash)
-            if not cached_entry:
-                logger.debug("Cache MISS: No existing file_id for content hash=%s", 
-                            content_hash[:16] + "...")
-                return None
-            
-            # Check TTL expiration
-            current_time = time.time()
-            if current_time > cached_entry['expires_at']:
-                # Remove expired entry
-                del self._cache[content_hash]
-                logger.info("Cache EXPIRED: Removed expired file_id=%s for hash=%s", 
-                           cached_entry['file_id'], content_hash[:16] + "...")
-                return None
-            
-            file_id = cached_entry['file_id']
-            logger.info("Cache HIT: Found valid file_id=%s for content hash=%s (expires in %d seconds)", 
-                       file_id, content_hash[:16] + "...", 
-                       int(cached_entry['expires_at'] - current_time))
-            return file_id
-    
-    async def cache_file_id(self, pdf_content: bytes, file_id: str) -> None:
+        entry = await self.get_entry(pdf_content, content_sha256)
+        if entry and entry.status == STATUS_READY:
+            logger.info("Cache HIT: Found valid file_id=%s for content hash=%s (expires in %d seconds)",
+                        entry.file_id, entry.content_sha256[:16] + "...", int(entry.expires_at - time.time()))
+            return entry.file_id
+        return None
+
+    async def cache_file_id(self, pdf_content: Optional[bytes], file_id: str, content_sha256: Optional[str] = None,
+                            size_bytes: Optional[int] = None) -> None:
         """
-        Cache a file ID for future use with atomic write semantics.
-        
+        Cache a file ID for future use (also releases any upload lease on the content).
+
         Args:
             pdf_content: Raw PDF bytes
             file_id: Claude file ID from upload
+            content_sha256: Precomputed content hash (used instead of pdf_content)
+            size_bytes: Size of the uploaded file
         """
-        # Handle both bytes and string input
-        if isinstance(pdf_content, bytes):
-            content_hash = sha256_str(pdf_content.decode('utf-8', errors='ignore'))
-        else:
-            content_hash = sha256_str(str(pdf_content))
-        
-        expires_at = time.time() + CLAUDE_FILE_TTL_SECONDS
-        
-        async with self._lock:
-            # Atomic write: only update if not already present (race condition protection)
-            if content_hash not in self._cache:
-                self._cache[content_hash] = {
-                    'file_id': file_id,
-                    'created_at': time.time(),
-                    'expires_at': expires_at
-                }
-                logger.info("Cached file_id=%s for content hash=%s (expires: %s, cache size: %d)", 
-                           file_id, content_hash[:16] + "...", 
-                           time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(expires_at)),
-                           len(self._cache))
-            else:
-                logger.debug("Cache entry already exists for hash=%s, skipping duplicate write", 
-                            content_hash[:16] + "...")
-    
-    async def get_cache_stats(self) -> Dict[str, any]:
+        key = self.content_key(pdf_content, content_sha256)
+        if size_bytes is None and pdf_content is not None:
+            size_bytes = len(pdf_content)
+        await self._run(self._put, key, STATUS_READY, file_id, None, size_bytes, self.ttl_seconds)
+        record_cache_operation("file_set", "stored")
+        logger.info("Cached file_id=%s for content hash=%s", file_id, key[:16] + "...")
+
+    async def cache_rejection(self, content_sha256: str, reason: str, size_bytes: Optional[int] = None) -> None:
+        """Remember that the Files API rejected this content so it is not re-sent until the entry expires."""
+        await self._run(self._put, content_sha256, STATUS_REJECTED, None, reason[:1000], size_bytes,
+                        self.rejection_ttl_seconds)
+        record_cache_operation("file_set", "rejected")
+        logger.info("Negatively cached rejected content hash=%s: %s", content_sha256[:16] + "...", reason[:200])
+
+    async def invalidate(self, content_sha256: str) -> None:
+        """Forget a cached file ID (e.g. the file was deleted or expired upstream)."""
+        if await self._run(self._delete, content_sha256, STATUS_READY, default=0):
+            self._stats["invalidations"] += 1
+            record_cache_operation("file_get", "invalidated")
+
+    async def mark_validated(self, content_sha256: str) -> None:
+        """Record that the cached file ID was just confirmed live."""
+        await self._run(self._mark_validated, content_sha256)
+
+    async def claim_upload(self, content_sha256: str, owner: str,
+                           lease_seconds: float = CLAUDE_FILE_UPLOAD_LEASE_SECONDS) -> bool:
+        """
+        Take the upload lease for content so no other worker uploads it concurrently.
+
+        Returns:
+            True if the caller should upload; False if another worker holds a live lease
+            or a result is already cached. Store errors grant the lease (uploading twice is
+            better than not uploading).
+        """
+        return await self._run(self._claim, content_sha256, owner, lease_seconds, default=True)
+
+    async def release_upload(self, content_sha256: str, owner: str) -> None:
+        """Give up an upload lease without a result (the upload failed)."""
+        await self._run(self._delete, content_sha256, STATUS_UPLOADING, owner, default=0)
+
+    async def wait_for_upload(self, content_sha256: str, timeout: float = CLAUDE_FILE_UPLOAD_LEASE_SECONDS,
+                              poll_interval: float = 0.5) -> Optional[FileCacheEntry]:
+        """
+        Wait for another worker's upload of the same content to finish.
+
+        Returns:
+            The resulting entry (file ID or rejection), or None if the lease lapsed or the
+            upload failed without a result
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            entry = await self.get_entry(content_sha256=content_sha256)
+            if entry:
+                return entry
+            if not await self._run(self._lease_active, content_sha256, default=False):
+                # The holder failed or died without a result
+                return None
+        return None
+
+    async def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics including expiration info."""
-        async with self._lock:
-            current_time = time.time()
-            valid_entries = 0
-            expired_entries = 0
-            
-            for entry in self._cache.values():
-                if current_time > entry['expires_at']:
-                    expired_entries += 1
-                else:
-                    valid_entries += 1
-            
-            return {
-                "cached_files": len(self._cache),
-                "valid_entries": valid_entries,
-                "expired_entries": expired_entries,
-                "total_size_bytes": sum(len(k) + len(str(v)) for k, v in self._cache.items()),
-                "ttl_seconds": CLAUDE_FILE_TTL_SECONDS
-            }
-    
+        store = await self._run(self._store_stats, default={})
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["expired"]
+        return {
+            **store,
+            **self._stats,
+            "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "rejection_ttl_seconds": self.rejection_ttl_seconds
+        }
+
     async def cleanup_expired(self) -> int:
         """Remove expired entries and return count cleaned."""
-        async with self._lock:
-            current_time = time.time()
-            expired_keys = [
-                content_hash for content_hash, entry in self._cache.items()
-                if current_time > entry['expires_at']
-            ]
-            
-            for key in expired_keys:
-                del self._cache[key]
-            
-            if expired_keys:
-                logger.info("Cleaned up %d expired cache entries", len(expired_keys))
-            
-            return len(expired_keys)
-    
+        removed = await self._run(self._cleanup_expired, default=0)
+        if removed:
+            logger.info("Cleaned up %d expired cache entries", removed)
+        return removed
+
     async def clear_cache(self) -> int:
         """Clear all cached entries and return count cleared."""
-        async with self._lock:
-            count = len(self._cache)
-            self._cache.clear()
-            logger.info("Cleared %d cached file IDs", count)
-            return count
+        count = await self._run(self._clear, default=0)
+        logger.info("Cleared %d cached file IDs", count)
+        return count
+
+
+def upload_lease_owner() -> str:
+    """Unique owner token for one upload attempt."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+_file_cache: Optional[FileCacheManager] = None
+
 
-# Global cache instance
-_file_cache = FileCacheManager()
+def get_file_cache() -> FileCacheManager:
+    """Get the process-wide file cache bound to the application database."""
+    global _file_cache
+    if _file_cache is None:
+        _file_cache = FileCacheManager()
+    return _file_cache
 
-async def get_cached_file_id(pdf_content: bytes) -> Optional[str]:
-    """Get cached Claude file ID for PDF content."""
-    return await _file_cache.get_file_id(pdf_content)
+async def get_cached_file_id(pdf_content: Optional[bytes] = None, content_sha256: Optional[str] = None) -> Optional[str]:
+    """Get cached Claude file ID for PDF content (or its precomputed SHA-256)."""
+    return await get_file_cache().get_file_id(pdf_content, content_sha256=content_sha256)
 
-async def cache_file_id(pdf_content: bytes, file_id: str) -> None:
-    """Cache Claude file ID for PDF content with atomic write."""
-    await _file_cache.cache_file_id(pdf_content, file_id)
+async def cache_file_id(pdf_content: Optional[bytes] = None, file_id: str = None, content_sha256: Optional[str] = None) -> None:
+    """Cache Claude file ID for PDF content (or its precomputed SHA-256)."""
+    await get_file_cache().cache_file_id(pdf_content, file_id, content_sha256=content_sha256)
 
-async def get_file_cache_stats() -> Dict[str, any]:
+async def get_file_cache_stats() -> Dict[str, Any]:
     """Get file cache statistics."""
-    return await _file_cache.get_cache_stats()
+    return await get_file_cache().get_cache_stats()
 
 async def cleanup_expired_cache() -> int:
     """Cleanup expired cache entries."""
-    return await _file_cache.cleanup_expired() 
\ No newline at end of file
+    return await get_file_cache().cleanup_expired()
@@ -0,0 +1,68 @@
+"""
+Host-shared SQLite stores.
+
+State that every worker process on a host has to agree on but that can always be
+rebuilt (the Claude rate limiter, the response cache, the streaming session store) is
+kept in small SQLite files outside the application database. LocalStore holds what
+they have in common:
+- autocommit connections; writers take ``BEGIN IMMEDIATE`` explicitly when they
+  need a transaction
+- a busy timeout so concurrent writers queue instead of failing
+- WAL journaling so readers never block the writer
+- ``synchronous=NORMAL``: losing the last writes on power loss only costs a cache miss
+- running the blocking calls in a worker thread, logging store errors instead of
+  raising them so an unavailable store never fails a request
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def default_store_path(env_var: str, filename: str) -> str:
+    """Store file named by ``env_var``, defaulting to ``filename`` in the temp directory."""
+    return os.getenv(env_var, os.path.join(tempfile.gettempdir(), filename))
+
+
+class LocalStore:
+    """Base class for stores kept in a host-shared SQLite file."""
+
+    # Used in log messages about failed store operations
+    store_name = "Local store"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self) -> None:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+        finally:
+            conn.close()
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        """Create the store's tables and indexes (idempotently)."""
+        raise NotImplementedError
+
+    async def _run(self, operation, *args, default=None):
+        """Run a synchronous store operation in a worker thread; store errors are logged and ignored."""
+        try:
+            return await asyncio.to_thread(operation, *args)
+        except sqlite3.Error as e:
+            logger.warning("%s operation %s failed: %s", self.store_name, operation.__name__, e)
+            return default
@@ -3,7 +3,7 @@
 This module provides conversion functions for:
 1. Converting between Claude API message format and internal message models
 2. Converting between frontend message format and internal message models
-3. Converting citations between different formats
+3. Converting citations between different formats, including stored (database) citations
 """
 
 import uuid
@@ -18,6 +18,7 @@ from models.citation import (
     PageLocationCitation,
     ContentBlock
 )
+from models.database_models import Citation as CitationRecord
 
 
 def claude_message_to_internal(claude_message: Dict[str, Any]) -> Message:
@@ -146,6 +147,18 @@ def internal_message_to_frontend(message: Message) -> Dict[str, Any]:
     return frontend_message
 
 
+def stored_citation_to_internal(citation: CitationRecord, document_title: Optional[str]) -> Citation:
+    """Convert a stored citation row and its document's filename to a page-location Citation."""
+    return PageLocationCitation(
+        type=CitationType.PAGE_LOCATION,
+        cited_text=citation.text,
+        document_index=0,
+        document_title=document_title or "Unknown Document",
+        start_page_number=citation.page,
+        end_page_number=citation.page,
+    )
+
+
 def _convert_claude_citation(claude_citation: Dict[str, Any]) -> Optional[Citation]:
     """Convert a Claude citation to internal Citation model."""
     try:
@@ -48,6 +48,63 @@ if PROMETHEUS_AVAILABLE:
         ['model']
     )
     
+    # Local estimator drift vs sampled SDK count_tokens
+    claude_token_estimate_drift = Histogram(
+        'claude_token_estimate_drift_ratio',
+        'Ratio of sampled SDK count_tokens result to local token estimate',
+        ['model']
+    )
+    
+    # Prompt cache reads/writes reported in response usage
+    claude_prompt_cache_tokens_total = Counter(
+        'claude_prompt_cache_tokens_total',
+        'Input tokens read from or written to the Claude prompt cache',
+        ['model', 'operation']  # operation: read/write
+    )
+    
+    # Write-behind persistence of streamed assistant content
+    stream_content_flushes_total = Counter(
+        'stream_content_flushes_total',
+        'Database writes of streamed assistant message content',
+        ['reason']  # bytes/interval/tool_start/complete
+    )
+    stream_content_flush_lag_seconds = Histogram(
+        'stream_content_flush_lag_seconds',
+        'Age of the oldest unwritten streamed content when it was flushed'
+    )
+    
+    # Cancelled streams
+    stream_cancellations_total = Counter(
+        'stream_cancellations_total',
+        'Streaming responses stopped before completion',
+        ['reason']  # client_cancel/disconnect
+    )
+    claude_cancelled_output_tokens_saved = Histogram(
+        'claude_cancelled_output_tokens_saved',
+        'Output tokens reserved for a cancelled stream but never generated (upper bound on savings)',
+        buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+    )
+    
+    # WebSocket outbound queues (per-connection sender tasks)
+    ws_outbound_queue_depth = Histogram(
+        'ws_outbound_queue_depth',
+        'Frames waiting in a connection outbox when its sender drained it',
+        buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+    )
+    ws_frames_sent_total = Counter(
+        'ws_frames_sent_total',
+        'WebSocket frames written to clients'
+    )
+    ws_frames_coalesced_total = Counter(
+        'ws_frames_coalesced_total',
+        'Queued WebSocket events merged into other frames before sending'
+    )
+    ws_slow_consumer_total = Counter(
+        'ws_slow_consumer_total',
+        'Connection outboxes that reached their depth limit',
+        ['action']  # block/disconnect
+    )
+    
     # Cost optimization
     claude_cost_reduction_percent = Gauge(
         'claude_cost_reduction_percent',
@@ -78,6 +135,16 @@ else:
     claude_tool_calls_total = MockMetric()
     claude_cache_operations_total = MockMetric()
     claude_token_efficiency = MockMetric()
+    claude_token_estimate_drift = MockMetric()
+    claude_prompt_cache_tokens_total = MockMetric()
+    stream_content_flushes_total = MockMetric()
+    stream_content_flush_lag_seconds = MockMetric()
+    stream_cancellations_total = MockMetric()
+    claude_cancelled_output_tokens_saved = MockMetric()
+    ws_outbound_queue_depth = MockMetric()
+    ws_frames_sent_total = MockMetric()
+    ws_frames_coalesced_total = MockMetric()
+    ws_slow_consumer_total = MockMetric()
     claude_cost_reduction_percent = MockMetric()
     claude_haiku_usage_ratio = MockMetric()
 
@@ -121,6 +188,31 @@ def record_cache_operation(operation: str, result: str) -> None:
     claude_cache_operations_total.labels(operation=operation, result=result).inc()
     logger.debug("Cache operation recorded: %s -> %s", operation, result)
 
+def record_stream_flush(reason: str, lag_seconds: float) -> None:
+    """Record a write-behind flush of streamed message content."""
+    stream_content_flushes_total.labels(reason=reason).inc()
+    stream_content_flush_lag_seconds.observe(lag_seconds)
+
+def record_stream_cancellation(reason: str) -> None:
+    """Record a streaming response cancelled by the client or by a disconnect."""
+    stream_cancellations_total.labels(reason=reason).inc()
+
+def record_cancelled_output_tokens(tokens_saved: int) -> None:
+    """Record output tokens a cancelled Claude stream did not generate."""
+    if tokens_saved > 0:
+        claude_cancelled_output_tokens_saved.observe(tokens_saved)
+
+def record_ws_drain(queue_depth: int, frames_sent: int) -> None:
+    """Record one drain of a WebSocket connection outbox."""
+    ws_outbound_queue_depth.observe(queue_depth)
+    ws_frames_sent_total.inc(frames_sent)
+    if queue_depth > frames_sent:
+        ws_frames_coalesced_total.inc(queue_depth - frames_sent)
+
+def record_ws_slow_consumer(action: str) -> None:
+    """Record a connection outbox hitting its depth limit."""
+    ws_slow_consumer_total.labels(action=action).inc()
+
 def record_token_efficiency(model: str, estimated_tokens: int, actual_tokens: int) -> None:
     """Record token estimation accuracy."""
     if estimated_tokens > 0:
@@ -129,6 +221,23 @@ def record_token_efficiency(model: str, estimated_tokens: int, actual_tokens: in
         logger.debug("Token efficiency recorded: %s model, %.2f ratio (%d actual / %d estimated)", 
                     model, efficiency_ratio, actual_tokens, estimated_tokens)
 
+def record_token_estimate_drift(model: str, estimated_tokens: int, sdk_tokens: int) -> None:
+    """Record drift between the local token estimate and a sampled SDK count."""
+    if estimated_tokens > 0:
+        drift_ratio = sdk_tokens / estimated_tokens
+        claude_token_estimate_drift.labels(model=model).observe(drift_ratio)
+        logger.debug("Token estimate drift recorded: %s model, %.2f ratio (%d sdk / %d estimated)",
+                    model, drift_ratio, sdk_tokens, estimated_tokens)
+
+def record_prompt_cache_usage(model: str, cache_read_tokens: int, cache_write_tokens: int) -> None:
+    """Record prompt cache read and write tokens for a single request."""
+    if cache_read_tokens:
+        claude_prompt_cache_tokens_total.labels(model=model, operation="read").inc(cache_read_tokens)
+    if cache_write_tokens:
+        claude_prompt_cache_tokens_total.labels(model=model, operation="write").inc(cache_write_tokens)
+    logger.debug("Prompt cache usage recorded: %s model, %d read, %d written",
+                model, cache_read_tokens, cache_write_tokens)
+
 def update_cost_metrics(haiku_calls: int, sonnet_calls: int) -> None:
     """Update cost optimization metrics."""
     total_calls = haiku_calls + sonnet_calls
@@ -170,6 +279,8 @@ def get_metrics_summary() -> Dict[str, Any]:
                 "claude_tool_calls_total", 
                 "claude_cache_operations_total",
                 "claude_token_efficiency_ratio",
+                "claude_token_estimate_drift_ratio",
+                "claude_prompt_cache_tokens_total",
                 "claude_cost_reduction_percent",
                 "claude_haiku_usage_ratio"
             ]
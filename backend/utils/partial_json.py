@@ -0,0 +1,160 @@
+"""
+Incremental JSON parsing for streamed tool inputs.
+
+Claude streams ``tool_use`` inputs as ``input_json_delta`` fragments that are only valid
+JSON once the block is complete. IncrementalJSONParser scans each fragment once, keeping
+the nesting state between calls, and reports every member that has become complete at
+a bounded depth. For a tool input that means top-level keys (``chartType``, ``config``)
+and individual rows of the top-level ``data`` array as soon as their closing
+bracket arrives. Only the text of a completed member is handed to ``json.loads``, so
+the total parsing work stays linear in the input size.
+
+The parser is tolerant: malformed members are skipped, and nothing is reported for a
+value that never completes.
+"""
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Path = Tuple[Any, ...]
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    """An open object or array."""
+    __slots__ = ("kind", "path", "key", "index", "expect", "value_start")
+
+    def __init__(self, kind: str, path: Path):
+        self.kind = kind  # "object" or "array"
+        self.path = path
+        self.key: Optional[str] = None
+        self.index = 0
+        # object: key -> colon -> value -> comma; array: value -> comma
+        self.expect = "key" if kind == "object" else "value"
+        self.value_start: Optional[int] = None
+
+    @property
+    def member(self) -> Any:
+        return self.key if self.kind == "object" else self.index
+
+
+class IncrementalJSONParser:
+    """Feed JSON text in fragments; get back the members completed by each fragment."""
+
+    def __init__(self, max_depth: int = 2):
+        """
+        Args:
+            max_depth: Deepest member reported (1 = keys of the root object,
+                2 = also elements/keys of the root's children)
+        """
+        self.max_depth = max_depth
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self.done = False
+
+    def feed(self, fragment: str) -> List[Tuple[Path, Any]]:
+        """
+        Consume the next fragment.
+
+        Returns:
+            (path, value) for each member completed by this fragment, in document order
+        """
+        completed: List[Tuple[Path, Any]] = []
+        self.text += fragment
+        text = self.text
+        i = self._pos
+        end = len(text)
+        while i < end and not self.done:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_string(i, completed)
+                i += 1
+                continue
+            if c in _WHITESPACE:
+                i += 1
+                continue
+            frame = self._stack[-1] if self._stack else None
+            if c == '"':
+                if frame is not None and not (frame.kind == "object" and frame.expect == "key"):
+                    self._begin_value(frame, i)
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if frame is not None:
+                    self._begin_value(frame, i)
+                    path = frame.path + (frame.member,)
+                else:
+                    path = ()
+                self._stack.append(_Frame("object" if c == "{" else "array", path))
+            elif c in "}]":
+                if frame is None:
+                    i += 1
+                    continue
+                if frame.value_start is not None:  # Trailing scalar
+                    self._complete(frame, frame.value_start, i, completed)
+                self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if parent is None:
+                    self.done = True
+                elif parent.value_start is not None:
+                    self._complete(parent, parent.value_start, i + 1, completed)
+            elif c == ":":
+                if frame is not None and frame.kind == "object":
+                    frame.expect = "value"
+            elif c == ",":
+                if frame is not None:
+                    if frame.value_start is not None:
+                        self._complete(frame, frame.value_start, i, completed)
+                    if frame.kind == "array":
+                        frame.index += 1
+                        frame.expect = "value"
+                    else:
+                        frame.expect = "key"
+            elif frame is not None and frame.value_start is None and frame.expect == "value":
+                # Start of a number, true, false or null
+                self._begin_value(frame, i)
+            i += 1
+        self._pos = i
+        return completed
+
+    def _begin_value(self, frame: _Frame, position: int) -> None:
+        if frame.expect == "value":
+            frame.value_start = position
+            frame.expect = "comma"
+
+    def _end_string(self, position: int, completed: List[Tuple[Path, Any]]) -> None:
+        frame = self._stack[-1] if self._stack else None
+        if frame is None:
+            return
+        if frame.kind == "object" and frame.expect == "key":
+            try:
+                frame.key = json.loads(self.text[self._string_start:position + 1])
+            except ValueError:
+                frame.key = None
+            frame.expect = "colon"
+        elif frame.value_start is not None:
+            self._complete(frame, frame.value_start, position + 1, completed)
+
+    def _complete(self, frame: _Frame, start: int, end: int, completed: List[Tuple[Path, Any]]) -> None:
+        frame.value_start = None
+        path = frame.path + (frame.member,)
+        if len(path) > self.max_depth:
+            return
+        raw = self.text[start:end].strip()
+        try:
+            completed.append((path, json.loads(raw)))
+        except ValueError:
+            logger.debug(f"Skipping malformed streamed JSON member at {path}: {raw[:80]}")
@@ -0,0 +1,136 @@
+"""
+Prompt caching helpers for Claude API requests.
+
+Places ``cache_control`` breakpoints on the stable prefix of a request so that the
+turns of a multi-turn tool loop re-read the tool schemas, system prompt and document
+from the prompt cache instead of paying for them again. Cache prefixes are built in
+the order tools -> system -> messages, and the API accepts at most four breakpoints.
+
+Writing a prefix to the cache costs more than reading it uncached, so breakpoints only
+pay off when a later request re-reads them: callers making one-off requests should not
+add them, and prefixes shorter than the model's minimum cacheable length are never
+cached at all.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHE_BREAKPOINTS = 4
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+
+# Shortest prefix the API caches, in tokens; shorter breakpoints are ignored
+MIN_CACHEABLE_TOKENS = 1024
+_MIN_CACHEABLE_TOKENS_BY_FAMILY = {"haiku": 2048}
+
+
+def min_cacheable_tokens(model: Optional[str]) -> int:
+    """Minimum cacheable prompt length for a model."""
+    for family, tokens in _MIN_CACHEABLE_TOKENS_BY_FAMILY.items():
+        if model and family in model:
+            return tokens
+    return MIN_CACHEABLE_TOKENS
+
+
+def _has_cache_control(block: Any) -> bool:
+    return isinstance(block, dict) and "cache_control" in block
+
+
+def count_cache_breakpoints(params: Dict[str, Any]) -> int:
+    """Count the cache_control markers already present in a request."""
+    count = sum(1 for tool in params.get("tools") or [] if _has_cache_control(tool))
+    system = params.get("system")
+    if isinstance(system, list):
+        count += sum(1 for block in system if _has_cache_control(block))
+    for message in params.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, list):
+            count += sum(1 for block in content if _has_cache_control(block))
+    return count
+
+
+def _mark(block: Dict[str, Any]) -> Dict[str, Any]:
+    return {**block, "cache_control": dict(EPHEMERAL_CACHE_CONTROL)}
+
+
+def _find_document_block(messages: List[Dict[str, Any]]) -> Optional[tuple]:
+    """Locate the first document block; (message index, block index) or None."""
+    for m_idx, message in enumerate(messages):
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, list):
+            for b_idx, block in enumerate(content):
+                if isinstance(block, dict) and block.get("type") == "document":
+                    return m_idx, b_idx
+    return None
+
+
+def _with_marked_block(messages: List[Dict[str, Any]], m_idx: int, b_idx: int) -> List[Dict[str, Any]]:
+    message = messages[m_idx]
+    content = list(message["content"])
+    content[b_idx] = _mark(content[b_idx])
+    messages[m_idx] = {**message, "content": content}
+    return messages
+
+
+def apply_cache_breakpoints(params: Dict[str, Any], max_breakpoints: int = MAX_CACHE_BREAKPOINTS) -> Dict[str, Any]:
+    """
+    Return a copy of Messages API parameters with cache breakpoints on the stable prefix.
+
+    Breakpoints are added, in priority order, to the last tool schema, the system
+    prompt, the first document block and - for multi-turn requests - the last block
+    of the final message so the growing conversation prefix is cached between turns.
+    Caller-supplied breakpoints are kept and count toward the limit. The input
+    (including the shared tool list and message objects) is never mutated.
+
+    Args:
+        params: Keyword arguments for messages.create / messages.stream
+        max_breakpoints: Maximum number of cache_control markers per request
+
+    Returns:
+        New parameter dict with cache_control markers added
+    """
+    budget = max_breakpoints - count_cache_breakpoints(params)
+    if budget <= 0:
+        return params
+
+    params = dict(params)
+
+    tools = params.get("tools")
+    if budget > 0 and tools and not any(_has_cache_control(tool) for tool in tools):
+        tools = list(tools)
+        tools[-1] = _mark(tools[-1])
+        params["tools"] = tools
+        budget -= 1
+
+    system = params.get("system")
+    if budget > 0 and system:
+        if isinstance(system, str):
+            params["system"] = [_mark({"type": "text", "text": system})]
+            budget -= 1
+        elif isinstance(system, list) and not any(_has_cache_control(block) for block in system):
+            system = list(system)
+            system[-1] = _mark(system[-1])
+            params["system"] = system
+            budget -= 1
+
+    messages = params.get("messages")
+    if budget > 0 and isinstance(messages, list) and messages:
+        messages = list(messages)
+        document_position = _find_document_block(messages)
+        if document_position and not _has_cache_control(messages[document_position[0]]["content"][document_position[1]]):
+            messages = _with_marked_block(messages, *document_position)
+            budget -= 1
+
+        last = messages[-1]
+        if budget > 0 and len(messages) > 1 and isinstance(last, dict):
+            content = last.get("content")
+            if isinstance(content, str) and content:
+                messages[-1] = {**last, "content": [_mark({"type": "text", "text": content})]}
+                budget -= 1
+            elif isinstance(content, list) and content and not _has_cache_control(content[-1]):
+                messages = _with_marked_block(messages, len(messages) - 1, len(content) - 1)
+                budget -= 1
+        params["messages"] = messages
+
+    return params
@@ -0,0 +1,221 @@
+"""
+Persistent cache for deterministic Claude responses.
+
+Document classification, structured financial extraction and visualization-needs
+classification give the same answer for the same input bytes, model and prompt
+(none of them pass tools). Their parsed results are stored in a host-local SQLite file so re-uploads of
+byte-identical documents and extraction retries do not repeat full model calls.
+
+Entries are bounded by count and total size (least recently used first), expire after
+a TTL, and are dropped when the prompt they were produced with changes.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from utils.hashlib_utils import sha256_str
+from utils.local_store import LocalStore, default_store_path
+from utils.metrics import record_cache_operation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = default_store_path("CLAUDE_RESPONSE_CACHE_DB", "cfin_claude_response_cache.sqlite3")
+DEFAULT_TTL_SECONDS = int(os.getenv("CLAUDE_RESPONSE_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))  # 30 days
+DEFAULT_MAX_ENTRIES = int(os.getenv("CLAUDE_RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_MAX_BYTES = int(os.getenv("CLAUDE_RESPONSE_CACHE_MAX_MB", "100")) * 1024 * 1024
+
+
+def prompt_hash(*parts: Optional[str]) -> str:
+    """Hash the prompt text(s) a response depends on."""
+    return sha256_str("\x1f".join(part or "" for part in parts))
+
+
+class ResponseCache(LocalStore):
+    """
+    SQLite-backed LRU cache of parsed Claude responses.
+
+    Key: sha256 of (content sha256, model, prompt hash).
+    Each entry also records the prompt name and hash so a prompt change invalidates
+    everything produced with the old version.
+    """
+
+    store_name = "Response cache"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "sets": 0, "evictions": 0, "invalidations": 0}
+        super().__init__(db_path)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " cache_key TEXT PRIMARY KEY,"
+            " prompt_name TEXT NOT NULL,"
+            " prompt_hash TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " size_bytes INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_lru ON response_cache (last_accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_prompt ON response_cache (prompt_name, prompt_hash)")
+
+    @staticmethod
+    def make_key(content_sha256: str, model: str, prompt_digest: str) -> str:
+        """Build the cache key for one deterministic call."""
+        return sha256_str(f"{content_sha256}|{model}|{prompt_digest}")
+
+    # -- synchronous operations (run in a worker thread by the async wrappers) --
+
+    def _get(self, cache_key: str) -> Optional[Any]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT payload, expires_at FROM response_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                record_cache_operation("response_get", "miss")
+                return None
+            payload, expires_at = row
+            if now > expires_at:
+                conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
+                self._stats["expired"] += 1
+                record_cache_operation("response_get", "expired")
+                return None
+            conn.execute("UPDATE response_cache SET last_accessed = ? WHERE cache_key = ?", (now, cache_key))
+            self._stats["hits"] += 1
+            record_cache_operation("response_get", "hit")
+            return json.loads(payload)
+        finally:
+            conn.close()
+
+    def _set(self, cache_key: str, value: Any, prompt_name: str, prompt_digest: str, model: str) -> None:
+        payload = json.dumps(value, default=str)
+        size_bytes = len(payload.encode("utf-8"))
+        if size_bytes > self.max_bytes:
+            logger.info("Response too large to cache (%d bytes) for prompt %s", size_bytes, prompt_name)
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache"
+                " (cache_key, prompt_name, prompt_hash, model, payload, size_bytes, created_at, expires_at, last_accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, prompt_name, prompt_digest, model, payload, size_bytes, now, now + self.ttl_seconds, now)
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+            self._stats["sets"] += 1
+            record_cache_operation("response_set", "stored")
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least recently used ones until within bounds."""
+        expired = conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,)).rowcount
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM response_cache"
+        ).fetchone()
+        evicted = 0
+        if count > self.max_entries or total_bytes > self.max_bytes:
+            for cache_key, size_bytes in conn.execute(
+                "SELECT cache_key, size_bytes FROM response_cache ORDER BY last_accessed ASC"
+            ).fetchall():
+                if count <= self.max_entries and total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
+                count -= 1
+                total_bytes -= size_bytes
+                evicted += 1
+        if expired or evicted:
+            self._stats["evictions"] += expired + evicted
+            record_cache_operation("response_evict", "lru")
+
+    def sync_prompt_versions(self, prompts: Dict[str, str]) -> int:
+        """
+        Drop entries produced with an older version of any named prompt.
+
+        Args:
+            prompts: Mapping of prompt name to its current prompt hash
+
+        Returns:
+            Number of entries invalidated
+        """
+        conn = self._connect()
+        try:
+            removed = 0
+            for name, digest in prompts.items():
+                removed += conn.execute(
+                    "DELETE FROM response_cache WHERE prompt_name = ? AND prompt_hash != ?", (name, digest)
+                ).rowcount
+            if removed:
+                self._stats["invalidations"] += removed
+                logger.info("Invalidated %d cached Claude responses after prompt changes", removed)
+            return removed
+        finally:
+            conn.close()
+
+    def clear(self) -> int:
+        """Remove every cached response."""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM response_cache").rowcount
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the shared store's size."""
+        conn = self._connect()
+        try:
+            count, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM response_cache"
+            ).fetchone()
+        finally:
+            conn.close()
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["expired"]
+        return {
+            **self._stats,
+            "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": count,
+            "total_size_bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    # -- async API -------------------------------------------------------------
+
+    async def get(self, cache_key: str) -> Optional[Any]:
+        """Return the cached value for a key, or None on miss/expiry/store error."""
+        return await self._run(self._get, cache_key)
+
+    async def set(self, cache_key: str, value: Any, prompt_name: str, prompt_digest: str, model: str) -> None:
+        """Store a JSON-serializable value; failures are logged and ignored."""
+        try:
+            await self._run(self._set, cache_key, value, prompt_name, prompt_digest, model)
+        except (TypeError, ValueError) as e:
+            logger.warning("Response cache write failed: %s", e)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache bound to the host-shared store."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
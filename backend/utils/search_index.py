@@ -0,0 +1,218 @@
+"""
+Full-text search index for conversation titles and message content.
+
+SQLite: FTS5 tables ``message_search`` and ``conversation_search`` index
+``messages.content`` and ``conversations.title``. Each index row carries the source
+row's primary key in an UNINDEXED ``id`` column and searches join on it, because the
+implicit rowid of tables without an INTEGER primary key can be renumbered by VACUUM.
+Triggers keep the index in sync with every INSERT, UPDATE and DELETE, including the
+write-behind updates of streamed messages. The index row is given the source rowid
+when that is free, so the triggers normally find it by rowid; after a VACUUM they fall
+back to scanning for the id until the index is rebuilt.
+Postgres: GIN indexes on ``to_tsvector('english', ...)`` of the same columns.
+
+``install_search_index`` runs after ``Base.metadata.create_all`` (see
+models/database_models.py), so new databases, test databases and application startup
+all get the index. The first install on an existing SQLite database, or on one with
+the older rowid-linked index, builds the index from the current rows.
+``rebuild_search_index`` (migrate_search_index.py) re-syncs it.
+
+Searches are ranked (bm25 / ts_rank, lower is better) and return highlighted snippets
+in which the matched terms are wrapped in ``<mark>`` and the rest is HTML-escaped.
+"""
+import html
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import DateTime, event, text
+
+logger = logging.getLogger(__name__)
+
+# Highlight delimiters used inside SQL; replaced after the snippet is HTML-escaped
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+SNIPPET_TOKENS = 24
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+    " id UNINDEXED, content, tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS conversation_search USING fts5("
+    " id UNINDEXED, title, tokenize='porter unicode61')",
+]
+_SQLITE_TRIGGERS = [
+    # (table, indexed column, fts table)
+    ("messages", "content", "message_search"),
+    ("conversations", "title", "conversation_search"),
+]
+_POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_search ON messages USING GIN (to_tsvector('english', content))",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_title_search ON conversations USING GIN (to_tsvector('english', title))",
+]
+
+
+def _sqlite_trigger_ddl(table: str, column: str, fts: str):
+    # The index row is found by rowid while it still matches the source row; only after
+    # the source rowids were renumbered does the delete scan the (unindexed) id column
+    delete_old = (
+        f"DELETE FROM {fts} WHERE rowid = (SELECT CASE"
+        f" WHEN EXISTS (SELECT 1 FROM {fts} WHERE rowid = old.rowid AND id = old.id) THEN old.rowid"
+        f" ELSE (SELECT rowid FROM {fts} WHERE id = old.id) END);"
+    )
+    # Reuse the source rowid unless another index row holds it (NULL lets FTS5 assign one)
+    insert_new = (
+        f"INSERT INTO {fts}(rowid, id, {column}) SELECT"
+        f" CASE WHEN EXISTS (SELECT 1 FROM {fts} WHERE rowid = new.rowid) THEN NULL ELSE new.rowid END,"
+        f" new.id, new.{column};"
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"{delete_old} {insert_new} END",
+    ]
+
+
+def install_search_index(connection, rebuild_if_new: bool = True) -> bool:
+    """
+    Create the search index objects for the connection's backend if missing.
+
+    Returns:
+        True if the SQLite index was created (and, with rebuild_if_new, populated) now
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+        return False
+    if dialect != "sqlite":
+        return False
+
+    existing = connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'message_search'")
+    ).first()
+    if existing is not None and not _has_id_column(connection, "message_search"):
+        # Index from before rows were keyed by id: replace it
+        _drop_sqlite_index(connection)
+        existing = None
+    for statement in _SQLITE_DDL:
+        connection.execute(text(statement))
+    for table, column, fts in _SQLITE_TRIGGERS:
+        for statement in _sqlite_trigger_ddl(table, column, fts):
+            connection.execute(text(statement))
+    if existing is None and rebuild_if_new:
+        rebuild_search_index(connection)
+    return existing is None
+
+
+def _has_id_column(connection, fts: str) -> bool:
+    return any(row[1] == "id" for row in connection.execute(text(f"PRAGMA table_info({fts})")))
+
+
+def _drop_sqlite_index(connection) -> None:
+    for table, _, fts in _SQLITE_TRIGGERS:
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+
+
+def rebuild_search_index(connection) -> None:
+    """Re-index every message and conversation title from the source tables (SQLite)."""
+    if connection.dialect.name != "sqlite":
+        return
+    for table, column, fts in _SQLITE_TRIGGERS:
+        connection.execute(text(f"DELETE FROM {fts}"))
+        connection.execute(text(f"INSERT INTO {fts}(rowid, id, {column}) SELECT rowid, id, {column} FROM {table}"))
+
+
+def register_search_index(metadata) -> None:
+    """Install the search index whenever ``metadata.create_all`` runs."""
+    @event.listens_for(metadata, "after_create")
+    def _install(target, connection, **kw):
+        if install_search_index(connection):
+            logger.info("Created full-text search index for messages and conversation titles")
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for free-text user input: every word must match, the last
+    one as a prefix (search-as-you-type). Words are quoted, so FTS5 operators and
+    punctuation in the input are taken literally. None if the input has no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight(snippet: Optional[str]) -> str:
+    """HTML-escape a snippet and turn the highlight delimiters into ``<mark>`` tags."""
+    escaped = html.escape(snippet or "", quote=False)
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+MESSAGE_SEARCH_SQLITE = text(f"""
+    SELECT m.id AS message_id, m.conversation_id, c.title AS conversation_title, m.role, m.created_at,
+           snippet(message_search, 1, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+           bm25(message_search) AS rank
+    FROM message_search
+    JOIN messages m ON m.id = message_search.id
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE message_search MATCH :match AND c.user_id = :user_id
+    ORDER BY rank, m.created_at DESC
+    LIMIT :limit OFFSET :offset
+""").columns(created_at=DateTime)
+
+CONVERSATION_SEARCH_SQLITE = text("""
+    WITH matches AS (
+        SELECT c.id AS conversation_id, 2.0 * bm25(conversation_search) AS rank
+        FROM conversation_search
+        JOIN conversations c ON c.id = conversation_search.id
+        WHERE conversation_search MATCH :match AND c.user_id = :user_id
+        UNION ALL
+        SELECT m.conversation_id, bm25(message_search) AS rank
+        FROM message_search
+        JOIN messages m ON m.id = message_search.id
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE message_search MATCH :match AND c.user_id = :user_id
+    )
+    SELECT conversation_id, MIN(rank) AS rank
+    FROM matches
+    GROUP BY conversation_id
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+""")
+
+_HEADLINE_OPTIONS = f"StartSel={_MARK_START}, StopSel={_MARK_END}, MaxFragments=1, MaxWords={SNIPPET_TOKENS}, MinWords=8"
+
+MESSAGE_SEARCH_POSTGRES = text(f"""
+    SELECT m.id AS message_id, m.conversation_id, c.title AS conversation_title, m.role, m.created_at,
+           ts_headline('english', m.content, q, '{_HEADLINE_OPTIONS}') AS snippet,
+           -ts_rank(to_tsvector('english', m.content), q) AS rank
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id,
+         websearch_to_tsquery('english', :query) q
+    WHERE to_tsvector('english', m.content) @@ q AND c.user_id = :user_id
+    ORDER BY rank, m.created_at DESC
+    LIMIT :limit OFFSET :offset
+""").columns(created_at=DateTime)
+
+CONVERSATION_SEARCH_POSTGRES = text("""
+    WITH q AS (SELECT websearch_to_tsquery('english', :query) AS q),
+    matches AS (
+        SELECT c.id AS conversation_id, -2.0 * ts_rank(to_tsvector('english', c.title), q.q) AS rank
+        FROM conversations c, q
+        WHERE to_tsvector('english', c.title) @@ q.q AND c.user_id = :user_id
+        UNION ALL
+        SELECT m.conversation_id, -ts_rank(to_tsvector('english', m.content), q.q) AS rank
+        FROM messages m JOIN conversations c ON c.id = m.conversation_id, q
+        WHERE to_tsvector('english', m.content) @@ q.q AND c.user_id = :user_id
+    )
+    SELECT conversation_id, MIN(rank) AS rank
+    FROM matches
+    GROUP BY conversation_id
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+""")
@@ -0,0 +1,140 @@
+"""
+Fast serialization for API responses and streamed frames.
+
+JSON goes through orjson when it is installed (stdlib ``json`` otherwise), with one
+``default`` hook for everything orjson does not handle natively: Pydantic models (by
+alias), sets, Decimals and other objects, which become strings as
+``ensure_json_serializable`` always did.
+
+- ``dumps`` / ``dumps_text`` / ``loads``: general-purpose encode/decode
+- ``to_jsonable``: plain JSON-compatible copy of a tree, e.g. before writing a JSON column
+- ``ModelEncoder``: a precomputed Pydantic serializer for a response type. Returning
+  ``encoder.response(value)`` from a route bypasses FastAPI's response_model
+  re-validation and ``jsonable_encoder`` walk, which dominate large responses
+- ``FastJSONResponse``: JSONResponse rendered with ``dumps``
+- ``packb`` / ``negotiate_ws_encoding``: MessagePack frames for WebSocket clients that
+  ask for ``?encoding=msgpack`` (ormsgpack or msgpack must be installed)
+"""
+import json
+import logging
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+try:
+    import ormsgpack as _msgpack
+except ImportError:  # Fall back to msgpack, then to JSON-only
+    try:
+        import msgpack as _msgpack
+    except ImportError:
+        _msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+MSGPACK_AVAILABLE = _msgpack is not None
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(by_alias=True)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    return str(obj)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON."""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data: Any) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON."""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Any) -> Any:
+        return json.loads(data)
+
+
+def dumps_text(obj: Any) -> str:
+    """Serialize to a JSON string (WebSocket text frames, SSE data lines)."""
+    return dumps(obj).decode("utf-8")
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Plain dict/list/str/number copy of ``obj``, converted the way ``dumps`` converts it."""
+    return loads(dumps(obj))
+
+
+def packb(obj: Any) -> bytes:
+    """Serialize to MessagePack; requires ormsgpack or msgpack."""
+    if _msgpack is None:
+        raise RuntimeError("MessagePack encoding requested but neither ormsgpack nor msgpack is installed")
+    # Round-trip through JSON types so both libraries see the same plain tree
+    return _msgpack.packb(to_jsonable(obj))
+
+
+def unpackb(data: bytes) -> Any:
+    if _msgpack is None:
+        raise RuntimeError("MessagePack decoding requested but neither ormsgpack nor msgpack is installed")
+    return _msgpack.unpackb(data)
+
+
+def negotiate_ws_encoding(requested: Optional[str]) -> str:
+    """
+    Resolve the frame encoding requested by a WebSocket client.
+
+    Returns:
+        "msgpack" if requested and available, otherwise "json"
+    """
+    if requested and requested.lower() == ENCODING_MSGPACK:
+        if MSGPACK_AVAILABLE:
+            return ENCODING_MSGPACK
+        logger.warning("Client requested msgpack WebSocket frames but no MessagePack library is installed; using JSON")
+    return ENCODING_JSON
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fast encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ModelEncoder:
+    """
+    Precomputed serializer for a Pydantic response type, e.g. ``ModelEncoder(List[Message])``.
+
+    Build one per type at import time; the core schema is compiled once and every call
+    serializes straight to JSON bytes.
+    """
+
+    def __init__(self, type_: Any, by_alias: bool = True):
+        self.adapter = TypeAdapter(type_)
+        self.by_alias = by_alias
+
+    def encode(self, value: Any) -> bytes:
+        return self.adapter.dump_json(value, by_alias=self.by_alias)
+
+    def response(self, value: Any, status_code: int = 200) -> Response:
+        return Response(content=self.encode(value), status_code=status_code, media_type="application/json")
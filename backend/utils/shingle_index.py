@@ -0,0 +1,104 @@
+"""
+Incremental near-duplicate detection for streamed text.
+
+ShingleIndex keeps the vocabulary and the hashed word shingles (runs of
+``shingle_words`` consecutive words) of everything added so far. Text can be added
+in arbitrary fragments, e.g. as it streams in: a word cut off at the end of a
+fragment is held back until the next fragment (or ``flush``) completes it, and
+shingles span fragment boundaries.
+
+A near-duplicate check then costs O(len(new_text)) whatever the size of the
+indexed text, where re-splitting and comparing every sentence of the accumulated
+answer cost O(n·m) per check.
+"""
+import re
+from collections import deque
+from typing import Deque, List, Set
+
+_WORD = re.compile(r"\w+")
+_TRAILING_WORD = re.compile(r"\w+$")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class ShingleIndex:
+    """Words and word-shingle hashes of accumulated text."""
+
+    def __init__(self, shingle_words: int = 5):
+        """
+        Args:
+            shingle_words: Words per shingle; shorter texts are judged on vocabulary alone
+        """
+        self.shingle_words = shingle_words
+        self.words: Set[str] = set()
+        self.shingles: Set[int] = set()
+        self.word_count = 0
+        self._window: Deque[str] = deque(maxlen=shingle_words)
+        self._pending = ""
+
+    @classmethod
+    def from_text(cls, text: str, shingle_words: int = 5) -> "ShingleIndex":
+        index = cls(shingle_words)
+        index.add(text)
+        index.flush()
+        return index
+
+    def add(self, fragment: str) -> None:
+        """Index a fragment of text; a trailing partial word waits for the next fragment."""
+        text = self._pending + fragment.lower()
+        match = _TRAILING_WORD.search(text)
+        if match:
+            self._pending = match.group()
+            text = text[:match.start()]
+        else:
+            self._pending = ""
+        for word in _WORD.findall(text):
+            self._add_word(word)
+
+    def flush(self) -> None:
+        """Index the held-back partial word (end of a turn or message)."""
+        if self._pending:
+            self._add_word(self._pending)
+            self._pending = ""
+
+    def _add_word(self, word: str) -> None:
+        self.words.add(word)
+        self.word_count += 1
+        self._window.append(word)
+        if len(self._window) == self.shingle_words:
+            self.shingles.add(hash(tuple(self._window)))
+
+    def _shingles_of(self, words: List[str]) -> Set[int]:
+        k = self.shingle_words
+        return {hash(tuple(words[i:i + k])) for i in range(len(words) - k + 1)}
+
+    def is_substantially_new(self, new_text: str, similarity_threshold: float = 0.15) -> bool:
+        """
+        Check whether new_text adds enough to the indexed text.
+
+        Args:
+            new_text: Candidate text
+            similarity_threshold: Minimum proportion of new content required (0.15 = 15% new)
+
+        Returns:
+            False if new_text is empty or its words, or its shingles, are more than
+            (1 - similarity_threshold) already indexed; True otherwise
+        """
+        words = _words(new_text)
+        if not words:
+            return False
+        if self.word_count == 0 and not self._pending:
+            return True
+
+        unique = set(words)
+        known = sum(1 for word in unique if word in self.words or word == self._pending)
+        if known / len(unique) > 1 - similarity_threshold:
+            return False
+
+        if len(words) >= self.shingle_words:
+            candidate = self._shingles_of(words)
+            if len(candidate & self.shingles) / len(candidate) > 1 - similarity_threshold:
+                return False
+        return True
@@ -42,6 +42,17 @@ Interactions with other files:
    - Upload endpoints use StorageService via DocumentRepository
    - Routes document uploads through the storage layer
 
+Uploads are written with save_stream: chunks go straight to the backend while a
+SHA-256 is computed and a size limit is enforced, so no full in-memory copy of the
+file is needed. The resulting StoredFile is a handle that later stages open or read
+on demand instead of passing bytes around.
+
+In content-addressed mode (the default) uploads are stored once per SHA-256 under
+``blobs/<sha[:2]>/<sha>.pdf`` via save_blob; identical uploads share one blob and the
+database tracks a reference count per blob (see repositories/blob_repository.py).
+Documents uploaded before this mode keep their legacy ``<document_id>.pdf`` key until
+migrate_blob_storage.py folds them into blobs.
+
 This service is configurable through environment variables:
 - STORAGE_TYPE: "local" or "s3" to select the storage backend
 - UPLOAD_DIR: Directory for local file storage
@@ -49,6 +60,7 @@ This service is configurable through environment variables:
 - AWS_ACCESS_KEY_ID: AWS credentials for S3 access
 - AWS_SECRET_ACCESS_KEY: AWS credentials for S3 access
 - S3_REGION: AWS region for S3 bucket
+- STORAGE_CONTENT_ADDRESSED: "true" (default) to store uploads as deduplicated blobs
 
 The storage service layer ensures file operations are consistent regardless of
 the underlying storage mechanism, making the application more flexible and
@@ -57,14 +69,80 @@ easier to deploy in different environments.
 
 import os
 import io
+import asyncio
+import hashlib
+import tempfile
+import contextlib
+import uuid
 import aiofiles
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, AsyncIterator, BinaryIO, AsyncContextManager, Tuple
 import boto3
+from botocore.exceptions import ClientError
 import logging
 from abc import ABC, abstractmethod
 
 logger = logging.getLogger(__name__)
 
+# Read/write granularity for streamed uploads and hashing
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Key prefix for content-addressed blobs (and their in-flight staging files)
+BLOB_PREFIX = "blobs"
+
+
+class FileTooLargeError(ValueError):
+    """Raised by save_stream as soon as an upload crosses its size limit."""
+    def __init__(self, max_size_bytes: int):
+        super().__init__(f"File exceeds the {max_size_bytes / (1024 ** 2):.0f} MB upload limit")
+        self.max_size_bytes = max_size_bytes
+
+
+@dataclass
+class StoredFile:
+    """Handle to a file in storage: identity, size and content hash without the bytes."""
+    file_id: str
+    path: str
+    size: int
+    sha256: str
+    storage: 'StorageService' = field(repr=False, compare=False)
+
+    def open(self) -> AsyncContextManager[BinaryIO]:
+        """Open the stored file for streaming reads."""
+        return self.storage.open_file(self.file_id)
+
+    async def read(self) -> bytes:
+        """Read the whole file (only for consumers that genuinely need the bytes)."""
+        data = await self.storage.get_file(self.file_id)
+        if data is None:
+            raise FileNotFoundError(f"Stored file {self.file_id} not found")
+        return data
+
+
+async def iter_bytes(data: bytes, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Adapt an in-memory payload to the save_stream chunk interface."""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+class _HashingSizeGuard:
+    """Accumulates SHA-256 and size over streamed chunks, enforcing a size limit."""
+
+    def __init__(self, max_size_bytes: Optional[int]):
+        self.max_size_bytes = max_size_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_size_bytes is not None and self.size > self.max_size_bytes:
+            raise FileTooLargeError(self.max_size_bytes)
+        self._hash.update(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
 class StorageService(ABC):
     """Abstract base class for storage services."""
     
@@ -88,6 +166,106 @@ class StorageService(ABC):
         """Get the physical path to a file in storage."""
         pass
     
+    @abstractmethod
+    async def save_stream(
+        self, chunks: AsyncIterator[bytes], file_id: str, content_type: str, max_size_bytes: Optional[int] = None
+    ) -> StoredFile:
+        """
+        Stream chunks into storage, hashing as they are written.
+        
+        Raises FileTooLargeError (leaving nothing behind) once max_size_bytes is crossed.
+        """
+        pass
+    
+    @abstractmethod
+    def open_file(self, file_id: str) -> AsyncContextManager[BinaryIO]:
+        """Async context manager yielding a readable binary file object."""
+        pass
+    
+    @abstractmethod
+    async def exists(self, file_id: str) -> bool:
+        """Check whether a file exists in storage."""
+        pass
+    
+    @abstractmethod
+    async def move_file(self, source_id: str, target_id: str) -> None:
+        """Move a file to a new key, replacing any existing file at the target."""
+        pass
+    
+    @property
+    def content_addressed(self) -> bool:
+        """Whether uploads are stored as deduplicated blobs keyed by their SHA-256."""
+        return os.getenv("STORAGE_CONTENT_ADDRESSED", "true").lower() == "true"
+    
+    @staticmethod
+    def blob_key(sha256: str, extension: str = ".pdf") -> str:
+        """Storage key of the blob holding content with the given SHA-256."""
+        return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}{extension}"
+    
+    def blob_for(self, staged: StoredFile, extension: str = ".pdf") -> StoredFile:
+        """Handle to the blob a staged upload will be promoted to."""
+        key = self.blob_key(staged.sha256, extension)
+        return StoredFile(key, self.get_file_path(key), staged.size, staged.sha256, self)
+    
+    async def stage_blob(
+        self, chunks: AsyncIterator[bytes], content_type: str, max_size_bytes: Optional[int] = None,
+        extension: str = ".pdf"
+    ) -> StoredFile:
+        """Stream content to a unique staging key, hashing it on the way."""
+        staging_key = f"{BLOB_PREFIX}/staging/{uuid.uuid4().hex}{extension}"
+        return await self.save_stream(chunks, staging_key, content_type, max_size_bytes)
+    
+    async def promote_blob(self, staged: StoredFile, extension: str = ".pdf") -> Tuple[StoredFile, bool]:
+        """
+        Move a staged upload to its blob key, or discard it if the blob file already exists.
+        
+        Call this only once a reference to the blob is committed: from then on no delete can
+        remove the blob, so the existence check cannot go stale.
+        
+        Returns:
+            Handle to the blob and whether this call wrote its file
+        """
+        blob = self.blob_for(staged, extension)
+        created = not await self.exists(blob.file_id)
+        if created:
+            await self.move_file(staged.file_id, blob.file_id)
+        else:
+            await self.delete_file(staged.file_id)
+            logger.info(f"Upload matches existing blob {blob.file_id}; staged copy discarded")
+        return blob, created
+    
+    async def save_blob(
+        self, chunks: AsyncIterator[bytes], content_type: str, max_size_bytes: Optional[int] = None,
+        extension: str = ".pdf"
+    ) -> Tuple[StoredFile, bool]:
+        """
+        Stream content into a content-addressed blob.
+        
+        The content is staged under a unique key while it is hashed, then moved to its blob
+        key; if a blob with the same hash already exists the staged copy is discarded. Callers
+        that also record a database reference should stage, commit the reference and then
+        promote instead (see DocumentRepository.create_document_from_stream).
+        
+        Returns:
+            Handle to the blob and whether this call created it
+        """
+        staged = await self.stage_blob(chunks, content_type, max_size_bytes, extension)
+        return await self.promote_blob(staged, extension)
+    
+    async def describe_file(self, file_id: str) -> Optional[StoredFile]:
+        """Build a StoredFile handle for an existing file by streaming it once to hash it."""
+        try:
+            async with self.open_file(file_id) as fh:
+                def _digest():
+                    guard = _HashingSizeGuard(None)
+                    for chunk in iter(lambda: fh.read(STREAM_CHUNK_SIZE), b""):
+                        guard.update(chunk)
+                    return guard
+                guard = await asyncio.to_thread(_digest)
+        except FileNotFoundError:
+            return None
+        return StoredFile(file_id, self.get_file_path(file_id), guard.size, guard.sha256, self)
+    
     @staticmethod
     def get_storage_service() -> 'StorageService':
         """Factory method to get the appropriate storage service."""
@@ -155,6 +333,50 @@ class LocalStorageService(StorageService):
     def get_file_path(self, file_id: str) -> str:
         """Get the physical path to a file in local storage."""
         return os.path.join(self.upload_dir, file_id)
+    
+    async def save_stream(
+        self, chunks: AsyncIterator[bytes], file_id: str, content_type: str, max_size_bytes: Optional[int] = None
+    ) -> StoredFile:
+        """Stream a file to local storage via a temporary file renamed into place."""
+        file_path = os.path.join(self.upload_dir, file_id)
+        part_path = f"{file_path}.part"
+        guard = _HashingSizeGuard(max_size_bytes)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        
+        try:
+            async with aiofiles.open(part_path, "wb") as f:
+                async for chunk in chunks:
+                    guard.update(chunk)
+                    await f.write(chunk)
+            os.replace(part_path, file_path)
+        except BaseException as e:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part_path)
+            if not isinstance(e, FileTooLargeError):
+                logger.error(f"Error saving file {file_id}: {str(e)}")
+            raise
+        
+        logger.info(f"File {file_id} streamed to {file_path} ({guard.size} bytes)")
+        return StoredFile(file_id, file_path, guard.size, guard.sha256, self)
+    
+    @contextlib.asynccontextmanager
+    async def open_file(self, file_id: str):
+        """Open a locally stored file for reading."""
+        fh = await asyncio.to_thread(open, os.path.join(self.upload_dir, file_id), "rb")
+        try:
+            yield fh
+        finally:
+            fh.close()
+    
+    async def exists(self, file_id: str) -> bool:
+        """Check whether a file exists in local storage."""
+        return os.path.exists(os.path.join(self.upload_dir, file_id))
+    
+    async def move_file(self, source_id: str, target_id: str) -> None:
+        """Atomically rename a file within local storage."""
+        target_path = os.path.join(self.upload_dir, target_id)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(os.path.join(self.upload_dir, source_id), target_path)
 
 
 class S3StorageService(StorageService):
@@ -230,4 +452,58 @@ class S3StorageService(StorageService):
         be used for accessing the file, but it's not a local path.
         """
         # For S3, we don't have a physical path, so return an S3 URL
-        return f"s3://{self.bucket_name}/{file_id}"
\ No newline at end of file
+        return f"s3://{self.bucket_name}/{file_id}"
+    
+    async def save_stream(
+        self, chunks: AsyncIterator[bytes], file_id: str, content_type: str, max_size_bytes: Optional[int] = None
+    ) -> StoredFile:
+        """Spool chunks (memory up to 8 MB, then disk) while hashing, then upload to S3."""
+        guard = _HashingSizeGuard(max_size_bytes)
+        
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            async for chunk in chunks:
+                guard.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+            try:
+                await asyncio.to_thread(
+                    self.s3_client.upload_fileobj, spool, self.bucket_name, file_id,
+                    ExtraArgs={"ContentType": content_type}
+                )
+            except Exception as e:
+                logger.error(f"Error uploading file {file_id} to S3: {str(e)}")
+                raise
+        
+        s3_url = f"s3://{self.bucket_name}/{file_id}"
+        logger.info(f"File {file_id} streamed to S3: {s3_url} ({guard.size} bytes)")
+        return StoredFile(file_id, s3_url, guard.size, guard.sha256, self)
+    
+    @contextlib.asynccontextmanager
+    async def open_file(self, file_id: str):
+        """Download an S3 object into a spooled temporary file for reading."""
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            try:
+                await asyncio.to_thread(self.s3_client.download_fileobj, self.bucket_name, file_id, spool)
+            except Exception as e:
+                raise FileNotFoundError(f"S3 object {file_id} not readable: {e}") from e
+            spool.seek(0)
+            yield spool
+    
+    async def exists(self, file_id: str) -> bool:
+        """Check whether an object exists in S3 storage."""
+        try:
+            await asyncio.to_thread(self.s3_client.head_object, Bucket=self.bucket_name, Key=file_id)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+    
+    async def move_file(self, source_id: str, target_id: str) -> None:
+        """Copy an object to a new key within the bucket, then delete the original."""
+        await asyncio.to_thread(
+            self.s3_client.copy_object,
+            Bucket=self.bucket_name, Key=target_id,
+            CopySource={"Bucket": self.bucket_name, "Key": source_id}
+        )
+        await asyncio.to_thread(self.s3_client.delete_object, Bucket=self.bucket_name, Key=source_id)
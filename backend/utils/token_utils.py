@@ -1,28 +1,52 @@
 # backend/utils/token_utils.py
 
 import json
-from typing import List, Dict, Any
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    logger.warning("tiktoken not available. Token estimates will use the 4 chars/token heuristic.")
+    TIKTOKEN_AVAILABLE = False
+
+# Fixed costs that the text-only estimate cannot see
+MESSAGE_OVERHEAD_TOKENS = 4         # role/turn framing per message
+TOOL_USE_SYSTEM_TOKENS = 346        # hidden tool-use system prompt added when tools are present
+DOCUMENT_BLOCK_TOKENS = 3_000       # Files API / base64 PDF whose page count is unknown locally
+IMAGE_BLOCK_TOKENS = 1_600          # upper bound for a resized image block
+
+# Correction factor learning (exponential moving average of actual/raw)
+CORRECTION_SMOOTHING = 0.2
+CORRECTION_MIN = 0.5
+CORRECTION_MAX = 3.0
+
 
 def count_tokens(messages: List[Dict[str, Any]]) -> int:
     """
     Estimate token count for a list of messages.
     This is a rough approximation: 4 characters ≈ 1 token for English text.
-    
+
     Args:
         messages: List of message dictionaries
-        
+
     Returns:
         Estimated token count
     """
     total_chars = 0
-    
+
     for message in messages:
         content = message.get("content", "")
-        
+
         # Handle string content
         if isinstance(content, str):
             total_chars += len(content)
-        
+
         # Handle list content (multimodal messages)
         elif isinstance(content, list):
             for item in content:
@@ -33,10 +57,227 @@ def count_tokens(messages: List[Dict[str, Any]]) -> int:
                     # For document/image content, add a base estimate
                     elif item.get("type") in ["document", "image"]:
                         total_chars += 100  # Base overhead for media
-        
+
         # Handle dict content (legacy format)
         elif isinstance(content, dict):
             total_chars += len(json.dumps(content))
-    
+
     # Rough approximation: 4 characters ≈ 1 token
-    return total_chars // 4 
\ No newline at end of file
+    return total_chars // 4
+
+
+@dataclass
+class TokenEstimate:
+    """Result of a local request-size estimate."""
+    model: str
+    raw_tokens: int        # uncorrected tiktoken/heuristic count
+    tokens: int            # raw_tokens scaled by the model's learned correction factor
+    correction: float
+    # Document/image blocks were counted at a flat placeholder size, so the estimate
+    # says little about the model's tokenizer and is not used to learn the correction
+    has_placeholder_blocks: bool = False
+
+
+class TokenEstimator:
+    """
+    Local input-token estimator for Claude requests.
+
+    Counts the system prompt, tool schemas, messages and document/image blocks with
+    tiktoken, then scales the result by a per-model correction factor that is learned
+    from ``usage.input_tokens`` of completed responses. This replaces the awaited
+    ``messages.count_tokens`` round trip on the request hot path.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", smoothing: float = CORRECTION_SMOOTHING):
+        self._encoding_name = encoding_name
+        self._encoding = None
+        self._encoding_unavailable = not TIKTOKEN_AVAILABLE
+        self._smoothing = smoothing
+        self._corrections: Dict[str, float] = {}
+        self._observations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if self._encoding is None and not self._encoding_unavailable:
+            try:
+                self._encoding = tiktoken.get_encoding(self._encoding_name)
+            except Exception as e:
+                # Typically the BPE file is not cached and cannot be downloaded
+                logger.warning(f"Could not load tiktoken encoding '{self._encoding_name}': {e}. Using 4 chars/token heuristic.")
+                self._encoding_unavailable = True
+        return self._encoding
+
+    def count_text(self, text: Optional[str]) -> int:
+        """Count tokens in a plain string."""
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            return max(1, len(text) // 4)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def _count_block(self, block: Any) -> int:
+        if isinstance(block, str):
+            return self.count_text(block)
+        if not isinstance(block, dict):
+            return self.count_text(str(block))
+
+        block_type = block.get("type")
+        if block_type == "text":
+            return self.count_text(block.get("text", ""))
+        if block_type == "document":
+            source = block.get("source") or {}
+            if source.get("type") == "text":
+                return self.count_text(source.get("data", ""))
+            if source.get("type") == "content" and isinstance(source.get("content"), list):
+                return sum(self._count_block(b) for b in source["content"])
+            return DOCUMENT_BLOCK_TOKENS
+        if block_type == "image":
+            return IMAGE_BLOCK_TOKENS
+        if block_type == "tool_use":
+            return self.count_text(block.get("name", "")) + self.count_text(json.dumps(block.get("input", {}), default=str))
+        if block_type == "tool_result":
+            content = block.get("content", "")
+            if isinstance(content, list):
+                return sum(self._count_block(b) for b in content)
+            return self.count_text(content if isinstance(content, str) else json.dumps(content, default=str))
+        return self.count_text(json.dumps(block, default=str))
+
+    @classmethod
+    def _has_placeholder_block(cls, content: Any) -> bool:
+        """Whether content holds a block counted at DOCUMENT_BLOCK_TOKENS or IMAGE_BLOCK_TOKENS."""
+        if isinstance(content, list):
+            return any(cls._has_placeholder_block(item) for item in content)
+        if not isinstance(content, dict):
+            return False
+        block_type = content.get("type")
+        if block_type == "image":
+            return True
+        if block_type == "document":
+            source = content.get("source") or {}
+            if source.get("type") == "content" and isinstance(source.get("content"), list):
+                return cls._has_placeholder_block(source["content"])
+            return source.get("type") != "text"
+        if block_type == "tool_result":
+            return cls._has_placeholder_block(content.get("content"))
+        return False
+
+    def _count_content(self, content: Any) -> int:
+        if isinstance(content, list):
+            return sum(self._count_block(item) for item in content)
+        if isinstance(content, dict):
+            return self._count_block(content)
+        return self.count_text(content if isinstance(content, str) else str(content or ""))
+
+    def estimate_raw(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> int:
+        """
+        Count the uncorrected input tokens of a request.
+
+        Args:
+            messages: Anthropic-format messages
+            system: System prompt string or list of system content blocks
+            tools: Tool definitions sent with the request
+
+        Returns:
+            Raw token count before per-model correction
+        """
+        total = 0
+        if system:
+            total += self._count_content(system)
+        if tools:
+            total += TOOL_USE_SYSTEM_TOKENS
+            for tool in tools:
+                tool_def = {k: v for k, v in tool.items() if k != "cache_control"} if isinstance(tool, dict) else tool
+                total += self.count_text(json.dumps(tool_def, default=str))
+        for message in messages or []:
+            total += MESSAGE_OVERHEAD_TOKENS
+            if isinstance(message, dict):
+                total += self._count_content(message.get("content", ""))
+        return total
+
+    def estimate(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> TokenEstimate:
+        """Estimate input tokens for a request, corrected for the target model."""
+        raw = self.estimate_raw(messages, system=system, tools=tools)
+        correction = self.correction_factor(model)
+        has_placeholder_blocks = any(
+            self._has_placeholder_block(message.get("content"))
+            for message in messages or [] if isinstance(message, dict)
+        )
+        return TokenEstimate(model=model, raw_tokens=raw, tokens=int(raw * correction), correction=correction,
+                             has_placeholder_blocks=has_placeholder_blocks)
+
+    def correction_factor(self, model: str) -> float:
+        """Current learned actual/raw ratio for a model (1.0 until observed)."""
+        with self._lock:
+            return self._corrections.get(model, 1.0)
+
+    def observe(self, model: str, raw_tokens: int, actual_tokens: int) -> None:
+        """
+        Learn from a completed response.
+
+        Args:
+            model: Model the request was sent to
+            raw_tokens: Raw estimate recorded before the request was sent
+            actual_tokens: Total input tokens reported in the response usage
+        """
+        if raw_tokens <= 0 or actual_tokens <= 0:
+            return
+        ratio = min(CORRECTION_MAX, max(CORRECTION_MIN, actual_tokens / raw_tokens))
+        with self._lock:
+            previous = self._corrections.get(model)
+            if previous is None:
+                updated = ratio
+            else:
+                updated = previous + self._smoothing * (ratio - previous)
+            self._corrections[model] = updated
+            self._observations[model] = self._observations.get(model, 0) + 1
+        logger.debug(f"Token estimator correction for {model}: {updated:.3f} (raw={raw_tokens}, actual={actual_tokens})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-model correction factors for debugging and stats endpoints."""
+        with self._lock:
+            return {
+                "encoding": None if self._encoding_unavailable else self._encoding_name,
+                "models": {
+                    model: {
+                        "correction_factor": round(factor, 4),
+                        "observations": self._observations.get(model, 0),
+                    }
+                    for model, factor in self._corrections.items()
+                },
+            }
+
+
+def total_input_tokens(usage: Any) -> int:
+    """
+    Total prompt tokens billed for a response, including prompt-cache reads and writes.
+
+    Args:
+        usage: ``usage`` object from an Anthropic Message
+
+    Returns:
+        input_tokens + cache_creation_input_tokens + cache_read_input_tokens
+    """
+    if usage is None:
+        return 0
+    total = 0
+    for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+        value = getattr(usage, field, None)
+        if isinstance(value, int):
+            total += value
+    return total
+
+
+# Global estimator shared by all ClaudeService instances in this process
+token_estimator = TokenEstimator()
@@ -0,0 +1,109 @@
+"""
+Progressive visualization tool inputs.
+
+Builds partial ``generate_graph_data`` / ``generate_table_data`` inputs from the
+``input_json_delta`` fragments of a streaming response, so charts and tables can start
+rendering before the whole answer has finished. ToolInputProgress feeds the fragments
+to an IncrementalJSONParser and turns completed members into ``tool_progress`` events:
+the chart/table type and ``config`` as soon as they are complete, and each ``data`` row
+once it is complete and passes validation.
+
+The final tool input is still taken from the complete message and processed by
+utils.tool_processing; progress events are a preview only.
+"""
+import logging
+from numbers import Number
+from typing import Any, Dict, List, Optional
+
+from utils.partial_json import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+PROGRESSIVE_TOOLS = ("generate_graph_data", "generate_table_data")
+
+_TYPE_KEYS = {"generate_graph_data": "chartType", "generate_table_data": "tableType"}
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, bool, Number))
+
+
+class ToolInputProgress:
+    """Partial input of one streamed visualization tool call."""
+
+    def __init__(self, tool_id: str, tool_name: str):
+        self.tool_id = tool_id
+        self.tool_name = tool_name
+        self.parser = IncrementalJSONParser(max_depth=2)
+        self.visualization_type: Optional[str] = None
+        self.config: Optional[Dict[str, Any]] = None
+        self.chart_config: Optional[Dict[str, Any]] = None
+        self.rows: List[Dict[str, Any]] = []
+        self.rejected_rows = 0
+
+    def feed(self, partial_json: str, message_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Consume one input_json_delta fragment.
+
+        Returns:
+            A tool_progress event if the fragment completed anything worth showing, else None
+        """
+        new_rows: List[Dict[str, Any]] = []
+        row_offset = len(self.rows)
+        config_changed = False
+        for path, value in self.parser.feed(partial_json):
+            key = path[0]
+            if len(path) == 2 and key == "data":
+                row = self._validate_row(value)
+                if row is None:
+                    self.rejected_rows += 1
+                else:
+                    new_rows.append(row)
+            elif len(path) == 1:
+                if key == _TYPE_KEYS[self.tool_name] and isinstance(value, str):
+                    self.visualization_type = value
+                    config_changed = True
+                elif key == "config" and isinstance(value, dict):
+                    self.config = value
+                    config_changed = True
+                elif key == "chartConfig" and isinstance(value, dict):
+                    self.chart_config = value
+                    config_changed = True
+        if not new_rows and not config_changed:
+            return None
+        self.rows.extend(new_rows)
+
+        event: Dict[str, Any] = {
+            "type": "tool_progress",
+            "tool_id": self.tool_id,
+            "tool_name": self.tool_name,
+            "message_id": message_id,
+            "visualization_type": self.visualization_type,
+            "rows": new_rows,
+            "row_offset": row_offset,
+            "rows_total": len(self.rows)
+        }
+        if config_changed:
+            event["config"] = self.config
+            if self.tool_name == "generate_graph_data":
+                event["chart_config"] = self.chart_config
+        return event
+
+    def _validate_row(self, row: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(row, dict) or not row:
+            return None
+        if not all(_is_scalar(value) for value in row.values()):
+            return None
+        if self.tool_name == "generate_graph_data":
+            x_key = (self.config or {}).get("xAxisKey") or "name"
+            if x_key not in row:
+                return None
+            if not any(isinstance(value, Number) and not isinstance(value, bool) for key, value in row.items() if key != x_key):
+                return None
+            return row
+        columns = (self.config or {}).get("columns")
+        if isinstance(columns, list):
+            keys = {column.get("key") for column in columns if isinstance(column, dict)}
+            if keys and not keys.intersection(row):
+                return None
+        return row
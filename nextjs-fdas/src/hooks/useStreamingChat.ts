@@ -3,6 +3,7 @@
 import { useState, useCallback, useRef, useEffect } from 'react';
 import { Message } from '@/types';
 import { conversationApi } from '@/lib/api/conversation';
+import { DeltaStreamDecoder, STREAM_PROTOCOL_VERSION } from '@/lib/streamProtocol';
 
 export interface StreamingEvent {
   type: 'message_start' | 'text_delta' | 'tool_start' | 'tool_complete' | 
@@ -18,6 +19,9 @@ export interface StreamingEvent {
   success?: boolean;
   error?: string;
   message?: string;
+  // Delta protocol: per-message frame sequence and text length
+  seq?: number;
+  length?: number;
   // Enhanced metadata for better content handling
   is_initial_content?: boolean;
   content_length?: number;
@@ -68,6 +72,15 @@ export function useStreamingChat({
   
   // Use a ref to store the latest handler to avoid stale closures
   const handleStreamingEventRef = useRef<(event: StreamingEvent) => void>();
+
+  // Rebuilds accumulated_text from delta-protocol frames before they reach the handler
+  const streamDecoderRef = useRef(new DeltaStreamDecoder());
+  const dispatchStreamFrame = useCallback((frame: StreamingEvent) => {
+    for (const streamingEvent of streamDecoderRef.current.decode(frame)) {
+      // Use the ref to call the latest version of the handler
+      handleStreamingEventRef.current?.(streamingEvent as StreamingEvent);
+    }
+  }, []);
   
   // Reconnection state
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
@@ -595,7 +608,7 @@ export function useStreamingChat({
       const protocol = backendUrl.protocol === 'https:' ? 'wss:' : 'ws:';
       
       // Construct WebSocket URL pointing to the backend server
-      const wsUrl = `${protocol}//${backendUrl.hostname}:${backendUrl.port || (backendUrl.protocol === 'https:' ? '443' : '8000')}/ws/conversation/${conversationId}`;
+      const wsUrl = `${protocol}//${backendUrl.hostname}:${backendUrl.port || (backendUrl.protocol === 'https:' ? '443' : '8000')}/ws/conversation/${conversationId}?protocol=${STREAM_PROTOCOL_VERSION}`;
       
       console.log('Starting WebSocket connection to:', wsUrl);
       console.log('Current isConnected state before connection:', isConnected);
@@ -612,8 +625,7 @@ export function useStreamingChat({
       wsRef.current.onmessage = (event) => {
         try {
           const streamingEvent: StreamingEvent = JSON.parse(event.data);
-          // Use the ref to call the latest version of the handler
-          handleStreamingEventRef.current?.(streamingEvent);
+          dispatchStreamFrame(streamingEvent);
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
         }
@@ -656,7 +668,7 @@ export function useStreamingChat({
       isConnectingRef.current = false; // Clear connecting flag
       onError?.('Failed to establish WebSocket connection');
     }
-  }, [conversationId, onError, clearReconnectTimeout, getReconnectDelay]);
+  }, [conversationId, onError, clearReconnectTimeout, getReconnectDelay, dispatchStreamFrame]);
 
   // Server-Sent Events streaming (fallback)
   const connectSSE = useCallback(() => {
@@ -665,7 +677,7 @@ export function useStreamingChat({
     }
 
     try {
-      const sseUrl = `/api/conversation/${conversationId}/message/stream`;
+      const sseUrl = `/api/conversation/${conversationId}/message/stream?protocol=${STREAM_PROTOCOL_VERSION}`;
       eventSourceRef.current = new EventSource(sseUrl);
 
       eventSourceRef.current.onopen = () => {
@@ -676,8 +688,7 @@ export function useStreamingChat({
       eventSourceRef.current.onmessage = (event) => {
         try {
           const streamingEvent: StreamingEvent = JSON.parse(event.data);
-          // Use the ref to call the latest version of the handler
-          handleStreamingEventRef.current?.(streamingEvent);
+          dispatchStreamFrame(streamingEvent);
         } catch (error) {
           console.error('Error parsing SSE message:', error);
         }
@@ -691,7 +702,7 @@ export function useStreamingChat({
       console.error('Error connecting SSE:', error);
       setIsConnected(false);
     }
-  }, [conversationId]);
+  }, [conversationId, dispatchStreamFrame]);
 
   // Send streaming message via WebSocket
   const sendStreamingMessage = useCallback(async (content: string) => {
@@ -721,7 +732,7 @@ export function useStreamingChat({
   // Send streaming message via HTTP (fallback)
   const sendStreamingMessageHTTP = useCallback(async (content: string) => {
     try {
-      const response = await fetch(`/api/conversation/${conversationId}/message/stream`, {
+      const response = await fetch(`/api/conversation/${conversationId}/message/stream?protocol=${STREAM_PROTOCOL_VERSION}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -760,8 +771,7 @@ export function useStreamingChat({
           if (line.startsWith('data: ')) {
             try {
               const streamingEvent: StreamingEvent = JSON.parse(line.slice(6));
-              // Use the ref to call the latest version of the handler
-              handleStreamingEventRef.current?.(streamingEvent);
+              dispatchStreamFrame(streamingEvent);
             } catch (error) {
               console.error('Error parsing SSE chunk:', error);
             }
@@ -772,7 +782,7 @@ export function useStreamingChat({
       console.error('Error in HTTP streaming:', error);
       throw error;
     }
-  }, [conversationId]);
+  }, [conversationId, dispatchStreamFrame]);
 
   // Auto-connect WebSocket on mount (only if conversationId is provided)
   useEffect(() => {
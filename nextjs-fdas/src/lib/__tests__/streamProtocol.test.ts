@@ -0,0 +1,44 @@
+import { DeltaStreamDecoder, StreamFrame } from '@/lib/streamProtocol';
+
+const texts = (events: StreamFrame[]) => events.map(event => event.accumulated_text);
+
+describe('DeltaStreamDecoder', () => {
+  it('rebuilds accumulated_text from deltas and snapshots', () => {
+    const decoder = new DeltaStreamDecoder();
+    const frames: StreamFrame[] = [
+      { type: 'message_start', message_id: 'm1', seq: 1 },
+      { type: 'text_delta', message_id: 'm1', seq: 2, text: 'Revenue ' },
+      { type: 'text_delta', message_id: 'm1', seq: 3, text: 'grew' },
+      { type: 'snapshot', message_id: 'm1', seq: 4, text: 'Revenue grew 12%', length: 16 },
+      { type: 'content_update', message_id: 'm1', seq: 5, length: 16 },
+      { type: 'text_delta', message_id: 'm1', seq: 6, text: '.' },
+    ];
+
+    const events = frames.flatMap(frame => decoder.decode(frame));
+
+    expect(events.map(event => event.type)).toEqual([
+      'message_start', 'text_delta', 'text_delta', 'content_update', 'content_update', 'text_delta'
+    ]);
+    expect(texts(events).slice(1)).toEqual([
+      'Revenue ', 'Revenue grew', 'Revenue grew 12%', 'Revenue grew 12%', 'Revenue grew 12%.'
+    ]);
+  });
+
+  it('drops frames that were already applied', () => {
+    const decoder = new DeltaStreamDecoder();
+    const delta: StreamFrame = { type: 'text_delta', message_id: 'm1', seq: 1, text: 'Cash' };
+
+    expect(texts(decoder.decode(delta))).toEqual(['Cash']);
+    expect(decoder.decode(delta)).toEqual([]);
+    decoder.decode({ type: 'message_complete', message_id: 'm1', seq: 2 });
+    expect(decoder.decode(delta)).toEqual([]);
+  });
+
+  it('passes legacy frames through unchanged', () => {
+    const decoder = new DeltaStreamDecoder();
+    const frame: StreamFrame = { type: 'text_delta', message_id: 'm1', text: 'a', accumulated_text: 'xa' };
+
+    expect(decoder.decode(frame)).toEqual([frame]);
+    expect(texts(decoder.decode({ type: 'text_delta', message_id: 'm1', text: 'b' }))).toEqual(['xab']);
+  });
+});
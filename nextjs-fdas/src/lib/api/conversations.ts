@@ -5,6 +5,7 @@ import {
   ConversationAnalysisResponseSchema
 } from '@/validation/schemas';
 import { Citation, ConversationAnalysisResponse } from '@/types/enhanced';
+import { STREAM_PROTOCOL_VERSION } from '@/lib/streamProtocol';
 
 // Function to handle API errors - keeping for backwards compatibility
 const handleApiError = (error: any): never => {
@@ -265,10 +266,17 @@ export const conversationsApi = {
       
       // Use the streaming API
       await apiService.stream<any>(
-        `/conversation/${sessionId}/message/stream`,
+        `/conversation/${sessionId}/message/stream?protocol=${STREAM_PROTOCOL_VERSION}`,
         data,
         // Handle each chunk
         (chunk) => {
+          if (chunk.type === 'snapshot') {
+            // Full text so far; replaces whatever the deltas rebuilt
+            accumulatedContent = chunk.text || '';
+            callbacks.onChunk({ content: '', full: accumulatedContent });
+            return;
+          }
+
           // Different backends might format chunks differently
           const content = chunk.content || chunk.delta || chunk.text || '';
           
@@ -0,0 +1,90 @@
+/**
+ * Client side of the streaming wire protocol (backend: services/stream_protocol.py).
+ *
+ * Protocol 2 frames carry a per-message `seq`. `text_delta` frames carry only the new
+ * text, `content_update` frames carry the text `length` instead of the text, and
+ * `snapshot` frames carry the full text. DeltaStreamDecoder rebuilds the text of each
+ * message and turns frames back into events with `accumulated_text`, so handlers
+ * written for the legacy protocol keep working unchanged.
+ */
+
+export const STREAM_PROTOCOL_VERSION = 2;
+
+export interface StreamFrame {
+  type: string;
+  seq?: number;
+  message_id?: string;
+  text?: string;
+  length?: number;
+  accumulated_text?: string;
+}
+
+interface MessageStreamState {
+  text: string;
+  seq: number;
+}
+
+export class DeltaStreamDecoder {
+  private messages = new Map<string, MessageStreamState>();
+
+  /**
+   * Decode one frame into the events to handle, in order. Frames that were already
+   * applied (e.g. replayed after a reconnect) decode to nothing.
+   */
+  decode(frame: StreamFrame): StreamFrame[] {
+    const key = frame.message_id ?? '';
+    let state = this.messages.get(key);
+    if (!state) {
+      state = { text: '', seq: 0 };
+      this.messages.set(key, state);
+    }
+
+    if (typeof frame.seq === 'number') {
+      if (frame.seq <= state.seq) {
+        return [];
+      }
+      if (state.seq > 0 && frame.seq !== state.seq + 1) {
+        // The next snapshot brings the text back in sync
+        console.warn(`Stream ${key}: frames ${state.seq + 1}-${frame.seq - 1} missing`);
+      }
+      state.seq = frame.seq;
+    }
+
+    switch (frame.type) {
+      case 'snapshot':
+        state.text = frame.text ?? '';
+        return [{ type: 'content_update', message_id: frame.message_id, accumulated_text: state.text }];
+
+      case 'text_delta':
+        if (frame.accumulated_text !== undefined) {
+          // Legacy frame
+          state.text = frame.accumulated_text;
+          return [frame];
+        }
+        state.text += frame.text ?? '';
+        return [{ ...frame, accumulated_text: state.text }];
+
+      case 'content_update':
+        if (frame.accumulated_text !== undefined) {
+          state.text = frame.accumulated_text;
+          return [frame];
+        }
+        if (typeof frame.length !== 'number') {
+          return [frame];
+        }
+        if (frame.length !== state.text.length) {
+          console.warn(`Stream ${key}: have ${state.text.length} chars, server has ${frame.length}`);
+        }
+        return [{ ...frame, accumulated_text: state.text }];
+
+      case 'message_complete':
+      case 'error':
+        // Keep the seq so late duplicates are still dropped
+        state.text = '';
+        return [frame];
+
+      default:
+        return [frame];
+    }
+  }
+}